@@ -0,0 +1,61 @@
+import importlib
+import functools
+import asyncio
+
+# Built-in backend modules are imported on first use, so importing the engine (or running
+# `autologic --help`) does not pull in every provider SDK and llama.cpp's shared library.
+_BUILTIN_MODULES = {
+    "gemini": "gemini",
+    "local": "localLLM",
+    "local_workers": "localWorkers",
+    "openai": "openai",
+}
+_modules = {}
+
+# Backends beyond the built-in ModelTypes, keyed by the model_type string set on an LLMConfig.
+_backends = {}
+
+
+def load(name: str):
+    module = _modules.get(name)
+    if module is None:
+        module = importlib.import_module(f"{__package__}.{_BUILTIN_MODULES[name]}")
+        _modules[name] = module
+    return module
+
+
+def loaded() -> list:
+    return sorted(_modules)
+
+
+def register_backend(name: str, backend):
+    """Register `backend` under `name` so LLMConfig(model_type=name) dispatches to it.
+
+    The backend provides `invoke(prompt, llmConfig, **options) -> str` and, optionally, a coroutine
+    `async_invoke` with the same signature. options are template, grammar, json_mode and scanner;
+    backends may ignore any of them.
+    """
+    _backends[name] = backend
+
+
+def unregister_backend(name: str):
+    _backends.pop(name,None)
+
+
+def get_backend(name: str):
+    backend = _backends.get(name)
+    if backend is None:
+        raise ValueError("Unsupported model Type!")
+    return backend
+
+
+def invoke(name: str, prompt: str, llmConfig, **options) -> str:
+    return get_backend(name).invoke(prompt,llmConfig,**options)
+
+
+async def async_invoke(name: str, prompt: str, llmConfig, **options) -> str:
+    backend = get_backend(name)
+    if hasattr(backend,"async_invoke"):
+        return await backend.async_invoke(prompt,llmConfig,**options)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None,functools.partial(backend.invoke,prompt,llmConfig,**options))
@@ -0,0 +1,292 @@
+from . import reasoningEngine
+from . import structureCache
+from . import metrics
+from . import scheduler
+from . import cascade as cascadePolicy
+from .utils import log_print
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+import threading
+import json
+import time
+import os
+
+
+@dataclass
+class BatchJobConfig:
+    input_path: str
+    output_path: str
+    discover_config: reasoningEngine.LLMConfig
+    solve_config: reasoningEngine.LLMConfig = None
+    cascade: cascadePolicy.CascadePolicy = field(default=None,metadata={"description": "Solve with these tiers instead of solve_config."})
+    concurrency: int = field(default=4,metadata={"description": "Tasks in flight at once. Input is read only as slots free up."})
+    retries: int = 3
+    reuse_structure: bool = field(default=True,metadata={"description": "Reuse reasoning structures for repeated tasks, and per `family` field of the input."})
+    discovery_mode: str = "three_step"
+    resume: bool = field(default=True,metadata={"description": "Continue from the checkpoint next to the output file instead of starting over."})
+    progress_every: int = field(default=100,metadata={"description": "Log progress after this many completed tasks."})
+    verbose: bool = False
+
+
+@dataclass
+class BatchJobSummary:
+    completed: int = 0
+    failed: int = 0
+    resumed_from: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def throughput(self) -> float:
+        return self.completed / self.elapsed if self.elapsed else 0.0
+
+
+class Checkpoint:
+    """Progress of a batch job, saved next to its output after every round of completed tasks.
+
+    Every input line before `line` (starting at byte `offset`) is done, as are the lines in `done`;
+    the first `output_bytes` of the output hold their results. Anything written after that is
+    truncated on resume and redone.
+    """
+
+    def __init__(self, path: str, input_path: str):
+        self.path = path
+        self.input_path = os.path.abspath(input_path)
+        self.line = 0
+        self.offset = 0
+        self.done = set()
+        self.output_bytes = 0
+        self.completed = 0
+        self.failed = 0
+        self.pending = {}
+        self.read_line = 0
+        self.read_offset = 0
+
+    @classmethod
+    def load(cls, path: str, input_path: str) -> "Checkpoint":
+        checkpoint = cls(path,input_path)
+        with open(path) as f:
+            state = json.load(f)
+        if state["input"] != checkpoint.input_path:
+            raise ValueError(f"Checkpoint {path} belongs to {state['input']}, not {checkpoint.input_path}. Start over without resuming.")
+        checkpoint.line = checkpoint.read_line = state["line"]
+        checkpoint.offset = checkpoint.read_offset = state["offset"]
+        checkpoint.done = set(state["done"])
+        checkpoint.output_bytes = state["output_bytes"]
+        checkpoint.completed = state["completed"]
+        checkpoint.failed = state["failed"]
+        return checkpoint
+
+    def read(self, line: int, next_offset: int):
+        self.read_line = line + 1
+        self.read_offset = next_offset
+
+    def submit(self, line: int, offset: int):
+        self.pending[line] = offset
+
+    def complete(self, line: int, output_bytes: int, failed: bool):
+        del self.pending[line]
+        self.done.add(line)
+        self.output_bytes = output_bytes
+        self.completed += 1
+        self.failed += failed
+        # The watermark is the oldest task still in flight, or the read position when none is.
+        if self.pending:
+            self.line = min(self.pending)
+            self.offset = self.pending[self.line]
+        else:
+            self.line, self.offset = self.read_line, self.read_offset
+        self.done = {done for done in self.done if done >= self.line}
+
+    def save(self):
+        state = {
+            "input": self.input_path,
+            "line": self.line,
+            "offset": self.offset,
+            "done": sorted(self.done),
+            "output_bytes": self.output_bytes,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path,"w") as f:
+            json.dump(state,f)
+        os.replace(temp_path,self.path)
+
+
+def checkpoint_path(output_path: str) -> str:
+    return f"{output_path}.checkpoint"
+
+
+def read_lines(path: str, line: int = 0, offset: int = 0):
+    """Yield (line number, byte offset, next byte offset, raw line) from `offset` on, one line at a time."""
+    with open(path,"rb") as f:
+        f.seek(offset)
+        for raw in f:
+            yield (line,offset,offset + len(raw),raw)
+            offset += len(raw)
+            line += 1
+
+
+def parse_task(raw: bytes) -> dict:
+    try:
+        item = json.loads(raw)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Input line is not valid JSON: {e}")
+    if isinstance(item,str):
+        item = {"task": item}
+    if not isinstance(item,dict) or not isinstance(item.get("task"),str):
+        raise ValueError("Input line must be a JSON string or an object with a \"task\" string")
+    return item
+
+
+class _FamilyStructures:
+    # One discovery per task family; concurrent tasks of the family wait for it. A failed
+    # discovery is forgotten so the family's next task tries again.
+
+    def __init__(self):
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def get(self, family: str, discover) -> dict:
+        with self._lock:
+            future = self._futures.get(family)
+            owner = future is None
+            if owner:
+                future = self._futures[family] = Future()
+        if owner:
+            try:
+                future.set_result(discover())
+            except Exception as e:
+                with self._lock:
+                    del self._futures[family]
+                future.set_exception(e)
+        return future.result()
+
+
+class BatchJob:
+
+    def __init__(self, config: BatchJobConfig):
+        self.config = config
+        self.solve_config = config.solve_config or config.discover_config
+        self.cache = structureCache.default_cache() if config.reuse_structure else None
+        self.families = _FamilyStructures()
+
+    def discover(self, task: str) -> dict:
+        return reasoningEngine.self_discover(
+            task=task,
+            llmConfig=self.config.discover_config,
+            verbose=self.config.verbose,
+            retries=self.config.retries,
+            cache=self.cache,
+            discovery_mode=self.config.discovery_mode
+        )
+
+    def process(self, line: int, raw: bytes) -> dict:
+        # Never raises: a failed task becomes a result with an error.
+        record = {"line": line, "id": line, "answer": None, "reasoning_structure": None, "discover_seconds": 0.0, "solve_seconds": 0.0, "seconds": 0.0, "error": None}
+        start = time.perf_counter()
+        try:
+            # Batch calls queue behind interactive ones when a provider's budget is tight.
+            with scheduler.context(scheduler.Priority.BATCH,f"batch:{self.config.input_path}"):
+                item = parse_task(raw)
+                record["id"] = item.get("id",line)
+                task = item["task"]
+                reasoning_structure = item.get("reasoning_structure")
+                if reasoning_structure is None:
+                    family = item.get("family")
+                    if family is not None and self.config.reuse_structure:
+                        reasoning_structure = self.families.get(family,lambda: self.discover(task))
+                    else:
+                        reasoning_structure = self.discover(task)
+                record["reasoning_structure"] = reasoning_structure
+                record["discover_seconds"] = time.perf_counter() - start
+                solve_start = time.perf_counter()
+                if self.config.cascade is not None:
+                    record["answer"] = self.config.cascade.solve_with_structure(task=task,reasoning_structure=reasoning_structure,verbose=self.config.verbose)
+                else:
+                    record["answer"] = reasoningEngine.solve_with_structure(
+                        task=task,
+                        reasoning_structure=reasoning_structure,
+                        solve_config=self.solve_config,
+                        verbose=self.config.verbose,
+                        retries=self.config.retries
+                    )
+                record["solve_seconds"] = time.perf_counter() - solve_start
+        except Exception as e:
+            record["error"] = str(e) or type(e).__name__
+        record["seconds"] = time.perf_counter() - start
+        return record
+
+    def open_checkpoint(self) -> Checkpoint:
+        path = checkpoint_path(self.config.output_path)
+        if self.config.resume and os.path.exists(path):
+            checkpoint = Checkpoint.load(path,self.config.input_path)
+            size = os.path.getsize(self.config.output_path) if os.path.exists(self.config.output_path) else 0
+            if size < checkpoint.output_bytes:
+                raise ValueError(f"{self.config.output_path} is shorter than its checkpoint. Start over without resuming.")
+            # Results written after the last checkpoint are redone.
+            with open(self.config.output_path,"ab") as f:
+                f.truncate(checkpoint.output_bytes)
+            log_print(f"Resuming {self.config.input_path} at line {checkpoint.line} ({checkpoint.completed} tasks already done)")
+            return checkpoint
+        with open(self.config.output_path,"wb"):
+            pass
+        return Checkpoint(path,self.config.input_path)
+
+    def run(self) -> BatchJobSummary:
+        start = time.perf_counter()
+        checkpoint = self.open_checkpoint()
+        summary = BatchJobSummary(resumed_from=checkpoint.completed)
+        concurrency = max(1,self.config.concurrency)
+        lines = read_lines(self.config.input_path,checkpoint.line,checkpoint.offset)
+        in_flight = {}
+        exhausted = False
+        with open(self.config.output_path,"ab") as output, ThreadPoolExecutor(max_workers=concurrency) as executor:
+            while True:
+                while not exhausted and len(in_flight) < concurrency:
+                    next_line = next(lines,None)
+                    if next_line is None:
+                        exhausted = True
+                        break
+                    line, offset, next_offset, raw = next_line
+                    checkpoint.read(line,next_offset)
+                    if line in checkpoint.done or not raw.strip():
+                        continue
+                    checkpoint.submit(line,offset)
+                    in_flight[executor.submit(self.process,line,raw)] = line
+                if not in_flight:
+                    break
+                finished, _ = wait(in_flight,return_when=FIRST_COMPLETED)
+                for future in finished:
+                    line = in_flight.pop(future)
+                    record = future.result()
+                    output.write(json.dumps(record).encode("utf-8") + b"\n")
+                    output.flush()
+                    failed = record["error"] is not None
+                    checkpoint.complete(line,output.tell(),failed)
+                    summary.completed += 1
+                    summary.failed += failed
+                    if summary.completed % self.config.progress_every == 0:
+                        log_print(f"Batch progress: {checkpoint.completed} tasks done ({checkpoint.failed} failed), {summary.completed / (time.perf_counter() - start):.2f} tasks/s")
+                checkpoint.save()
+            if not checkpoint.pending:
+                # Blank or already-done lines at the end of the input move the watermark too.
+                checkpoint.line, checkpoint.offset = checkpoint.read_line, checkpoint.read_offset
+                checkpoint.done.clear()
+                checkpoint.save()
+        summary.elapsed = time.perf_counter() - start
+        metrics.flush()
+        log_print(f"Batch complete: {summary.completed} tasks in {summary.elapsed:.2f}s ({summary.failed} failed, {summary.resumed_from} done before resuming)")
+        if self.config.cascade is not None:
+            log_print(f"Cascade tiers:\n{self.config.cascade.report()}")
+        return summary
+
+
+def run_job(config: BatchJobConfig) -> BatchJobSummary:
+    """Solve every task of a JSONL file, writing one result line per task as it completes.
+
+    Each input line is a JSON string or an object with `task` and optionally `id`, `family`
+    (tasks of a family share one discovered structure) or a ready `reasoning_structure`.
+    Progress is checkpointed next to the output, so an interrupted job resumes where it stopped.
+    """
+    return BatchJob(config).run()
@@ -0,0 +1,4 @@
+from .fakeBackend import FakeBackend, load_responses, synthetic_response
+from .runner import BenchResult, WORKLOADS, CONCURRENT_WORKLOADS, run, run_workload, compare, percentile
+
+__all__ = ['FakeBackend','load_responses','synthetic_response','BenchResult','WORKLOADS','CONCURRENT_WORKLOADS','run','run_workload','compare','percentile']
@@ -0,0 +1,162 @@
+from .runner import WORKLOADS, CONCURRENT_WORKLOADS, run, compare
+from .fakeBackend import load_responses
+from . import startup
+from . import extraction
+from . import promptCost
+from .. import reasoningEngine
+import argparse
+import json
+import sys
+
+
+def run_entry(args):
+    backend_options = dict(
+        latency=args.latency,
+        jitter=args.jitter,
+        failure_rate=args.failure_rate,
+        malformed_rate=args.malformed_rate,
+        seed=args.seed,
+        truncate_rate=args.truncate_rate,
+    )
+    if args.responses:
+        backend_options["responses"] = load_responses(args.responses)
+    report = run(
+        args.workload or ["select", "self_discover", "solve"],
+        backend_options=backend_options,
+        iterations=args.iterations,
+        retries=args.retries,
+        concurrency=args.concurrency,
+        trace_memory=args.trace_memory
+    )
+    write_report(report,args.output)
+
+
+def compare_entry(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    report = compare(baseline,candidate,threshold=args.threshold)
+    write_report(report,args.output)
+    for row in report["workloads"]:
+        changes = ", ".join(f"{name} {change:+.1%}" for name, change in row["change"].items())
+        status = f"REGRESSED ({', '.join(row['regressions'])})" if row["regressions"] else "ok"
+        print(f"{row['workload']}: {changes} -> {status}",file=sys.stderr)
+    if report["regressed"]:
+        sys.exit(1)
+
+
+def startup_entry(args):
+    reports = [startup.measure(target,runs=args.runs) for target in args.target or ["engine", "cli"]]
+    write_report({"results": reports},args.output)
+    problems = [problem for report in reports for problem in startup.check(report,args.budget)]
+    for problem in problems:
+        print(problem,file=sys.stderr)
+    if problems:
+        sys.exit(1)
+
+
+def extraction_entry(args):
+    report = extraction.measure(tuple(args.size or extraction.SIZES),runs=args.runs)
+    write_report(report,args.output)
+    for row in report["results"]:
+        legacy = f"{row['legacy_seconds'] * 1000:.3f}ms" if row["legacy_ok"] else "failed"
+        print(f"{row['case']} ({row['chars']} chars): legacy {legacy}, repairing {row['seconds'] * 1000:.3f}ms" + (f" {row['repairs']}" if row["repairs"] else ""),file=sys.stderr)
+
+
+def tokens_entry(args):
+    report = promptCost.account(args.backend,model_name=args.model_name,gguf_path=args.gguf_path)
+    write_report(report,args.output)
+    print(f"tokenizer: {report['tokenizer']}",file=sys.stderr)
+    for row in report["results"]:
+        print(f"{row['phase']} ({row['style']}): {row['tokens']} tokens" + (f", {row['saved']:.0%} saved" if row["style"] != "full" else ""),file=sys.stderr)
+
+
+def prompts_entry(args):
+    llmConfig = None
+    if args.backend:
+        llmConfig = reasoningEngine.LLMConfig(model_type=reasoningEngine.ModelType(args.backend),model_name=args.model_name,gguf_path=args.gguf_path,temp=args.temp)
+    backend_options = dict(latency=args.latency,prefill=args.prefill,malformed_rate=args.malformed_rate,seed=args.seed)
+    report = promptCost.measure(llmConfig,backend_options=backend_options,iterations=args.iterations,retries=args.retries,styles=args.style)
+    write_report(report,args.output)
+    for row in report["results"]:
+        print(f"{row['style']}: parse success {row['parse_success']:.1%}, {row['errors']} errors, p50 {row['p50']:.3f}s, p95 {row['p95']:.3f}s, {row['prompt_chars_per_call']:.0f} prompt chars per call",file=sys.stderr)
+
+
+def write_report(report: dict, output: str):
+    text = json.dumps(report,indent=2)
+    if output:
+        with open(output,"w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline autologic benchmarks against a deterministic fake backend.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='Run workloads and report latency percentiles, throughput, retries and peak memory as JSON.')
+    run_parser.add_argument('-w','--workload',action='append',choices=[*WORKLOADS, *CONCURRENT_WORKLOADS], help='Workload to run; repeat for several. Default: select, self_discover, solve.')
+    run_parser.add_argument('-n','--iterations',type=int, default=200, help='Calls (or tasks, for batch workloads) per workload.')
+    run_parser.add_argument('-r','--retries',type=int, default=3, help='Retries per phase.')
+    run_parser.add_argument('--concurrency',type=int, default=4, help='Concurrency for solve_batch and async_solve.')
+    run_parser.add_argument('--latency',type=float, default=0.0, help='Simulated seconds per backend call. 0 measures the engine overhead alone.')
+    run_parser.add_argument('--jitter',type=float, default=0.0, help='Uniform random extra latency, in seconds.')
+    run_parser.add_argument('--failure_rate',type=float, default=0.0, help='Fraction of backend calls that raise.')
+    run_parser.add_argument('--malformed_rate',type=float, default=0.0, help='Fraction of responses without a parseable code block.')
+    run_parser.add_argument('--truncate_rate',type=float, default=0.0, help='Fraction of responses cut short, as when a model runs out of tokens.')
+    run_parser.add_argument('--seed',type=int, default=0, help='Seed for latency, failure and malformed-response draws.')
+    run_parser.add_argument('--responses',type=str, default=None, help='JSON file of recorded responses per phase to replay instead of synthetic ones.')
+    run_parser.add_argument('--trace_memory',action='store_true', help='Also report peak Python allocations with tracemalloc (slows the run).')
+    run_parser.add_argument('-o','--output',type=str, default=None, help='Write the JSON report here instead of stdout.')
+    run_parser.set_defaults(func=run_entry)
+
+    compare_parser = subparsers.add_parser('compare', help='Diff two run reports; exits 1 if the candidate regressed.')
+    compare_parser.add_argument('baseline',type=str, help='Baseline run report.')
+    compare_parser.add_argument('candidate',type=str, help='Candidate run report.')
+    compare_parser.add_argument('-t','--threshold',type=float, default=0.1, help='Relative change counted as a regression. Default 0.1 (10%%).')
+    compare_parser.add_argument('-o','--output',type=str, default=None, help='Write the JSON comparison here instead of stdout.')
+    compare_parser.set_defaults(func=compare_entry)
+
+    startup_parser = subparsers.add_parser('startup', help='Measure cold import time in fresh interpreters; exits 1 if over budget or if a backend SDK is imported eagerly.')
+    startup_parser.add_argument('--target',action='append',choices=list(startup.TARGETS), help='What to import; repeat for several. Default: engine and cli.')
+    startup_parser.add_argument('--runs',type=int, default=10, help='Fresh interpreters per target.')
+    startup_parser.add_argument('--budget',type=float, default=0.5, help='Maximum median import time in seconds. Default 0.5.')
+    startup_parser.add_argument('-o','--output',type=str, default=None, help='Write the JSON report here instead of stdout.')
+    startup_parser.set_defaults(func=startup_entry)
+
+    extraction_parser = subparsers.add_parser('extraction', help='Time JSON extraction from responses, clean and defective, against the previous regex extractor.')
+    extraction_parser.add_argument('--size',type=int, action='append', help='Response size in characters; repeat for several. Default: 2k, 100k and 1M.')
+    extraction_parser.add_argument('--runs',type=int, default=20, help='Extractions per case; the median is reported.')
+    extraction_parser.add_argument('-o','--output',type=str, default=None, help='Write the JSON report here instead of stdout.')
+    extraction_parser.set_defaults(func=extraction_entry)
+
+    tokens_parser = subparsers.add_parser('tokens', help='Report the tokens each phase prompt costs on a backend, full and compact.')
+    tokens_parser.add_argument('--backend',type=str, default='openai', choices=['gemini', 'openai', 'local'], help='Backend whose tokenizer to count with. Default: openai.')
+    tokens_parser.add_argument('--model_name',type=str, default=None, help='Model whose tokenizer to use (openai and gemini).')
+    tokens_parser.add_argument('--gguf_path',type=str, default=None, help='GGUF file whose vocabulary to use (local).')
+    tokens_parser.add_argument('-o','--output',type=str, default=None, help='Write the JSON report here instead of stdout.')
+    tokens_parser.set_defaults(func=tokens_entry)
+
+    prompts_parser = subparsers.add_parser('prompts', help='Compare answer-parse success and latency of full solves with full and compact prompts.')
+    prompts_parser.add_argument('--style',action='append',choices=list(promptCost.STYLES), help='Prompt style to run; repeat for several. Default: all.')
+    prompts_parser.add_argument('-n','--iterations',type=int, default=20, help='Tasks solved per style.')
+    prompts_parser.add_argument('-r','--retries',type=int, default=3, help='Retries per phase.')
+    prompts_parser.add_argument('--backend',type=str, default=None, choices=['gemini', 'openai', 'local'], help='Run against this live backend instead of the fake one.')
+    prompts_parser.add_argument('--model_name',type=str, default=None, help='Model to call on the live backend.')
+    prompts_parser.add_argument('--gguf_path',type=str, default=None, help='GGUF file for the local backend.')
+    prompts_parser.add_argument('--temp',type=float, default=0.8, help='Temperature on the live backend.')
+    prompts_parser.add_argument('--latency',type=float, default=0.0, help='Fake backend: simulated seconds per call.')
+    prompts_parser.add_argument('--prefill',type=float, default=0.002, help='Fake backend: simulated seconds per 1000 prompt characters.')
+    prompts_parser.add_argument('--malformed_rate',type=float, default=0.0, help='Fake backend: fraction of responses without a parseable code block.')
+    prompts_parser.add_argument('--seed',type=int, default=0, help='Fake backend: seed for the random draws.')
+    prompts_parser.add_argument('-o','--output',type=str, default=None, help='Write the JSON report here instead of stdout.')
+    prompts_parser.set_defaults(func=prompts_entry)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
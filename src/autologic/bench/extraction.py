@@ -0,0 +1,82 @@
+from .. import jsonRepair
+from .fakeBackend import _STRUCTURE, _fill
+import statistics
+import json
+import time
+import re
+
+# JSON extraction as it was before jsonRepair: first fenced block by regex, then json.loads.
+_LEGACY_PATTERN = re.compile(r"```(?:json)?\s*(.*?)```",flags=re.DOTALL)
+
+SIZES = (2_000, 100_000, 1_000_000)
+
+
+def legacy_extract(response: str):
+    matches = _LEGACY_PATTERN.findall(response)
+    if matches:
+        return json.loads(matches[0])
+    if response.lstrip().startswith("{"):
+        return json.loads(response)
+    raise ValueError("No JSON Found")
+
+
+def _structure(size: int) -> dict:
+    # A filled-out reasoning structure of roughly `size` characters.
+    structure = {"Reasoning Structure": _fill(_STRUCTURE)}
+    step = 0
+    while len(json.dumps(structure)) < size:
+        step += 1
+        structure["Reasoning Structure"][f"Step {step + 3}: Elaborate"] = {"Notes": "Worked out from the task. " * 20}
+    structure["Reasoning Structure"]["FINAL_ANSWER"] = structure["Reasoning Structure"].pop("FINAL_ANSWER")
+    return structure
+
+
+def cases(size: int) -> dict:
+    """Responses carrying about `size` characters, clean and with the defects jsonRepair repairs."""
+    body = json.dumps(_structure(size),indent=2)
+    quoted = body.replace("Apply the operations in order.",'Apply the "operations" in order.')
+    commentary = "\n\nLet me know if you need anything else. Here is an example: ```python\nprint(1)\n```\n" * max(1,size // 200)
+    return {
+        "clean": f"```json\n{body}\n```\nLet me know if you need anything else.",
+        "long_tail": f"```json\n{body}\n```{commentary}",
+        "unfenced": f"Here is the completed structure:\n{body}\nLet me know if you need anything else.",
+        "trailing_comma": f"```json\n{body[:-1].rstrip()},\n}}\n```",
+        "unclosed_fence": f"```json\n{body}\n",
+        "unescaped_quote": f"```json\n{quoted}\n```",
+        "truncated": f"```json\n{body[:len(body) * 2 // 3]}",
+    }
+
+
+def _time(function, response: str, runs: int) -> tuple:
+    samples = []
+    ok = True
+    for _ in range(runs):
+        start = time.perf_counter()
+        try:
+            function(response)
+        except Exception:
+            ok = False
+        samples.append(time.perf_counter() - start)
+    return (statistics.median(samples),ok)
+
+
+def measure(sizes: tuple = SIZES, runs: int = 20) -> dict:
+    """Median seconds per extraction, legacy regex vs jsonRepair.extract, per response size and defect."""
+    results = []
+    for size in sizes:
+        for name, response in cases(size).items():
+            legacy_seconds, legacy_ok = _time(legacy_extract,response,runs)
+            seconds, ok = _time(jsonRepair.extract,response,runs)
+            extraction = jsonRepair.extract(response) if ok else None
+            results.append({
+                "case": name,
+                "chars": len(response),
+                "legacy_seconds": legacy_seconds,
+                "legacy_ok": legacy_ok,
+                "seconds": seconds,
+                "ok": ok,
+                "complete": extraction.complete if extraction else None,
+                "repairs": extraction.repairs if extraction else None,
+                "speedup": legacy_seconds / seconds if seconds else None,
+            })
+    return {"runs": runs, "results": results}
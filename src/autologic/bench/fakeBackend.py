@@ -0,0 +1,154 @@
+from .. import config
+from .. import utils
+import threading
+import asyncio
+import random
+import json
+import time
+
+PHASES = {
+    config.SELECT_PHASE_PROMPT_TEMPLATE: "select",
+    config.ADAPT_PHASE_PROMPT_TEMPLATE: "adapt",
+    config.IMPLEMENT_PHASE_PROMPT_TEMPLATE: "implement",
+    config.FUSED_DISCOVERY_PROMPT_TEMPLATE: "fused",
+    config.SOLVE_PROMPT_TEMPLATE: "solve",
+    config.SOLVE_CONTINUE_PROMPT_TEMPLATE: "continue",
+    config.COMPACT_SELECT_PHASE_PROMPT_TEMPLATE: "select",
+    config.COMPACT_ADAPT_PHASE_PROMPT_TEMPLATE: "adapt",
+    config.COMPACT_IMPLEMENT_PHASE_PROMPT_TEMPLATE: "implement",
+    config.COMPACT_FUSED_DISCOVERY_PROMPT_TEMPLATE: "fused",
+    config.COMPACT_SOLVE_PROMPT_TEMPLATE: "solve",
+    config.COMPACT_SOLVE_CONTINUE_PROMPT_TEMPLATE: "continue",
+}
+
+_STRUCTURE = {
+    "Step 1: Identify the Given Quantities": {
+        "Description": "List every quantity stated in the task.",
+        "Quantities": ""
+    },
+    "Step 2: Determine the Operations": {
+        "Description": "Decide which operations relate the quantities.",
+        "Operations": ""
+    },
+    "Step 3: Compute the Result": {
+        "Description": "Apply the operations in order.",
+        "Intermediate Results": "",
+        "Result": ""
+    },
+    "FINAL_ANSWER": ""
+}
+
+_ADAPTED = [
+    "Identify the quantities in the task: write down each number and what it refers to.",
+    "Break the task into steps: decide the order in which the quantities are combined.",
+    "Check the result: verify the final number against the task statement."
+]
+
+
+def _fill(structure):
+    if isinstance(structure,dict):
+        return {key: ("42" if key == "FINAL_ANSWER" else _fill(value)) for key, value in structure.items()}
+    return "Worked out from the task." if structure == "" else structure
+
+
+def synthetic_response(phase: str, prompt: str) -> str:
+    if phase == "select":
+        body = json.dumps({"reasoning_modules": [1, 15, 32]},indent=4)
+    elif phase == "adapt":
+        return "Here are the rephrased modules:\n\n```md\n" + "".join(f"- {module}\n" for module in _ADAPTED) + "```\n"
+    elif phase == "implement":
+        body = json.dumps({"Reasoning Structure": _STRUCTURE},indent=2)
+    elif phase == "fused":
+        body = json.dumps({"reasoning_modules": [1, 15, 32], "adapted_modules": _ADAPTED, "reasoning_structure": _STRUCTURE},indent=2)
+    elif phase == "solve":
+        # Fill in the structure the prompt carries so the response has a realistic size.
+        try:
+            structure = utils.extractJSONToDict(response=prompt)
+        except Exception:
+            structure = _STRUCTURE
+        body = json.dumps(_fill(structure),indent=2)
+    elif phase == "continue":
+        body = json.dumps(_fill(utils.extractJSONToDict(response=prompt[prompt.index("# Fields To Complete"):])),indent=2)
+    else:
+        raise ValueError(f"Unknown phase: {phase}")
+    return f"```json\n{body}\n```\nLet me know if you need anything else."
+
+
+class FakeBackend:
+    """Deterministic stand-in for an LLM backend, for offline benchmarks.
+
+    Responses are recorded ones (`responses` maps a phase to a list of responses that is cycled
+    through) or synthetic ones shaped like real model output. Latency, backend failures,
+    malformed (unparseable) and truncated responses are drawn from a seeded RNG, so a run is
+    reproducible. `prefill` adds latency per 1000 prompt characters, as prompt processing does.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, failure_rate: float = 0.0, malformed_rate: float = 0.0, seed: int = 0, responses: dict = None, truncate_rate: float = 0.0, prefill: float = 0.0):
+        self.latency = latency
+        self.prefill = prefill
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.malformed_rate = malformed_rate
+        self.truncate_rate = truncate_rate
+        self.responses = responses or {}
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._positions = {}
+        self._lock = threading.Lock()
+
+    def _plan(self, prompt: str, template: str) -> tuple:
+        phase = PHASES.get(template,"solve")
+        with self._lock:
+            self.calls += 1
+            delay = self.latency + (self._rng.uniform(0,self.jitter) if self.jitter else 0.0) + self.prefill * len(prompt) / 1000
+            fail = self._rng.random() < self.failure_rate
+            malformed = self._rng.random() < self.malformed_rate
+            # Only drawn when enabled, so existing seeds keep their sequences.
+            truncated = self.truncate_rate and self._rng.random() < self.truncate_rate
+            recorded = self.responses.get(phase)
+            response = None
+            if recorded:
+                position = self._positions.get(phase,0)
+                response = recorded[position % len(recorded)]
+                self._positions[phase] = position + 1
+        if response is None:
+            response = synthetic_response(phase,prompt)
+        if malformed:
+            response = "I am not sure how to format this."
+        elif truncated:
+            # Cut short as if the model ran out of tokens.
+            response = response[:len(response) * 2 // 3]
+        return (delay,fail,response)
+
+    def _deliver(self, response: str, fail: bool, scanner) -> str:
+        if fail:
+            raise Exception("Injected backend failure")
+        if scanner is None:
+            return response
+        for start in range(0,len(response),16):
+            if scanner.feed(response[start:start + 16]):
+                scanner.early_stop = True
+                break
+        return scanner.text
+
+    def invoke(self, prompt: str, llmConfig, template: str = None, scanner=None, **options) -> str:
+        delay, fail, response = self._plan(prompt,template)
+        if delay:
+            time.sleep(delay)
+        return self._deliver(response,fail,scanner)
+
+    async def async_invoke(self, prompt: str, llmConfig, template: str = None, scanner=None, **options) -> str:
+        delay, fail, response = self._plan(prompt,template)
+        if delay:
+            await asyncio.sleep(delay)
+        return self._deliver(response,fail,scanner)
+
+
+def load_responses(path: str) -> dict:
+    """Recorded responses as JSON: {"select": [...], "adapt": [...], "implement": [...], "fused": [...], "solve": [...]}."""
+    with open(path) as f:
+        responses = json.load(f)
+    unknown = set(responses) - set(PHASES.values())
+    if unknown:
+        raise ValueError(f"Unknown phases in recorded responses: {sorted(unknown)}")
+    return responses
@@ -0,0 +1,141 @@
+from .. import reasoningEngine
+from .. import backends
+from .. import metrics
+from .. import prompts
+from .. import utils
+from .. import jsonRepair
+from .fakeBackend import FakeBackend, _ADAPTED, _fill
+from .runner import TASKS, BACKEND_NAME, percentile, _structure
+import contextlib
+import dataclasses
+import time
+import io
+
+# Prompt rendering styles compared: (compact_prompts, abbreviate_modules).
+STYLES = {
+    "full": (False, False),
+    "compact": (True, False),
+    "compact_abbreviated": (True, True),
+}
+
+
+def estimate(text: str) -> int:
+    # About four characters per token for English text.
+    return (len(text) + 3) // 4
+
+
+def tokenizer(backend: str, model_name: str = None, gguf_path: str = None, api_key: str = None) -> tuple:
+    """(name, count) where `count(text)` is the number of tokens `backend` bills for `text`.
+
+    Uses tiktoken for openai, the GGUF vocabulary for local models and the Gemini API's
+    count_tokens for gemini; falls back to a characters / 4 estimate when those are unavailable.
+    """
+    try:
+        if backend == "openai":
+            import tiktoken
+            try:
+                encoding = tiktoken.encoding_for_model(model_name or "gpt-3.5-turbo-0125")
+            except KeyError:
+                encoding = tiktoken.get_encoding("cl100k_base")
+            return (f"tiktoken:{encoding.name}",lambda text: len(encoding.encode(text)))
+        if backend == "local" and gguf_path:
+            from llama_cpp import Llama
+            llm = Llama(model_path=gguf_path,vocab_only=True,verbose=False)
+            return (f"gguf:{gguf_path}",lambda text: len(llm.tokenize(text.encode("utf-8"),add_bos=False,special=True)))
+        if backend == "gemini":
+            from .. import gemini
+            if gemini._resolve_api_key(api_key):
+                return (f"gemini:{model_name or gemini.DEFAULT_MODEL}",lambda text: gemini.count_tokens(text,api_key,model_name))
+    except ImportError:
+        pass
+    return ("estimate",estimate)
+
+
+def sample_prompts(task: str = TASKS[0], compact: bool = False, abbreviated: bool = False) -> dict:
+    """Each phase's prompt for `task`, rendered with representative inputs."""
+    structure = {"Reasoning Structure": _structure()}
+    selection = {"reasoning_modules": [utils.id_to_rm(id) for id in (1, 15, 32)]}
+    adapted_modules = "".join(f"- {module}\n" for module in _ADAPTED)
+    fields = jsonRepair.missing_fields({},structure)
+    # Half of the fields filled out, as after a truncated SOLVE answer.
+    half = len(fields) // 2
+    partial = jsonRepair.merge(structure,jsonRepair.subset(_fill(structure),fields[:half]))
+    return {
+        "select": prompts.select(task,compact,abbreviated),
+        "adapt": prompts.adapt(task,selection,compact),
+        "implement": prompts.implement(task,adapted_modules,compact),
+        "fused": prompts.fused(task,compact,abbreviated),
+        "solve": prompts.solve(task,structure,compact),
+        "continue": prompts.solve_continue(task,partial,fields[half:],compact),
+    }
+
+
+def account(backend: str = "openai", model_name: str = None, gguf_path: str = None, api_key: str = None, task: str = TASKS[0]) -> dict:
+    """Tokens each phase's prompt costs on `backend`, per rendering style."""
+    name, count = tokenizer(backend,model_name,gguf_path,api_key)
+    rows = []
+    full = {}
+    for style, (compact, abbreviated) in STYLES.items():
+        for phase, prompt in sample_prompts(task,compact,abbreviated).items():
+            tokens = count(prompt)
+            full.setdefault(phase,tokens)
+            rows.append({
+                "phase": phase,
+                "style": style,
+                "chars": len(prompt),
+                "tokens": tokens,
+                "saved": 1 - tokens / full[phase] if full[phase] else 0.0,
+            })
+    return {"backend": backend, "model_name": model_name, "tokenizer": name, "results": rows}
+
+
+def _solve_style(llmConfig, iterations: int, retries: int) -> dict:
+    registry = metrics.enable()
+    latencies = []
+    errors = 0
+    try:
+        with reasoningEngine.track_usage() as usage, contextlib.redirect_stdout(io.StringIO()):
+            for iteration in range(iterations):
+                start = time.perf_counter()
+                try:
+                    reasoningEngine.solve(task=TASKS[iteration % len(TASKS)],discover_config=llmConfig,retries=retries)
+                except Exception:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+    finally:
+        metrics.disable()
+    counters = registry.snapshot()["counters"]
+    extraction_failures = int(sum(counter["value"] for counter in counters if counter["name"] == metrics.EXTRACTION_FAILURES))
+    return {
+        "iterations": iterations,
+        "errors": errors,
+        "backend_calls": usage.calls,
+        "extraction_failures": extraction_failures,
+        "parse_success": 1 - extraction_failures / usage.calls if usage.calls else 0.0,
+        "prompt_chars_per_call": usage.prompt_chars / usage.calls if usage.calls else 0.0,
+        "p50": percentile(latencies,0.50),
+        "p95": percentile(latencies,0.95),
+        "mean": sum(latencies) / len(latencies) if latencies else 0.0,
+    }
+
+
+def measure(llmConfig: reasoningEngine.LLMConfig = None, backend_options: dict = None, iterations: int = 20, retries: int = 3, styles: list = None) -> dict:
+    """Full solves per prompt style: answer-parse success, latency and prompt size.
+
+    Runs against `llmConfig` when given (a live backend), otherwise against a FakeBackend built
+    from `backend_options`, whose `prefill` option makes latency grow with prompt length.
+    """
+    results = []
+    for style in styles or STYLES:
+        compact, abbreviated = STYLES[style]
+        if llmConfig is None:
+            backends.register_backend(BACKEND_NAME,FakeBackend(**(backend_options or {})))
+            style_config = reasoningEngine.LLMConfig(model_type=BACKEND_NAME,compact_prompts=compact,abbreviate_modules=abbreviated)
+        else:
+            style_config = dataclasses.replace(llmConfig,compact_prompts=compact,abbreviate_modules=abbreviated)
+        try:
+            results.append({"style": style, **_solve_style(style_config,iterations,retries)})
+        finally:
+            if llmConfig is None:
+                backends.unregister_backend(BACKEND_NAME)
+    return {"backend": "fake" if llmConfig is None else getattr(llmConfig.model_type,"value",llmConfig.model_type), "results": results}
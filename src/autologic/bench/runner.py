@@ -0,0 +1,236 @@
+from .. import reasoningEngine
+from .. import utils
+from .. import backends
+from .. import metrics
+from .fakeBackend import FakeBackend, synthetic_response
+from dataclasses import dataclass, asdict
+import contextlib
+import tracemalloc
+import platform
+import asyncio
+import resource
+import math
+import time
+import sys
+import io
+
+BACKEND_NAME = "bench-fake"
+
+TASKS = [
+    "John has 12 apples. He gives 5 apples to his sister. If he finds 8 more apples, how many apples does he have in total?",
+    "A train travels 120 km in 2 hours and then 90 km in 1.5 hours. What is its average speed over the whole trip?",
+    "Sort the following words alphabetically: pear, apple, fig, banana, cherry.",
+    "If all bloops are razzies and all razzies are lazzies, are all bloops definitely lazzies?",
+]
+
+
+def _structure():
+    return utils.extractJSONToDict(response=synthetic_response("implement",""))["Reasoning Structure"]
+
+
+def _select(llmConfig, task, retries):
+    reasoningEngine.select(task=task,llmConfig=llmConfig)
+
+def _adapt(llmConfig, task, retries):
+    reasoningEngine.adapt(task=task,reasoning_modules={"reasoning_modules": [1, 15, 32]},llmConfig=llmConfig)
+
+def _implement(llmConfig, task, retries):
+    reasoningEngine.implement(task=task,adapted_modules="- Identify the quantities.\n- Combine them.\n",llmConfig=llmConfig)
+
+def _self_discover(llmConfig, task, retries):
+    reasoningEngine.self_discover(task=task,llmConfig=llmConfig,retries=retries)
+
+def _fused_discover(llmConfig, task, retries):
+    reasoningEngine.self_discover(task=task,llmConfig=llmConfig,retries=retries,discovery_mode="fused")
+
+def _solve_with_structure(llmConfig, task, retries):
+    reasoningEngine.solve_with_structure(task=task,reasoning_structure=_structure(),solve_config=llmConfig,retries=retries)
+
+def _solve(llmConfig, task, retries):
+    reasoningEngine.solve(task=task,discover_config=llmConfig,retries=retries)
+
+# Operations timed one at a time; one iteration is one call.
+WORKLOADS = {
+    "select": _select,
+    "adapt": _adapt,
+    "implement": _implement,
+    "self_discover": _self_discover,
+    "fused_discover": _fused_discover,
+    "solve_with_structure": _solve_with_structure,
+    "solve": _solve,
+}
+# Operations over many tasks at once; one iteration is one task and latency is per task.
+CONCURRENT_WORKLOADS = ("solve_batch", "async_solve")
+
+
+@dataclass
+class BenchResult:
+    workload: str
+    iterations: int
+    concurrency: int
+    elapsed: float
+    throughput: float
+    p50: float
+    p95: float
+    p99: float
+    mean: float
+    max: float
+    errors: int
+    retries: int
+    extraction_failures: int
+    backend_calls: int
+    peak_rss_kb: int
+    peak_traced_bytes: int = None
+
+
+def percentile(samples: list, q: float) -> float:
+    # Nearest-rank percentile over the exact samples.
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0,min(len(ordered) - 1,math.ceil(q * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def _run_sequential(workload, llmConfig, iterations, retries) -> tuple:
+    latencies = []
+    errors = 0
+    for iteration in range(iterations):
+        task = TASKS[iteration % len(TASKS)]
+        start = time.perf_counter()
+        try:
+            workload(llmConfig,task,retries)
+        except Exception:
+            errors += 1
+        latencies.append(time.perf_counter() - start)
+    return (latencies,errors)
+
+
+def _run_batch(llmConfig, iterations, retries, concurrency) -> tuple:
+    tasks = [TASKS[iteration % len(TASKS)] for iteration in range(iterations)]
+    result = reasoningEngine.solve_batch(tasks,discover_config=llmConfig,task_family="bench",concurrency=concurrency,retries=retries)
+    return ([item.seconds for item in result.items],len(result.failed))
+
+
+def _run_async(llmConfig, iterations, retries, concurrency) -> tuple:
+    async def run():
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+        errors = 0
+
+        async def one(task):
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    await reasoningEngine.async_solve(task=task,discover_config=llmConfig,retries=retries)
+                except Exception:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(one(TASKS[iteration % len(TASKS)]) for iteration in range(iterations)))
+        return (latencies,errors)
+    return asyncio.run(run())
+
+
+def run_workload(name: str, backend: FakeBackend, iterations: int = 100, retries: int = 3, concurrency: int = 4, trace_memory: bool = False) -> BenchResult:
+    if name not in WORKLOADS and name not in CONCURRENT_WORKLOADS:
+        raise ValueError(f"Unknown workload: {name}")
+    backends.register_backend(BACKEND_NAME,backend)
+    llmConfig = reasoningEngine.LLMConfig(model_type=BACKEND_NAME)
+    registry = metrics.enable()
+    calls_before = backend.calls
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        # The engine logs progress to stdout; keep it out of the measurements and the report.
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            if name == "solve_batch":
+                latencies, errors = _run_batch(llmConfig,iterations,retries,concurrency)
+            elif name == "async_solve":
+                latencies, errors = _run_async(llmConfig,iterations,retries,concurrency)
+            else:
+                latencies, errors = _run_sequential(WORKLOADS[name],llmConfig,iterations,retries)
+            elapsed = time.perf_counter() - start
+        peak_traced = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+        metrics.disable()
+        backends.unregister_backend(BACKEND_NAME)
+
+    counters = registry.snapshot()["counters"]
+    def total(metric_name):
+        return int(sum(counter["value"] for counter in counters if counter["name"] == metric_name))
+    return BenchResult(
+        workload=name,
+        iterations=iterations,
+        concurrency=concurrency if name in CONCURRENT_WORKLOADS else 1,
+        elapsed=elapsed,
+        throughput=iterations / elapsed if elapsed else 0.0,
+        p50=percentile(latencies,0.50),
+        p95=percentile(latencies,0.95),
+        p99=percentile(latencies,0.99),
+        mean=sum(latencies) / len(latencies) if latencies else 0.0,
+        max=max(latencies) if latencies else 0.0,
+        errors=errors,
+        retries=total(metrics.RETRIES),
+        extraction_failures=total(metrics.EXTRACTION_FAILURES),
+        backend_calls=backend.calls - calls_before,
+        peak_rss_kb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        peak_traced_bytes=peak_traced,
+    )
+
+
+def run(workloads: list, backend_options: dict = None, iterations: int = 100, retries: int = 3, concurrency: int = 4, trace_memory: bool = False) -> dict:
+    backend_options = backend_options or {}
+    results = []
+    for name in workloads:
+        # A fresh backend per workload keeps each one's RNG sequence independent of the others.
+        backend = FakeBackend(**backend_options)
+        results.append(asdict(run_workload(name,backend,iterations=iterations,retries=retries,concurrency=concurrency,trace_memory=trace_memory)))
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "argv": sys.argv,
+        },
+        "backend": {key: value for key, value in backend_options.items() if key != "responses"},
+        "results": results,
+    }
+
+
+# For these, a higher value is worse; for throughput a lower value is worse.
+LATENCY_FIELDS = ("p50", "p95", "p99", "mean")
+
+
+def compare(baseline: dict, candidate: dict, threshold: float = 0.1) -> dict:
+    """Relative change of every latency field and throughput per workload present in both runs.
+
+    A workload regresses when any latency grows, or throughput drops, by more than `threshold`.
+    """
+    baseline_results = {result["workload"]: result for result in baseline["results"]}
+    rows = []
+    for result in candidate["results"]:
+        base = baseline_results.get(result["workload"])
+        if base is None:
+            continue
+        changes = {}
+        regressions = []
+        for name in (*LATENCY_FIELDS, "throughput"):
+            before, after = base[name], result[name]
+            change = (after - before) / before if before else 0.0
+            changes[name] = change
+            worse = change > threshold if name in LATENCY_FIELDS else change < -threshold
+            if worse:
+                regressions.append(name)
+        rows.append({
+            "workload": result["workload"],
+            "baseline": {name: base[name] for name in changes},
+            "candidate": {name: result[name] for name in changes},
+            "change": changes,
+            "retries": [base["retries"], result["retries"]],
+            "regressions": regressions,
+        })
+    return {"threshold": threshold, "workloads": rows, "regressed": any(row["regressions"] for row in rows)}
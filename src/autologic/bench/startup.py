@@ -0,0 +1,56 @@
+from .runner import percentile
+import subprocess
+import statistics
+import json
+import sys
+
+# Modules that must only be imported once a backend that needs them is used.
+HEAVY_MODULES = ("google.generativeai", "openai", "llama_cpp", "numpy")
+
+TARGETS = {
+    "engine": "import autologic.reasoningEngine",
+    "package": "import autologic",
+    "cli": "import autologic.cli",
+}
+
+_PROBE = """
+import sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+import json
+print(json.dumps({{"seconds": elapsed, "heavy": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+
+def measure(target: str = "engine", runs: int = 10) -> dict:
+    """Cold-import `target` in `runs` fresh interpreters; reports the import time and any heavy modules pulled in."""
+    statement = TARGETS[target]
+    samples = []
+    heavy = set()
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-W", "ignore", "-c", _PROBE.format(statement=statement,heavy=HEAVY_MODULES)],
+            capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        samples.append(result["seconds"])
+        heavy.update(result["heavy"])
+    return {
+        "target": target,
+        "statement": statement,
+        "runs": runs,
+        "median": statistics.median(samples),
+        "p95": percentile(samples,0.95),
+        "min": min(samples),
+        "heavy_modules": sorted(heavy),
+    }
+
+
+def check(report: dict, budget: float) -> list:
+    problems = []
+    if report["median"] > budget:
+        problems.append(f"{report['statement']} took {report['median']:.3f}s (median), over the {budget:.3f}s budget")
+    if report["heavy_modules"]:
+        problems.append(f"{report['statement']} imported {', '.join(report['heavy_modules'])}")
+    return problems
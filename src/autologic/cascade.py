@@ -0,0 +1,235 @@
+from . import reasoningEngine
+from . import responseCache
+from . import metrics
+from .utils import log_print
+from dataclasses import dataclass, field, fields
+from collections import Counter
+import concurrent.futures
+import contextvars
+import threading
+import asyncio
+import json
+import time
+import os
+
+
+@dataclass
+class CascadeTier:
+    llmConfig: reasoningEngine.LLMConfig
+    name: str = None
+    retries: int = field(default=1,metadata={"description": "Solve attempts on this tier before escalating. Keep it small; the next tier is the retry."})
+    timeout: float = field(default=None,metadata={"description": "Seconds before the tier is abandoned and the task escalates. None = no limit."})
+    samples: int = field(default=1,metadata={"description": "Answers to sample on this tier. With more than one, the tier escalates unless enough of them agree."})
+    min_agreement: float = field(default=0.5,metadata={"description": "Fraction of samples that must give the majority answer. Only used when samples > 1."})
+    cost_per_1k_tokens: float = field(default=0.0,metadata={"description": "Price used for the estimated cost report."})
+
+    def __post_init__(self):
+        if self.name is None:
+            llmConfig = self.llmConfig
+            model = llmConfig.model_name or (os.path.basename(llmConfig.gguf_path) if llmConfig.gguf_path else None)
+            self.name = model or getattr(llmConfig.model_type,"value",llmConfig.model_type)
+
+
+@dataclass
+class TierStats:
+    name: str
+    attempts: int = 0
+    served: int = 0
+    failures: int = 0
+    timeouts: int = 0
+    low_agreement: int = 0
+    seconds: float = 0.0
+    calls: int = 0
+    estimated_tokens: int = 0
+    cost: float = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        return self.served / self.attempts if self.attempts else 0.0
+
+    @property
+    def mean_seconds(self) -> float:
+        return self.seconds / self.attempts if self.attempts else 0.0
+
+
+class _LowAgreement(Exception):
+    pass
+
+
+def _normalize(answer) -> str:
+    return " ".join(str(answer).split()).lower()
+
+
+def _majority(tier: CascadeTier, answers: list):
+    if len(answers) == 1:
+        return answers[0]
+    counts = Counter(_normalize(answer) for answer in answers)
+    winner, votes = counts.most_common(1)[0]
+    agreement = votes / len(answers)
+    if agreement < tier.min_agreement:
+        raise _LowAgreement(f"{agreement:.0%} of {len(answers)} samples agreed")
+    return next(answer for answer in answers if _normalize(answer) == winner)
+
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def _run_with_timeout(coroutine, timeout: float):
+    # Timed sync attempts run on one long-lived loop, so API clients bound to it are reused across
+    # attempts, and it works from within a running loop too. The caller's context (usage tracking,
+    # trace spans, event streams) goes with the coroutine.
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever,name="autologic-cascade",daemon=True).start()
+    context = contextvars.copy_context()
+    async def run():
+        return await context.run(asyncio.ensure_future,coroutine)
+    future = asyncio.run_coroutine_threadsafe(run(),_loop)
+    try:
+        return future.result(timeout)
+    except concurrent.futures.TimeoutError:
+        # Cancelling the attempt stops its in-flight call instead of leaving it running.
+        future.cancel()
+        raise TimeoutError()
+
+
+class CascadePolicy:
+    """Solves with an ordered list of tiers, cheapest first, escalating to the next tier when one
+    cannot produce an answer within its retries, exceeds its timeout or its samples disagree.
+
+    Per-tier hit rates, latency and estimated cost are kept in `stats`; see `report`.
+    """
+
+    def __init__(self, tiers: list):
+        if not tiers:
+            raise ValueError("A cascade needs at least one tier!")
+        self.tiers = [tier if isinstance(tier,CascadeTier) else CascadeTier(tier) for tier in tiers]
+        self.stats = [TierStats(name=tier.name) for tier in self.tiers]
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def _record(self, index: int, seconds: float, usage: reasoningEngine.CallUsage, outcome: str):
+        tier, stats = self.tiers[index], self.stats[index]
+        with self._lock:
+            stats.attempts += 1
+            stats.seconds += seconds
+            stats.calls += usage.calls
+            stats.estimated_tokens += usage.estimated_tokens
+            stats.cost += usage.estimated_tokens / 1000 * tier.cost_per_1k_tokens
+            if outcome == "served":
+                stats.served += 1
+            elif outcome == "timeout":
+                stats.timeouts += 1
+            elif outcome == "low_agreement":
+                stats.low_agreement += 1
+            else:
+                stats.failures += 1
+        metrics.inc(metrics.CASCADE_ATTEMPTS,tier=tier.name,outcome=outcome)
+        metrics.observe(metrics.CASCADE_SECONDS,seconds,tier=tier.name)
+
+    def _escalate(self, index: int, outcome: str, error: Exception, errors: list):
+        errors.append(f"{self.tiers[index].name}: {outcome} ({error})")
+        if index + 1 < len(self.tiers):
+            log_print(f"Cascade tier {self.tiers[index].name} failed ({outcome}: {error}), escalating to {self.tiers[index + 1].name}")
+
+    def _failed(self, errors: list) -> Exception:
+        return Exception(f"All cascade tiers failed: {'; '.join(errors)}")
+
+    async def _async_attempt(self, tier: CascadeTier, task: str, reasoning_structure: dict, verbose: bool):
+        answers = []
+        for _ in range(max(1,tier.samples)):
+            answers.append(await reasoningEngine.async_solve_with_structure(task=task,reasoning_structure=reasoning_structure,solve_config=tier.llmConfig,verbose=verbose,retries=tier.retries))
+        return _majority(tier,answers)
+
+    def _attempt(self, tier: CascadeTier, task: str, reasoning_structure: dict, verbose: bool):
+        if tier.timeout is not None:
+            return _run_with_timeout(self._async_attempt(tier,task,reasoning_structure,verbose),tier.timeout)
+        answers = []
+        for _ in range(max(1,tier.samples)):
+            answers.append(reasoningEngine.solve_with_structure(task=task,reasoning_structure=reasoning_structure,solve_config=tier.llmConfig,verbose=verbose,retries=tier.retries))
+        return _majority(tier,answers)
+
+    def solve_with_structure(self, task: str, reasoning_structure: dict, verbose=False) -> str:
+        with self._lock:
+            self.requests += 1
+        errors = []
+        for index, tier in enumerate(self.tiers):
+            start = time.perf_counter()
+            with reasoningEngine.track_usage() as usage:
+                try:
+                    answer = self._attempt(tier,task,reasoning_structure,verbose)
+                except responseCache.CacheMiss:
+                    raise
+                except (asyncio.TimeoutError, TimeoutError) as e:
+                    outcome, error = "timeout", str(e) or f"over {tier.timeout}s"
+                except _LowAgreement as e:
+                    outcome, error = "low_agreement", e
+                except Exception as e:
+                    outcome, error = "failure", e
+                else:
+                    self._record(index,time.perf_counter() - start,usage,"served")
+                    return answer
+            self._record(index,time.perf_counter() - start,usage,outcome)
+            self._escalate(index,outcome,error,errors)
+        raise self._failed(errors)
+
+    async def async_solve_with_structure(self, task: str, reasoning_structure: dict, verbose=False) -> str:
+        with self._lock:
+            self.requests += 1
+        errors = []
+        for index, tier in enumerate(self.tiers):
+            start = time.perf_counter()
+            with reasoningEngine.track_usage() as usage:
+                try:
+                    answer = await asyncio.wait_for(self._async_attempt(tier,task,reasoning_structure,verbose),tier.timeout)
+                except responseCache.CacheMiss:
+                    raise
+                except (asyncio.TimeoutError, TimeoutError) as e:
+                    outcome, error = "timeout", str(e) or f"over {tier.timeout}s"
+                except _LowAgreement as e:
+                    outcome, error = "low_agreement", e
+                except Exception as e:
+                    outcome, error = "failure", e
+                else:
+                    self._record(index,time.perf_counter() - start,usage,"served")
+                    return answer
+            self._record(index,time.perf_counter() - start,usage,outcome)
+            self._escalate(index,outcome,error,errors)
+        raise self._failed(errors)
+
+    def report(self) -> str:
+        lines = []
+        for stats in self.stats:
+            share = stats.served / self.requests if self.requests else 0.0
+            lines.append(
+                f"{stats.name}: served {stats.served}/{stats.attempts} attempts ({stats.hit_rate:.0%}), {share:.0%} of requests, "
+                f"{stats.failures} failed, {stats.timeouts} timed out, {stats.low_agreement} low agreement, "
+                f"{stats.mean_seconds:.2f}s mean, ~{stats.estimated_tokens} tokens, ${stats.cost:.4f}"
+            )
+        return "\n".join(lines)
+
+
+_TIER_OPTIONS = {tier_field.name for tier_field in fields(CascadeTier)} - {"llmConfig"}
+
+
+def tier_from_dict(spec: dict) -> CascadeTier:
+    """Build a tier from LLMConfig fields plus CascadeTier options, e.g. {"model_type": "openai", "model_name": "gpt-4", "timeout": 60}."""
+    spec = dict(spec)
+    options = {name: spec.pop(name) for name in list(spec) if name in _TIER_OPTIONS}
+    if "model_type" in spec:
+        try:
+            spec["model_type"] = reasoningEngine.ModelType(spec["model_type"])
+        except ValueError:
+            pass  # A backend registered with backends.register_backend.
+    if "chat_template" in spec:
+        spec["chat_template"] = reasoningEngine.ChatTemplate(spec["chat_template"])
+    return CascadeTier(reasoningEngine.LLMConfig(**spec),**options)
+
+
+def load_policy(path: str) -> CascadePolicy:
+    # A JSON list of tiers, cheapest first.
+    with open(path) as f:
+        return CascadePolicy([tier_from_dict(spec) for spec in json.load(f)])
@@ -1,8 +1,23 @@
 import argparse
 from . import reasoningEngine
+from . import backends
+from . import metrics
+from . import responseCache
+from . import server
+from . import batchJob
+from . import cascade
+from . import events
+from . import hedging
+from . import scheduler
+from . import tracing
+from .utils import log_print
 import sys 
 
-def interactiveMode(discoverLLMConfig: reasoningEngine.LLMConfig, solveLLMConfig: reasoningEngine.LLMConfig,verbose: bool = False, retries: int = 5):
+def interactiveMode(discoverLLMConfig: reasoningEngine.LLMConfig, solveLLMConfig: reasoningEngine.LLMConfig,verbose: bool = False, retries: int = 5, discovery_mode: str = "three_step", cascade: cascade.CascadePolicy = None):
+    # Keep local models resident across prompts instead of loading them on the first phase of each one.
+    configs = [config for config in (discoverLLMConfig, solveLLMConfig) if config]
+    for config in configs:
+        reasoningEngine.preload(config)
     print(f"\nEntering Interactive Mode: CTRL + C to send multi-line input. CTRL + D to exit the program.")
     while True:
         try:
@@ -14,26 +29,119 @@ def interactiveMode(discoverLLMConfig: reasoningEngine.LLMConfig, solveLLMConfig
             if lines:
                 prompt = "\n".join(lines)
                 print(f"\nThinking...")
-                answer = reasoningEngine.solve(
+                stream = reasoningEngine.solve_stream(
                     task=prompt,
                     discover_config=discoverLLMConfig,
                     solve_config=solveLLMConfig,
                     verbose=verbose,
-                    retries=retries
+                    retries=retries,
+                    discovery_mode=discovery_mode,
+                    cascade=cascade
                 )
-                print(f"\n\nANSWER: {answer}\n\n")
+                for event in stream:
+                    render_event(event,verbose)
+                metrics.flush()
+                if verbose and cascade is not None:
+                    print(f"Cascade tiers:\n{cascade.report()}\n")
+                if verbose and any(config.model_type == reasoningEngine.ModelType.LOCAL for config in configs):
+                    stats = backends.load("local").pool_stats()
+                    print(f"Model pool: {stats.hits} hits, {stats.misses} misses, {stats.load_time:.2f}s loading\n")
+                if verbose:
+                    for config in {id(config): config for config in configs if config.hedge is not None}.values():
+                        print(f"Hedging:\n{config.hedge.report()}\n")
+                if verbose and any(config.workers for config in configs):
+                    for pool in backends.load("local_workers").pools():
+                        print(f"Local workers:\n{pool.report()}\n")
         except EOFError:
             print(f"Goodbye!")
             sys.exit(0)    
 
-def mixed_inference(args):
+def render_event(event, verbose: bool = False):
+    # Phase output is shown live as it is generated, one block per phase.
+    if isinstance(event,events.PhaseStarted):
+        print(f"\n[{event.phase}]",flush=True)
+    elif isinstance(event,events.Token):
+        sys.stdout.write(event.text)
+        sys.stdout.flush()
+    elif isinstance(event,events.PhaseFinished):
+        print(f"\n[{event.phase} {'done' if event.ok else 'failed'} in {event.seconds:.2f}s]",flush=True)
+    elif isinstance(event,events.Retry):
+        print(f"[retrying {event.phase}: {event.error}]",flush=True)
+    elif isinstance(event,events.ModulesSelected) and not verbose:
+        print(f"Selected modules: {', '.join(str(id) for id in event.ids)}",flush=True)
+    elif isinstance(event,events.StructureReady) and event.source != "discovered" and not verbose:
+        print(f"Reasoning structure from {event.source}",flush=True)
+    elif isinstance(event,events.Answer):
+        print(f"\n\nANSWER: {event.answer}\n\n")
+    elif isinstance(event,events.Failed):
+        print(f"\n\nFAILED: {event.error}\n\n")
+
+def enable_metrics(args):
+    sinks = []
+    if args.metrics_file:
+        sinks.append(metrics.PrometheusFileSink(args.metrics_file))
+    if args.metrics_jsonl:
+        sinks.append(metrics.JSONLinesSink(args.metrics_jsonl))
+    if sinks:
+        metrics.enable(sinks)
+
+def enable_tracing(args):
+    if args.trace:
+        tracing.enable(args.trace)
+
+def enable_scheduler(args):
+    # Without budgets calls bypass the scheduler and rate limits are retried by the backend SDKs.
+    if args.rate_limit:
+        scheduler.set_default_scheduler(scheduler.Scheduler(dict(scheduler.parse_budget(spec) for spec in args.rate_limit)))
+
+def enable_response_cache(args):
+    if args.response_cache or args.cache_mode != "read_write":
+        responseCache.set_default_cache(responseCache.ResponseCache(
+            path=args.response_cache,
+            mode=args.cache_mode,
+            max_bytes=args.response_cache_mb * 1024 * 1024,
+            allow_sampling=args.cache_sampled
+        ))
+
+def enable_hedging(args, *configs):
+    # Hedging only pays off for API models; a duplicate local call competes for the same cores.
+    if args.hedge_percentile is None:
+        return
+    for config in {id(config): config for config in configs if config}.values():
+        if config.model_type != reasoningEngine.ModelType.LOCAL:
+            config.hedge = hedging.HedgePolicy(percentile=args.hedge_percentile,max_rate=args.hedge_rate,phases=args.hedge_phase)
+
+def enable_compact_prompts(args, *configs):
+    for config in configs:
+        if config:
+            config.compact_prompts = args.compact_prompts
+            config.abbreviate_modules = args.abbreviate_modules
+
+def enable_local_select(args, llmConfig):
+    if not args.local_select:
+        return
+    # numpy is only imported once local selection is asked for.
+    from . import moduleSelector, structureIndex
+    embedder = structureIndex.LlamaEmbedder(args.select_embedder) if args.select_embedder else None
+    selector = moduleSelector.ModuleSelector(embedder=embedder,threshold=args.select_threshold,log_path=args.select_log)
+    if embedder is None and not selector.trained:
+        # Hashed word features only match tasks and module descriptions by shared words, which rarely clears the threshold.
+        log_print(
+            f"Warning: --local_select has no semantic embedder and no trained classifier yet, so SELECT will go to the LLM "
+            f"until {selector.min_examples} of its selections have been logged{'' if args.select_log else ' (use --select_log to keep them across runs)'}. "
+            f"Pass --select_embedder with a GGUF embedding model to select by similarity from the start."
+        )
+    llmConfig.selector = selector
+
+def mixed_configs(args) -> tuple:
     # Construct LLMConfig for the discover stage. 
-    print(args)
     if args.discover_model_type == "gemini":
         discoverLLMConfig = reasoningEngine.LLMConfig(
             context_length=args.discover_context_length,
             api_key=args.discover_api_key,
             temp=args.discover_temp,
+            structured_output=args.structured_output,
+            stream=args.stream,
             model_type=reasoningEngine.ModelType.GEMINI,
         )
     elif args.discover_model_type == "openai":
@@ -41,6 +149,8 @@ def mixed_inference(args):
             context_length=args.discover_context_length,
             api_key=args.discover_api_key,
             temp=args.discover_temp,
+            structured_output=args.structured_output,
+            stream=args.stream,
             model_type=reasoningEngine.ModelType.OPENAI,
             model_name=args.discover_model_name
         )
@@ -59,9 +169,13 @@ def mixed_inference(args):
             gguf_path = args.discover_gguf_path,
             context_length=args.discover_context_length,
             temp=args.discover_temp,
+            structured_output=args.structured_output,
+            stream=args.stream,
             model_type=reasoningEngine.ModelType.LOCAL,
             chat_template=chat_template,
             threads=args.discover_threads,
+            gpu_layers=args.discover_layers,
+            workers=args.discover_workers,
         )
     else:
         TypeError("Invalid Discover Model Type!")
@@ -76,6 +190,8 @@ def mixed_inference(args):
             context_length=args.solve_context_length,
             api_key=args.solve_api_key,
             temp=args.solve_temp,
+            structured_output=args.structured_output,
+            stream=args.stream,
             model_type=reasoningEngine.ModelType.GEMINI,
         )
     elif args.solve_model_type == "openai":
@@ -83,6 +199,8 @@ def mixed_inference(args):
             context_length=args.solve_context_length,
             api_key=args.solve_api_key,
             temp=args.solve_temp,
+            structured_output=args.structured_output,
+            stream=args.stream,
             model_type=reasoningEngine.ModelType.OPENAI,
             model_name=args.solve_model_name
         )
@@ -101,13 +219,30 @@ def mixed_inference(args):
             gguf_path = args.solve_gguf_path,
             context_length=args.solve_context_length,
             temp=args.solve_temp,
+            structured_output=args.structured_output,
+            stream=args.stream,
             model_type=reasoningEngine.ModelType.LOCAL,
             chat_template=chat_template,
             threads=args.solve_threads,
+            gpu_layers=args.solve_layers,
+            workers=args.solve_workers,
         )
     else:
         TypeError("Invalid Solve Model Type!")
-        
+    
+    return (discoverLLMConfig,solveLLMConfig)
+
+def mixed_inference(args):
+    print(args)
+    enable_metrics(args)
+    enable_tracing(args)
+    enable_response_cache(args)
+    enable_scheduler(args)
+    discoverLLMConfig, solveLLMConfig = mixed_configs(args)
+    enable_hedging(args,discoverLLMConfig,solveLLMConfig)
+    enable_compact_prompts(args,discoverLLMConfig,solveLLMConfig)
+    enable_local_select(args,discoverLLMConfig)
+    policy = cascade.load_policy(args.cascade) if args.cascade else None
     
     if args.prompt:
         print("Thinking...")
@@ -116,14 +251,75 @@ def mixed_inference(args):
             discover_config=discoverLLMConfig,
             solve_config=solveLLMConfig,
             verbose = args.verbose,
-            retries=args.retries
+            retries=args.retries,
+            discovery_mode=args.discovery_mode,
+            cascade=policy
         )
         print(f"\n\nANSWER: {answer}\n\n")
+        if args.verbose and policy is not None:
+            print(f"Cascade tiers:\n{policy.report()}\n")
     else:
-        interactiveMode(discoverLLMConfig=discoverLLMConfig,solveLLMConfig=solveLLMConfig,verbose=args.verbose,retries=args.retries)
+        interactiveMode(discoverLLMConfig=discoverLLMConfig,solveLLMConfig=solveLLMConfig,verbose=args.verbose,retries=args.retries,discovery_mode=args.discovery_mode,cascade=policy)
+
 
+def serve_entry(args):
+    enable_metrics(args)
+    enable_tracing(args)
+    enable_response_cache(args)
+    enable_scheduler(args)
+    discoverLLMConfig, solveLLMConfig = mixed_configs(args)
+    enable_hedging(args,discoverLLMConfig,solveLLMConfig)
+    enable_compact_prompts(args,discoverLLMConfig,solveLLMConfig)
+    enable_local_select(args,discoverLLMConfig)
+    concurrency = {}
+    for limit in args.concurrency or []:
+        backend, _, value = limit.partition("=")
+        if not value.isdigit():
+            raise ValueError(f"Invalid --concurrency value {limit!r}, expected BACKEND=N")
+        concurrency[backend] = int(value)
+    server.serve(server.ServerConfig(
+        discover_config=discoverLLMConfig,
+        solve_config=solveLLMConfig,
+        host=args.host,
+        port=args.port,
+        concurrency=concurrency,
+        queue_size=args.queue_size,
+        retries=args.retries,
+        reuse_structure=not args.no_reuse_structure,
+        discovery_mode=args.discovery_mode,
+        drain_timeout=args.drain_timeout,
+        verbose=args.verbose
+    ))
+
+def batch_entry(args):
+    enable_metrics(args)
+    enable_tracing(args)
+    enable_response_cache(args)
+    enable_scheduler(args)
+    discoverLLMConfig, solveLLMConfig = mixed_configs(args)
+    enable_hedging(args,discoverLLMConfig,solveLLMConfig)
+    enable_compact_prompts(args,discoverLLMConfig,solveLLMConfig)
+    enable_local_select(args,discoverLLMConfig)
+    summary = batchJob.run_job(batchJob.BatchJobConfig(
+        input_path=args.input,
+        output_path=args.output,
+        discover_config=discoverLLMConfig,
+        solve_config=solveLLMConfig,
+        cascade=cascade.load_policy(args.cascade) if args.cascade else None,
+        concurrency=args.concurrency,
+        retries=args.retries,
+        reuse_structure=not args.no_reuse_structure,
+        discovery_mode=args.discovery_mode,
+        resume=not args.no_resume,
+        verbose=args.verbose
+    ))
+    if summary.failed:
+        sys.exit(1)
 
 def inference_entry(args):
+    enable_metrics(args)
+    enable_tracing(args)
+    enable_response_cache(args)
 
     if args.command == 'gemini':
         
@@ -131,6 +327,8 @@ def inference_entry(args):
             context_length=args.context_length,
             api_key=args.api_key,
             temp=args.temp,
+            structured_output=args.structured_output,
+            stream=args.stream,
             model_type=reasoningEngine.ModelType.GEMINI,
         )
     elif args.command == "openai":
@@ -138,8 +336,11 @@ def inference_entry(args):
             context_length=args.context_length,
             api_key=args.api_key,
             temp=args.temp,
+            structured_output=args.structured_output,
+            stream=args.stream,
             model_type=reasoningEngine.ModelType.OPENAI,
-            model_name=args.model_name
+            model_name=args.model_name,
+            base_url=args.base_url
         )
     else: 
         chat_template = None
@@ -156,25 +357,105 @@ def inference_entry(args):
             gguf_path = args.gguf_path,
             context_length=args.context_length,
             temp=args.temp,
+            structured_output=args.structured_output,
+            stream=args.stream,
             model_type=reasoningEngine.ModelType.LOCAL,
             chat_template=chat_template,
             threads=args.threads,
-            
+            gpu_layers=args.layers,
+            workers=args.workers,
         )
     
+    if args.command != "local":
+        enable_scheduler(args)
+        enable_hedging(args,llmConfig)
+    enable_compact_prompts(args,llmConfig)
+    enable_local_select(args,llmConfig)
+    
     if args.prompt:
         print("Thinking...")
         answer = reasoningEngine.solve(
             task=args.prompt,
             discover_config=llmConfig,
             verbose = args.verbose,
-            retries=args.retries
+            retries=args.retries,
+            discovery_mode=args.discovery_mode
         )
         print(f"\n\nANSWER: {answer}\n\n")
     else:
-        interactiveMode(discoverLLMConfig=llmConfig,solveLLMConfig=llmConfig,verbose=args.verbose,retries=args.retries)
+        interactiveMode(discoverLLMConfig=llmConfig,solveLLMConfig=llmConfig,verbose=args.verbose,retries=args.retries,discovery_mode=args.discovery_mode)
+
+
+
+def add_model_arguments(parser):
+    # Discover/solve model options shared by the mixed and serve subcommands.
+    discover_group = parser.add_argument_group('Discovery Options') 
+    discover_group.add_argument('--discover-context_length',type=int, default=2000, help='Maximum tokens per message.')
+    discover_group.add_argument('--discover-temp',type=float, default=0.8, help="Temperature setting for LLM inference.") #
+    discover_group.add_argument('--discover-api_key',type=str, default=None, help='Gemini/OpenAI API Key. If not specified, it will be read from the environment.')
+    discover_group.add_argument('--discover-model_name',type=str, default=None, help="OpenAI/Gemini Model Name.") #
+    discover_group.add_argument('--discover-gguf_path',type=str,help="Path to GGUF Model file.")
+    discover_group.add_argument('--discover-threads',type=int,default=4,help="Number of Threads use with llama.cpp.")
+    discover_group.add_argument('--discover-workers',type=int,default=0,help="Local model worker processes, each pinned to its own cores. 0 = in-process.")
+    discover_group.add_argument('--discover-layers',type=int,default=-1,help="Number of layers to offload to GPU. -1 = as many as possible.")
+    discover_group.add_argument('--discover-format', choices=['mixtral_instruct','zephyr','chatml'], default='mixtral_instruct', help='Chat Template Format (default: mixtral_instruct)')
+    discover_group.add_argument('--discover-model_type', choices=['openai','gemini','local'], default='gemini', help='Model type (default: gemini)')
+    discover_group.add_argument('--discover_threads',type=int,default=4,help="Number of Threads use with llama.cpp.")
+
+    solve_group = parser.add_argument_group('Solve Options')
+    solve_group.add_argument('--solve-context_length',type=int, default=2000, help='Maximum tokens per message.')
+    solve_group.add_argument('--solve-temp',type=float, default=0.8, help="Temperature setting for LLM inference.") #
+    solve_group.add_argument('--solve-api_key',type=str, default=None, help='Gemini/OpenAI API Key. If not specified, it will be read from the environment.')
+    solve_group.add_argument('--solve-model_name',type=str, default=None, help="OpenAI/Gemini Model Name.") #
+    solve_group.add_argument('--solve-gguf_path',type=str,help="Path to GGUF Model file.")
+    solve_group.add_argument('--solve-threads',type=int,default=4,help="Number of Threads use with llama.cpp.")
+    solve_group.add_argument('--solve-workers',type=int,default=0,help="Local model worker processes, each pinned to its own cores. 0 = in-process.")
+    solve_group.add_argument('--solve-layers',type=int,default=-1,help="Number of layers to offload to GPU. -1 = as many as possible.")
+    solve_group.add_argument('--solve-format', choices=['mixtral_instruct','zephyr','chatml'], default='mixtral_instruct', help='Chat Template Format (default: mixtral_instruct)')
+    solve_group.add_argument('--solve-model_type', choices=['openai','gemini','local'], default=None, help='')
+    solve_group.add_argument('--solve_threads',type=int,default=4,help="Number of Threads use with llama.cpp.")
+
+def add_output_arguments(parser):
+    parser.add_argument('--structured_output',action='store_true', help='Constrain each phase to its expected output shape (grammars for local models, JSON mode for API models) to avoid parse retries.')
+    parser.add_argument('--stream',action='store_true', help='Stream responses and stop generating once the expected code block is complete.')
+    parser.add_argument('--discovery_mode', type=str, choices=['three_step', 'fused'], default='three_step', help='fused runs SELECT, ADAPT and IMPLEMENT in a single LLM call, falling back to three calls if its response is invalid.')
 
+def add_metrics_arguments(parser):
+    parser.add_argument('--metrics_file',type=str, default=None, help='Write phase/backend latency histograms, retry counters and token counts to this file in Prometheus text format.')
+    parser.add_argument('--metrics_jsonl',type=str, default=None, help='Append every recorded metric sample to this JSON lines file.')
 
+def add_cascade_arguments(parser):
+    parser.add_argument('--cascade',type=str, default=None, help='JSON file with an ordered list of solve tiers (LLMConfig fields plus retries, timeout, samples, min_agreement, cost_per_1k_tokens), cheapest first. Replaces the solve model.')
+
+def add_hedge_arguments(parser):
+    hedge_group = parser.add_argument_group('Hedging Options')
+    hedge_group.add_argument('--hedge_percentile',type=float, default=None, help='Duplicate an API call still running past this percentile of recent latency for its phase (e.g. 0.95) and keep the first response that parses. Off by default.')
+    hedge_group.add_argument('--hedge_rate',type=float, default=0.1, help='Largest fraction of calls per phase that may be hedged. Default: 0.1')
+    hedge_group.add_argument('--hedge_phase',action='append',choices=['select','adapt','implement','fused','solve'], help='Only hedge this phase; repeat for several. Default: all phases.')
+
+def add_scheduler_arguments(parser):
+    parser.add_argument('--rate_limit',action='append', help='Budget for a provider or model as PROVIDER[:MODEL]=REQUESTS_PER_MINUTE[/TOKENS_PER_MINUTE], e.g. openai=500/90000 or openai:gpt-4=60. Calls queue instead of failing. Repeatable.')
+
+def add_prompt_arguments(parser):
+    parser.add_argument('--compact_prompts',action='store_true', help='Send compact prompts: trimmed examples and instructions, minified reasoning structures.')
+    parser.add_argument('--abbreviate_modules',action='store_true', help='List reasoning modules by one-line summaries in SELECT and fused discovery prompts.')
+
+def add_trace_arguments(parser):
+    parser.add_argument('--trace',type=str, default=None, metavar='FILE', help='Record a span per phase attempt, backend call and extraction. A .jsonl FILE gets JSON lines as spans finish; any other name a Chrome trace-event JSON file at exit.')
+
+def add_selector_arguments(parser):
+    select_group = parser.add_argument_group('Local Selection Options')
+    select_group.add_argument('--local_select',action='store_true', help='Pick reasoning modules locally from embeddings and a classifier trained on past LLM selections; only call the LLM for SELECT when not confident.')
+    select_group.add_argument('--select_threshold',type=float, default=0.5, help='Minimum score for a locally picked module. Default: 0.5')
+    select_group.add_argument('--select_log',type=str, default=None, help='JSON lines file of past LLM selections to train the local selector from; new ones are appended.')
+    select_group.add_argument('--select_embedder',type=str, default=None, metavar='GGUF', help='GGUF embedding model used to score modules by similarity to the task. Without it, only the trained classifier picks modules locally.')
+
+def add_response_cache_arguments(parser):
+    cache_group = parser.add_argument_group('Response Cache Options')
+    cache_group.add_argument('--response_cache',type=str, default=None, help='Memoize LLM responses in this SQLite file, keyed on the formatted prompt and generation parameters.')
+    cache_group.add_argument('--cache_mode', choices=['read_write','record','replay'], default='read_write', help='record always calls the backend and overwrites; replay never calls it and fails on a miss.')
+    cache_group.add_argument('--response_cache_mb',type=int, default=256, help='Size budget of the on-disk response cache in MB (compressed).')
+    cache_group.add_argument('--cache_sampled',action='store_true', help='Also memoize calls with a non-zero temperature (they bypass the cache by default).')
 
 def build_args():
     parser = argparse.ArgumentParser(description='Autologic CLI')
@@ -188,6 +469,14 @@ def build_args():
     gemini_parser.add_argument('--temp',type=float, default=0.8, help="Temperature setting for LLM inference.") #
     gemini_parser.add_argument('-a','--api_key',type=str, default=None, help='Gemini Pro API Key. If not specified, it will be read from the GEMINI_PRO_API_KEY environment variable.')
     gemini_parser.add_argument('-r','--retries',type=int, default=5, help='How many times to retry inference on each phase of the self-discover process. Default is 5.')
+    add_output_arguments(gemini_parser)
+    add_metrics_arguments(gemini_parser)
+    add_hedge_arguments(gemini_parser)
+    add_scheduler_arguments(gemini_parser)
+    add_response_cache_arguments(gemini_parser)
+    add_prompt_arguments(gemini_parser)
+    add_selector_arguments(gemini_parser)
+    add_trace_arguments(gemini_parser)
     gemini_parser.set_defaults(func=inference_entry)
 
     # Parser for the "openai" subcommand
@@ -199,6 +488,15 @@ def build_args():
     openai_parser.add_argument('-a','--api_key',type=str, default=None, help='OpenAI API Key. If not specified, it will be read from the AUTOLOGIC_OPENAI_API_KEY environment variable.')
     openai_parser.add_argument('-r','--retries',type=int, default=5, help='How many times to retry inference on each phase of the self-discover process. Default is 5.')
     openai_parser.add_argument('-m','--model_name',type=str, default=None, help="OpenAI Model Name.") #
+    openai_parser.add_argument('--base_url',type=str, default=None, help="Base URL of an OpenAI-compatible API. Defaults to the OpenAI API.")
+    add_output_arguments(openai_parser)
+    add_metrics_arguments(openai_parser)
+    add_hedge_arguments(openai_parser)
+    add_scheduler_arguments(openai_parser)
+    add_response_cache_arguments(openai_parser)
+    add_prompt_arguments(openai_parser)
+    add_selector_arguments(openai_parser)
+    add_trace_arguments(openai_parser)
     openai_parser.set_defaults(func=inference_entry)
 
     # Parser for the "local" subcommand
@@ -209,9 +507,16 @@ def build_args():
     local_parser.add_argument('--temp',type=float, default=0.8, help="Temperature setting for LLM inference.") #
     local_parser.add_argument('-g','--gguf_path',type=str,required=True,help="Path to GGUF Model file.")
     local_parser.add_argument('-t','--threads',type=int,default=4,help="Number of Threads use with llama.cpp.")
+    local_parser.add_argument('-w','--workers',type=int,default=0,help="Run the model in this many worker processes, each pinned to its own cores, so concurrent calls run in parallel. 0 = in-process.")
     local_parser.add_argument('-l','--layers',type=int,default=-1,help="Number of layers to offload to GPU. -1 = as many as possible.")
     local_parser.add_argument('-f', '--format', choices=['mixtral_instruct','zephyr','chatml'], default='mixtral_instruct', help='Chat Template Format (default: mixtral_instruct)')
     local_parser.add_argument('-r','--retries',type=int, default=5, help='How many times to retry inference on each phase of the self-discover process. Default is 5.')
+    add_output_arguments(local_parser)
+    add_metrics_arguments(local_parser)
+    add_response_cache_arguments(local_parser)
+    add_prompt_arguments(local_parser)
+    add_selector_arguments(local_parser)
+    add_trace_arguments(local_parser)
     local_parser.set_defaults(func=inference_entry)
     
     # Mixed Mode 
@@ -219,31 +524,60 @@ def build_args():
     mixed_parser.add_argument('-v','--verbose',action='store_true', help='Enable verbose output') #
     mixed_parser.add_argument('-p','--prompt',type=str, default=None, help="Prompt for the LLM. If not specified, the program will enter multiline interactive mode.") 
     mixed_parser.add_argument('-r','--retries',type=int, default=5, help='How many times to retry inference on each phase of the self-discover process. Default is 5.')
+    add_output_arguments(mixed_parser)
+    add_metrics_arguments(mixed_parser)
     
-    mixed_parser_discover_group = mixed_parser.add_argument_group('Discovery Options') 
-    mixed_parser_discover_group.add_argument('--discover-context_length',type=int, default=2000, help='Maximum tokens per message.')
-    mixed_parser_discover_group.add_argument('--discover-temp',type=float, default=0.8, help="Temperature setting for LLM inference.") #
-    mixed_parser_discover_group.add_argument('--discover-api_key',type=str, default=None, help='Gemini/OpenAI API Key. If not specified, it will be read from the environment.')
-    mixed_parser_discover_group.add_argument('--discover-model_name',type=str, default=None, help="OpenAI/Gemini Model Name.") #
-    mixed_parser_discover_group.add_argument('--discover-gguf_path',type=str,help="Path to GGUF Model file.")
-    mixed_parser_discover_group.add_argument('--discover-threads',type=int,default=4,help="Number of Threads use with llama.cpp.")
-    mixed_parser_discover_group.add_argument('--discover-layers',type=int,default=-1,help="Number of layers to offload to GPU. -1 = as many as possible.")
-    mixed_parser_discover_group.add_argument('--discover-format', choices=['mixtral_instruct','zephyr','chatml'], default='mixtral_instruct', help='Chat Template Format (default: mixtral_instruct)')
-    mixed_parser_discover_group.add_argument('--discover-model_type', choices=['openai','gemini','local'], default='gemini', help='Model type (default: gemini)')
-    mixed_parser_discover_group.add_argument('--discover_threads',type=int,default=4,help="Number of Threads use with llama.cpp.")
-
-    mixed_parser_solve_group = mixed_parser.add_argument_group('Solve Options')
-    mixed_parser_solve_group.add_argument('--solve-context_length',type=int, default=2000, help='Maximum tokens per message.')
-    mixed_parser_solve_group.add_argument('--solve-temp',type=float, default=0.8, help="Temperature setting for LLM inference.") #
-    mixed_parser_solve_group.add_argument('--solve-api_key',type=str, default=None, help='Gemini/OpenAI API Key. If not specified, it will be read from the environment.')
-    mixed_parser_solve_group.add_argument('--solve-model_name',type=str, default=None, help="OpenAI/Gemini Model Name.") #
-    mixed_parser_solve_group.add_argument('--solve-gguf_path',type=str,help="Path to GGUF Model file.")
-    mixed_parser_solve_group.add_argument('--solve-threads',type=int,default=4,help="Number of Threads use with llama.cpp.")
-    mixed_parser_solve_group.add_argument('--solve-layers',type=int,default=-1,help="Number of layers to offload to GPU. -1 = as many as possible.")
-    mixed_parser_solve_group.add_argument('--solve-format', choices=['mixtral_instruct','zephyr','chatml'], default='mixtral_instruct', help='Chat Template Format (default: mixtral_instruct)')
-    mixed_parser_solve_group.add_argument('--solve-model_type', choices=['openai','gemini','local'], default=None, help='')
-    mixed_parser_solve_group.add_argument('--solve_threads',type=int,default=4,help="Number of Threads use with llama.cpp.")
+    add_model_arguments(mixed_parser)
+    add_cascade_arguments(mixed_parser)
+    add_hedge_arguments(mixed_parser)
+    add_scheduler_arguments(mixed_parser)
+    add_response_cache_arguments(mixed_parser)
+    add_prompt_arguments(mixed_parser)
+    add_selector_arguments(mixed_parser)
+    add_trace_arguments(mixed_parser)
     mixed_parser.set_defaults(func=mixed_inference)
+
+    # Serve Mode
+    serve_parser = subparsers.add_parser('serve', help='Serve solve, self_discover and solve_with_structure over a local HTTP/JSON API, keeping models and caches warm.')
+    serve_parser.add_argument('-v','--verbose',action='store_true', help='Enable verbose output') #
+    serve_parser.add_argument('-r','--retries',type=int, default=5, help='How many times to retry inference on each phase of the self-discover process. Default is 5.')
+    add_output_arguments(serve_parser)
+    add_metrics_arguments(serve_parser)
+    serve_parser.add_argument('--host',type=str, default='127.0.0.1', help='Address to listen on. Default: 127.0.0.1')
+    serve_parser.add_argument('--port',type=int, default=8080, help='Port to listen on. Default: 8080')
+    serve_parser.add_argument('--concurrency',action='append', help='Concurrent requests per backend as BACKEND=N, e.g. local=1 or openai=16. Repeatable.')
+    serve_parser.add_argument('--queue_size',type=int, default=16, help='Requests allowed to wait per backend before new ones get 429. Default: 16')
+    serve_parser.add_argument('--drain_timeout',type=float, default=30.0, help='Seconds to wait for in-flight requests on SIGTERM/SIGINT. Default: 30')
+    serve_parser.add_argument('--no_reuse_structure',action='store_true', help='Do not cache discovered reasoning structures across requests.')
+    add_model_arguments(serve_parser)
+    add_hedge_arguments(serve_parser)
+    add_scheduler_arguments(serve_parser)
+    add_response_cache_arguments(serve_parser)
+    add_prompt_arguments(serve_parser)
+    add_selector_arguments(serve_parser)
+    add_trace_arguments(serve_parser)
+    serve_parser.set_defaults(func=serve_entry)
+
+    # Batch Mode
+    batch_parser = subparsers.add_parser('batch', help='Solve every task of a JSONL file in one process, writing results as they complete. Interrupted runs resume from a checkpoint.')
+    batch_parser.add_argument('-i','--input',type=str, required=True, help='JSONL file with one task per line: a JSON string, or an object with "task" and optional "id", "family" and "reasoning_structure".')
+    batch_parser.add_argument('-o','--output',type=str, required=True, help='JSONL file to write one result per task to. Its checkpoint is kept at OUTPUT.checkpoint.')
+    batch_parser.add_argument('-v','--verbose',action='store_true', help='Enable verbose output') #
+    batch_parser.add_argument('-r','--retries',type=int, default=5, help='How many times to retry inference on each phase of the self-discover process. Default is 5.')
+    batch_parser.add_argument('--concurrency',type=int, default=4, help='Tasks in flight at once. Default: 4')
+    batch_parser.add_argument('--no_resume',action='store_true', help='Start over, overwriting the output, even if a checkpoint exists.')
+    batch_parser.add_argument('--no_reuse_structure',action='store_true', help='Discover a new reasoning structure for every task, even repeated ones or ones of the same family.')
+    add_output_arguments(batch_parser)
+    add_metrics_arguments(batch_parser)
+    add_model_arguments(batch_parser)
+    add_cascade_arguments(batch_parser)
+    add_hedge_arguments(batch_parser)
+    add_scheduler_arguments(batch_parser)
+    add_response_cache_arguments(batch_parser)
+    add_prompt_arguments(batch_parser)
+    add_selector_arguments(batch_parser)
+    add_trace_arguments(batch_parser)
+    batch_parser.set_defaults(func=batch_entry)
     args = parser.parse_args()
     args.func(args)
     
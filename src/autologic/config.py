@@ -39,20 +39,22 @@ REASONING_MODULES_LIST = ["How could I devise an experiment to help solve that p
 ,"Let’s make a step by step plan and implement it with good notion and explanation."
 ]
 
+# Task-specific placeholders ({task}, and {modules} outside SELECT and fused discovery) come last in every
+# template: the text before them is the same for every task, so local models reuse its evaluated KV cache.
+# Bump PROMPT_LAYOUT when the order of template sections changes. It is part of the structure cache and
+# index version, so structures discovered with another layout are never reused. 2: task moved last.
+PROMPT_LAYOUT = 2
+
 SELECT_PHASE_PROMPT_TEMPLATE = """# Instructions
 For the given task, you are to select 1 to 5 Reasoning Modules which are crucial to utilize in order to solve the given task.
 
-## Task 
-
-{task}
-
 ## Reasoning Modules
 
 {modules}
 
 ## Detailed Instructions
 
-The reasoning modules have been listed above. 
+The reasoning modules have been listed above and the task is given at the end. 
 Your answer should include only the number associated with the associated Reasoning Module in a list stored in a field called "reasoning_modules" in a JSON object. 
 Your answer should be in a JSON code block.
 
@@ -63,17 +65,13 @@ Your answer should be in a JSON code block.
     "reasoning_modules": [1, 15, 32]
 }}
 ```
-"""
-
-ADAPT_PHASE_PROMPT_TEMPLATE = """# Given Reasoning Modules
 
-{modules}
-
-# Given Task 
+## Task 
 
 {task}
+"""
 
-# Detailed Instruction 
+ADAPT_PHASE_PROMPT_TEMPLATE = """# Detailed Instruction 
 
 Your need to Rephrase and specify each given reasoning module so that it better helps to solve the given task and its verbiage is task specific.
 Your answer should be in a markdown code block as shown in the example. The markdown codeblock should be enclosed in triple back-tick notation with the md language specifier.
@@ -97,17 +95,16 @@ John has 12 apples. He gives 5 apples to his sister. If he finds 8 more apples,
 - Consider common mathematical operations applied in similar problems: Recognize that this problem involves basic arithmetic operations—specifically, subtraction followed by addition—to find the total count of items.
 ```
 
-"""
-
-IMPLEMENT_PHASE_PROMPT_TEMPLATE = """# Given Task
-
-{task}
-
 # Given Reasoning Modules
 
 {modules}
 
-## Example Task 
+# Given Task 
+
+{task}
+"""
+
+IMPLEMENT_PHASE_PROMPT_TEMPLATE = """## Example Task 
 
 John has 12 apples. He gives 5 apples to his sister. If he finds 8 more apples, how many apples does he have in total?
 
@@ -156,7 +153,7 @@ John has 12 apples. He gives 5 apples to his sister. If he finds 8 more apples,
 
 # Detailed instructions 
 
-The reasoning modules have been listed above. 
+The given task and its reasoning modules are listed at the end. 
 Your job is to create a JSON formatted reasoning structure that implements the given reasoning modules for the given task but not to solve the given task. 
 The given task will be solved by someone else using the reasoning structure that you construct.
 Refer to the Example Reasoning Structure as an example of what a good comprehensive reasoning structure looks like. 
@@ -165,9 +162,33 @@ Your answer should be in a JSON code block similar to the "Example Reasoning Str
 The reasoning structure should be formatted as key-value pairs. The Key should represent a reasoning step within the reasoning structure and the value should be left as a blank string.
 The reasoning structure can be nested as deeply as needed to accurately spell out the reasoning steps required. 
 The reasoning structure must contain a key called "FINAL_ANSWER" at the root level of the JSON sturucture with a blank string as the value. Ensure that the "FINAL_ANSWER" key is at the very bottom (is the last field) of the JSON structure.
+
+# Given Task
+
+{task}
+
+# Given Reasoning Modules
+
+{modules}
 """
 
-SOLVE_PROMPT_TEMPLATE = """ # Given Reasoning Structure
+SOLVE_PROMPT_TEMPLATE = """ # Detailed Instructions 
+
+You must use the given REASONING STRUCTURE to solve the GIVEN TASK, both are provided below.
+The REASONING STRUCTURE will guide your answer for the GIVEN TASK. 
+You must fill out ALL of the empty strings on the value side of the key-value pairs in the JSON structure of the REASONING STRUCTURE.
+Your output will consist of one codeblock. The codeblock will be a json codeblock enclosed by triple back-ticks with the json language specificer as shown in the "Example Output".
+The json codeblock will contain the completely filled out reasoning structure.
+
+## Example Output 
+
+```json
+{{
+  ...
+}}
+```
+
+# Given Reasoning Structure
 
 ```json
 {reasoning_structure}
@@ -176,20 +197,248 @@ SOLVE_PROMPT_TEMPLATE = """ # Given Reasoning Structure
 # Given Task
 
 {task}
+"""
+SOLVE_CONTINUE_PROMPT_TEMPLATE = """ # Detailed Instructions 
 
-## Example Output 
+The PARTIALLY COMPLETED REASONING STRUCTURE below was filled out for the GIVEN TASK, but the answer was cut short.
+Continue from where it stopped: fill out ALL of the empty strings in FIELDS TO COMPLETE, staying consistent with what has already been filled out.
+Do not repeat the fields that are already filled out.
+Your output will consist of one codeblock. The codeblock will be a json codeblock enclosed by triple back-ticks with the json language specificer.
+The json codeblock will contain the FIELDS TO COMPLETE structure with every value filled out.
+
+# Partially Completed Reasoning Structure
+
+```json
+{reasoning_structure}
+```
+
+# Given Task
+
+{task}
+
+# Fields To Complete
+
+```json
+{fields}
+```
+"""
+FUSED_DISCOVERY_PROMPT_TEMPLATE = """# Instructions
+For the given task, you are to complete three steps and return the result of all three in a single JSON code block.
+
+1. SELECT: Select 1 to 5 Reasoning Modules from the list below which are crucial to utilize in order to solve the given task. Refer to them by the number associated with each Reasoning Module.
+2. ADAPT: Rephrase and specify each selected reasoning module so that it better helps to solve the given task and its verbiage is task specific.
+3. IMPLEMENT: Create a reasoning structure that implements the rephrased reasoning modules for the given task but does not solve the given task. The given task will be solved by someone else using the reasoning structure that you construct.
+
+## Reasoning Modules
+
+{modules}
+
+## Example Task 
+
+John has 12 apples. He gives 5 apples to his sister. If he finds 8 more apples, how many apples does he have in total?
+
+## Example Output
 
 ```json
 {{
-  ...
+  "reasoning_modules": [1, 15, 32],
+  "adapted_modules": [
+    "Break down the arithmetic operations involved in the problem: Start by identifying the initial number of apples John has, then subtract the number given to his sister, and finally add the number of apples found later.",
+    "Identify the core arithmetic operation required to solve the problem: Determine the sequence of addition and subtraction needed to calculate the total number of apples John ends up with.",
+    "Consider common mathematical operations applied in similar problems: Recognize that this problem involves basic arithmetic operations—specifically, subtraction followed by addition—to find the total count of items."
+  ],
+  "reasoning_structure": {{
+    "Step 1: Identify Initial Quantity": {{
+      "Description": "John starts with a certain number of apples.",
+      "Action": "Identify initial number of apples John has.",
+      "Initial Quantity": ""
+    }},
+    "Step 2: Subtract Quantity Given Away": {{
+      "Description": "John gives some apples to his sister.",
+      "Action": "Subtract the number of apples given to his sister from the initial count.",
+      "Quantity Given Away": "5 apples",
+      "Effect on Total": ""
+    }},
+    "Step 3: Add Quantity Found": {{
+      "Description": "John finds additional apples.",
+      "Action": "Add the number of apples found to the current total.",
+      "Quantity Found": "8 apples",
+      "Effect on Total": ""
+    }},
+    "Step 4: Calculate Final Quantity": {{
+      "Description": "Calculate the final count of apples John has.",
+      "Action": "Apply the sequence of subtraction and addition to the initial count.",
+      "Core Operations": "Subtraction followed by addition",
+      "Final Total": ""
+    }},
+    "FINAL_ANSWER": ""
+  }}
 }}
 ```
 
-# Detailed Instructions 
+# Detailed instructions 
 
-You must use the given REASONING STRUCTURE to solve the GIVEN TASK, both are provided above.
-The REASONING STRUCTURE will guide your answer for the GIVEN TASK. 
-You must fill out ALL of the empty strings on the value side of the key-value pairs in the JSON structure of the REASONING STRUCTURE.
-Your output will consist of one codeblock. The codeblock will be a json codeblock enclosed by triple back-ticks with the json language specificer as shown in the "Example Output".
-The json codeblock will contain the completely filled out reasoning structure.
-"""
\ No newline at end of file
+Your answer should be in a JSON code block similar to the "Example Output" section. The JSON code block should use the triple back-tick notation as shown.
+The "reasoning_modules" field is a list of the numbers of the selected Reasoning Modules.
+The "adapted_modules" field is a list with one rephrased reasoning module per selected Reasoning Module, in the same order.
+The "reasoning_structure" field should be formatted as key-value pairs. The Key should represent a reasoning step within the reasoning structure and the value should be left as a blank string.
+The reasoning structure can be nested as deeply as needed to accurately spell out the reasoning steps required. 
+The reasoning structure must contain a key called "FINAL_ANSWER" at its root level with a blank string as the value. Ensure that the "FINAL_ANSWER" key is at the very bottom (is the last field) of the reasoning structure.
+
+## Task 
+
+{task}
+"""
+
+# One-line versions of REASONING_MODULES_LIST, same order, for the abbreviated module list.
+REASONING_MODULES_SHORT_LIST = ["Devise an experiment."
+,"List ideas and apply them one by one."
+,"Measure progress."
+,"Simplify the problem."
+,"Key assumptions."
+,"Risks and drawbacks of each solution."
+,"Alternative perspectives."
+,"Long-term implications."
+,"Break it into smaller parts."
+,"Critical thinking: question assumptions, weigh the evidence, spot biases."
+,"Creative thinking: unconventional, out-of-the-box ideas."
+,"Collaboration: draw on others' perspectives and expertise."
+,"Systems thinking: underlying causes, feedback loops, interdependencies."
+,"Risk analysis: weigh risks, uncertainties and tradeoffs."
+,"Reflective thinking: examine own biases and mental models."
+,"The core issue to address."
+,"Underlying causes."
+,"Solutions tried before and lessons learned."
+,"Obstacles and challenges."
+,"Relevant data and how to analyze it."
+,"Affected stakeholders and their needs."
+,"Resources needed."
+,"How to measure success."
+,"Indicators or metrics."
+,"Technical or practical, or conceptual or theoretical?"
+,"Physical constraints (resources, infrastructure, space)?"
+,"Human behavior (social, cultural, psychological)?"
+,"Decisions or planning under uncertainty or competing objectives?"
+,"Analytical: data analysis, modeling, optimization?"
+,"Design challenge needing creative solutions?"
+,"Systemic or structural rather than individual issues?"
+,"Time-sensitive or urgent?"
+,"Typical solutions for this kind of problem."
+,"Guess other solutions given the current best one."
+,"Assume the current best solution is wrong; rethink the problem."
+,"Best way to modify the current best solution."
+,"Create an entirely new solution."
+,"Let’s think step by step."
+,"Make a step by step plan and explain it."
+]
+
+# Compact variants of the templates above: the same outputs asked for with fewer tokens,
+# with the worked examples cut down to the output format.
+COMPACT_SELECT_PHASE_PROMPT_TEMPLATE = """# Reasoning Modules
+{modules}
+# Instructions
+Select the 1 to 5 reasoning modules most crucial to solving the task below.
+Answer with a JSON code block listing their numbers in a "reasoning_modules" field, e.g.:
+```json
+{{"reasoning_modules":[1,15,32]}}
+```
+
+# Task
+{task}
+"""
+
+COMPACT_ADAPT_PHASE_PROMPT_TEMPLATE = """# Instructions
+Rephrase each reasoning module below so that it is specific to the task.
+Answer with a markdown code block (```md) holding one list item per rephrased module, e.g.:
+```md
+- Identify the initial quantity: note how many apples John starts with.
+```
+
+# Reasoning Modules
+{modules}
+# Task
+{task}
+"""
+
+COMPACT_IMPLEMENT_PHASE_PROMPT_TEMPLATE = """# Instructions
+Turn the reasoning modules below into a JSON reasoning structure for the task, but do not solve the task; someone else will fill it out.
+Keys are reasoning steps, nested as deeply as needed, and every value is a blank string.
+The root must end with a "FINAL_ANSWER" key with a blank string value.
+Answer with a JSON code block, e.g.:
+```json
+{{"Reasoning Structure":{{"Step 1: Identify Initial Quantity":{{"Action":"Identify how many apples John starts with.","Initial Quantity":""}},"Step 2: Apply Changes":{{"Action":"Subtract the apples given away, then add the apples found.","Final Total":""}},"FINAL_ANSWER":""}}}}
+```
+
+# Task
+{task}
+
+# Reasoning Modules
+{modules}"""
+
+COMPACT_SOLVE_PROMPT_TEMPLATE = """# Instructions
+Solve the task below by filling out ALL of the empty string values of the reasoning structure.
+Answer with one JSON code block holding the completely filled out reasoning structure.
+
+# Reasoning Structure
+```json
+{reasoning_structure}
+```
+
+# Task
+{task}
+"""
+
+COMPACT_SOLVE_CONTINUE_PROMPT_TEMPLATE = """# Instructions
+The answer to the task below was cut short. Fill out ALL of the empty string values of the fields to complete, consistent with what is already filled out.
+Answer with one JSON code block holding only the fields to complete.
+
+# Partially Completed Reasoning Structure
+```json
+{reasoning_structure}
+```
+
+# Task
+{task}
+
+# Fields To Complete
+```json
+{fields}
+```
+"""
+
+COMPACT_FUSED_DISCOVERY_PROMPT_TEMPLATE = """# Reasoning Modules
+{modules}
+# Instructions
+Return one JSON code block with three fields:
+1. "reasoning_modules": the numbers of the 1 to 5 reasoning modules most crucial to solving the task below.
+2. "adapted_modules": each selected module rephrased to be specific to the task, in the same order.
+3. "reasoning_structure": a reasoning structure implementing the adapted modules, but not solving the task. Keys are reasoning steps, nested as deeply as needed, every value is a blank string, and the root ends with a "FINAL_ANSWER" key with a blank string value.
+Example:
+```json
+{{"reasoning_modules":[1,15,32],"adapted_modules":["Identify how many apples John starts with.","Subtract the apples given away, then add the apples found."],"reasoning_structure":{{"Step 1: Identify Initial Quantity":{{"Initial Quantity":""}},"Step 2: Apply Changes":{{"Final Total":""}},"FINAL_ANSWER":""}}}}
+```
+
+# Task
+{task}
+"""
+
+COMPACT_TEMPLATES = {
+    SELECT_PHASE_PROMPT_TEMPLATE: COMPACT_SELECT_PHASE_PROMPT_TEMPLATE,
+    ADAPT_PHASE_PROMPT_TEMPLATE: COMPACT_ADAPT_PHASE_PROMPT_TEMPLATE,
+    IMPLEMENT_PHASE_PROMPT_TEMPLATE: COMPACT_IMPLEMENT_PHASE_PROMPT_TEMPLATE,
+    SOLVE_PROMPT_TEMPLATE: COMPACT_SOLVE_PROMPT_TEMPLATE,
+    SOLVE_CONTINUE_PROMPT_TEMPLATE: COMPACT_SOLVE_CONTINUE_PROMPT_TEMPLATE,
+    FUSED_DISCOVERY_PROMPT_TEMPLATE: COMPACT_FUSED_DISCOVERY_PROMPT_TEMPLATE,
+}
+
+# Generation cap in tokens per phase for local models; without one, a model that never closes its code
+# block generates until the context window is full. SOLVE gets the most room since it fills in the whole structure.
+PHASE_MAX_TOKENS = {
+    SELECT_PHASE_PROMPT_TEMPLATE: 256,
+    ADAPT_PHASE_PROMPT_TEMPLATE: 1024,
+    IMPLEMENT_PHASE_PROMPT_TEMPLATE: 2048,
+    FUSED_DISCOVERY_PROMPT_TEMPLATE: 3072,
+    SOLVE_PROMPT_TEMPLATE: 4096,
+    SOLVE_CONTINUE_PROMPT_TEMPLATE: 4096,
+}
+PHASE_MAX_TOKENS.update({COMPACT_TEMPLATES[template]: max_tokens for template, max_tokens in PHASE_MAX_TOKENS.items()})
@@ -0,0 +1,80 @@
+from dataclasses import dataclass, asdict
+import threading
+
+# Events yielded by reasoningEngine.solve_stream / async_solve_stream, in pipeline order:
+# PhaseStarted, Token..., PhaseFinished (and Retry) per phase call, ModulesSelected,
+# ModulesAdapted and StructureReady as discovery progresses, then Answer or Failed.
+
+
+@dataclass
+class PhaseStarted:
+    phase: str
+
+
+@dataclass
+class PhaseFinished:
+    phase: str
+    seconds: float
+    ok: bool
+
+
+@dataclass
+class Token:
+    phase: str
+    text: str
+
+
+@dataclass
+class Retry:
+    phase: str
+    error: str
+
+
+@dataclass
+class ModulesSelected:
+    ids: list
+    modules: list
+
+
+@dataclass
+class ModulesAdapted:
+    adapted_modules: str
+
+
+@dataclass
+class StructureReady:
+    reasoning_structure: dict
+    source: str  # "discovered", "fused", "cache" or "index"
+
+
+@dataclass
+class Answer:
+    answer: str
+    seconds: float
+
+
+@dataclass
+class Failed:
+    error: str
+    seconds: float
+
+
+def to_dict(event) -> dict:
+    return {"event": type(event).__name__, **asdict(event)}
+
+
+class EventStream:
+    """Forwards engine events to `sink`, tagging tokens with the phase they belong to."""
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.phase = None
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        with self._lock:
+            if isinstance(event,PhaseStarted):
+                self.phase = event.phase
+            elif isinstance(event,Token) and event.phase is None:
+                event.phase = self.phase
+            self.sink(event)
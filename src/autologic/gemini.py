@@ -1,36 +1,150 @@
 import google.generativeai as genai
+import google.ai.generativelanguage as glm
+from google.generativeai.types import GenerateContentResponse, AsyncGenerateContentResponse
 from dotenv import load_dotenv
+from .utils import ClientStats, BlockScanner
+from . import metrics
+import threading
+import asyncio
+import weakref
 import os
 
-def invoke(prompt: str, api_key: str = None, temp: float = 0.8, max_context: int = 2000):
-    
-    if not api_key:
+DEFAULT_MODEL = "gemini-pro"
+
+_timeout = 600.0
+_clients = {}
+_async_clients = weakref.WeakKeyDictionary()
+_env_api_key = None
+_lock = threading.Lock()
+stats = ClientStats()
+
+_safety_settings = [
+    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_ONLY_HIGH"},
+    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_ONLY_HIGH"},
+    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_ONLY_HIGH"},
+    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_ONLY_HIGH"},
+]
+
+
+def configure(timeout: float = None):
+    global _timeout
+    if timeout is not None:
+        _timeout = timeout
+
+
+def _resolve_api_key(api_key: str = None) -> str:
+    global _env_api_key
+    if api_key:
+        return api_key
+    if _env_api_key is None:
         load_dotenv()
-        api_key = os.environ.get("GEMINI_PRO_API_KEY")
-    genai.configure(api_key=api_key)
+        _env_api_key = os.environ.get("GEMINI_PRO_API_KEY")
+    return _env_api_key
+
+
+def get_client(api_key: str = None) -> glm.GenerativeServiceClient:
+    # Each client carries its own key, so calls with different keys never share or replace one another's client
+    # (genai.configure would swap the process-wide one).
+    api_key = _resolve_api_key(api_key)
+    with _lock:
+        client = _clients.get(api_key)
+        if client is not None:
+            stats.reused += 1
+            return client
+        stats.created += 1
+        client = _clients[api_key] = glm.GenerativeServiceClient(client_options={"api_key": api_key})
+        return client
+
+
+def get_async_client(api_key: str = None) -> glm.GenerativeServiceAsyncClient:
+    # grpc.aio channels are bound to the event loop that opened them, so keep one registry per loop.
+    api_key = _resolve_api_key(api_key)
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.setdefault(loop,{})
+        client = clients.get(api_key)
+        if client is not None:
+            stats.reused += 1
+            return client
+        stats.created += 1
+        client = clients[api_key] = glm.GenerativeServiceAsyncClient(client_options={"api_key": api_key})
+        return client
+
+
+def _model_path(model_name: str = None) -> str:
+    return f"models/{model_name or DEFAULT_MODEL}"
+
 
-    # Set up the model
+def _request(prompt: str, temp: float, max_context: int, model_name: str, json_mode: bool) -> genai.protos.GenerateContentRequest:
+    # A single-turn request is equivalent to sending one message on a fresh chat session.
     generation_config = {
         "temperature": temp,
         "top_p": 1,
         "top_k": 1,
         "max_output_tokens": max_context,
     }
-
-    safety_settings = [
-        {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_ONLY_HIGH"},
-        {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_ONLY_HIGH"},
-        {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_ONLY_HIGH"},
-        {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_ONLY_HIGH"},
-    ]
-
-    model = genai.GenerativeModel(
-        model_name="gemini-pro",
+    if json_mode:
+        generation_config["response_mime_type"] = "application/json"
+    return genai.protos.GenerateContentRequest(
+        model=_model_path(model_name),
+        contents=[{"role": "user", "parts": [{"text": prompt}]}],
         generation_config=generation_config,
-        safety_settings=safety_settings,
+        safety_settings=_safety_settings,
     )
 
-    convo = model.start_chat(history=[])
 
-    convo.send_message(prompt)
-    return convo.last.text
+def count_tokens(text: str, api_key: str = None, model_name: str = None) -> int:
+    request = genai.protos.CountTokensRequest(model=_model_path(model_name),contents=[{"role": "user", "parts": [{"text": text}]}])
+    return get_client(api_key).count_tokens(request,timeout=_timeout).total_tokens
+
+
+def _chunk_text(chunk) -> str:
+    # Chunks without candidate parts (e.g. the final one carrying only the finish reason) have no text.
+    try:
+        return chunk.text
+    except ValueError:
+        return ""
+
+
+def _record_usage(response):
+    usage = getattr(response,"usage_metadata",None)
+    if usage is not None:
+        metrics.tokens("gemini",usage.prompt_token_count,usage.candidates_token_count)
+
+
+def invoke(prompt: str, api_key: str = None, temp: float = 0.8, max_context: int = 2000, model_name: str = None, json_mode: bool = False, scanner: BlockScanner = None):
+    
+    client = get_client(api_key)
+    request = _request(prompt,temp,max_context,model_name,json_mode)
+    if scanner is None:
+        response = GenerateContentResponse.from_response(client.generate_content(request,timeout=_timeout))
+        _record_usage(response)
+        return response.text
+
+    chunk = None
+    for chunk in GenerateContentResponse.from_iterator(client.stream_generate_content(request,timeout=_timeout)):
+        if scanner.feed(_chunk_text(chunk)):
+            scanner.early_stop = True
+            break
+    # Every chunk carries the running usage totals.
+    _record_usage(chunk)
+    return scanner.text
+
+
+async def async_invoke(prompt: str, api_key: str = None, temp: float = 0.8, max_context: int = 2000, model_name: str = None, json_mode: bool = False, scanner: BlockScanner = None):
+    
+    client = get_async_client(api_key)
+    request = _request(prompt,temp,max_context,model_name,json_mode)
+    if scanner is None:
+        response = AsyncGenerateContentResponse.from_response(await client.generate_content(request,timeout=_timeout))
+        _record_usage(response)
+        return response.text
+
+    chunk = None
+    response = await AsyncGenerateContentResponse.from_aiterator(await client.stream_generate_content(request,timeout=_timeout))
+    async for chunk in response:
+        if scanner.feed(_chunk_text(chunk)):
+            scanner.early_stop = True
+            break
+    _record_usage(chunk)
+    return scanner.text
@@ -0,0 +1,86 @@
+from . import config
+import functools
+import json
+
+# GBNF grammars (llama.cpp) for each SELF-DISCOVER phase. Each one produces exactly the fenced block that
+# utils.extractJSONToDict / utils.extractMDBlock look for, so a constrained generation always parses.
+
+_JSON_PRIMITIVES = r'''
+ws ::= ( " " | "\n" [ \t]{0,20} )?
+char ::= [^"\\\x00-\x1f] | "\\" ( ["\\/bfnrt] | "u" [0-9a-fA-F] [0-9a-fA-F] [0-9a-fA-F] [0-9a-fA-F] )
+string ::= "\"" char* "\""
+answer ::= "\"" char+ "\""
+number ::= "-"? ( [0-9] | [1-9] [0-9]* ) ( "." [0-9]+ )? ( [eE] [-+]? [0-9]+ )?
+value ::= object | array | string | number | "true" | "false" | "null"
+object ::= "{" ws ( string ws ":" ws value ( ws "," ws string ws ":" ws value )* )? ws "}"
+array ::= "[" ws ( value ( ws "," ws value )* )? ws "]"
+'''
+
+
+def _module_id_rule() -> str:
+    # Only ids that exist in REASONING_MODULES_LIST can be generated.
+    return "module-id ::= " + " | ".join(f'"{module_id}"' for module_id in range(len(config.REASONING_MODULES_LIST)))
+
+
+SELECT_GRAMMAR = r'''
+root ::= "```json\n" ws "{" ws "\"reasoning_modules\"" ws ":" ws "[" ws module-id ( ws "," ws module-id )? ( ws "," ws module-id )? ( ws "," ws module-id )? ( ws "," ws module-id )? ws "]" ws "}" ws "\n```"
+''' + _module_id_rule() + "\n" + _JSON_PRIMITIVES
+
+ADAPT_GRAMMAR = r'''
+root ::= "```md\n" [^`]+ "```"
+'''
+
+# A reasoning structure is a nested object of string leaves whose last root-level key is FINAL_ANSWER,
+# optionally wrapped in {"Reasoning Structure": ...} as in the IMPLEMENT example.
+IMPLEMENT_GRAMMAR = r'''
+root ::= "```json\n" ws ( structure | "{" ws "\"Reasoning Structure\"" ws ":" ws structure ws "}" ) ws "\n```"
+structure ::= "{" ws ( step ws "," ws )* "\"FINAL_ANSWER\"" ws ":" ws "\"\"" ws "}"
+step ::= string ws ":" ws ( string | steps )
+steps ::= "{" ws ( step ( ws "," ws step )* )? ws "}"
+''' + _JSON_PRIMITIVES
+
+# The fused discovery response: selected module ids, one rephrased module per id and the reasoning structure.
+FUSED_GRAMMAR = r'''
+root ::= "```json\n" ws "{" ws "\"reasoning_modules\"" ws ":" ws ids ws "," ws "\"adapted_modules\"" ws ":" ws "[" ws answer ( ws "," ws answer )* ws "]" ws "," ws "\"reasoning_structure\"" ws ":" ws structure ws "}" ws "\n```"
+ids ::= "[" ws module-id ( ws "," ws module-id )? ( ws "," ws module-id )? ( ws "," ws module-id )? ( ws "," ws module-id )? ws "]"
+structure ::= "{" ws ( step ws "," ws )* "\"FINAL_ANSWER\"" ws ":" ws "\"\"" ws "}"
+step ::= string ws ":" ws ( string | steps )
+steps ::= "{" ws ( step ( ws "," ws step )* )? ws "}"
+''' + _module_id_rule() + "\n" + _JSON_PRIMITIVES
+
+
+def _literal(text: str) -> str:
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+
+
+def _structure_rules(node, name: str, rules: list) -> str:
+    if isinstance(node, dict):
+        members = []
+        for position, (key, child) in enumerate(node.items()):
+            child_name = f"{name}-{position}"
+            key_literal = _literal(json.dumps(key))
+            if key == "FINAL_ANSWER":
+                # The answer must actually be filled in.
+                value = "answer"
+            else:
+                value = _structure_rules(child, child_name, rules)
+            members.append(f'{key_literal} ws ":" ws {value}')
+        body = ' ws "," ws '.join(members)
+        rules.append(f'{name} ::= "{{" ws {body} ws "}}"' if members else f'{name} ::= "{{" ws "}}"')
+        return name
+    if isinstance(node, str):
+        return "string"
+    return "value"
+
+
+@functools.lru_cache(maxsize=256)
+def _solve_grammar(structure_json: str) -> str:
+    rules = []
+    root = _structure_rules(json.loads(structure_json), "node", rules)
+    header = f'root ::= "```json\\n" ws {root} ws "\\n```"'
+    return "\n".join([header, *rules, _JSON_PRIMITIVES])
+
+
+def solve_grammar(reasoning_structure: dict) -> str:
+    # The SOLVE output is the given structure with its values filled in, so the grammar fixes every key and its order.
+    return _solve_grammar(json.dumps(reasoning_structure))
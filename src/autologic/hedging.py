@@ -0,0 +1,224 @@
+from . import metrics
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from collections import deque
+from dataclasses import dataclass
+import contextvars
+import threading
+import asyncio
+import math
+import time
+
+
+@dataclass
+class HedgeStats:
+    calls: int = 0
+    fired: int = 0
+    wins: int = 0
+    capped: int = 0
+    cancelled: int = 0
+    abandoned: int = 0
+
+    @property
+    def fire_rate(self) -> float:
+        return self.fired / self.calls if self.calls else 0.0
+
+    @property
+    def win_rate(self) -> float:
+        return self.wins / self.fired if self.fired else 0.0
+
+
+class LatencyTracker:
+    """Latencies of the most recent calls per key, for percentile lookups."""
+
+    def __init__(self, window: int = 256):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def observe(self, key: str, seconds: float):
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def count(self, key: str) -> int:
+        with self._lock:
+            return len(self._samples.get(key,()))
+
+    def percentile(self, key: str, q: float) -> float:
+        # Nearest-rank percentile; None before anything was observed.
+        with self._lock:
+            samples = sorted(self._samples.get(key,()))
+        if not samples:
+            return None
+        return samples[max(0,min(len(samples) - 1,math.ceil(q * len(samples)) - 1))]
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _submit(function, *args):
+    # Sync calls that may be hedged run on a shared pool, in the caller's context.
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=64,thread_name_prefix="autologic-hedge")
+    return _executor.submit(contextvars.copy_context().run,function,*args)
+
+
+class HedgePolicy:
+    """Sends a duplicate of a phase call that has not returned by the `percentile` of recently
+    observed latency for that phase, to `alternate` or the same config, and keeps the first
+    response that parses. At most `max_rate` of a phase's calls are hedged.
+
+    Hedging starts once `min_samples` latencies of the phase have been observed. `phases`
+    limits it to some phases (select, adapt, implement, fused, solve); None hedges all of them.
+    """
+
+    def __init__(self, percentile: float = 0.95, alternate=None, max_rate: float = 0.1, phases: list = None, min_samples: int = 20, window: int = 256):
+        if not 0 < percentile < 1:
+            raise ValueError("The hedge percentile must be between 0 and 1")
+        self.percentile = percentile
+        self.alternate = alternate
+        self.max_rate = max_rate
+        self.phases = set(phases) if phases is not None else None
+        self.min_samples = min_samples
+        self.latency = LatencyTracker(window)
+        self.stats = {}
+        self._lock = threading.Lock()
+
+    def applies(self, phase: str) -> bool:
+        return phase is not None and (self.phases is None or phase in self.phases)
+
+    def delay(self, phase: str) -> float:
+        # Seconds to wait before hedging, or None while there is too little history.
+        if self.latency.count(phase) < self.min_samples:
+            return None
+        return self.latency.percentile(phase,self.percentile)
+
+    def _stats(self, phase: str) -> HedgeStats:
+        stats = self.stats.get(phase)
+        if stats is None:
+            stats = self.stats[phase] = HedgeStats()
+        return stats
+
+    def _start(self, phase: str):
+        with self._lock:
+            self._stats(phase).calls += 1
+
+    def _allow(self, phase: str) -> bool:
+        with self._lock:
+            stats = self._stats(phase)
+            if stats.fired + 1 > self.max_rate * stats.calls:
+                stats.capped += 1
+                allowed = False
+            else:
+                stats.fired += 1
+                allowed = True
+        metrics.inc(metrics.HEDGES,phase=phase,result="fired" if allowed else "capped")
+        return allowed
+
+    def _finish(self, phase: str, hedge_won: bool, cancelled: int, abandoned: int = 0):
+        with self._lock:
+            stats = self._stats(phase)
+            stats.wins += hedge_won
+            stats.cancelled += cancelled
+            stats.abandoned += abandoned
+        if hedge_won:
+            metrics.inc(metrics.HEDGES,phase=phase,result="won")
+
+    def run(self, phase: str, call, parses) -> tuple:
+        """Run `call(hedge)` with hedging; returns (response, whether the hedge's response won)."""
+        self._start(phase)
+        delay = self.delay(phase)
+        start = time.perf_counter()
+        if delay is None:
+            response = call(False)
+            self.latency.observe(phase,time.perf_counter() - start)
+            return (response,False)
+        primary = _submit(call,False)
+        done, _ = wait([primary],timeout=delay)
+        if done or not self._allow(phase):
+            response = primary.result()
+            self.latency.observe(phase,time.perf_counter() - start)
+            return (response,False)
+        # The window gets the primary's own latency once it finishes, even if the hedge wins, so slow calls stay in it.
+        primary.add_done_callback(lambda future: future.exception() is None and self.latency.observe(phase,time.perf_counter() - start))
+        pending = {primary: False, _submit(call,True): True}
+        fallback = error = None
+        while pending:
+            done, _ = wait(pending,return_when=FIRST_COMPLETED)
+            for future in done:
+                hedge = pending.pop(future)
+                try:
+                    response = future.result()
+                except Exception as e:
+                    error = error or e
+                    continue
+                if parses(response):
+                    # A running sync call cannot be interrupted; it finishes in the background and is dropped.
+                    cancelled = sum(other.cancel() for other in pending)
+                    self._finish(phase,hedge,cancelled,len(pending) - cancelled)
+                    return (response,hedge)
+                fallback = fallback or (response,hedge)
+        self._finish(phase,False,0)
+        if fallback is not None:
+            return fallback
+        raise error
+
+    async def async_run(self, phase: str, call, parses) -> tuple:
+        """Async counterpart of `run`; `call(hedge)` returns a coroutine and losing calls are cancelled."""
+        self._start(phase)
+        delay = self.delay(phase)
+        start = time.perf_counter()
+        if delay is None:
+            response = await call(False)
+            self.latency.observe(phase,time.perf_counter() - start)
+            return (response,False)
+        primary = asyncio.ensure_future(call(False))
+        pending = {primary: False}
+        try:
+            done, _ = await asyncio.wait([primary],timeout=delay)
+            if done or not self._allow(phase):
+                response = await primary
+                self.latency.observe(phase,time.perf_counter() - start)
+                return (response,False)
+            pending[asyncio.ensure_future(call(True))] = True
+            fallback = error = None
+            while pending:
+                done, _ = await asyncio.wait(pending,return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    hedge = pending.pop(task)
+                    try:
+                        response = task.result()
+                    except Exception as e:
+                        error = error or e
+                        continue
+                    won = parses(response)
+                    if not hedge or won and primary in pending:
+                        # A primary cancelled for the hedge took at least this long.
+                        self.latency.observe(phase,time.perf_counter() - start)
+                    if won:
+                        self._finish(phase,hedge,len(pending))
+                        return (response,hedge)
+                    fallback = fallback or (response,hedge)
+            self._finish(phase,False,0)
+            if fallback is not None:
+                return fallback
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def report(self) -> str:
+        lines = []
+        for phase, stats in sorted(self.stats.items()):
+            delay = self.delay(phase)
+            threshold = f"p{self.percentile * 100:g} {delay:.2f}s" if delay is not None else "warming up"
+            lines.append(
+                f"{phase}: {stats.calls} calls, {stats.fired} hedged ({stats.fire_rate:.1%}), {stats.wins} won by the hedge, "
+                f"{stats.capped} capped, {stats.cancelled} cancelled, {stats.abandoned} abandoned, {threshold}"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,401 @@
+from dataclasses import dataclass, field
+import json
+import re
+
+_FENCE = "```"
+_OPEN = re.compile(r"[{\[]")
+_OBJECT = re.compile(r"\{")
+_DECODER = json.JSONDecoder()
+_MISSING = object()
+_WORD_END = re.compile(r"""[\s,:}\]"']""")
+_NUMBER = re.compile(r"-?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?")
+_STRING_SPECIAL = {'"': re.compile(r'["\\\x00-\x1f]'), "'": re.compile(r"['\\\x00-\x1f]")}
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t", "'": "'"}
+_LITERALS = {"true": True, "false": False, "null": None, "True": True, "False": False, "None": None}
+# Characters that can start the value or key after a comma, used to tell a closing quote from an unescaped one.
+_AFTER_COMMA = set("\"'{}[]-0123456789tfnTFN")
+_CANDIDATES = 8
+
+
+@dataclass
+class JSONExtraction:
+    value: object
+    repairs: list = field(default_factory=list,metadata={"description": "Defects that were repaired, in the order they were met. Empty when the JSON parsed as is."})
+    complete: bool = field(default=True,metadata={"description": "False when the JSON was cut short and its open strings, arrays and objects were closed."})
+    fenced: bool = True
+
+
+class IncompleteJSON(ValueError):
+    """Raised for JSON that was cut short; carries what was recovered and the fields still missing."""
+
+    def __init__(self, message: str, value=None, missing: list = None):
+        super().__init__(message)
+        self.value = value
+        self.missing = missing or []
+
+
+class _Parser:
+    # Recursive descent over text[pos:limit] that accepts the defects models commonly produce.
+
+    def __init__(self, text: str, pos: int, limit: int):
+        self.text = text
+        self.pos = pos
+        self.limit = limit
+        self.repairs = []
+        self.truncated = False
+
+    def repair(self, what: str):
+        if what not in self.repairs:
+            self.repairs.append(what)
+
+    def skip(self):
+        text, limit = self.text, self.limit
+        while self.pos < limit:
+            char = text[self.pos]
+            if char.isspace():
+                self.pos += 1
+            elif text.startswith("//",self.pos):
+                self.repair("comment")
+                end = text.find("\n",self.pos,limit)
+                self.pos = limit if end < 0 else end + 1
+            elif text.startswith("/*",self.pos):
+                self.repair("comment")
+                end = text.find("*/",self.pos + 2,limit)
+                self.pos = limit if end < 0 else end + 2
+            else:
+                return
+
+    def peek(self) -> str:
+        self.skip()
+        return self.text[self.pos] if self.pos < self.limit else ""
+
+    def value(self):
+        char = self.peek()
+        if not char:
+            self.truncated = True
+            return _MISSING
+        if char == "{":
+            return self.object()
+        if char == "[":
+            return self.array()
+        if char in "\"'":
+            return self.string(char)
+        if char in "-.0123456789":
+            return self.number()
+        return self.word()
+
+    def object(self) -> dict:
+        self.pos += 1
+        result = {}
+        while True:
+            char = self.peek()
+            if not char:
+                self.truncated = True
+                return result
+            if char == "}":
+                self.pos += 1
+                return result
+            if char == ",":
+                self.repair("extra comma")
+                self.pos += 1
+                continue
+            if char == "]":
+                self.repair("mismatched bracket")
+                self.pos += 1
+                return result
+            key = self.string(char,key=True) if char in "\"'" else self.word(key=True)
+            if key is _MISSING:
+                self.truncated = True
+                return result
+            char = self.peek()
+            if char == ":":
+                self.pos += 1
+            elif char:
+                raise ValueError(f"Expected ':' after key {key!r} at position {self.pos}")
+            value = self.value()
+            if value is _MISSING:
+                return result
+            result[str(key)] = value
+            if not self.separator("}"):
+                return result
+
+    def array(self) -> list:
+        self.pos += 1
+        result = []
+        while True:
+            char = self.peek()
+            if not char:
+                self.truncated = True
+                return result
+            if char == "]":
+                self.pos += 1
+                return result
+            if char == ",":
+                self.repair("extra comma")
+                self.pos += 1
+                continue
+            if char == "}":
+                self.repair("mismatched bracket")
+                self.pos += 1
+                return result
+            value = self.value()
+            if value is _MISSING:
+                return result
+            result.append(value)
+            if not self.separator("]"):
+                return result
+
+    def separator(self, close: str) -> bool:
+        # After a member: True to read the next one. The closing bracket itself is left for the caller.
+        char = self.peek()
+        if char == ",":
+            self.pos += 1
+            if self.peek() == close:
+                self.repair("trailing comma")
+            return True
+        if char == close or char in "}]":
+            return True
+        if not char:
+            self.truncated = True
+            return False
+        self.repair("missing comma")
+        return True
+
+    def string(self, quote: str, key: bool = False):
+        text, limit = self.text, self.limit
+        if quote == "'":
+            self.repair("single quotes")
+        special = _STRING_SPECIAL[quote]
+        self.pos += 1
+        parts = []
+        while True:
+            match = special.search(text,self.pos,limit)
+            if match is None:
+                self.pos = limit
+                self.truncated = True
+                return _MISSING
+            position = match.start()
+            parts.append(text[self.pos:position])
+            char = text[position]
+            if char == quote:
+                if self._closes(position + 1,key):
+                    self.pos = position + 1
+                    return "".join(parts)
+                self.repair("unescaped quote")
+                parts.append(char)
+                self.pos = position + 1
+            elif char == "\\":
+                if position + 1 >= limit:
+                    self.pos = limit
+                    self.truncated = True
+                    return _MISSING
+                escaped = text[position + 1]
+                if escaped == "u" and position + 6 <= limit:
+                    try:
+                        parts.append(chr(int(text[position + 2:position + 6],16)))
+                        self.pos = position + 6
+                        continue
+                    except ValueError:
+                        pass
+                if escaped in _ESCAPES:
+                    parts.append(_ESCAPES[escaped])
+                else:
+                    self.repair("invalid escape")
+                    parts.append(escaped)
+                self.pos = position + 2
+            else:
+                self.repair("control character in string")
+                parts.append(char)
+                self.pos = position + 1
+
+    def _closes(self, position: int, key: bool) -> bool:
+        text, limit = self.text, self.limit
+        while position < limit and text[position] in " \t\r\n":
+            position += 1
+        if position >= limit:
+            return True
+        char = text[position]
+        if char in ":}]":
+            return True
+        if char in "\"'" and not key:
+            # Another string right after this one: a missing comma rather than a quote inside the value.
+            return self._ends_string(position)
+        if char != "," or key:
+            return False
+        position += 1
+        while position < limit and text[position] in " \t\r\n":
+            position += 1
+        return position >= limit or text[position] in _AFTER_COMMA
+
+    def _ends_string(self, position: int) -> bool:
+        # Whether the string starting at `position` is a whole member (a key, or an array item) by itself.
+        text, limit = self.text, self.limit
+        quote = text[position]
+        end = position
+        while True:
+            end = text.find(quote,end + 1,limit)
+            if end < 0:
+                return True
+            if text[end - 1] != "\\":
+                break
+        end += 1
+        while end < limit and text[end] in " \t\r\n":
+            end += 1
+        return end >= limit or text[end] in ":,]}"
+
+    def number(self):
+        match = _NUMBER.match(self.text,self.pos,self.limit)
+        if match is None:
+            return self.word()
+        self.pos = match.end()
+        if self.pos >= self.limit:
+            # A number that runs into the end may have lost digits.
+            self.truncated = True
+            return _MISSING
+        literal = match.group()
+        if literal.startswith(".") or literal.endswith(".") or literal.lstrip("-").startswith("."):
+            self.repair("malformed number")
+            return float(literal.replace("-.","-0.").rstrip(".") or 0)
+        return json.loads(literal)
+
+    def word(self, key: bool = False):
+        # Unquoted keys, Python literals and bare text values.
+        match = _WORD_END.search(self.text,self.pos,self.limit)
+        end = self.limit if match is None else match.start()
+        word = self.text[self.pos:end]
+        if not word:
+            raise ValueError(f"Unexpected {self.text[self.pos]!r} at position {self.pos}")
+        if end >= self.limit:
+            self.pos = end
+            self.truncated = True
+            return _MISSING
+        self.pos = end
+        if key:
+            self.repair("unquoted key")
+            return word
+        if word in _LITERALS:
+            if word not in ("true", "false", "null"):
+                self.repair("python literal")
+            return _LITERALS[word]
+        self.repair("unquoted value")
+        return word
+
+
+def _blocks(response: str, language_identifer_optional: bool):
+    # (content start, content end, fenced) for each fenced block in order, then the text as a whole.
+    marker = _FENCE if language_identifer_optional else _FENCE + "json"
+    search_from = 0
+    while True:
+        start = response.find(marker,search_from)
+        if start < 0:
+            break
+        content = start + len(marker)
+        if language_identifer_optional and response.startswith("json",content):
+            content += 4
+        end = response.find(_FENCE,content)
+        yield (content, len(response) if end < 0 else end, True)
+        if end < 0:
+            return
+        search_from = end + len(_FENCE)
+    yield (0, len(response), False)
+
+
+def _parse(response: str, start: int, limit: int, fenced: bool) -> JSONExtraction:
+    try:
+        # Valid JSON parses at C speed; a missing closing fence or trailing text does not matter here.
+        value, _ = _DECODER.raw_decode(response,start)
+        return JSONExtraction(value=value,fenced=fenced)
+    except json.JSONDecodeError:
+        pass
+    parser = _Parser(response,start,limit)
+    value = parser.value()
+    if value is _MISSING:
+        value = None
+    return JSONExtraction(value=value,repairs=parser.repairs,complete=not parser.truncated,fenced=fenced)
+
+
+def extract(response: str, language_identifer_optional: bool = True) -> JSONExtraction:
+    """Find and parse the JSON a model response carries, repairing common defects in one pass.
+
+    The first fenced block holding an object or array wins, with or without its closing fence;
+    otherwise the first bare object in the text. Trailing and missing commas, comments, single
+    quotes, unquoted keys, unescaped quotes and raw control characters in strings are repaired,
+    and a truncated tail is closed (`complete` is then False). Raises ValueError if nothing parses.
+    """
+    last_error = None
+    truncated = None
+    for content, end, fenced in _blocks(response,language_identifer_optional):
+        pattern = _OPEN if fenced else _OBJECT
+        position = content
+        for _ in range(_CANDIDATES):
+            match = pattern.search(response,position,end)
+            if match is None:
+                break
+            try:
+                extraction = _parse(response,match.start(),end,fenced)
+            except (ValueError, RecursionError) as e:
+                last_error = e
+            else:
+                if extraction.value is not None and (extraction.value or fenced):
+                    return extraction
+                if truncated is None and not extraction.complete and response[match.end():end].lstrip().startswith(("\"", "'")):
+                    # Cut short in its first member: nothing was recovered, but this is JSON rather than a brace in prose.
+                    truncated = extraction
+            if fenced:
+                break
+            # Prose can contain braces; try the next one.
+            position = match.start() + 1
+    if truncated is not None:
+        return truncated
+    raise ValueError(f"No JSON found in the response{f' ({last_error})' if last_error else ''}")
+
+
+def conform(value, template):
+    """`value` wrapped or unwrapped to match `template`; models sometimes drop or add the "Reasoning Structure" wrapper."""
+    if isinstance(template,dict) and isinstance(value,dict):
+        if len(template) == 1:
+            (wrapper, inner), = template.items()
+            if wrapper not in value and isinstance(inner,dict):
+                return {wrapper: value}
+        if len(value) == 1:
+            (wrapper, inner), = value.items()
+            if wrapper not in template and isinstance(inner,dict):
+                return inner
+    return value
+
+
+def missing_fields(value, template) -> list:
+    """Key paths of the empty template fields (`""`) that `value` leaves unfilled."""
+    missing = []
+
+    def walk(current, expected, path):
+        if isinstance(expected,dict):
+            current = current if isinstance(current,dict) else {}
+            for key, child in expected.items():
+                walk(current.get(key,_MISSING),child,path + [key])
+        elif expected == "" and (current is _MISSING or current in ("", None)):
+            missing.append(path)
+
+    walk(conform(value,template),template,[])
+    return missing
+
+
+def subset(template: dict, paths: list) -> dict:
+    """The part of `template` holding only `paths`."""
+    result = {}
+    for path in paths:
+        node = result
+        for key in path[:-1]:
+            node = node.setdefault(key,{})
+        node[path[-1]] = ""
+    return result
+
+
+def merge(value, update):
+    """Deep-merge `update` into a copy of `value`; non-empty values in `update` win."""
+    if isinstance(value,dict) and isinstance(update,dict):
+        merged = dict(value)
+        for key, child in update.items():
+            merged[key] = merge(merged.get(key),child)
+        return merged
+    return value if update in ("", None) else update
@@ -1,24 +1,344 @@
-from llama_cpp import Llama
+from llama_cpp import Llama, LlamaState
+import llama_cpp
+import numpy as np
 from dotenv import load_dotenv
+from .utils import BlockScanner
+from . import metrics
+from . import tracing
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+from dataclasses import dataclass, field
+import functools
+import threading
+import asyncio
+import hashlib
+import time
 import os
 
-def invoke(prompt: str, gguf_path: str = None, threads: int =12 ,temp: float = 0.8, max_context: int = 2000,stop: list[str] = ["[/INST]","<|im_end|>"]) -> str:
 
-    
-    llm = Llama(
-        model_path=gguf_path,
-        n_gpu_layers=-1, 
-        n_ctx=max_context, 
-        verbose=False,
-        n_threads=threads,
-        n_threads_batch=threads
+@dataclass
+class PoolStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    load_time: float = field(default=0.0,metadata={"description": "Total seconds spent loading GGUF files."})
+    prefix_reuses: int = field(default=0,metadata={"description": "Calls that started from a cached prompt-prefix KV state."})
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class _PooledModel:
+    def __init__(self, llm: Llama, size: int, key: tuple):
+        self.llm = llm
+        self.size = size
+        self.key = key
+        # llama.cpp contexts are not thread safe, callers must hold this while generating.
+        self.lock = threading.Lock()
+        # Prompt prefix -> LlamaState holding the evaluated KV cache for that prefix.
+        self.prefix_states = {}
+
+
+class ModelPool:
+    """Process-wide LRU pool of loaded llama.cpp models.
+
+    Models are keyed by (gguf_path, n_ctx, threads, n_gpu_layers). The pool holds at most
+    `max_models` models and, if `memory_budget` (bytes) is set, evicts least recently used
+    models until the GGUF sizes of the resident models fit in the budget. The most recently
+    requested model is always kept, even if it alone exceeds the budget.
+    """
+
+    def __init__(self, max_models: int = 2, memory_budget: int = None):
+        self.max_models = max_models
+        self.memory_budget = memory_budget
+        self.stats = PoolStats()
+        self._models = OrderedDict()
+        # Key -> (Future of a model being loaded, its GGUF size).
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    def get(self, gguf_path: str, n_ctx: int = 2000, threads: int = 12, n_gpu_layers: int = -1) -> _PooledModel:
+        key = (os.path.abspath(gguf_path), n_ctx, threads, n_gpu_layers)
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._models.move_to_end(key)
+                self.stats.hits += 1
+                return model
+            if key in self._loading:
+                # Another thread is already loading this model; wait for it instead of loading twice.
+                self.stats.hits += 1
+                loading = self._loading[key][0]
+                owner = False
+            else:
+                self.stats.misses += 1
+                size = os.path.getsize(gguf_path)
+                self._evict_for(size)
+                loading = Future()
+                self._loading[key] = (loading,size)
+                owner = True
+        if not owner:
+            return loading.result()
+
+        # Loads take seconds, so they run outside the pool lock: calls for resident models go on.
+        try:
+            start = time.perf_counter()
+            llm = Llama(
+                model_path=gguf_path,
+                n_gpu_layers=n_gpu_layers,
+                n_ctx=n_ctx,
+                verbose=False,
+                n_threads=threads,
+                n_threads_batch=threads
+            )
+            load_time = time.perf_counter() - start
+        except BaseException as e:
+            with self._lock:
+                del self._loading[key]
+            loading.set_exception(e)
+            raise
+        model = _PooledModel(llm,size,key)
+        with self._lock:
+            self.stats.load_time += load_time
+            del self._loading[key]
+            self._evict_for(size)
+            self._models[key] = model
+        loading.set_result(model)
+        return model
+
+    def _evict_for(self, size: int):
+        # Models other threads are still loading count as resident, so concurrent loads cannot overshoot.
+        while self._models and len(self._models) + len(self._loading) >= self.max_models:
+            self._evict_oldest()
+        if self.memory_budget is not None:
+            loading = sum(loading_size for _, loading_size in self._loading.values())
+            while self._models and self.resident_bytes() + loading + size > self.memory_budget:
+                self._evict_oldest()
+
+    def _evict_oldest(self):
+        # In-flight calls keep their own reference, so the model is freed once they finish.
+        self._models.popitem(last=False)
+        self.stats.evictions += 1
+
+    def resident_bytes(self) -> int:
+        return sum(model.size for model in self._models.values())
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+
+    def __len__(self):
+        return len(self._models)
+
+
+_pool = ModelPool()
+
+
+def configure_pool(max_models: int = None, memory_budget: int = None):
+    if max_models is not None:
+        _pool.max_models = max_models
+    if memory_budget is not None:
+        _pool.memory_budget = memory_budget
+
+
+def pool_stats() -> PoolStats:
+    return _pool.stats
+
+
+def get_model(gguf_path: str, threads: int = 12, max_context: int = 2000, n_gpu_layers: int = -1) -> _PooledModel:
+    return _pool.get(gguf_path,n_ctx=max_context,threads=threads,n_gpu_layers=n_gpu_layers)
+
+
+def _prefix_state_identity(model: _PooledModel, prefix: str) -> str:
+    # States are only valid for the exact model file, context size and llama.cpp build that produced them.
+    identity = (model.key, os.path.getmtime(model.key[0]), llama_cpp.__version__, prefix)
+    return hashlib.sha256(repr(identity).encode("utf-8")).hexdigest()
+
+
+def _save_prefix_state(state: LlamaState, path: str, identity: str):
+    # Plain arrays only, so loading a state file never runs code from it.
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path,"wb") as f:
+        np.savez(
+            f,
+            identity=np.array(identity),
+            input_ids=state.input_ids,
+            scores=state.scores,
+            n_tokens=np.array(state.n_tokens),
+            llama_state=np.frombuffer(state.llama_state,dtype=np.uint8),
+            llama_state_size=np.array(state.llama_state_size),
+            seed=np.array(state.seed)
+        )
+    os.replace(tmp_path,path)
+
+
+def _load_prefix_state(path: str, identity: str) -> LlamaState:
+    # None when the file is unreadable or was written for another model, context or prefix.
+    try:
+        with np.load(path,allow_pickle=False) as data:
+            if str(data["identity"]) != identity:
+                return None
+            llama_state = data["llama_state"].tobytes()
+            llama_state_size = int(data["llama_state_size"])
+            if len(llama_state) != llama_state_size:
+                return None
+            return LlamaState(
+                input_ids=data["input_ids"],
+                scores=data["scores"],
+                n_tokens=int(data["n_tokens"]),
+                llama_state=llama_state,
+                llama_state_size=llama_state_size,
+                seed=int(data["seed"])
+            )
+    except Exception:
+        return None
+
+
+def _prefix_state(model: _PooledModel, prefix: str, cache_dir: str = None) -> LlamaState:
+    state = model.prefix_states.get(prefix)
+    if state is not None:
+        return state
+
+    identity = path = None
+    if cache_dir:
+        identity = _prefix_state_identity(model,prefix)
+        path = os.path.join(cache_dir,f"{identity}.kvstate")
+        if os.path.exists(path):
+            state = _load_prefix_state(path,identity)
+
+    if state is None:
+        llm = model.llm
+        llm.reset()
+        llm.eval(llm.tokenize(prefix.encode("utf-8"),special=True))
+        state = llm.save_state()
+        if path:
+            os.makedirs(cache_dir,exist_ok=True)
+            _save_prefix_state(state,path,identity)
+
+    model.prefix_states[prefix] = state
+    return state
+
+
+def _reuse_prefix(model: _PooledModel, prompt: str, prefix: str, cache_dir: str = None):
+    # Llama.generate only evaluates the tokens after the longest common prefix of the prompt and
+    # the tokens already in the context, so restoring the prefix state skips re-evaluating it.
+    llm = model.llm
+    state = _prefix_state(model,prefix,cache_dir)
+    tokens = llm.tokenize(prompt.encode("utf-8"),special=True)
+    resident = Llama.longest_token_prefix(llm.input_ids[:llm.n_tokens].tolist(),tokens)
+    if resident < state.n_tokens:
+        llm.load_state(state)
+    _pool.stats.prefix_reuses += 1
+
+
+@functools.lru_cache(maxsize=64)
+def _compile_grammar(grammar: str) -> llama_cpp.LlamaGrammar:
+    return llama_cpp.LlamaGrammar.from_string(grammar,verbose=False)
+
+
+def _reset_timings(llm: Llama):
+    if tracing.enabled():
+        try:
+            llama_cpp.llama_perf_context_reset(llm.ctx)
+        except Exception:
+            pass
+
+def _record_timings(llm: Llama, span):
+    # Prompt evaluation vs token generation of this call, where the llama.cpp build exposes it.
+    if not tracing.enabled():
+        return
+    try:
+        timings = llama_cpp.llama_perf_context(llm.ctx)
+    except Exception:
+        return
+    span.set(
+        prompt_eval_seconds=timings.t_p_eval_ms / 1000,
+        prompt_tokens=timings.n_p_eval,
+        eval_seconds=timings.t_eval_ms / 1000,
+        completion_tokens=timings.n_eval
     )
 
-    output = llm(
-        prompt, # Prompt
-        max_tokens=None, # Generate up to 32 tokens, set to None to generate up to the end of the context window
-        stop=stop,# Stop generating just before the model would generate a new question
-        temperature=temp
-    ) # Generate a completion, can also call create_completion
+
+def invoke(prompt: str, gguf_path: str = None, threads: int =12 ,temp: float = 0.8, max_context: int = 2000,stop: list[str] = ["[/INST]","<|im_end|>"], n_gpu_layers: int = -1, prefix: str = None, prefix_cache_dir: str = None, cancel_event: threading.Event = None, grammar: str = None, scanner: BlockScanner = None, max_tokens: int = None) -> str:
+
+    with tracing.span("load","llama.cpp",gguf_path=gguf_path) as span:
+        misses = _pool.stats.misses
+        model = get_model(gguf_path,threads=threads,max_context=max_context,n_gpu_layers=n_gpu_layers)
+        span.set(cached=_pool.stats.misses == misses)
+
+    stopping_criteria = None
+    if cancel_event is not None:
+        stopping_criteria = llama_cpp.StoppingCriteriaList([lambda input_ids, logits: cancel_event.is_set()])
+
+    with model.lock:
+        if cancel_event is not None and cancel_event.is_set():
+            raise asyncio.CancelledError()
+        if prefix and prompt.startswith(prefix):
+            with tracing.span("prefix_restore","llama.cpp"):
+                _reuse_prefix(model,prompt,prefix,prefix_cache_dir)
+        with tracing.span("generate","llama.cpp",stream=scanner is not None) as span:
+            _reset_timings(model.llm)
+            output = model.llm(
+                prompt, # Prompt
+                max_tokens=max_tokens, # None generates up to the end of the context window
+                stop=stop,# Stop generating just before the model would generate a new question
+                temperature=temp,
+                stopping_criteria=stopping_criteria,
+                grammar=_compile_grammar(grammar) if grammar else None,
+                stream=scanner is not None
+            ) # Generate a completion, can also call create_completion
+            if scanner is not None:
+                # Stop pulling tokens as soon as the code block is closed instead of running to the end of the context.
+                for chunk in output:
+                    if not scanner.chunks and tracing.enabled():
+                        # Streamed, the first token marks the end of prompt evaluation.
+                        span.set(first_token_seconds=time.perf_counter() - span.start)
+                    if scanner.feed(chunk["choices"][0]["text"]):
+                        scanner.early_stop = True
+                        break
+                output.close()
+                _record_timings(model.llm,span)
+                if metrics.enabled():
+                    # llama.cpp streams one token per chunk.
+                    metrics.tokens("local",len(model.llm.tokenize(prompt.encode("utf-8"),special=True)),scanner.chunks)
+                return scanner.text
+            _record_timings(model.llm,span)
+    usage = output.get("usage") or {}
+    metrics.tokens("local",usage.get("prompt_tokens"),usage.get("completion_tokens"))
     response = output["choices"][0]["text"]
     return response
+
+
+_executor = None
+_executor_workers = 2
+_executor_lock = threading.Lock()
+
+
+def configure_executor(max_workers: int):
+    global _executor, _executor_workers
+    with _executor_lock:
+        _executor_workers = max_workers
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+            _executor = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=_executor_workers,thread_name_prefix="autologic-llama")
+        return _executor
+
+
+async def async_invoke(prompt: str, **kwargs) -> str:
+    # Generation runs on a bounded executor; cancelling the awaiting task stops the generation at the next token.
+    cancel_event = threading.Event()
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(_get_executor(),functools.partial(invoke,prompt,cancel_event=cancel_event,**kwargs))
+    except asyncio.CancelledError:
+        cancel_event.set()
+        raise
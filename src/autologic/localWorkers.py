@@ -0,0 +1,305 @@
+from .utils import BlockScanner
+from . import metrics
+from . import tracing
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+import multiprocessing
+import itertools
+import threading
+import asyncio
+import atexit
+import glob
+import time
+import os
+
+
+def _parse_cpulist(text: str) -> list:
+    cpus = []
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        cpus.extend(range(int(first),int(last or first) + 1))
+    return cpus
+
+
+def _numa_nodes(available: list) -> list:
+    nodes = []
+    for path in sorted(glob.glob("/sys/devices/system/node/node[0-9]*/cpulist")):
+        with open(path) as f:
+            cpus = [cpu for cpu in _parse_cpulist(f.read()) if cpu in available]
+        if cpus:
+            nodes.append(cpus)
+    return nodes or [available]
+
+
+def core_sets(workers: int) -> list:
+    """Split the CPUs this process may run on into one core set per worker.
+
+    Workers are spread round robin over NUMA nodes and each node's CPUs are divided evenly
+    between its workers, so no worker straddles two nodes.
+    """
+    if hasattr(os,"sched_getaffinity"):
+        available = sorted(os.sched_getaffinity(0))
+    else:
+        available = list(range(os.cpu_count() or 1))
+    nodes = _numa_nodes(available)
+    assignments = [[] for _ in nodes]
+    for worker in range(workers):
+        assignments[worker % len(nodes)].append(worker)
+    sets = [None] * workers
+    for cpus, node_workers in zip(nodes,assignments):
+        if not node_workers:
+            continue
+        size = max(1,len(cpus) // len(node_workers))
+        for position, worker in enumerate(node_workers):
+            # With more workers than cores, workers share single cores.
+            sets[worker] = cpus[position * size:(position + 1) * size] or [cpus[position % len(cpus)]]
+    return sets
+
+
+def _scanner_state(scanner: BlockScanner) -> dict:
+    if scanner is None:
+        return None
+    return {"text": scanner.text, "chunks": scanner.chunks, "complete": scanner.complete, "early_stop": scanner.early_stop, "elapsed": scanner.elapsed}
+
+
+def _token_totals(registry) -> tuple:
+    return (registry.counter(metrics.PROMPT_TOKENS,backend="local"),registry.counter(metrics.COMPLETION_TOKENS,backend="local"))
+
+
+def _worker_main(conn, cores: list):
+    if cores and hasattr(os,"sched_setaffinity"):
+        os.sched_setaffinity(0,cores)
+    from . import localLLM
+    # A private registry lets the worker report the token counts of each call back to the parent.
+    registry = metrics.enable()
+    while True:
+        try:
+            job_id, kind, kwargs = conn.recv()
+        except EOFError:
+            break
+        if kind == "stop":
+            break
+        start = time.perf_counter()
+        if tracing.enabled():
+            tracing.tracer().spans.clear()
+        tokens_before = _token_totals(registry)
+        try:
+            if kind == "preload":
+                localLLM.get_model(**kwargs)
+                result = None
+            else:
+                stream = kwargs.pop("stream",None)
+                # When the parent traces, record this call's load/generate spans to send back with the result.
+                if kwargs.pop("trace",False) and not tracing.enabled():
+                    tracing.enable()
+                scanner = BlockScanner(**stream) if stream is not None else None
+                text = localLLM.invoke(scanner=scanner,**kwargs)
+                result = {"text": text, "scanner": _scanner_state(scanner)}
+                if tracing.enabled():
+                    result["spans"] = tracing.detach(list(tracing.tracer().spans),start)
+            ok = True
+        except Exception as e:
+            result = f"{type(e).__name__}: {e}"
+            ok = False
+        prompt_tokens, completion_tokens = (after - before for after, before in zip(_token_totals(registry),tokens_before))
+        conn.send((job_id,ok,result,time.perf_counter() - start,prompt_tokens,completion_tokens))
+    conn.close()
+
+
+@dataclass
+class WorkerStats:
+    index: int
+    cores: list
+    jobs: int = 0
+    failures: int = 0
+    busy_seconds: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    started: float = field(default_factory=time.perf_counter)
+
+    @property
+    def utilization(self) -> float:
+        wall = time.perf_counter() - self.started
+        return min(1.0,self.busy_seconds / wall) if wall > 0 else 0.0
+
+    @property
+    def tokens_per_second(self) -> float:
+        return self.completion_tokens / self.busy_seconds if self.busy_seconds else 0.0
+
+
+class _Worker:
+
+    def __init__(self, index: int, cores: list, context):
+        self.index = index
+        self.cores = cores
+        self.stats = WorkerStats(index=index,cores=cores)
+        self.pending = {}
+        self.alive = True
+        self._send_lock = threading.Lock()
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main,args=(child_conn,cores),name=f"autologic-local-{index}",daemon=True)
+        self.process.start()
+        child_conn.close()
+        self._receiver = threading.Thread(target=self._receive,name=f"autologic-local-{index}-results",daemon=True)
+        self._receiver.start()
+
+    def submit(self, job_id: int, kind: str, kwargs: dict, future: Future):
+        with self._send_lock:
+            if not self.alive:
+                raise Exception(f"Local worker {self.index} has exited")
+            self.pending[job_id] = future
+            self.conn.send((job_id,kind,kwargs))
+
+    def _receive(self):
+        while True:
+            try:
+                job_id, ok, result, seconds, prompt_tokens, completion_tokens = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            self.stats.jobs += 1
+            self.stats.busy_seconds += seconds
+            self.stats.prompt_tokens += prompt_tokens
+            self.stats.completion_tokens += completion_tokens
+            metrics.tokens("local",prompt_tokens,completion_tokens)
+            future = self.pending.pop(job_id)
+            if ok and isinstance(result,dict) and "spans" in result:
+                # Worker clocks are not comparable, so its spans are placed to end when the result arrives.
+                result["start"] = time.perf_counter() - seconds
+            if ok:
+                future.set_result(result)
+            else:
+                self.stats.failures += 1
+                future.set_exception(Exception(result))
+        with self._send_lock:
+            self.alive = False
+            pending, self.pending = self.pending, {}
+        for future in pending.values():
+            future.set_exception(Exception(f"Local worker {self.index} exited"))
+
+    def stop(self):
+        with self._send_lock:
+            if self.alive:
+                try:
+                    self.conn.send((0,"stop",None))
+                except (OSError, ValueError):
+                    pass
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+
+
+class LocalWorkerPool:
+    """Runs local model calls on `workers` processes, each with its own llama.cpp instance pinned to a core set.
+
+    The GGUF file is memory-mapped by every worker, so the weights are shared through the page cache.
+    Calls go to the live worker with the fewest outstanding jobs, and each worker runs llama.cpp
+    with one thread per core in its set, in place of LLMConfig.threads.
+    """
+
+    def __init__(self, workers: int, cores: list = None):
+        self.workers = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        context = multiprocessing.get_context("spawn")
+        for index, core_set in enumerate(cores or core_sets(workers)):
+            self.workers.append(_Worker(index,core_set,context))
+
+    def _least_loaded(self) -> _Worker:
+        live = [worker for worker in self.workers if worker.alive]
+        if not live:
+            raise Exception("All local workers have exited")
+        return min(live,key=lambda worker: (len(worker.pending),worker.stats.busy_seconds))
+
+    def submit(self, kind: str, worker: _Worker = None, **kwargs) -> Future:
+        future = Future()
+        with self._lock:
+            worker = worker or self._least_loaded()
+            worker.submit(next(self._ids),kind,kwargs,future)
+        return future
+
+    def preload(self, gguf_path: str, max_context: int = 2000, n_gpu_layers: int = -1):
+        futures = [
+            self.submit("preload",worker=worker,gguf_path=gguf_path,threads=len(worker.cores),max_context=max_context,n_gpu_layers=n_gpu_layers)
+            for worker in self.workers if worker.alive
+        ]
+        for future in futures:
+            future.result()
+
+    def _submit_invoke(self, prompt: str, scanner: BlockScanner = None, **kwargs) -> Future:
+        kwargs.pop("cancel_event",None)
+        with self._lock:
+            worker = self._least_loaded()
+            kwargs["threads"] = len(worker.cores)
+            if tracing.enabled():
+                kwargs["trace"] = True
+            if scanner is not None:
+                kwargs["stream"] = {"json_block": scanner.json_block, "stop_at_block": scanner.stop_at_block}
+            future = Future()
+            worker.submit(next(self._ids),"invoke",dict(prompt=prompt,**kwargs),future)
+        return future
+
+    def _result(self, result: dict, scanner: BlockScanner) -> str:
+        if "spans" in result:
+            tracing.adopt(result["spans"],result["start"])
+        if scanner is not None:
+            for name, value in result["scanner"].items():
+                setattr(scanner,name,value)
+            # Chunks stay in the worker process, so listeners get the response in one piece.
+            if scanner.on_chunk is not None:
+                scanner.on_chunk(result["text"])
+        return result["text"]
+
+    def invoke(self, prompt: str, scanner: BlockScanner = None, **kwargs) -> str:
+        return self._result(self._submit_invoke(prompt,scanner=scanner,**kwargs).result(),scanner)
+
+    async def async_invoke(self, prompt: str, scanner: BlockScanner = None, **kwargs) -> str:
+        # A cancelled caller stops waiting; the worker finishes the call and the result is dropped.
+        result = await asyncio.wrap_future(self._submit_invoke(prompt,scanner=scanner,**kwargs))
+        return self._result(result,scanner)
+
+    def utilization(self) -> list:
+        return [worker.stats for worker in self.workers]
+
+    def report(self) -> str:
+        lines = []
+        for stats in self.utilization():
+            cores = f"{stats.cores[0]}-{stats.cores[-1]}" if len(stats.cores) > 1 else str(stats.cores[0])
+            lines.append(
+                f"worker {stats.index} (cores {cores}): {stats.jobs} calls, "
+                f"{stats.utilization:.0%} busy, {stats.tokens_per_second:.1f} tokens/s"
+            )
+        total = sum(stats.completion_tokens for stats in self.utilization())
+        busiest = max((stats.busy_seconds for stats in self.utilization()),default=0.0)
+        lines.append(f"aggregate: {total} completion tokens, {total / busiest if busiest else 0.0:.1f} tokens/s")
+        return "\n".join(lines)
+
+    def close(self):
+        for worker in self.workers:
+            worker.stop()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(workers: int) -> LocalWorkerPool:
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = _pools[workers] = LocalWorkerPool(workers)
+        return pool
+
+
+def pools() -> list:
+    return list(_pools.values())
+
+
+@atexit.register
+def shutdown():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
@@ -0,0 +1,302 @@
+from dataclasses import dataclass, field
+import contextlib
+import threading
+import atexit
+import bisect
+import math
+import json
+import time
+import os
+
+# Metrics are disabled until `enable` is called; every recording function then returns after a
+# single None check, so instrumented code paths pay next to nothing by default.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+PHASE_SECONDS = "autologic_phase_seconds"
+BACKEND_SECONDS = "autologic_backend_seconds"
+RETRIES = "autologic_retries_total"
+EXTRACTION_FAILURES = "autologic_extraction_failures_total"
+BACKEND_ERRORS = "autologic_backend_errors_total"
+PROMPT_TOKENS = "autologic_prompt_tokens_total"
+COMPLETION_TOKENS = "autologic_completion_tokens_total"
+STRUCTURE_REUSE = "autologic_structure_reuse_total"
+FUSED_FALLBACKS = "autologic_fused_fallbacks_total"
+RESPONSE_CACHE = "autologic_response_cache_total"
+CASCADE_ATTEMPTS = "autologic_cascade_attempts_total"
+CASCADE_SECONDS = "autologic_cascade_seconds"
+HEDGES = "autologic_hedges_total"
+SCHEDULER_WAIT_SECONDS = "autologic_scheduler_wait_seconds"
+RATE_LIMITED = "autologic_rate_limited_total"
+LOCAL_SELECTIONS = "autologic_local_selections_total"
+
+
+@dataclass
+class Histogram:
+    buckets: tuple = DEFAULT_BUCKETS
+    counts: list = field(default=None)
+    sum: float = 0.0
+    count: int = 0
+
+    def __post_init__(self):
+        if self.counts is None:
+            # One slot per upper bound plus the +Inf bucket.
+            self.counts = [0] * (len(self.buckets) + 1)
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets,value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        # Linear interpolation inside the bucket holding the q-th observation, as Prometheus does.
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for position, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[position - 1] if position else 0.0
+                if position == len(self.buckets):
+                    return lower
+                return lower + (self.buckets[position] - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+class Registry:
+    """In-process store of counters and histograms, keyed by metric name and label set."""
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float, labels: dict):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key,0) + value
+
+    def observe(self, name: str, value: float, labels: dict):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def counter(self, name: str, **labels) -> float:
+        return self._counters.get((name, _label_key(labels)),0)
+
+    def histogram(self, name: str, **labels) -> Histogram:
+        return self._histograms.get((name, _label_key(labels)))
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            histograms = [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": histogram.count,
+                    "sum": histogram.sum,
+                    "p50": histogram.quantile(0.5),
+                    "p95": histogram.quantile(0.95),
+                    "p99": histogram.quantile(0.99),
+                }
+                for (name, labels), histogram in sorted(self._histograms.items())
+            ]
+        return {"counters": counters, "histograms": histograms}
+
+    def prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} histogram")
+                    typed.add(name)
+                cumulative = 0
+                for bound, bucket_count in zip((*histogram.buckets, math.inf), histogram.counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == math.inf else _format_value(bound)
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(histogram.sum)}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    escaped = (f'{key}="{_escape(str(value))}"' for key, value in labels)
+    return "{" + ",".join(escaped) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\","\\\\").replace('"','\\"').replace("\n","\\n")
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value,float) else str(value)
+
+
+class Sink:
+    """Receives every recorded sample (`record`) and the aggregated registry on `flush`."""
+
+    def record(self, kind: str, name: str, value: float, labels: dict):
+        pass
+
+    def flush(self, registry: Registry):
+        pass
+
+    def close(self):
+        pass
+
+
+class PrometheusFileSink(Sink):
+    """Writes the registry in Prometheus text exposition format, e.g. for the node_exporter textfile collector."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def flush(self, registry: Registry):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory,exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path,"w") as f:
+            f.write(registry.prometheus())
+        os.replace(tmp_path,self.path)
+
+
+class JSONLinesSink(Sink):
+    """Appends one JSON object per recorded sample."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path,"a",buffering=1)
+
+    def record(self, kind: str, name: str, value: float, labels: dict):
+        line = json.dumps({"time": time.time(), "kind": kind, "name": name, "value": value, "labels": labels})
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def flush(self, registry: Registry):
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+_registry = None
+_sinks = ()
+_atexit_registered = False
+
+
+def enable(sinks: list = (), buckets: tuple = DEFAULT_BUCKETS) -> Registry:
+    global _registry, _sinks, _atexit_registered
+    _registry = Registry(buckets)
+    _sinks = tuple(sinks)
+    if not _atexit_registered:
+        atexit.register(flush)
+        _atexit_registered = True
+    return _registry
+
+
+def disable():
+    global _registry, _sinks
+    flush()
+    for sink in _sinks:
+        sink.close()
+    _registry = None
+    _sinks = ()
+
+
+def registry() -> Registry:
+    return _registry
+
+
+def enabled() -> bool:
+    return _registry is not None
+
+
+def inc(name: str, value: float = 1, **labels):
+    if _registry is None:
+        return
+    _registry.inc(name,value,labels)
+    for sink in _sinks:
+        sink.record("counter",name,value,labels)
+
+
+def observe(name: str, value: float, **labels):
+    if _registry is None:
+        return
+    _registry.observe(name,value,labels)
+    for sink in _sinks:
+        sink.record("histogram",name,value,labels)
+
+
+def tokens(backend: str, prompt_tokens: int = None, completion_tokens: int = None):
+    if _registry is None:
+        return
+    if prompt_tokens:
+        inc(PROMPT_TOKENS,prompt_tokens,backend=backend)
+    if completion_tokens:
+        inc(COMPLETION_TOKENS,completion_tokens,backend=backend)
+
+
+class _Timer:
+    __slots__ = ("name", "labels", "start")
+
+    def __init__(self, name: str, labels: dict):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.name,time.perf_counter() - self.start,**self.labels)
+        return False
+
+
+_NULL_TIMER = contextlib.nullcontext()
+
+
+def timed(name: str, **labels):
+    if _registry is None:
+        return _NULL_TIMER
+    return _Timer(name,labels)
+
+
+def flush():
+    if _registry is None:
+        return
+    for sink in _sinks:
+        sink.flush(_registry)
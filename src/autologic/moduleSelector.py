@@ -0,0 +1,164 @@
+from . import config
+from .structureIndex import HashingEmbedder
+from dataclasses import dataclass
+import numpy as np
+import threading
+import hashlib
+import json
+import os
+
+
+@dataclass
+class Selection:
+    reasoning_modules: list
+    confidence: float
+    source: str  # "classifier" or "similarity"
+
+
+def _modules_version() -> str:
+    return hashlib.sha256("\n".join(config.REASONING_MODULES_LIST).encode("utf-8")).hexdigest()[:16]
+
+
+class ModuleSelector:
+    """Picks reasoning modules for a task locally, in place of the SELECT LLM call.
+
+    Each module is scored against the task: by a ridge classifier trained on logged LLM selections
+    once `min_examples` have been recorded, otherwise by cosine similarity between the task and
+    module embeddings. The classifier only scores tasks whose embedding is within `familiarity`
+    (cosine) of a logged task; it knows nothing about others. Up to `max_modules` modules scoring at least `threshold` are picked; when
+    none does, `select` returns None and the caller falls back to the LLM.
+
+    Module embeddings are computed once, and kept in `cache_path` when given. LLM selections passed
+    to `record` are appended to `log_path` when given, and the classifier is refit every
+    `retrain_every` new selections.
+    """
+
+    def __init__(self, embedder=None, threshold: float = 0.5, max_modules: int = 3, cache_path: str = None, log_path: str = None, min_examples: int = 30, retrain_every: int = 20, l2: float = 1.0, familiarity: float = 0.3):
+        if not 1 <= max_modules <= 5:
+            raise ValueError("max_modules must be between 1 and 5")
+        self.embedder = embedder or HashingEmbedder()
+        self.threshold = threshold
+        self.max_modules = max_modules
+        self.cache_path = cache_path
+        self.log_path = log_path
+        self.min_examples = min_examples
+        self.retrain_every = retrain_every
+        self.l2 = l2
+        self.familiarity = familiarity
+        self._lock = threading.Lock()
+        self._tasks = []
+        self._labels = []
+        self._weights = None
+        self._bias = None
+        self._features = None
+        self._trained_on = 0
+        self.module_vectors = self._module_vectors()
+        if log_path and os.path.exists(log_path):
+            with open(log_path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self._tasks.append(entry["task"])
+                    self._labels.append(entry["reasoning_modules"])
+            if len(self._tasks) >= min_examples:
+                self.train()
+
+    def _module_vectors(self) -> np.ndarray:
+        meta = {"embedder": type(self.embedder).__name__, "dim": self.embedder.dim, "modules": _modules_version()}
+        if self.cache_path:
+            meta_path = self.cache_path + ".json"
+            if os.path.exists(self.cache_path) and os.path.exists(meta_path):
+                with open(meta_path) as f:
+                    if json.load(f) == meta:
+                        return np.load(self.cache_path)
+        vectors = self.embedder.embed_batch(config.REASONING_MODULES_LIST)
+        if self.cache_path:
+            # np.save appends .npy unless it is already there; write through a handle to keep the given name.
+            with open(self.cache_path,"wb") as f:
+                np.save(f,vectors)
+            with open(self.cache_path + ".json","w") as f:
+                json.dump(meta,f)
+        return vectors
+
+    @property
+    def trained(self) -> bool:
+        return self._weights is not None
+
+    def scores(self, tasks: list) -> tuple:
+        """(scores, sources): one row of module scores per task and where each row came from."""
+        queries = self.embedder.embed_batch(tasks)
+        scores = queries @ self.module_vectors.T
+        sources = ["similarity"] * len(tasks)
+        with self._lock:
+            weights, bias, features = self._weights, self._bias, self._features
+        if weights is not None:
+            familiar = (queries @ features.T).max(axis=1) >= self.familiarity
+            scores[familiar] = queries[familiar] @ weights + bias
+            sources = ["classifier" if known else "similarity" for known in familiar]
+        return (scores,sources)
+
+    def choose_batch(self, tasks: list) -> list:
+        scores, sources = self.scores(tasks)
+        selections = []
+        for row, source in zip(scores,sources):
+            top = np.argsort(-row,kind="stable")[:self.max_modules]
+            picked = [int(module_id) for module_id in top if row[module_id] >= self.threshold]
+            selections.append(Selection(reasoning_modules=picked,confidence=float(row[top[0]]),source=source))
+        return selections
+
+    def choose(self, task: str) -> Selection:
+        return self.choose_batch([task])[0]
+
+    def select(self, task: str) -> dict:
+        """The selection in the shape `reasoningEngine.select` returns, or None when not confident."""
+        selection = self.choose(task)
+        if not selection.reasoning_modules:
+            return None
+        return {"reasoning_modules": selection.reasoning_modules}
+
+    def record(self, task: str, reasoning_modules: list):
+        """Log an LLM selection for `task` as a training example."""
+        try:
+            labels = sorted({int(module_id) for module_id in reasoning_modules})
+        except (TypeError, ValueError):
+            return
+        if not labels or not all(0 <= module_id < len(config.REASONING_MODULES_LIST) for module_id in labels):
+            return
+        with self._lock:
+            self._tasks.append(task)
+            self._labels.append(labels)
+            if self.log_path:
+                with open(self.log_path,"a") as f:
+                    f.write(json.dumps({"task": task, "reasoning_modules": labels}) + "\n")
+            due = len(self._tasks) >= self.min_examples and len(self._tasks) - self._trained_on >= self.retrain_every
+        if due:
+            self.train()
+
+    def train(self):
+        """Fit a ridge classifier from task embeddings to the logged module picks (multi-hot)."""
+        with self._lock:
+            tasks = list(self._tasks)
+            labels = list(self._labels)
+        if not tasks:
+            return
+        embedded = self.embedder.embed_batch(tasks)
+        features = embedded.astype(np.float64)
+        targets = np.zeros((len(tasks), len(config.REASONING_MODULES_LIST)))
+        for row, picked in enumerate(labels):
+            targets[row, picked] = 1.0
+        feature_mean = features.mean(axis=0)
+        target_mean = targets.mean(axis=0)
+        centered = features - feature_mean
+        # Closed form: a dim x dim solve, cheap enough to refit on every retrain.
+        weights = np.linalg.solve(centered.T @ centered + self.l2 * np.eye(features.shape[1]),centered.T @ (targets - target_mean))
+        bias = target_mean - feature_mean @ weights
+        with self._lock:
+            self._weights = weights.astype(np.float32)
+            self._bias = bias.astype(np.float32)
+            self._features = embedded
+            self._trained_on = len(tasks)
+
+    def __len__(self):
+        return len(self._tasks)
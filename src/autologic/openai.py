@@ -1,21 +1,105 @@
 import openai
 from dotenv import load_dotenv
+from .utils import ClientStats, BlockScanner
+from . import metrics
+import threading
+import asyncio
+import weakref
 import os
 
+try:
+    # openai>=3 is built on httpx2, earlier releases on httpx.
+    from httpx2 import Limits
+except ImportError:
+    from httpx import Limits
 
+DEFAULT_MODEL = "gpt-3.5-turbo-0125"
 
-def invoke(prompt: str, api_key: str = None, temp: float = 0.8, max_context: int = 2000, model_name: str = None):
-    
-    if not api_key:
+_pool_size = 20
+_timeout = 600.0
+_max_retries = 2
+_clients = {}
+_async_clients = weakref.WeakKeyDictionary()
+_env_api_key = None
+_lock = threading.Lock()
+stats = ClientStats()
+
+
+def configure(pool_size: int = None, timeout: float = None, max_retries: int = None):
+    # Changing connection settings drops the registry so new clients pick them up.
+    global _pool_size, _timeout, _max_retries
+    with _lock:
+        if pool_size is not None:
+            _pool_size = pool_size
+        if timeout is not None:
+            _timeout = timeout
+        if max_retries is not None:
+            _max_retries = max_retries
+        _clients.clear()
+        _async_clients.clear()
+
+
+def _resolve_api_key(api_key: str = None) -> str:
+    global _env_api_key
+    if api_key:
+        return api_key
+    if _env_api_key is None:
         load_dotenv()
-        api_key = os.environ.get("AUTOLOGIC_OPENAI_API_KEY")
+        _env_api_key = os.environ.get("AUTOLOGIC_OPENAI_API_KEY")
+    return _env_api_key
+
+
+def _limits() -> Limits:
+    return Limits(max_connections=_pool_size,max_keepalive_connections=_pool_size)
+
+
+def get_client(api_key: str = None, base_url: str = None, max_retries: int = None) -> openai.OpenAI:
+    # Clients are shared per (api_key, base_url); the model is a request parameter, so all models reuse one connection pool.
+    # `max_retries` overrides the configured SDK retries, e.g. 0 when a scheduler already retries rate-limited calls.
+    key = (_resolve_api_key(api_key), base_url, max_retries)
+    with _lock:
+        client = _clients.get(key)
+        if client is not None:
+            stats.reused += 1
+            return client
+        stats.created += 1
+        client = openai.OpenAI(
+            api_key=key[0],
+            base_url=base_url,
+            max_retries=_max_retries if max_retries is None else max_retries,
+            http_client=openai.DefaultHttpxClient(limits=_limits(),timeout=openai.Timeout(_timeout))
+        )
+        _clients[key] = client
+        return client
+
+
+def get_async_client(api_key: str = None, base_url: str = None, max_retries: int = None) -> openai.AsyncOpenAI:
+    # Async connection pools are bound to the event loop that opened them, so keep one registry per loop.
+    key = (_resolve_api_key(api_key), base_url, max_retries)
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.setdefault(loop,{})
+        client = clients.get(key)
+        if client is not None:
+            stats.reused += 1
+            return client
+        stats.created += 1
+        client = openai.AsyncOpenAI(
+            api_key=key[0],
+            base_url=base_url,
+            max_retries=_max_retries if max_retries is None else max_retries,
+            http_client=openai.DefaultAsyncHttpxClient(limits=_limits(),timeout=openai.Timeout(_timeout))
+        )
+        clients[key] = client
+        return client
 
+
+def _completion_args(prompt: str, temp: float, max_context: int, model_name: str, json_mode: bool = False) -> dict:
     # Set default model name if caller did not specify
     if not model_name:
-        model_name = "gpt-3.5-turbo-0125"
+        model_name = DEFAULT_MODEL
 
-    client = openai.OpenAI(api_key=api_key) 
-    response = client.chat.completions.create(
+    args = dict(
         model=model_name,
         messages=[
             {
@@ -33,4 +117,54 @@ def invoke(prompt: str, api_key: str = None, temp: float = 0.8, max_context: int
         frequency_penalty=0,
         presence_penalty=0,
     )
-    return response.choices[0].message.content
\ No newline at end of file
+    if json_mode:
+        # The model then returns a bare JSON object instead of a fenced block.
+        args["response_format"] = {"type": "json_object"}
+    return args
+
+
+def _record_usage(response):
+    if response.usage is not None:
+        metrics.tokens("openai",response.usage.prompt_tokens,response.usage.completion_tokens)
+
+
+def invoke(prompt: str, api_key: str = None, temp: float = 0.8, max_context: int = 2000, model_name: str = None, base_url: str = None, json_mode: bool = False, scanner: BlockScanner = None, max_retries: int = None):
+    
+    client = get_client(api_key,base_url,max_retries)
+    if scanner is None:
+        response = client.chat.completions.create(**_completion_args(prompt,temp,max_context,model_name,json_mode))
+        _record_usage(response)
+        return response.choices[0].message.content
+
+    stream = client.chat.completions.create(stream=True,**_completion_args(prompt,temp,max_context,model_name,json_mode))
+    try:
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content and scanner.feed(chunk.choices[0].delta.content):
+                scanner.early_stop = True
+                break
+    finally:
+        # Closing the response aborts the generation server side.
+        stream.close()
+    # Streamed responses carry no usage; each content chunk is roughly one token.
+    metrics.tokens("openai",None,scanner.chunks)
+    return scanner.text
+
+
+async def async_invoke(prompt: str, api_key: str = None, temp: float = 0.8, max_context: int = 2000, model_name: str = None, base_url: str = None, json_mode: bool = False, scanner: BlockScanner = None, max_retries: int = None):
+    
+    client = get_async_client(api_key,base_url,max_retries)
+    if scanner is None:
+        response = await client.chat.completions.create(**_completion_args(prompt,temp,max_context,model_name,json_mode))
+        _record_usage(response)
+        return response.choices[0].message.content
+
+    stream = await client.chat.completions.create(stream=True,**_completion_args(prompt,temp,max_context,model_name,json_mode))
+    try:
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content and scanner.feed(chunk.choices[0].delta.content):
+                scanner.early_stop = True
+                break
+    finally:
+        await stream.close()
+    metrics.tokens("openai",None,scanner.chunks)
+    return scanner.text
@@ -0,0 +1,50 @@
+from . import config
+from . import jsonRepair
+from . import utils
+import json
+
+# Templates whose {modules} is the fixed reasoning module list rather than modules chosen for the task.
+MODULE_LIST_TEMPLATES = {
+    config.SELECT_PHASE_PROMPT_TEMPLATE,
+    config.FUSED_DISCOVERY_PROMPT_TEMPLATE,
+    config.COMPACT_SELECT_PHASE_PROMPT_TEMPLATE,
+    config.COMPACT_FUSED_DISCOVERY_PROMPT_TEMPLATE,
+}
+
+
+def template(full_template: str, compact: bool = False) -> str:
+    return config.COMPACT_TEMPLATES[full_template] if compact else full_template
+
+
+def serialize(structure, compact: bool = False) -> str:
+    # Minified JSON carries the same structure in far fewer tokens than the indented form.
+    if compact:
+        return json.dumps(structure,separators=(",",":"),ensure_ascii=False)
+    return json.dumps(structure,indent=2)
+
+
+def select(task: str, compact: bool = False, abbreviated: bool = False) -> str:
+    return template(config.SELECT_PHASE_PROMPT_TEMPLATE,compact).format(task=task,modules=utils.rm_list(abbreviated))
+
+
+def adapt(task: str, reasoning_modules: dict, compact: bool = False) -> str:
+    module_list = ""
+    for module in reasoning_modules["reasoning_modules"]:
+        module_list += f"- {module}\n"
+    return template(config.ADAPT_PHASE_PROMPT_TEMPLATE,compact).format(task=task,modules=module_list)
+
+
+def implement(task: str, adapted_modules: str, compact: bool = False) -> str:
+    return template(config.IMPLEMENT_PHASE_PROMPT_TEMPLATE,compact).format(task=task,modules=adapted_modules)
+
+
+def fused(task: str, compact: bool = False, abbreviated: bool = False) -> str:
+    return template(config.FUSED_DISCOVERY_PROMPT_TEMPLATE,compact).format(task=task,modules=utils.rm_list(abbreviated))
+
+
+def solve(task: str, reasoning_structure: dict, compact: bool = False) -> str:
+    return template(config.SOLVE_PROMPT_TEMPLATE,compact).format(task=task,reasoning_structure=serialize(reasoning_structure,compact))
+
+
+def solve_continue(task: str, partial: dict, missing: list, compact: bool = False) -> str:
+    return template(config.SOLVE_CONTINUE_PROMPT_TEMPLATE,compact).format(task=task,reasoning_structure=serialize(partial,compact),fields=serialize(jsonRepair.subset(partial,missing),compact))
@@ -2,15 +2,38 @@ from . import config
 from enum import Enum
 from dataclasses import dataclass, field
 from . import utils
-from . import gemini 
 from dotenv import load_dotenv
 import os
-from . import localLLM
 from .utils import log_print
 import json
-from . import openai
+from . import structureCache
+from . import grammars
+from . import metrics
+from . import backends
+from . import responseCache
+from . import events
+from . import jsonRepair
+from . import scheduler
+from . import prompts
+from . import tracing
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import queue
+import functools
+import asyncio
+import typing
+import time
+import contextvars
+import contextlib
 
-__all__ = ['ModelType','LLMConfig','select','adapt','implement','solve','self_discover','ChatTemplate']
+if typing.TYPE_CHECKING:
+    # numpy is only needed once an index is actually used.
+    from . import structureIndex
+    from . import cascade as cascadePolicy
+    from . import hedging
+    from . import moduleSelector
+
+__all__ = ['ModelType','LLMConfig','select','adapt','implement','solve','self_discover','ChatTemplate','preload','solve_with_structure','solve_batch','BatchItem','BatchResult','async_select','async_adapt','async_implement','async_self_discover','async_solve','async_solve_with_structure','DiscoveryMode','fused_discover','async_fused_discover','CallUsage','track_usage','solve_stream','async_solve_stream']
 
 
 class ModelType(Enum):
@@ -22,6 +45,10 @@ class ChatTemplate(Enum):
     MIXTRAL_INSTRUCT = "mixtral_instruct"
     ZEPHYR = "zephyr"
     CHATML = "chatml"
+
+class DiscoveryMode(Enum):
+    THREE_STEP = "three_step"
+    FUSED = "fused"
     
     
 
@@ -35,6 +62,16 @@ class LLMConfig:
     chat_template: ChatTemplate = field(default=ChatTemplate.MIXTRAL_INSTRUCT,metadata={"description": "Only for local ModelType. Chat Template Type"})
     model_type: ModelType = field(default=ModelType.GEMINI,metadata={"description": "Model Type."})
     model_name: str = field(default=None,metadata={"description": "Model name. Only used by Gemini or OPENAI models. Use this to set the model to call, for example 'gpt-3.5-turbo-0125' if using openai models. "})
+    gpu_layers: int = field(default=-1,metadata={"description": "Only for local ModelType. Number of layers to offload to GPU. -1 = as many as possible."})
+    base_url: str = field(default=None,metadata={"description": "Only for OPENAI ModelType. Base URL of an OpenAI-compatible API. Defaults to the OpenAI API."})
+    structured_output: bool = field(default=False,metadata={"description": "Constrain phase outputs to their expected shape: GBNF grammars for LOCAL models, JSON mode for OPENAI and GEMINI models."})
+    kv_cache_dir: str = field(default=None,metadata={"description": "Only for local ModelType. Directory used to persist prompt-prefix KV states across processes."})
+    stream: bool = field(default=False,metadata={"description": "Stream responses and stop generating as soon as the first complete code block has been received."})
+    workers: int = field(default=0,metadata={"description": "Only for local ModelType. Run local calls on this many worker processes, each with its own model instance pinned to a core set. 0 = in-process."})
+    hedge: "hedging.HedgePolicy" = field(default=None,metadata={"description": "Duplicate phase calls that run past a latency percentile and keep the first response that parses. None = no hedging."})
+    compact_prompts: bool = field(default=False,metadata={"description": "Send the compact prompt templates: trimmed examples and instructions, minified reasoning structures."})
+    abbreviate_modules: bool = field(default=False,metadata={"description": "List the reasoning modules by their one-line summaries in SELECT and fused discovery prompts."})
+    selector: "moduleSelector.ModuleSelector" = field(default=None,metadata={"description": "Pick reasoning modules locally and only call the LLM for SELECT when the selector is not confident. None = always call the LLM."})
     
     
 def formatPrompt(prompt: str,llmConfig: LLMConfig) ->tuple:
@@ -55,326 +92,893 @@ def formatPrompt(prompt: str,llmConfig: LLMConfig) ->tuple:
     return (prompt,stop)
 
 
-def select(task: str, llmConfig: LLMConfig = LLMConfig()) -> dict:
-    
-    selection = None
-    if llmConfig.model_type == ModelType.GEMINI:
-        selection = __select_gemini(llmConfig=llmConfig,task=task)
-    elif llmConfig.model_type == ModelType.LOCAL:
-        selection = __select_local(llmConfig=llmConfig,task=task)
-    elif llmConfig.model_type == ModelType.OPENAI:
-        selection = __select_openai(llmConfig=llmConfig,task=task)
-    else:
-        raise ValueError("Unsupported model Type!")
-    
-    return selection
+@functools.lru_cache(maxsize=None)
+def __static_prefix(template: str, chat_template: ChatTemplate, abbreviated: bool = False) -> str:
+    # Templates keep task-specific placeholders last, so the formatted prompt up to the first of them is the
+    # same for every task and its KV state can be reused. SELECT and fused discovery include the module list.
+    sentinel = "\x00"
+    modules = utils.rm_list(abbreviated) if template in prompts.MODULE_LIST_TEMPLATES else sentinel
+    prompt,_ = formatPrompt(template.format(task=sentinel,modules=modules,reasoning_structure=sentinel,fields=sentinel),LLMConfig(chat_template=chat_template))
+    return prompt.split(sentinel,1)[0]
 
-def adapt(task: str, reasoning_modules: dict, llmConfig: LLMConfig = LLMConfig()) -> str:
-    
-    adapted_modules = None
-    if llmConfig.model_type == ModelType.GEMINI:
-        adapted_modules = __adapt_gemini(llmConfig=llmConfig,task=task,reasoning_modules=reasoning_modules)
+
+@dataclass
+class CallUsage:
+    calls: int = 0
+    prompt_chars: int = 0
+    completion_chars: int = 0
+
+    @property
+    def estimated_tokens(self) -> int:
+        # About four characters per token for English text; exact counts are in the token metrics.
+        return (self.prompt_chars + self.completion_chars) // 4
+
+__usage = contextvars.ContextVar("autologic_usage",default=None)
+
+@contextlib.contextmanager
+def track_usage():
+    """Count the backend calls made in this thread or task (memoized responses excluded)."""
+    usage = CallUsage()
+    token = __usage.set(usage)
+    try:
+        yield usage
+    finally:
+        __usage.reset(token)
+
+def __record_usage(prompt: str, response: str) -> str:
+    usage = __usage.get()
+    if usage is not None:
+        usage.calls += 1
+        usage.prompt_chars += len(prompt)
+        usage.completion_chars += len(response or "")
+    return response
+
+
+def preload(llmConfig: LLMConfig):
+    # Load a local model into the process-wide pool ahead of the first phase call.
+    if llmConfig.model_type == ModelType.LOCAL and llmConfig.workers:
+        backends.load("local_workers").get_pool(llmConfig.workers).preload(
+            llmConfig.gguf_path,
+            max_context=llmConfig.context_length,
+            n_gpu_layers=llmConfig.gpu_layers
+        )
     elif llmConfig.model_type == ModelType.LOCAL:
-        adapted_modules = __adapt_local(llmConfig=llmConfig,task=task,reasoning_modules=reasoning_modules)
-    elif llmConfig.model_type == ModelType.OPENAI:
-        adapted_modules = __adapt_openai(llmConfig=llmConfig,task=task,reasoning_modules=reasoning_modules)
-    else: 
-        raise ValueError("Unsupported model Type!")
+        backends.load("local").get_model(
+            llmConfig.gguf_path,
+            threads=llmConfig.threads,
+            max_context=llmConfig.context_length,
+            n_gpu_layers=llmConfig.gpu_layers
+        )
+
+
+def __schedule(llmConfig: LLMConfig) -> scheduler.Scheduler:
+    # Local calls are bounded by the model pool rather than the scheduler. Without budgets there is nothing
+    # to queue against, so calls skip the scheduler and its lock, and rate limits are left to the SDK's retries.
+    if llmConfig.model_type == ModelType.LOCAL:
+        return None
+    schedule = scheduler.default_scheduler()
+    return schedule if schedule is not None and schedule.budgets else None
+
+def __call_backend(prompt: str, llmConfig: LLMConfig, template: str = None, grammar: str = None, json_mode: bool = False, scanner: utils.BlockScanner = None) -> str:
     
-    return adapted_modules
+    schedule = __schedule(llmConfig)
+    if schedule is None:
+        return __dispatch(prompt,llmConfig,template,grammar,json_mode,scanner)
+    backend = getattr(llmConfig.model_type,"value",llmConfig.model_type)
+    return schedule.run(backend,llmConfig.model_name,prompt,lambda: __dispatch(prompt,llmConfig,template,grammar,json_mode,scanner))
 
-def implement(task: str, adapted_modules: str, llmConfig: LLMConfig = LLMConfig()) -> dict:
+async def __async_call_backend(prompt: str, llmConfig: LLMConfig, template: str = None, grammar: str = None, json_mode: bool = False, scanner: utils.BlockScanner = None) -> str:
     
-    reasoning_structure = None
+    schedule = __schedule(llmConfig)
+    if schedule is None:
+        return await __async_dispatch(prompt,llmConfig,template,grammar,json_mode,scanner)
+    backend = getattr(llmConfig.model_type,"value",llmConfig.model_type)
+    return await schedule.async_run(backend,llmConfig.model_name,prompt,lambda: __async_dispatch(prompt,llmConfig,template,grammar,json_mode,scanner))
+
+def __backend_call(prompt: str, llmConfig: LLMConfig, template: str, grammar: str, json_mode: bool, scanner: utils.BlockScanner) -> tuple:
+    # The backend to call and the arguments of its invoke/async_invoke.
+    backend = getattr(llmConfig.model_type,"value",llmConfig.model_type)
     if llmConfig.model_type == ModelType.GEMINI:
-        reasoning_structure = __implement_gemini(llmConfig=llmConfig,task=task,adapted_modules=adapted_modules)
-    elif llmConfig.model_type == ModelType.LOCAL:
-        reasoning_structure = __implement_local(llmConfig=llmConfig,task=task,adapted_modules=adapted_modules)
-    elif llmConfig.model_type == ModelType.OPENAI:
-        reasoning_structure = __implement_openai(llmConfig=llmConfig,task=task,adapted_modules=adapted_modules)
-    else: 
-        raise ValueError("Unsupported model Type!")
-    
-    return reasoning_structure
+        return (backends.load("gemini"),(prompt,),dict(api_key=llmConfig.api_key,temp=llmConfig.temp,max_context=llmConfig.context_length,model_name=llmConfig.model_name,json_mode=json_mode,scanner=scanner))
+    if llmConfig.model_type == ModelType.LOCAL:
+        return (__local_backend(llmConfig),(),__local_invoke_args(prompt,llmConfig,template,grammar,scanner))
+    if llmConfig.model_type == ModelType.OPENAI:
+        # A scheduled call is retried on rate limits by the scheduler, so the SDK must not retry it as well.
+        max_retries = 0 if __schedule(llmConfig) is not None else None
+        return (backends.load("openai"),(prompt,),dict(api_key=llmConfig.api_key,temp=llmConfig.temp,max_context=llmConfig.context_length,model_name=llmConfig.model_name,base_url=llmConfig.base_url,json_mode=json_mode,scanner=scanner,max_retries=max_retries))
+    return (backends,(backend,prompt,llmConfig),dict(template=template,grammar=grammar,json_mode=json_mode,scanner=scanner))
 
-def __implement_openai(llmConfig: LLMConfig, task: str, adapted_modules: str):
-    prompt = config.IMPLEMENT_PHASE_PROMPT_TEMPLATE.format(task=task,modules=adapted_modules)
-    response = openai.invoke(prompt,api_key=llmConfig.api_key,temp=llmConfig.temp,max_context=llmConfig.context_length,model_name=llmConfig.model_name)
-    reasoning_structure = utils.extractJSONToDict(response=response)
-    return reasoning_structure
+@contextlib.contextmanager
+def __dispatching(prompt: str, llmConfig: LLMConfig):
+    backend = getattr(llmConfig.model_type,"value",llmConfig.model_type)
+    try:
+        with tracing.span(backend,"backend",model=llmConfig.model_name or llmConfig.gguf_path,prompt_chars=len(prompt)) as span, metrics.timed(metrics.BACKEND_SECONDS,backend=backend):
+            yield span
+    except Exception:
+        metrics.inc(metrics.BACKEND_ERRORS,backend=backend)
+        raise
+
+def __dispatch(prompt: str, llmConfig: LLMConfig, template: str = None, grammar: str = None, json_mode: bool = False, scanner: utils.BlockScanner = None) -> str:
     
-def __implement_gemini(llmConfig: LLMConfig, task: str, adapted_modules: str):
-    prompt = config.IMPLEMENT_PHASE_PROMPT_TEMPLATE.format(task=task,modules=adapted_modules)
-    response = gemini.invoke(prompt,api_key=llmConfig.api_key,temp=llmConfig.temp,max_context=llmConfig.context_length)
-    reasoning_structure = utils.extractJSONToDict(response=response)
-    return reasoning_structure
+    with __dispatching(prompt,llmConfig) as span:
+        target, args, kwargs = __backend_call(prompt,llmConfig,template,grammar,json_mode,scanner)
+        response = target.invoke(*args,**kwargs)
+        span.set(completion_chars=len(response or ""))
+        return response
 
-def __implement_local(llmConfig: LLMConfig, task: str, adapted_modules: str):
-    prompt = config.IMPLEMENT_PHASE_PROMPT_TEMPLATE.format(task=task,modules=adapted_modules)
+async def __async_dispatch(prompt: str, llmConfig: LLMConfig, template: str = None, grammar: str = None, json_mode: bool = False, scanner: utils.BlockScanner = None) -> str:
     
+    with __dispatching(prompt,llmConfig) as span:
+        target, args, kwargs = __backend_call(prompt,llmConfig,template,grammar,json_mode,scanner)
+        response = await target.async_invoke(*args,**kwargs)
+        span.set(completion_chars=len(response or ""))
+        return response
+
+# Phase, retry and extraction logic is written once, as generators that yield each backend call
+# (a _BackendCall) and receive its response; __run and __async_run make the calls.
+
+def __run(steps) -> typing.Any:
+    response = error = None
+    while True:
+        try:
+            call = steps.send(response) if error is None else steps.throw(error)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            response, error = __make_call(call), None
+        except BaseException as e:
+            response, error = None, e
+
+async def __async_run(steps) -> typing.Any:
+    response = error = None
+    while True:
+        try:
+            call = steps.send(response) if error is None else steps.throw(error)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            # Cancellation is thrown into the steps too, so their phases and spans close.
+            response, error = await __async_make_call(call), None
+        except BaseException as e:
+            response, error = None, e
+
+def __make_call(call: "_BackendCall") -> str:
+    if call.policy is None:
+        return __record_usage(call.prompt,__call_backend(*call.args(False)))
+    response, hedge_won = call.policy.run(call.phase,lambda hedge: __record_usage(call.prompt,__call_backend(*call.args(hedge))),call.parses)
+    call.adopt(hedge_won)
+    return response
+
+async def __async_make_call(call: "_BackendCall") -> str:
+    if call.policy is None:
+        return __record_usage(call.prompt,await __async_call_backend(*call.args(False)))
+    async def attempt(hedge: bool):
+        return __record_usage(call.prompt,await __async_call_backend(*call.args(hedge)))
+    response, hedge_won = await call.policy.async_run(call.phase,attempt,call.parses)
+    call.adopt(hedge_won)
+    return response
+
+def __invoke(prompt: str, llmConfig: LLMConfig, template: str = None, grammar: str = None, json_mode: bool = False, scanner: utils.BlockScanner = None):
+    
+    with tracing.span("invoke","llm",prompt_chars=len(prompt)) as span:
+        key, response = __memoized(prompt,llmConfig,grammar,json_mode,scanner)
+        if response is not None:
+            span.set(memoized=True)
+        else:
+            phase = __current_phase.get()
+            policy = llmConfig.hedge if llmConfig.hedge is not None and llmConfig.hedge.applies(phase) else None
+            call = _BackendCall(prompt,llmConfig,template,grammar,json_mode,scanner,policy,phase)
+            response = yield call
+            if policy is not None:
+                span.set(hedge_won=call.hedge_won)
+            if key is not None:
+                responseCache.default_cache().put(key,response)
+        span.set(completion_chars=len(response or ""))
+    return response
+
+class _BackendCall:
+    # A backend call of a phase. When hedged, each copy of the call streams into its own scanner,
+    # so a losing call that is still running cannot touch the one the phase reads.
+
+    def __init__(self, prompt: str, llmConfig: LLMConfig, template: str, grammar: str, json_mode: bool, scanner: utils.BlockScanner, policy: "hedging.HedgePolicy", phase: str):
+        self.prompt = prompt
+        self.llmConfig = llmConfig
+        self.template = template
+        self.grammar = grammar
+        self.json_mode = json_mode
+        self.target = scanner
+        self.policy = policy
+        self.phase = phase
+        self.hedge_won = False
+        self.live = True
+        self.scanners = {}
+
+    def args(self, hedge: bool) -> tuple:
+        # __call_backend arguments of the primary call or of the hedge.
+        if self.policy is None:
+            return (self.prompt,self.llmConfig,self.template,self.grammar,self.json_mode,self.target)
+        return (self.prompt,self.llm_config(hedge),self.template,self.grammar,self.json_mode,self.scanner(hedge))
+
+    def llm_config(self, hedge: bool) -> LLMConfig:
+        return (self.policy.alternate or self.llmConfig) if hedge else self.llmConfig
+
+    def scanner(self, hedge: bool) -> utils.BlockScanner:
+        if self.target is None:
+            return None
+        # Only the primary call streams to listeners, and only until a response has been picked.
+        on_chunk = self.target.on_chunk
+        forward = (lambda text: self.live and on_chunk(text)) if on_chunk is not None and not hedge else None
+        scanner = self.scanners[hedge] = utils.BlockScanner(json_block=self.target.json_block,stop_at_block=self.target.stop_at_block,on_chunk=forward)
+        return scanner
+
+    def parses(self, response: str) -> bool:
+        try:
+            if self.template in (config.ADAPT_PHASE_PROMPT_TEMPLATE, config.COMPACT_ADAPT_PHASE_PROMPT_TEMPLATE):
+                return response.count("```") >= 2
+            return jsonRepair.extract(response).complete
+        except Exception:
+            return False
+
+    def adopt(self, hedge_won: bool):
+        self.hedge_won = hedge_won
+        self.live = False
+        winner = self.scanners.get(hedge_won)
+        if self.target is not None and winner is not None:
+            for name in ("text", "chunks", "complete", "early_stop", "elapsed"):
+                setattr(self.target,name,getattr(winner,name))
+
+def __memoized(prompt: str, llmConfig: LLMConfig, grammar: str, json_mode: bool, scanner: utils.BlockScanner) -> tuple:
+    # Returns the memo key (None when not memoizing) and the recorded response, if any.
+    cache = responseCache.default_cache()
+    if cache is None or not cache.applies(llmConfig.temp):
+        return (None,None)
+    backend = getattr(llmConfig.model_type,"value",llmConfig.model_type)
+    if llmConfig.model_type == ModelType.LOCAL:
+        prompt,_ = formatPrompt(prompt,llmConfig)
+    params = dict(
+        model_name=llmConfig.model_name,
+        gguf_path=llmConfig.gguf_path,
+        # A rebuilt or replaced GGUF file must not serve responses recorded from the old one.
+        gguf_mtime=os.path.getmtime(llmConfig.gguf_path) if llmConfig.gguf_path and os.path.exists(llmConfig.gguf_path) else None,
+        base_url=llmConfig.base_url,
+        temp=llmConfig.temp,
+        context_length=llmConfig.context_length,
+        grammar=grammar,
+        json_mode=json_mode
+    )
+    key = responseCache.response_key(backend,prompt,params)
+    response = cache.lookup(key)
+    if response is not None and scanner is not None:
+        scanner.feed(response)
+    return (key,response)
+
+def __local_backend(llmConfig: LLMConfig):
+    if llmConfig.workers:
+        return backends.load("local_workers").get_pool(llmConfig.workers)
+    return backends.load("local")
+
+def __local_invoke_args(prompt: str, llmConfig: LLMConfig, template: str = None, grammar: str = None, scanner: utils.BlockScanner = None) -> dict:
     prompt,stop = formatPrompt(prompt,llmConfig)
-    
-    response = localLLM.invoke(
+    return dict(
         prompt = prompt,
         gguf_path=llmConfig.gguf_path,
         temp=llmConfig.temp,
         max_context=llmConfig.context_length,
         threads=llmConfig.threads,
-        stop=stop
-        
+        n_gpu_layers=llmConfig.gpu_layers,
+        stop=stop,
+        prefix=__static_prefix(template,llmConfig.chat_template,llmConfig.abbreviate_modules) if template else None,
+        prefix_cache_dir=llmConfig.kv_cache_dir,
+        max_tokens=config.PHASE_MAX_TOKENS.get(template),
+        grammar=grammar,
+        scanner=scanner
     )
-    
-    reasoning_structure = utils.extractJSONToDict(response=response)
-    return reasoning_structure
 
+def __structured(llmConfig: LLMConfig, grammar: str, json_mode: bool = True) -> dict:
+    # Backend-specific constraints for a phase; each backend only uses the one it supports.
+    if not llmConfig.structured_output:
+        return {}
+    return dict(grammar=grammar,json_mode=json_mode)
 
-def self_discover(task: str, llmConfig: LLMConfig = LLMConfig(),verbose=False,retries = 3) -> dict:
-    
-    # SELECT
-    selection = None 
+def __scanner(llmConfig: LLMConfig, json_block: bool = True) -> utils.BlockScanner:
+    sink = __events.get()
+    if not llmConfig.stream and sink is None:
+        return None
+    # Event streams need the tokens, but generation only stops at the block when the config asks for it.
+    on_chunk = (lambda text: sink(events.Token(phase=None,text=text))) if sink is not None else None
+    return utils.BlockScanner(json_block=json_block,stop_at_block=llmConfig.stream,on_chunk=on_chunk)
+
+__events = contextvars.ContextVar("autologic_events",default=None)
+__current_phase = contextvars.ContextVar("autologic_phase",default=None)
+
+def __emit(event):
+    sink = __events.get()
+    if sink is not None:
+        sink(event)
+
+@contextlib.contextmanager
+def __phase(phase: str):
+    __emit(events.PhaseStarted(phase=phase))
+    token = __current_phase.set(phase)
+    start = time.perf_counter()
+    ok = False
+    try:
+        # Each attempt of a phase is its own span; a failed attempt carries the error.
+        with tracing.span(phase,"phase"), metrics.timed(metrics.PHASE_SECONDS,phase=phase):
+            yield
+        ok = True
+    finally:
+        __current_phase.reset(token)
+        __emit(events.PhaseFinished(phase=phase,seconds=time.perf_counter() - start,ok=ok))
+
+def __retry(phase: str, error: Exception):
+    metrics.inc(metrics.RETRIES,phase=phase)
+    __emit(events.Retry(phase=phase,error=str(error) or type(error).__name__))
+
+def __log_stream(phase: str, scanner: utils.BlockScanner, verbose: bool):
+    if scanner is not None and verbose:
+        log_print(f"{phase} {scanner.report()}")
+
+def __extract(phase: str, extractor, response: str):
+    try:
+        return extractor(response=response)
+    except Exception:
+        metrics.inc(metrics.EXTRACTION_FAILURES,phase=phase)
+        __reject_response()
+        raise
+
+def __reject_response():
+    # Drop an unparseable memoized response so the retry asks the backend again.
+    cache = responseCache.default_cache()
+    if cache is not None:
+        cache.reject_last()
+
+def __template(template: str, llmConfig: LLMConfig) -> str:
+    return prompts.template(template,llmConfig.compact_prompts)
+
+def __select_prompt(task: str, llmConfig: LLMConfig) -> str:
+    return prompts.select(task,llmConfig.compact_prompts,llmConfig.abbreviate_modules)
+
+def __adapt_prompt(task: str, reasoning_modules: dict, llmConfig: LLMConfig) -> str:
+    return prompts.adapt(task,reasoning_modules,llmConfig.compact_prompts)
+
+def __implement_prompt(task: str, adapted_modules: str, llmConfig: LLMConfig) -> str:
+    return prompts.implement(task,adapted_modules,llmConfig.compact_prompts)
+
+def __fused_prompt(task: str, llmConfig: LLMConfig) -> str:
+    return prompts.fused(task,llmConfig.compact_prompts,llmConfig.abbreviate_modules)
+
+def __solve_prompt(task: str, reasoning_structure: dict, llmConfig: LLMConfig) -> str:
+    return prompts.solve(task,reasoning_structure,llmConfig.compact_prompts)
+
+def __continue_prompt(task: str, partial: dict, missing: list, llmConfig: LLMConfig) -> str:
+    return prompts.solve_continue(task,partial,missing,llmConfig.compact_prompts)
+
+def __local_select(task: str, llmConfig: LLMConfig, verbose: bool) -> dict:
+    selector = llmConfig.selector
+    if selector is None:
+        return None
+    selection = selector.choose(task)
+    confident = bool(selection.reasoning_modules)
+    metrics.inc(metrics.LOCAL_SELECTIONS,source=selection.source,result="selected" if confident else "fallback")
+    if verbose: log_print(f"Local SELECT ({selection.source}) confidence {selection.confidence:.2f}" + ("" if confident else f" below {selector.threshold}, asking the LLM"))
+    return {"reasoning_modules": selection.reasoning_modules} if confident else None
+
+def __learn_selection(task: str, selection: dict, llmConfig: LLMConfig):
+    if llmConfig.selector is not None and isinstance(selection,dict):
+        llmConfig.selector.record(task,selection.get("reasoning_modules") or [])
+
+def __final_answer(reasoning):
+    answer = None
+    try:
+        answer = reasoning["Reasoning Structure"]["FINAL_ANSWER"]
+    except:
+        pass
+    try:
+        answer = reasoning["FINAL_ANSWER"]
+    except:
+        pass
+    return answer
+
+def __extract_answer(response: str, reasoning_structure: dict = None, partial: dict = None) -> tuple:
+    with tracing.span("extract_answer","extract",chars=len(response or "")) as span:
+        extraction = jsonRepair.extract(response)
+        span.set(repairs=extraction.repairs,complete=extraction.complete)
+    reasoning = extraction.value
+    if reasoning_structure is not None:
+        reasoning = jsonRepair.conform(reasoning,reasoning_structure)
+    if partial is not None:
+        # A continuation only carries the fields that were missing.
+        reasoning = jsonRepair.merge(partial,reasoning)
+    answer = __final_answer(reasoning)
+    
+    if not answer:
+        if reasoning_structure is not None and isinstance(reasoning,dict):
+            missing = jsonRepair.missing_fields(reasoning,reasoning_structure)
+            if missing and len(missing) < len(jsonRepair.missing_fields({},reasoning_structure)):
+                raise jsonRepair.IncompleteJSON(f"Completed reasoning structure is missing {len(missing)} fields",value=reasoning,missing=missing)
+        raise ValueError("Unable to exxtract FINAL_ANSWER from completed reasoning structure")
+    return (answer,reasoning)
+
+
+def __phase_call(phase: str, label: str, prompt: str, template: str, llmConfig: LLMConfig, grammar: str, extractor, verbose: bool, json_block: bool = True):
+    scanner = __scanner(llmConfig,json_block=json_block)
+    response = yield from __invoke(prompt,llmConfig,__template(template,llmConfig),scanner=scanner,**__structured(llmConfig,grammar,json_mode=json_block))
+    __log_stream(label,scanner,verbose)
+    return __extract(phase,extractor,response)
+
+def __select(task: str, llmConfig: LLMConfig, verbose: bool):
+    with __phase("select"):
+        selection = __local_select(task,llmConfig,verbose)
+        if selection is None:
+            selection = yield from __phase_call("select","SELECT",__select_prompt(task,llmConfig),config.SELECT_PHASE_PROMPT_TEMPLATE,llmConfig,grammars.SELECT_GRAMMAR,utils.extractJSONToDict,verbose)
+            __learn_selection(task,selection,llmConfig)
+    return selection
+
+def __adapt(task: str, reasoning_modules: dict, llmConfig: LLMConfig, verbose: bool):
+    with __phase("adapt"):
+        return (yield from __phase_call("adapt","ADAPT",__adapt_prompt(task,reasoning_modules,llmConfig),config.ADAPT_PHASE_PROMPT_TEMPLATE,llmConfig,grammars.ADAPT_GRAMMAR,utils.extractMDBlock,verbose,json_block=False))
+
+def __implement(task: str, adapted_modules: str, llmConfig: LLMConfig, verbose: bool):
+    with __phase("implement"):
+        return (yield from __phase_call("implement","IMPLEMENT",__implement_prompt(task,adapted_modules,llmConfig),config.IMPLEMENT_PHASE_PROMPT_TEMPLATE,llmConfig,grammars.IMPLEMENT_GRAMMAR,utils.extractJSONToDict,verbose))
+
+def __fused_discover(task: str, llmConfig: LLMConfig, verbose: bool):
+    with __phase("fused"):
+        return (yield from __phase_call("fused","FUSED DISCOVERY",__fused_prompt(task,llmConfig),config.FUSED_DISCOVERY_PROMPT_TEMPLATE,llmConfig,grammars.FUSED_GRAMMAR,utils.extractJSONToDict,verbose))
+
+def select(task: str, llmConfig: LLMConfig = LLMConfig(), verbose=False) -> dict:
+    return __run(__select(task,llmConfig,verbose))
+
+def adapt(task: str, reasoning_modules: dict, llmConfig: LLMConfig = LLMConfig(), verbose=False) -> str:
+    return __run(__adapt(task,reasoning_modules,llmConfig,verbose))
+
+def implement(task: str, adapted_modules: str, llmConfig: LLMConfig = LLMConfig(), verbose=False) -> dict:
+    return __run(__implement(task,adapted_modules,llmConfig,verbose))
+
+def fused_discover(task: str, llmConfig: LLMConfig = LLMConfig(), verbose=False) -> dict:
+    return __run(__fused_discover(task,llmConfig,verbose))
+
+async def async_select(task: str, llmConfig: LLMConfig = LLMConfig(), verbose=False) -> dict:
+    return await __async_run(__select(task,llmConfig,verbose))
+
+async def async_adapt(task: str, reasoning_modules: dict, llmConfig: LLMConfig = LLMConfig(), verbose=False) -> str:
+    return await __async_run(__adapt(task,reasoning_modules,llmConfig,verbose))
+
+async def async_implement(task: str, adapted_modules: str, llmConfig: LLMConfig = LLMConfig(), verbose=False) -> dict:
+    return await __async_run(__implement(task,adapted_modules,llmConfig,verbose))
+
+async def async_fused_discover(task: str, llmConfig: LLMConfig = LLMConfig(), verbose=False) -> dict:
+    return await __async_run(__fused_discover(task,llmConfig,verbose))
+
+def __retrying(phase: str, attempt, retries: int, failed):
+    # Runs fresh attempt() steps until one produces a result, at most `retries` times;
+    # failed(error, numAttempts) returns the message to log, if any.
+    result = None
     numAttempts = 0
-    log_print("Starting SELECT Phase")
-    while selection is None and numAttempts < retries:
+    while result is None and numAttempts < retries:
         try:
-            selection = select(task= task,llmConfig=llmConfig)
+            result = yield from attempt()
+        except responseCache.CacheMiss:
+            raise
         except Exception as e:
             numAttempts += 1
-            log_print(f"Failed to select Reasoning Modules due to {e}...")
+            __retry(phase,e)
+            message = failed(e,numAttempts)
+            if message: log_print(message)
+    return result
+
+def __validate_fused(discovery: dict) -> tuple:
+    # Returns (selection, adapted_modules, reasoning_structure) in the shapes the three-step phases produce.
+    if not isinstance(discovery,dict):
+        raise ValueError("Fused discovery response is not a JSON object")
+    
+    module_ids = discovery.get("reasoning_modules")
+    if not isinstance(module_ids,list) or not 1 <= len(module_ids) <= 5:
+        raise ValueError("Expected 1 to 5 reasoning_modules")
+    try:
+        # Ids may come back as strings; later steps index the module list with them.
+        ids = [int(module_id) for module_id in module_ids]
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid reasoning module ids: {module_ids}")
+    if not all(0 <= module_id < len(config.REASONING_MODULES_LIST) for module_id in ids):
+        raise ValueError(f"Invalid reasoning module ids: {module_ids}")
+    
+    adapted = discovery.get("adapted_modules")
+    if isinstance(adapted,str):
+        adapted = [adapted]
+    if not isinstance(adapted,list) or not adapted or not all(isinstance(module,str) and module.strip() for module in adapted):
+        raise ValueError("Expected a non-empty list of adapted_modules")
+    adapted_modules = "".join(f"- {module.strip()}\n" for module in adapted)
+    
+    reasoning_structure = discovery.get("reasoning_structure")
+    if isinstance(reasoning_structure,dict) and isinstance(reasoning_structure.get("Reasoning Structure"),dict):
+        reasoning_structure = reasoning_structure["Reasoning Structure"]
+    if not isinstance(reasoning_structure,dict) or list(reasoning_structure)[-1:] != ["FINAL_ANSWER"]:
+        raise ValueError("reasoning_structure must end with a FINAL_ANSWER key")
+    if len(reasoning_structure) < 2:
+        raise ValueError("reasoning_structure has no reasoning steps")
+    
+    return ({"reasoning_modules": ids},adapted_modules,reasoning_structure)
+
+def __log_fused(discovery: tuple, verbose: bool):
+    log_print("FUSED DISCOVERY Complete")
+    selection, adapted_modules, reasoning_structure = discovery
+    __emit_selection(selection)
+    __emit(events.ModulesAdapted(adapted_modules=adapted_modules))
+    if verbose:
+        __log_selection(selection)
+        log_print(f"Task-specific Reasoning Module verbiage:\n{adapted_modules}")
+
+def __fused(task: str, llmConfig: LLMConfig, verbose: bool):
+    # A single round-trip; any failure falls back to the three-step path rather than retrying.
+    log_print("Starting FUSED DISCOVERY")
+    try:
+        discovery = __validate_fused((yield from __fused_discover(task,llmConfig,verbose)))
+    except responseCache.CacheMiss:
+        raise
+    except Exception as e:
+        __reject_response()
+        log_print(f"FUSED DISCOVERY failed due to {e}, falling back to SELECT, ADAPT and IMPLEMENT...")
+        metrics.inc(metrics.FUSED_FALLBACKS)
+        return None
+    __log_fused(discovery,verbose)
+    return discovery[2]
+
+
+def __reuse_structure(task: str, llmConfig: LLMConfig, verbose: bool, cache: structureCache.StructureCache, index: "structureIndex.StructureIndex") -> tuple:
+    
+    cache_key = None
+    if cache is not None:
+        cache_key = structureCache.cache_key(task,llmConfig)
+        reasoning_structure = cache.get(cache_key)
+        if reasoning_structure is not None:
+            metrics.inc(metrics.STRUCTURE_REUSE,source="cache")
+            __emit(events.StructureReady(reasoning_structure=reasoning_structure,source="cache"))
+            log_print("Reusing cached Reasoning Structure")
+            if verbose: 
+                log_print(f"Reasoning Structure:\n{json.dumps(reasoning_structure, indent=2)}")
+            return (reasoning_structure,cache_key)
+    
+    if index is not None:
+        match = index.lookup(task,structureCache.model_key(llmConfig))
+        if match is not None:
+            metrics.inc(metrics.STRUCTURE_REUSE,source="index")
+            __emit(events.StructureReady(reasoning_structure=match.structure,source="index"))
+            log_print(f"Reusing Reasoning Structure of a similar task (similarity {match.score:.3f})")
+            if verbose: 
+                log_print(f"Similar task:\n{match.task}\nReasoning Structure:\n{json.dumps(match.structure, indent=2)}")
+            if cache is not None:
+                cache.put(cache_key,match.structure)
+            return (match.structure,cache_key)
+    
+    return (None,cache_key)
+
+# Discovered structures are returned, cached and indexed in the shape of the IMPLEMENT example, whichever
+# path produced them and whether or not the model kept the wrapper.
+__STRUCTURE_SHAPE = {"Reasoning Structure": {}}
+
+def __discovered(reasoning_structure: dict, source: str, verbose: bool) -> dict:
+    reasoning_structure = jsonRepair.conform(reasoning_structure,__STRUCTURE_SHAPE)
+    __emit(events.StructureReady(reasoning_structure=reasoning_structure,source=source))
+    if verbose: 
+        log_print(f"Reasoning Structure:\n{json.dumps(reasoning_structure, indent=2)}")
+    return reasoning_structure
+
+def __remember_structure(task: str, reasoning_structure: dict, llmConfig: LLMConfig, cache_key: str, cache: structureCache.StructureCache, index: "structureIndex.StructureIndex"):
+    if cache is not None:
+        cache.put(cache_key,reasoning_structure)
+    if index is not None:
+        index.add(task,reasoning_structure,structureCache.model_key(llmConfig))
+
+def __emit_selection(selection: dict):
+    if __events.get() is None:
+        return
+    ids = list(selection.get("reasoning_modules") or [])
+    modules = []
+    for module_id in ids:
+        try:
+            modules.append(utils.id_to_rm(int(module_id)))
+        except (TypeError, ValueError):
+            modules.append(None)
+    __emit(events.ModulesSelected(ids=ids,modules=modules))
+
+def __log_selection(selection: dict):
+    module_list = ""
+    for module in selection["reasoning_modules"]:
+        module_list += f"- {module}. {utils.id_to_rm(module)}\n"
+    log_print(f"Reasoning Modules Picked:\n{module_list}")
+
+
+def __self_discover(task: str, llmConfig: LLMConfig, verbose: bool, retries: int, cache: structureCache.StructureCache, index: "structureIndex.StructureIndex", discovery_mode: DiscoveryMode):
+    
+    reasoning_structure, cache_key = __reuse_structure(task,llmConfig,verbose,cache,index)
+    if reasoning_structure is not None:
+        return reasoning_structure
+    
+    source = "fused"
+    if DiscoveryMode(discovery_mode) == DiscoveryMode.FUSED:
+        reasoning_structure = yield from __fused(task,llmConfig,verbose)
+    if reasoning_structure is None:
+        source = "discovered"
+        reasoning_structure = yield from __three_step(task,llmConfig,verbose,retries)
+    reasoning_structure = __discovered(reasoning_structure,source,verbose)
+    
+    __remember_structure(task,reasoning_structure,llmConfig,cache_key,cache,index)
+    return reasoning_structure
+
+def __three_step(task: str, llmConfig: LLMConfig, verbose: bool, retries: int):
+    
+    # SELECT
+    log_print("Starting SELECT Phase")
+    selection = yield from __retrying("select",lambda: __select(task,llmConfig,verbose),retries,
+        lambda e, numAttempts: f"Failed to select Reasoning Modules due to {e}...")
     if selection is None: raise Exception("Unable to Reasoning Module selection from LLM response.")
     log_print("SELECT Phase Complete")
+    __emit_selection(selection)
     if verbose: 
-        
-        module_list = ""
-        for module in selection["reasoning_modules"]:
-            module_list += f"- {module}. {utils.id_to_rm(module)}\n"
-        log_print(f"Reasoning Modules Picked:\n{module_list}")
+        __log_selection(selection)
             
     # ADAPT
-    adapted_modules = None
-    numAttempts = 0
     log_print("Starting ADAPT Phase")
-    while adapted_modules is None and numAttempts < retries:
-        try:
-            adapted_modules = adapt(task=task,reasoning_modules=selection,llmConfig=llmConfig)
-        except Exception as e:
-            numAttempts += 1
-            log_print(f"Failed to rephrase Reasoning Modules due to {e}...")
+    adapted_modules = yield from __retrying("adapt",lambda: __adapt(task,selection,llmConfig,verbose),retries,
+        lambda e, numAttempts: f"Failed to rephrase Reasoning Modules due to {e}...")
     if adapted_modules is None: raise Exception("Unable to extract adapted_modules from LLM response.")
     log_print("ADAPT Phase Complete")
+    __emit(events.ModulesAdapted(adapted_modules=adapted_modules))
     if verbose: 
         log_print(f"Task-specific Reasoning Module verbiage:\n{adapted_modules}")
     
     # IMPLEMENT
-    reasoning_structure = None
-    numAttempts = 0
     log_print("Starting IMPLEMENT Phase")
-    while reasoning_structure is None and numAttempts < retries:
-        try:
-            reasoning_structure = implement(task=task,adapted_modules=adapted_modules,llmConfig=llmConfig)
-        except:
-            numAttempts += 1
-            if verbose: log_print(f"Failed to construct Reasoning Structure in JSON. Starting attempt {numAttempts+1}/{retries} ...")
+    reasoning_structure = yield from __retrying("implement",lambda: __implement(task,adapted_modules,llmConfig,verbose),retries,
+        lambda e, numAttempts: verbose and f"Failed to construct Reasoning Structure in JSON. Starting attempt {numAttempts+1}/{retries} ...")
     if reasoning_structure is None: raise Exception("Unable to extract reasoning structure from LLM response.")
     log_print("IMPLEMENT Phase Complete")
-    if verbose: 
-        log_print(f"Reasoning Structure:\n{json.dumps(reasoning_structure, indent=2)}")
-        
     return reasoning_structure
+
+@tracing.traced("self_discover")
+def self_discover(task: str, llmConfig: LLMConfig = LLMConfig(),verbose=False,retries = 3,cache: structureCache.StructureCache = None,index: "structureIndex.StructureIndex" = None,discovery_mode: DiscoveryMode = DiscoveryMode.THREE_STEP) -> dict:
+    return __run(__self_discover(task,llmConfig,verbose,retries,cache,index,discovery_mode))
+
+@tracing.traced("self_discover")
+async def async_self_discover(task: str, llmConfig: LLMConfig = LLMConfig(),verbose=False,retries = 3,cache: structureCache.StructureCache = None,index: "structureIndex.StructureIndex" = None,discovery_mode: DiscoveryMode = DiscoveryMode.THREE_STEP) -> dict:
+    return await __async_run(__self_discover(task,llmConfig,verbose,retries,cache,index,discovery_mode))
     
-def solve(task: str, discover_config: LLMConfig = LLMConfig(), solve_config: LLMConfig = None,verbose=False,retries=3) -> str:
+@tracing.traced("request")
+def solve(task: str, discover_config: LLMConfig = LLMConfig(), solve_config: LLMConfig = None,verbose=False,retries=3,reuse_structure=False,structure_cache: structureCache.StructureCache = None,structure_index: "structureIndex.StructureIndex" = None,discovery_mode: DiscoveryMode = DiscoveryMode.THREE_STEP,cascade: "cascadePolicy.CascadePolicy" = None) -> str:
     
     if verbose: log_print(f"discover_config: {discover_config}\nsolve_config: {solve_config}")
-    reasoning_structure = self_discover(task=task,llmConfig=discover_config,verbose=verbose,retries=retries)
+    if reuse_structure and structure_cache is None:
+        structure_cache = structureCache.default_cache()
+    reasoning_structure = self_discover(task=task,llmConfig=discover_config,verbose=verbose,retries=retries,cache=structure_cache if reuse_structure else None,index=structure_index,discovery_mode=discovery_mode)
     
     if not solve_config:
         solve_config = discover_config
         
-    if solve_config.model_type == ModelType.GEMINI:
-        answer = __solve_gemini(task=task,llmConfig=solve_config,reasoning_structure=reasoning_structure,verbose=verbose,retries=retries)
-    elif solve_config.model_type == ModelType.LOCAL:
-        answer = __solve_local(task=task,llmConfig=solve_config,reasoning_structure=reasoning_structure,verbose=verbose,retries=retries)
-    elif solve_config.model_type == ModelType.OPENAI:
-        answer = __solve_openai(task=task,llmConfig=solve_config,reasoning_structure=reasoning_structure,verbose=verbose,retries=retries)
-    else: 
-        raise ValueError("Unsupported model Type!")
+    if cascade is not None:
+        answer = cascade.solve_with_structure(task=task,reasoning_structure=reasoning_structure,verbose=verbose)
+    else:
+        answer = solve_with_structure(task=task,reasoning_structure=reasoning_structure,solve_config=solve_config,verbose=verbose,retries=retries)
     log_print("Solution has been found.")
     return answer
+
+@tracing.traced("request")
+async def async_solve(task: str, discover_config: LLMConfig = LLMConfig(), solve_config: LLMConfig = None,verbose=False,retries=3,reuse_structure=False,structure_cache: structureCache.StructureCache = None,structure_index: "structureIndex.StructureIndex" = None,discovery_mode: DiscoveryMode = DiscoveryMode.THREE_STEP,timeout: float = None,cascade: "cascadePolicy.CascadePolicy" = None) -> str:
     
-def __solve_gemini(task: str, llmConfig: LLMConfig,reasoning_structure: dict,verbose=False,retries=3) -> str:
+    async def run():
+        reasoning_structure = await async_self_discover(task=task,llmConfig=discover_config,verbose=verbose,retries=retries,cache=cache,index=structure_index,discovery_mode=discovery_mode)
+        if cascade is not None:
+            return await cascade.async_solve_with_structure(task=task,reasoning_structure=reasoning_structure,verbose=verbose)
+        return await async_solve_with_structure(task=task,reasoning_structure=reasoning_structure,solve_config=solve_config or discover_config,verbose=verbose,retries=retries)
     
-    reasoning_structure_str = json.dumps(reasoning_structure,indent=2)
-    prompt = config.SOLVE_PROMPT_TEMPLATE.format(task=task,reasoning_structure=reasoning_structure_str)
-    numAttempts = 0
-    answer = None
-    log_print("Starting to Solve Problem using Reasoning Structure")
-    while answer is None and numAttempts < retries:
+    if verbose: log_print(f"discover_config: {discover_config}\nsolve_config: {solve_config}")
+    cache = None
+    if reuse_structure:
+        cache = structure_cache or structureCache.default_cache()
+    # wait_for cancels the in-flight phase on timeout, which in turn stops local generation early.
+    answer = await asyncio.wait_for(run(),timeout=timeout)
+    log_print("Solution has been found.")
+    return answer
+
+__STREAM_END = object()
+
+def solve_stream(task: str, discover_config: LLMConfig = LLMConfig(), solve_config: LLMConfig = None,verbose=False,retries=3,reuse_structure=False,structure_cache: structureCache.StructureCache = None,structure_index: "structureIndex.StructureIndex" = None,discovery_mode: DiscoveryMode = DiscoveryMode.THREE_STEP,cascade: "cascadePolicy.CascadePolicy" = None):
+    """Run `solve` on a background thread and yield its `events` as they happen.
+
+    Phase calls stream their tokens even without `LLMConfig.stream`. The last event is an
+    `events.Answer`, or `events.Failed` if no answer could be found.
+    """
+    pending = queue.Queue()
+    
+    def run():
+        token = __events.set(events.EventStream(pending.put))
+        start = time.perf_counter()
         try:
-            response = gemini.invoke(prompt,api_key=llmConfig.api_key,temp=llmConfig.temp,max_context=llmConfig.context_length)
-            reasoning = utils.extractJSONToDict(response)
-            answer = None
-            try:
-                answer = reasoning["Reasoning Structure"]["FINAL_ANSWER"]
-            except:
-                pass
-            try:
-                answer = reasoning["FINAL_ANSWER"]
-            except:
-                pass
-            
-            if not answer:
-                raise ValueError("Unable to exxtract FINAL_ANSWER from completed reasoning structure")
-            
+            answer = solve(task=task,discover_config=discover_config,solve_config=solve_config,verbose=verbose,retries=retries,reuse_structure=reuse_structure,structure_cache=structure_cache,structure_index=structure_index,discovery_mode=discovery_mode,cascade=cascade)
+            pending.put(events.Answer(answer=answer,seconds=time.perf_counter() - start))
         except Exception as e:
-            numAttempts += 1
-            if verbose: log_print(f"Failed to Extract answer. Exception: {e} . Starting attempt {numAttempts+1}/{retries} ...")
-    if verbose: log_print(f"Problem Solved\nCompleted Reasoning Structure:\n{json.dumps(reasoning,indent=2)}")
-    return answer
+            pending.put(events.Failed(error=str(e) or type(e).__name__,seconds=time.perf_counter() - start))
+        finally:
+            __events.reset(token)
+            pending.put(__STREAM_END)
+    
+    threading.Thread(target=run,name="autologic-solve-stream",daemon=True).start()
+    while True:
+        event = pending.get()
+        if event is __STREAM_END:
+            return
+        yield event
 
-def __solve_openai(task: str, llmConfig: LLMConfig,reasoning_structure: dict,verbose=False,retries=3) -> str:
-    
-    reasoning_structure_str = json.dumps(reasoning_structure,indent=2)
-    prompt = config.SOLVE_PROMPT_TEMPLATE.format(task=task,reasoning_structure=reasoning_structure_str)
-    numAttempts = 0
-    answer = None
-    log_print("Starting to Solve Problem using Reasoning Structure")
-    while answer is None and numAttempts < retries:
+async def async_solve_stream(task: str, discover_config: LLMConfig = LLMConfig(), solve_config: LLMConfig = None,verbose=False,retries=3,reuse_structure=False,structure_cache: structureCache.StructureCache = None,structure_index: "structureIndex.StructureIndex" = None,discovery_mode: DiscoveryMode = DiscoveryMode.THREE_STEP,timeout: float = None,cascade: "cascadePolicy.CascadePolicy" = None):
+    """Async counterpart of `solve_stream`; closing the generator early cancels the solve."""
+    loop = asyncio.get_running_loop()
+    pending = asyncio.Queue()
+    
+    def put(event):
+        # Local models stream from executor threads.
+        loop.call_soon_threadsafe(pending.put_nowait,event)
+    
+    async def run():
+        __events.set(events.EventStream(put))
+        start = time.perf_counter()
         try:
-            response = openai.invoke(prompt,api_key=llmConfig.api_key,temp=llmConfig.temp,max_context=llmConfig.context_length,model_name=llmConfig.model_name)
-            reasoning = utils.extractJSONToDict(response)
-            answer = None
-            try:
-                answer = reasoning["Reasoning Structure"]["FINAL_ANSWER"]
-            except:
-                pass
-            try:
-                answer = reasoning["FINAL_ANSWER"]
-            except:
-                pass
-            
-            if not answer:
-                raise ValueError("Unable to exxtract FINAL_ANSWER from completed reasoning structure")
+            answer = await async_solve(task=task,discover_config=discover_config,solve_config=solve_config,verbose=verbose,retries=retries,reuse_structure=reuse_structure,structure_cache=structure_cache,structure_index=structure_index,discovery_mode=discovery_mode,timeout=timeout,cascade=cascade)
+            put(events.Answer(answer=answer,seconds=time.perf_counter() - start))
         except Exception as e:
-            numAttempts += 1
-            if verbose: log_print(f"Failed to Extract answer. Exception: {e} . Starting attempt {numAttempts+1}/{retries} ...")
-    if verbose: log_print(f"Problem Solved\nCompleted Reasoning Structure:\n{json.dumps(reasoning,indent=2)}")
-    return answer
+            put(events.Failed(error=str(e) or type(e).__name__,seconds=time.perf_counter() - start))
+        finally:
+            put(__STREAM_END)
+    
+    task_run = asyncio.create_task(run())
+    try:
+        while True:
+            event = await pending.get()
+            if event is __STREAM_END:
+                return
+            yield event
+    finally:
+        if not task_run.done():
+            task_run.cancel()
 
-def __solve_local(task: str, llmConfig: LLMConfig,reasoning_structure: dict,verbose=False,retries=3) -> str:
-    reasoning_structure_str = json.dumps(reasoning_structure,indent=2)
-    prompt = config.SOLVE_PROMPT_TEMPLATE.format(task=task,reasoning_structure=reasoning_structure_str)
-    
-    prompt,stop = formatPrompt(prompt,llmConfig)
+def __solve_with_structure(task: str, reasoning_structure: dict, solve_config: LLMConfig, verbose: bool, retries: int):
     
+    prompt = __solve_prompt(task,reasoning_structure,solve_config)
+    structured = __structured(solve_config,grammars.solve_grammar(reasoning_structure) if solve_config.structured_output else None)
     numAttempts = 0
     answer = None
+    reasoning = None
+    partial = None
+    template = __template(config.SOLVE_PROMPT_TEMPLATE,solve_config)
     log_print("Starting to Solve Problem using Reasoning Structure")
     while answer is None and numAttempts < retries:
         try:
-            response = localLLM.invoke(
-                prompt = prompt,
-                gguf_path=llmConfig.gguf_path,
-                temp=llmConfig.temp,
-                max_context=llmConfig.context_length,
-                threads=llmConfig.threads,
-                stop=stop
-            )
-            
-            reasoning = utils.extractJSONToDict(response)
-            
-            answer = None
-            try:
-                answer = reasoning["Reasoning Structure"]["FINAL_ANSWER"]
-            except:
-                pass
-            try:
-                answer = reasoning["FINAL_ANSWER"]
-            except:
-                pass
-            
-            if not answer:
-                raise ValueError("Unable to exxtract FINAL_ANSWER from completed reasoning structure")
-            
-                
+            scanner = __scanner(solve_config)
+            with __phase("solve"):
+                response = yield from __invoke(prompt,solve_config,template,scanner=scanner,**structured)
+                __log_stream("SOLVE",scanner,verbose)
+                answer, reasoning = __extract("solve",lambda response: __extract_answer(response,reasoning_structure,partial),response)
+        except responseCache.CacheMiss:
+            raise
+        except jsonRepair.IncompleteJSON as e:
+            # Keep what was filled out and only ask for the missing fields.
+            numAttempts += 1
+            __retry("solve",e)
+            partial = e.value
+            prompt = __continue_prompt(task,partial,e.missing,solve_config)
+            template = __template(config.SOLVE_CONTINUE_PROMPT_TEMPLATE,solve_config)
+            structured = __structured(solve_config,grammars.solve_grammar(jsonRepair.subset(partial,e.missing)) if solve_config.structured_output else None)
+            if verbose: log_print(f"Answer was cut short, {len(e.missing)} fields missing. Starting attempt {numAttempts+1}/{retries} for the missing fields ...")
         except Exception as e:
             numAttempts += 1
-            
+            __retry("solve",e)
             if verbose: log_print(f"Failed to Extract answer. Exception: {e} . Starting attempt {numAttempts+1}/{retries} ...")
-    if answer is None: raise Exception("Unable to extract answer markdown block from LLM response.")
+    if answer is None: raise Exception("Unable to extract answer from LLM response.")
     if verbose: log_print(f"Problem Solved\nCompleted Reasoning Structure:\n{json.dumps(reasoning,indent=2)}")
     return answer
 
+@tracing.traced("solve_with_structure")
+def solve_with_structure(task: str, reasoning_structure: dict, solve_config: LLMConfig = LLMConfig(),verbose=False,retries=3) -> str:
+    return __run(__solve_with_structure(task,reasoning_structure,solve_config,verbose,retries))
 
-def __select_gemini(llmConfig: LLMConfig, task: str) -> dict:
-    
-    prompt = config.SELECT_PHASE_PROMPT_TEMPLATE.format(task=task,modules=utils.rm_list())
-    response = gemini.invoke(prompt,api_key=llmConfig.api_key,temp=llmConfig.temp,max_context=llmConfig.context_length)
-    selection = utils.extractJSONToDict(response=response)
-    return selection
-    
-def __select_openai(llmConfig: LLMConfig, task: str) -> dict:
-    
-    prompt = config.SELECT_PHASE_PROMPT_TEMPLATE.format(task=task,modules=utils.rm_list())
-    response = openai.invoke(prompt,api_key=llmConfig.api_key,temp=llmConfig.temp,max_context=llmConfig.context_length,model_name = llmConfig.model_name)
-    selection = utils.extractJSONToDict(response=response)
-    return selection
+@tracing.traced("solve_with_structure")
+async def async_solve_with_structure(task: str, reasoning_structure: dict, solve_config: LLMConfig = LLMConfig(),verbose=False,retries=3) -> str:
+    return await __async_run(__solve_with_structure(task,reasoning_structure,solve_config,verbose,retries))
 
-def __adapt_gemini(llmConfig: LLMConfig, task: str, reasoning_modules: dict) -> str:
-    
-    module_list = ""
-    for module in reasoning_modules["reasoning_modules"]:
-        module_list += f"- {module}\n"
-        
-    prompt = config.ADAPT_PHASE_PROMPT_TEMPLATE.format(task=task,modules=module_list)
-    response = gemini.invoke(prompt,api_key=llmConfig.api_key,temp=llmConfig.temp,max_context=llmConfig.context_length)
-    adapted_modules = utils.extractMDBlock(response=response)
-    return adapted_modules
+@dataclass
+class BatchItem:
+    index: int
+    task: str
+    family: str = None
+    answer: str = None
+    error: str = None
+    seconds: float = 0.0
 
-def __adapt_openai(llmConfig: LLMConfig, task: str, reasoning_modules: dict) -> str:
-    
-    module_list = ""
-    for module in reasoning_modules["reasoning_modules"]:
-        module_list += f"- {module}\n"
-        
-    prompt = config.ADAPT_PHASE_PROMPT_TEMPLATE.format(task=task,modules=module_list)
-    response = openai.invoke(prompt,api_key=llmConfig.api_key,temp=llmConfig.temp,max_context=llmConfig.context_length,model_name=llmConfig.model_name)
-    adapted_modules = utils.extractMDBlock(response=response)
-    return adapted_modules
+@dataclass
+class BatchResult:
+    items: list
+    elapsed: float = 0.0
+    discover_seconds: float = 0.0
+    families: int = 0
+    
+    @property
+    def answers(self) -> list:
+        return [item.answer for item in self.items]
+    
+    @property
+    def failed(self) -> list:
+        return [item for item in self.items if item.error is not None]
+    
+    @property
+    def throughput(self) -> float:
+        return len(self.items) / self.elapsed if self.elapsed else 0.0
 
-def __adapt_local(llmConfig: LLMConfig, task: str, reasoning_modules: dict) -> str:
-    module_list = ""
-    for module in reasoning_modules["reasoning_modules"]:
-        module_list += f"- {module}\n"
-        
-    prompt = config.ADAPT_PHASE_PROMPT_TEMPLATE.format(task=task,modules=module_list)
+def __family_labels(tasks: list, task_family) -> list:
+    if task_family is None or isinstance(task_family,str):
+        return [task_family] * len(tasks)
+    if callable(task_family):
+        return [task_family(task) for task in tasks]
+    if len(task_family) != len(tasks):
+        raise ValueError("task_family must have one label per task!")
+    return list(task_family)
+
+def solve_batch(tasks: list, discover_config: LLMConfig = LLMConfig(), solve_config: LLMConfig = None, task_family = None, concurrency: int = 4,verbose=False,retries=3,structure_cache: structureCache.StructureCache = None,structure_index: "structureIndex.StructureIndex" = None,discovery_mode: DiscoveryMode = DiscoveryMode.THREE_STEP,cascade: "cascadePolicy.CascadePolicy" = None) -> BatchResult:
+    """Discover one reasoning structure per task family and solve every task with it concurrently.
+
+    task_family may be None or a string (every task belongs to one family), a list with one label
+    per task, or a callable mapping a task to its label. The first task of each family is used as
+    the instance for discovery. Results keep the input order; failures are reported per item.
+    """
+    if not solve_config:
+        solve_config = discover_config
     
-    prompt,stop = formatPrompt(prompt,llmConfig)
+    start = time.perf_counter()
+    labels = __family_labels(tasks,task_family)
+    items = [BatchItem(index=index,task=task,family=label) for index, (task, label) in enumerate(zip(tasks,labels))]
     
-    response = localLLM.invoke(
-        prompt = prompt,
-        gguf_path=llmConfig.gguf_path,
-        temp=llmConfig.temp,
-        max_context=llmConfig.context_length,
-        threads=llmConfig.threads,
-        stop=stop
-        
-    )
+    representatives = {}
+    for item in items:
+        representatives.setdefault(item.family,item.task)
     
-    adapted_modules = utils.extractMDBlock(response=response)
-    return adapted_modules
-
-def __select_local(llmConfig: LLMConfig, task: str) -> dict:
-    prompt = config.SELECT_PHASE_PROMPT_TEMPLATE.format(task=task,modules=utils.rm_list())
+    # Batch calls queue behind interactive ones when a provider's budget is tight.
+    _, caller = scheduler.current()
     
-    prompt,stop = formatPrompt(prompt,llmConfig)
+    def discover(task):
+        with scheduler.context(scheduler.Priority.BATCH,caller):
+            return self_discover(task=task,llmConfig=discover_config,verbose=verbose,retries=retries,cache=structure_cache,index=structure_index,discovery_mode=discovery_mode)
     
-    response = localLLM.invoke(
-        prompt = prompt,
-        gguf_path=llmConfig.gguf_path,
-        temp=llmConfig.temp,
-        max_context=llmConfig.context_length,
-        threads=llmConfig.threads,
-        stop=stop
+    def solve_item(item, reasoning_structure):
+        item_start = time.perf_counter()
+        try:
+            with scheduler.context(scheduler.Priority.BATCH,caller):
+                if cascade is not None:
+                    item.answer = cascade.solve_with_structure(task=item.task,reasoning_structure=reasoning_structure,verbose=verbose)
+                else:
+                    item.answer = solve_with_structure(task=item.task,reasoning_structure=reasoning_structure,solve_config=solve_config,verbose=verbose,retries=retries)
+        except Exception as e:
+            item.error = str(e) or type(e).__name__
+        item.seconds = time.perf_counter() - item_start
+    
+    with ThreadPoolExecutor(max_workers=max(1,concurrency)) as executor:
+        discoveries = {label: executor.submit(discover,task) for label, task in representatives.items()}
+        structures = {}
+        errors = {}
+        for label, future in discoveries.items():
+            try:
+                structures[label] = future.result()
+            except Exception as e:
+                errors[label] = f"Discovery failed for task family {label!r}: {e}"
+        discover_seconds = time.perf_counter() - start
         
-    )
-    selection = utils.extractJSONToDict(response=response)
-    return selection
\ No newline at end of file
+        pending = []
+        for item in items:
+            if item.family in errors:
+                item.error = errors[item.family]
+            else:
+                pending.append(executor.submit(solve_item,item,structures[item.family]))
+        for future in pending:
+            future.result()
+    
+    result = BatchResult(items=items,elapsed=time.perf_counter() - start,discover_seconds=discover_seconds,families=len(representatives))
+    log_print(f"Solved {len(items) - len(result.failed)}/{len(items)} tasks across {result.families} task families in {result.elapsed:.2f}s ({result.throughput:.2f} tasks/s)")
+    return result
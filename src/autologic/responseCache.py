@@ -0,0 +1,211 @@
+from . import metrics
+from collections import OrderedDict
+from dataclasses import dataclass
+from enum import Enum
+import contextvars
+import threading
+import hashlib
+import sqlite3
+import json
+import zlib
+import time
+import os
+
+
+class CacheMode(Enum):
+    READ_WRITE = "read_write"  # Serve hits, call the backend on a miss and record the response.
+    RECORD = "record"          # Always call the backend and overwrite what was recorded.
+    REPLAY = "replay"          # Serve hits only; a miss raises CacheMiss instead of calling the backend.
+
+
+class CacheMiss(Exception):
+    pass
+
+
+def response_key(backend: str, prompt: str, params: dict) -> str:
+    identity = [backend, prompt, params]
+    return hashlib.sha256(json.dumps(identity,sort_keys=True,default=str).encode("utf-8")).hexdigest()
+
+
+@dataclass
+class ResponseCacheStats:
+    hits: int = 0
+    misses: int = 0
+    bypassed: int = 0
+    stores: int = 0
+    discards: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+# Key of the last response looked up in the current thread or task, so a response the engine
+# fails to parse can be dropped before the retry sends the identical request again.
+_last_key = contextvars.ContextVar("autologic_response_key",default=None)
+
+
+class ResponseCache:
+    """Memoizes LLM responses by a hash of the formatted prompt and generation parameters.
+
+    Entries live in an in-memory LRU in front of an optional zlib-compressed SQLite store that is
+    kept under `max_bytes` by evicting the least recently used responses. Calls with a non-zero
+    temperature bypass the cache unless `allow_sampling` is set.
+    """
+
+    def __init__(self, path: str = None, mode: CacheMode = CacheMode.READ_WRITE, max_entries: int = 1024, max_bytes: int = 256 * 1024 * 1024, allow_sampling: bool = False):
+        self.path = path
+        self.mode = CacheMode(mode)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.allow_sampling = allow_sampling
+        self.stats = ResponseCacheStats()
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._disk_bytes = 0
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)),exist_ok=True)
+            self._conn = sqlite3.connect(path,check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response BLOB NOT NULL, size INTEGER NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+            self._conn.commit()
+            self._disk_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def applies(self, temp: float) -> bool:
+        if not temp or self.allow_sampling:
+            return True
+        if self.mode == CacheMode.REPLAY:
+            raise CacheMiss(f"Replay mode cannot serve sampled calls (temp={temp}); use temp=0 or allow_sampling")
+        self.stats.bypassed += 1
+        metrics.inc(metrics.RESPONSE_CACHE,result="bypass")
+        _last_key.set(None)
+        return False
+
+    def lookup(self, key: str) -> str:
+        _last_key.set(key)
+        response = None if self.mode == CacheMode.RECORD else self._get(key)
+        metrics.inc(metrics.RESPONSE_CACHE,result="miss" if response is None else "hit")
+        if response is None:
+            self.stats.misses += 1
+            if self.mode == CacheMode.REPLAY:
+                raise CacheMiss(f"No recorded response for request {key[:16]}")
+        else:
+            self.stats.hits += 1
+        return response
+
+    def put(self, key: str, response: str):
+        if self.mode == CacheMode.REPLAY:
+            return
+        self.stats.stores += 1
+        with self._lock:
+            self._remember(key,response)
+            if self._conn is not None:
+                now = time.time()
+                blob = zlib.compress(response.encode("utf-8"))
+                self._drop_row(key)
+                self._conn.execute(
+                    "INSERT INTO responses (key, response, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                    (key, blob, len(blob), now, now)
+                )
+                self._disk_bytes += len(blob)
+                if self._disk_bytes > self.max_bytes:
+                    self._evict_disk()
+                self._conn.commit()
+
+    def discard(self, key: str):
+        with self._lock:
+            self._memory.pop(key,None)
+            if self._conn is not None:
+                self._drop_row(key)
+                self._conn.commit()
+        self.stats.discards += 1
+
+    def reject_last(self):
+        # Called when the last response could not be parsed; recorded (replay) data is left untouched.
+        key = _last_key.get()
+        if key is not None and self.mode != CacheMode.REPLAY:
+            self.discard(key)
+        _last_key.set(None)
+
+    def _get(self, key: str) -> str:
+        with self._lock:
+            response = self._memory.get(key)
+            if response is not None:
+                self._memory.move_to_end(key)
+                return response
+            if self._conn is None:
+                return None
+            row = self._conn.execute("SELECT response FROM responses WHERE key = ?",(key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?",(time.time(),key))
+            self._conn.commit()
+            response = zlib.decompress(row[0]).decode("utf-8")
+            self._remember(key,response)
+            return response
+
+    def _remember(self, key: str, response: str):
+        self._memory[key] = response
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _drop_row(self, key: str):
+        row = self._conn.execute("SELECT size FROM responses WHERE key = ?",(key,)).fetchone()
+        if row is not None:
+            self._conn.execute("DELETE FROM responses WHERE key = ?",(key,))
+            self._disk_bytes -= row[0]
+
+    def _evict_disk(self):
+        # Least recently used first, until the compressed responses fit the budget again.
+        while self._disk_bytes > self.max_bytes:
+            rows = self._conn.execute("SELECT key, size FROM responses ORDER BY accessed ASC LIMIT 64").fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if self._disk_bytes <= self.max_bytes:
+                    break
+                self._conn.execute("DELETE FROM responses WHERE key = ?",(key,))
+                self._disk_bytes -= size
+                self.stats.evictions += 1
+
+    def disk_bytes(self) -> int:
+        return self._disk_bytes
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM responses")
+                self._conn.commit()
+                self._disk_bytes = 0
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+
+    def __len__(self):
+        with self._lock:
+            if self._conn is None:
+                return len(self._memory)
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+_default_cache = None
+
+
+def default_cache() -> ResponseCache:
+    return _default_cache
+
+
+def set_default_cache(cache: ResponseCache):
+    """Memoize every backend call made by the engine with `cache`; None turns memoization off."""
+    global _default_cache
+    _default_cache = cache
@@ -0,0 +1,340 @@
+from . import metrics
+from dataclasses import dataclass, field
+from enum import Enum
+import email.utils
+import contextvars
+import contextlib
+import threading
+import itertools
+import asyncio
+import random
+import time
+
+
+class Priority(Enum):
+    INTERACTIVE = 0
+    BATCH = 1
+
+
+@dataclass
+class Budget:
+    requests_per_minute: float = field(default=None,metadata={"description": "Requests allowed per minute. None = unlimited."})
+    tokens_per_minute: float = field(default=None,metadata={"description": "Prompt plus completion tokens allowed per minute, estimated at four characters per token. None = unlimited."})
+    max_concurrency: int = field(default=None,metadata={"description": "Calls in flight at once. None = unlimited."})
+    burst_seconds: float = field(default=1.0,metadata={"description": "Seconds of budget that may be spent at once after an idle period. Providers often enforce per-minute limits over shorter windows."})
+    completion_tokens: int = field(default=500,metadata={"description": "Completion tokens reserved per call until the actual response size is known."})
+
+
+@dataclass
+class LaneStats:
+    calls: int = 0
+    rate_limited: int = 0
+    waited_seconds: float = 0.0
+    rate_factor: float = 1.0
+    blocked_until: float = 0.0
+    in_flight: int = 0
+    queued: int = 0
+
+
+class _Bucket:
+    # Refills continuously at `rate` per second up to `capacity`; may go into debt when a call
+    # turns out larger than reserved.
+
+    def __init__(self, per_minute: float, burst_seconds: float):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0,self.rate * burst_seconds)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float, factor: float):
+        self.level = min(self.capacity,self.level + (now - self.updated) * self.rate * factor)
+        self.updated = now
+
+    def wait(self, amount: float, factor: float) -> float:
+        # Asking for more than the bucket holds waits for a full bucket instead of forever.
+        amount = min(amount,self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / (self.rate * factor)
+
+
+class _Waiter:
+
+    def __init__(self, priority: Priority, caller: str, seq: int, tokens: int, loop=None):
+        self.priority = priority
+        self.caller = caller
+        self.seq = seq
+        self.tokens = tokens
+        self.loop = loop
+        self.event = asyncio.Event() if loop is not None else None
+
+
+class _Lane:
+
+    def __init__(self, budget: Budget):
+        self.budget = budget or Budget()
+        self.requests = _Bucket(self.budget.requests_per_minute,self.budget.burst_seconds) if self.budget.requests_per_minute else None
+        self.tokens = _Bucket(self.budget.tokens_per_minute,self.budget.burst_seconds) if self.budget.tokens_per_minute else None
+        self.waiters = []
+        self.served = {}
+        self.stats = LaneStats()
+        self.failures = 0
+
+    def head(self) -> _Waiter:
+        # Interactive before batch; within a priority the caller served least so far goes first.
+        return min(self.waiters,key=lambda waiter: (waiter.priority.value,self.served.get(waiter.caller,0),waiter.seq))
+
+    def wait(self, waiter: _Waiter, now: float) -> float:
+        # Seconds until `waiter` may start (0 = now), or None to wait for a running call to finish.
+        if self.budget.max_concurrency and self.stats.in_flight >= self.budget.max_concurrency:
+            return None
+        wait = max(0.0,self.stats.blocked_until - now)
+        for bucket, amount in ((self.requests, 1), (self.tokens, waiter.tokens)):
+            if bucket is not None:
+                bucket.refill(now,self.stats.rate_factor)
+                wait = max(wait,bucket.wait(amount,self.stats.rate_factor))
+        return wait
+
+    def start(self, waiter: _Waiter):
+        if self.requests is not None:
+            self.requests.level -= 1
+        if self.tokens is not None:
+            self.tokens.level -= waiter.tokens
+        self.served[waiter.caller] = self.served.get(waiter.caller,0) + 1
+        self.stats.in_flight += 1
+        self.stats.calls += 1
+
+
+def rate_limit_delay(error: Exception) -> float:
+    """The Retry-After of a provider's rate-limit error in seconds (0 if it gave none), or None if `error` is not one."""
+    status = getattr(error,"status_code",None) or getattr(error,"code",None)
+    if status != 429 and type(error).__name__ not in ("RateLimitError", "ResourceExhausted", "TooManyRequests"):
+        return None
+    response = getattr(error,"response",None)
+    headers = getattr(response,"headers",None) or {}
+    for name in ("retry-after-ms", "retry-after"):
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            seconds = float(value)
+            return seconds / 1000 if name == "retry-after-ms" else seconds
+        except ValueError:
+            try:
+                return max(0.0,email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                return 0.0
+    return 0.0
+
+
+_context = contextvars.ContextVar("autologic_schedule",default=(Priority.INTERACTIVE,None))
+
+
+@contextlib.contextmanager
+def context(priority: Priority = Priority.INTERACTIVE, caller: str = None):
+    """Backend calls made in this thread or task are queued with `priority` and shared fairly per `caller`."""
+    token = _context.set((Priority(priority),caller))
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def current() -> tuple:
+    # (priority, caller) of the calls made in this thread or task.
+    return _context.get()
+
+
+class Scheduler:
+    """Queues backend calls per provider and model against request and token budgets.
+
+    Budgets are looked up as "provider:model", then "provider"; unknown lanes are unlimited but
+    still back off on rate-limit errors. A call that gets a 429 waits for its Retry-After (or an
+    exponential backoff), halves the lane's rate and is retried here, without spending one of the
+    engine's retries. The rate recovers as calls succeed.
+    """
+
+    def __init__(self, budgets: dict = None, max_rate_limit_retries: int = 8, max_backoff: float = 60.0):
+        self.budgets = dict(budgets or {})
+        self.max_rate_limit_retries = max_rate_limit_retries
+        self.max_backoff = max_backoff
+        self.lanes = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._seq = itertools.count()
+
+    def _lane(self, provider: str, model: str) -> _Lane:
+        key = f"{provider}:{model}" if model and f"{provider}:{model}" in self.budgets else provider
+        with self._lock:
+            lane = self.lanes.get(key)
+            if lane is None:
+                lane = self.lanes[key] = _Lane(self.budgets.get(key))
+            return lane
+
+    def _notify(self, lane: _Lane):
+        self._changed.notify_all()
+        for waiter in lane.waiters:
+            if waiter.loop is not None:
+                waiter.loop.call_soon_threadsafe(waiter.event.set)
+
+    def _waiter(self, lane: _Lane, tokens: int, loop=None) -> _Waiter:
+        priority, caller = _context.get()
+        waiter = _Waiter(priority,caller,next(self._seq),tokens,loop)
+        lane.waiters.append(waiter)
+        lane.stats.queued = len(lane.waiters)
+        return waiter
+
+    def _try_start(self, lane: _Lane, waiter: _Waiter) -> float:
+        # 0 once the call started; otherwise how long to wait before trying again (None = until notified).
+        if lane.head() is not waiter:
+            return None
+        wait = lane.wait(waiter,time.monotonic())
+        if wait == 0:
+            lane.waiters.remove(waiter)
+            lane.stats.queued = len(lane.waiters)
+            lane.start(waiter)
+            self._notify(lane)
+        return wait
+
+    def _leave(self, lane: _Lane, waiter: _Waiter):
+        if waiter in lane.waiters:
+            lane.waiters.remove(waiter)
+            lane.stats.queued = len(lane.waiters)
+            self._notify(lane)
+
+    def _acquire(self, lane: _Lane, tokens: int):
+        start = time.perf_counter()
+        with self._lock:
+            waiter = self._waiter(lane,tokens)
+            try:
+                while True:
+                    wait = self._try_start(lane,waiter)
+                    if wait == 0:
+                        break
+                    self._changed.wait(timeout=wait)
+            finally:
+                self._leave(lane,waiter)
+            lane.stats.waited_seconds += time.perf_counter() - start
+        return time.perf_counter() - start
+
+    async def _async_acquire(self, lane: _Lane, tokens: int):
+        start = time.perf_counter()
+        with self._lock:
+            waiter = self._waiter(lane,tokens,asyncio.get_running_loop())
+        try:
+            while True:
+                with self._lock:
+                    wait = self._try_start(lane,waiter)
+                    waiter.event.clear()
+                if wait == 0:
+                    break
+                try:
+                    await asyncio.wait_for(waiter.event.wait(),timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._lock:
+                self._leave(lane,waiter)
+                lane.stats.waited_seconds += time.perf_counter() - start
+        return time.perf_counter() - start
+
+    def _finish(self, lane: _Lane, reserved: int, used: int, error: Exception) -> float:
+        # Returns how long to wait before retrying a rate-limited call, None otherwise.
+        delay = rate_limit_delay(error) if error is not None else None
+        with self._lock:
+            lane.stats.in_flight -= 1
+            if lane.tokens is not None:
+                lane.tokens.level -= used - reserved
+            if delay is not None:
+                lane.failures += 1
+                lane.stats.rate_limited += 1
+                lane.stats.rate_factor = max(0.05,lane.stats.rate_factor / 2)
+                if delay > 0:
+                    # Honour the provider's Retry-After, with jitter so queued calls do not all retry at once.
+                    delay *= 1 + random.random() / 10
+                else:
+                    delay = min(self.max_backoff,(2 ** (lane.failures - 1)) * (1 + random.random()))
+                lane.stats.blocked_until = max(lane.stats.blocked_until,time.monotonic() + delay)
+            elif error is None:
+                lane.failures = 0
+                lane.stats.rate_factor = min(1.0,lane.stats.rate_factor + 0.05)
+            self._notify(lane)
+        return delay
+
+    def run(self, provider: str, model: str, prompt: str, call):
+        """Run `call()` once `provider`'s budget allows, retrying it on rate-limit errors."""
+        lane = self._lane(provider,model)
+        reserved = len(prompt) // 4 + lane.budget.completion_tokens
+        for attempt in range(self.max_rate_limit_retries + 1):
+            waited = self._acquire(lane,reserved)
+            metrics.observe(metrics.SCHEDULER_WAIT_SECONDS,waited,provider=provider)
+            try:
+                response = call()
+            except Exception as e:
+                delay = self._finish(lane,reserved,reserved,e)
+                if delay is None or attempt == self.max_rate_limit_retries:
+                    raise
+                metrics.inc(metrics.RATE_LIMITED,provider=provider)
+                continue
+            self._finish(lane,reserved,(len(prompt) + len(response or "")) // 4,None)
+            return response
+
+    async def async_run(self, provider: str, model: str, prompt: str, call):
+        """Async counterpart of `run`; `call()` returns a coroutine."""
+        lane = self._lane(provider,model)
+        reserved = len(prompt) // 4 + lane.budget.completion_tokens
+        for attempt in range(self.max_rate_limit_retries + 1):
+            waited = await self._async_acquire(lane,reserved)
+            metrics.observe(metrics.SCHEDULER_WAIT_SECONDS,waited,provider=provider)
+            try:
+                response = await call()
+            except asyncio.CancelledError as e:
+                self._finish(lane,reserved,reserved,e)
+                raise
+            except Exception as e:
+                delay = self._finish(lane,reserved,reserved,e)
+                if delay is None or attempt == self.max_rate_limit_retries:
+                    raise
+                metrics.inc(metrics.RATE_LIMITED,provider=provider)
+                continue
+            self._finish(lane,reserved,(len(prompt) + len(response or "")) // 4,None)
+            return response
+
+    def status(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                key: dict(
+                    calls=lane.stats.calls,
+                    rate_limited=lane.stats.rate_limited,
+                    waited_seconds=lane.stats.waited_seconds,
+                    rate_factor=lane.stats.rate_factor,
+                    blocked_for=max(0.0,lane.stats.blocked_until - now),
+                    in_flight=lane.stats.in_flight,
+                    queued=lane.stats.queued,
+                )
+                for key, lane in self.lanes.items()
+            }
+
+
+def parse_budget(spec: str) -> tuple:
+    """"openai:gpt-4=500/30000" -> ("openai:gpt-4", Budget(500, 30000)); the token budget is optional."""
+    key, _, limits = spec.partition("=")
+    requests, _, tokens = limits.partition("/")
+    try:
+        return (key, Budget(requests_per_minute=float(requests) if requests else None,tokens_per_minute=float(tokens) if tokens else None))
+    except ValueError:
+        raise ValueError(f"Invalid rate limit {spec!r}, expected PROVIDER[:MODEL]=REQUESTS_PER_MINUTE[/TOKENS_PER_MINUTE]")
+
+
+_default_scheduler = Scheduler()
+
+
+def default_scheduler() -> Scheduler:
+    return _default_scheduler
+
+
+def set_default_scheduler(scheduler: Scheduler):
+    """Route every API backend call through `scheduler`; None sends calls straight to the backend."""
+    global _default_scheduler
+    _default_scheduler = scheduler
@@ -0,0 +1,361 @@
+from . import reasoningEngine
+from . import structureCache
+from . import metrics
+from . import scheduler
+from . import backends
+from .utils import log_print
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from dataclasses import dataclass, field, asdict
+import threading
+import signal
+import json
+import time
+
+REQUEST_SECONDS = "autologic_http_request_seconds"
+REQUESTS = "autologic_http_requests_total"
+REJECTED = "autologic_http_rejected_total"
+
+DEFAULT_CONCURRENCY = {"local": 1, "gemini": 8, "openai": 8}
+DISCOVERY_MODES = [mode.value for mode in reasoningEngine.DiscoveryMode]
+
+
+class Lane:
+    """Bounded admission for one backend: `concurrency` requests run, up to `queue_size` more wait."""
+
+    def __init__(self, concurrency: int, queue_size: int):
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.running = 0
+        self.waiting = 0
+        self._slots = threading.Semaphore(concurrency)
+        self._lock = threading.Lock()
+
+    def try_admit(self) -> bool:
+        with self._lock:
+            if self.running + self.waiting >= self.concurrency + self.queue_size:
+                return False
+            self.waiting += 1
+            return True
+
+    def acquire(self):
+        self._slots.acquire()
+        with self._lock:
+            self.waiting -= 1
+            self.running += 1
+
+    def cancel(self):
+        with self._lock:
+            self.waiting -= 1
+
+    def release(self):
+        with self._lock:
+            self.running -= 1
+        self._slots.release()
+
+    def status(self) -> dict:
+        return {"concurrency": self.concurrency, "queue_size": self.queue_size, "running": self.running, "waiting": self.waiting}
+
+
+@dataclass
+class ServerConfig:
+    discover_config: reasoningEngine.LLMConfig
+    solve_config: reasoningEngine.LLMConfig = None
+    host: str = "127.0.0.1"
+    port: int = 8080
+    concurrency: dict = field(default_factory=dict,metadata={"description": "Concurrent requests per backend (model type value). Unlisted backends use DEFAULT_CONCURRENCY."})
+    queue_size: int = field(default=16,metadata={"description": "Requests allowed to wait per backend before new ones are rejected with 429."})
+    retries: int = 3
+    reuse_structure: bool = field(default=True,metadata={"description": "Keep discovered reasoning structures in the process-wide cache across requests."})
+    discovery_mode: str = "three_step"
+    drain_timeout: float = field(default=30.0,metadata={"description": "Seconds to wait for in-flight requests on shutdown."})
+    verbose: bool = False
+
+
+class _HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _backend(llmConfig: reasoningEngine.LLMConfig) -> str:
+    return getattr(llmConfig.model_type,"value",llmConfig.model_type)
+
+
+class Server:
+    """Long-lived HTTP/JSON front end for the engine.
+
+    Models, API clients and the structure cache stay warm across requests. Every request is
+    admitted to the lane of each backend it uses (429 if any lane is full), and SIGTERM/SIGINT
+    stop accepting work and drain in-flight requests before exiting.
+    """
+
+    def __init__(self, config: ServerConfig):
+        self.config = config
+        self.solve_config = config.solve_config or config.discover_config
+        self.draining = False
+        self.started = time.time()
+        self._in_flight = 0
+        self._idle = threading.Condition()
+        self.lanes = {}
+        for llmConfig in (config.discover_config, self.solve_config):
+            backend = _backend(llmConfig)
+            if backend not in self.lanes:
+                # A local worker pool runs one call per worker.
+                default = llmConfig.workers or DEFAULT_CONCURRENCY.get(backend,4)
+                concurrency = config.concurrency.get(backend,default)
+                self.lanes[backend] = Lane(concurrency,config.queue_size)
+        self.httpd = ThreadingHTTPServer((config.host,config.port),_make_handler(self))
+        self.httpd.daemon_threads = True
+
+    def warm_up(self):
+        for llmConfig in (self.config.discover_config, self.solve_config):
+            reasoningEngine.preload(llmConfig)
+
+    def _lanes_for(self, configs: tuple) -> list:
+        # Sorted so concurrent requests acquire shared lanes in the same order.
+        return [self.lanes[backend] for backend in sorted({_backend(llmConfig) for llmConfig in configs})]
+
+    def run(self, lanes: list, call):
+        if self.draining:
+            raise _HTTPError(503,"Server is draining")
+        admitted = []
+        for lane in lanes:
+            if not lane.try_admit():
+                for other in admitted:
+                    other.cancel()
+                metrics.inc(REJECTED)
+                raise _HTTPError(429,"Server is saturated, retry later")
+            admitted.append(lane)
+        with self._idle:
+            self._in_flight += 1
+        acquired = []
+        try:
+            for lane in lanes:
+                lane.acquire()
+                acquired.append(lane)
+            return call()
+        finally:
+            for lane in acquired:
+                lane.release()
+            for lane in lanes[len(acquired):]:
+                lane.cancel()
+            with self._idle:
+                self._in_flight -= 1
+                self._idle.notify_all()
+
+    def _retries(self, body: dict) -> int:
+        return _optional(body,"retries",self.config.retries,lambda value: type(value) is int and value >= 1,"a positive integer")
+
+    def _reuse_structure(self, body: dict) -> bool:
+        return _optional(body,"reuse_structure",self.config.reuse_structure,lambda value: isinstance(value,bool),"true or false")
+
+    def _discovery_mode(self, body: dict) -> str:
+        return _optional(body,"discovery_mode",self.config.discovery_mode,lambda value: value in DISCOVERY_MODES,f"one of {', '.join(DISCOVERY_MODES)}")
+
+    def solve(self, body: dict) -> dict:
+        task = _task(body)
+        retries, reuse, discovery_mode = self._retries(body), self._reuse_structure(body), self._discovery_mode(body)
+        answer = self.run(
+            self._lanes_for((self.config.discover_config, self.solve_config)),
+            lambda: reasoningEngine.solve(
+                task=task,
+                discover_config=self.config.discover_config,
+                solve_config=self.solve_config,
+                verbose=self.config.verbose,
+                retries=retries,
+                reuse_structure=reuse,
+                discovery_mode=discovery_mode
+            )
+        )
+        return {"answer": answer}
+
+    def self_discover(self, body: dict) -> dict:
+        task = _task(body)
+        retries, reuse, discovery_mode = self._retries(body), self._reuse_structure(body), self._discovery_mode(body)
+        reasoning_structure = self.run(
+            self._lanes_for((self.config.discover_config,)),
+            lambda: reasoningEngine.self_discover(
+                task=task,
+                llmConfig=self.config.discover_config,
+                verbose=self.config.verbose,
+                retries=retries,
+                cache=structureCache.default_cache() if reuse else None,
+                discovery_mode=discovery_mode
+            )
+        )
+        return {"reasoning_structure": reasoning_structure}
+
+    def solve_with_structure(self, body: dict) -> dict:
+        task = _task(body)
+        reasoning_structure = _require(body,"reasoning_structure")
+        if not isinstance(reasoning_structure,dict) or not reasoning_structure:
+            raise _HTTPError(400,"reasoning_structure must be a non-empty JSON object")
+        retries = self._retries(body)
+        answer = self.run(
+            self._lanes_for((self.solve_config,)),
+            lambda: reasoningEngine.solve_with_structure(
+                task=task,
+                reasoning_structure=reasoning_structure,
+                solve_config=self.solve_config,
+                verbose=self.config.verbose,
+                retries=retries
+            )
+        )
+        return {"answer": answer}
+
+    def health(self) -> dict:
+        return {
+            "status": "draining" if self.draining else "ok",
+            "uptime": time.time() - self.started,
+            "in_flight": self._in_flight,
+            "lanes": {backend: lane.status() for backend, lane in self.lanes.items()},
+            "scheduler": scheduler.default_scheduler().status() if scheduler.default_scheduler() else {},
+            "local_workers": [
+                dict(asdict(stats),utilization=stats.utilization,tokens_per_second=stats.tokens_per_second)
+                for pool in _worker_pools() for stats in pool.utilization()
+            ],
+        }
+
+    def drain(self, timeout: float = None) -> bool:
+        # Reject new work, then wait for in-flight requests to finish.
+        self.draining = True
+        deadline = time.monotonic() + (self.config.drain_timeout if timeout is None else timeout)
+        with self._idle:
+            while self._in_flight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def shutdown(self):
+        drained = self.drain()
+        log_print("Drained in-flight requests" if drained else f"Drain timed out with {self._in_flight} requests in flight")
+        self.httpd.shutdown()
+
+    def serve_forever(self):
+        def on_signal(signum, frame):
+            log_print(f"Received signal {signum}, draining...")
+            # shutdown() blocks until serve_forever returns, so it must not run on the serving thread.
+            threading.Thread(target=self.shutdown,daemon=True).start()
+        signal.signal(signal.SIGTERM,on_signal)
+        signal.signal(signal.SIGINT,on_signal)
+        host, port = self.httpd.server_address[:2]
+        log_print(f"Serving on http://{host}:{port}")
+        try:
+            self.httpd.serve_forever()
+        finally:
+            self.httpd.server_close()
+            metrics.flush()
+
+
+def _worker_pools() -> list:
+    if "local_workers" not in backends.loaded():
+        return []
+    return backends.load("local_workers").pools()
+
+
+def _require(body: dict, key: str):
+    value = body.get(key)
+    if value is None:
+        raise _HTTPError(400,f"Missing field: {key}")
+    return value
+
+
+def _task(body: dict) -> str:
+    task = _require(body,"task")
+    if not isinstance(task,str) or not task.strip():
+        raise _HTTPError(400,"task must be a non-empty string")
+    return task
+
+
+def _optional(body: dict, key: str, default, valid, expected: str):
+    # Body fields are checked before any work is admitted, so a bad value is a 400 rather than a failed solve.
+    value = body.get(key)
+    if value is None:
+        return default
+    if not valid(value):
+        raise _HTTPError(400,f"{key} must be {expected}")
+    return value
+
+
+ROUTES = {
+    "/v1/solve": Server.solve,
+    "/v1/self_discover": Server.self_discover,
+    "/v1/solve_with_structure": Server.solve_with_structure,
+}
+
+
+def _make_handler(server: Server):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            if server.config.verbose:
+                log_print(f"{self.address_string()} {format % args}")
+
+        def _send(self, status: int, body, content_type: str = "application/json", headers: dict = None):
+            payload = body if isinstance(body,bytes) else json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type",content_type)
+            self.send_header("Content-Length",str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name,value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path == "/healthz":
+                health = server.health()
+                self._send(503 if server.draining else 200,health)
+            elif self.path == "/metrics":
+                registry = metrics.registry()
+                text = registry.prometheus() if registry is not None else ""
+                self._send(200,text.encode("utf-8"),content_type="text/plain; version=0.0.4")
+            else:
+                self._send(404,{"error": "Not found"})
+
+        def do_POST(self):
+            route = ROUTES.get(self.path)
+            if route is None:
+                self._send(404,{"error": "Not found"})
+                return
+            start = time.perf_counter()
+            status = 200
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except json.JSONDecodeError:
+                    raise _HTTPError(400,"Request body is not valid JSON")
+                if not isinstance(body,dict):
+                    raise _HTTPError(400,"Request body must be a JSON object")
+                # Requests share each provider's budget fairly per client; batch clients can ask to go last.
+                priority = _optional(body,"priority","interactive",lambda value: value in ("interactive", "batch"),"interactive or batch")
+                with scheduler.context(scheduler.Priority.BATCH if priority == "batch" else scheduler.Priority.INTERACTIVE,self.client_address[0]):
+                    result = route(server,body)
+                result["seconds"] = time.perf_counter() - start
+                self._send(200,result)
+            except _HTTPError as e:
+                status = e.status
+                headers = {"Retry-After": "1"} if status in (429, 503) else None
+                self._send(status,{"error": str(e)},headers=headers)
+            except Exception as e:
+                status = 500
+                self._send(500,{"error": str(e) or type(e).__name__})
+            finally:
+                metrics.observe(REQUEST_SECONDS,time.perf_counter() - start,endpoint=self.path)
+                metrics.inc(REQUESTS,endpoint=self.path,status=str(status))
+
+    return Handler
+
+
+def serve(config: ServerConfig):
+    if not metrics.enabled():
+        # /metrics needs at least the in-process registry.
+        metrics.enable()
+    server = Server(config)
+    log_print("Loading models...")
+    server.warm_up()
+    server.serve_forever()
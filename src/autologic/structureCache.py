@@ -0,0 +1,233 @@
+from . import config
+from collections import OrderedDict
+from dataclasses import dataclass
+import threading
+import hashlib
+import sqlite3
+import json
+import time
+import os
+
+
+def _template_version() -> str:
+    # Any edit to the discovery templates or the module list invalidates previously cached structures.
+    parts = [
+        str(config.PROMPT_LAYOUT),
+        config.SELECT_PHASE_PROMPT_TEMPLATE,
+        config.ADAPT_PHASE_PROMPT_TEMPLATE,
+        config.IMPLEMENT_PHASE_PROMPT_TEMPLATE,
+        config.FUSED_DISCOVERY_PROMPT_TEMPLATE,
+        config.COMPACT_SELECT_PHASE_PROMPT_TEMPLATE,
+        config.COMPACT_ADAPT_PHASE_PROMPT_TEMPLATE,
+        config.COMPACT_IMPLEMENT_PHASE_PROMPT_TEMPLATE,
+        config.COMPACT_FUSED_DISCOVERY_PROMPT_TEMPLATE,
+        "\n".join(config.REASONING_MODULES_LIST),
+        "\n".join(config.REASONING_MODULES_SHORT_LIST),
+    ]
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()[:16]
+
+TEMPLATE_VERSION = _template_version()
+
+
+def normalize_task(task: str) -> str:
+    return " ".join(task.split())
+
+
+def model_identity(llmConfig) -> tuple:
+    model_type = getattr(llmConfig.model_type, "value", llmConfig.model_type)
+    chat_template = getattr(llmConfig.chat_template, "value", llmConfig.chat_template)
+    return (model_type, llmConfig.model_name, llmConfig.gguf_path, chat_template)
+
+
+def model_key(llmConfig) -> str:
+    return json.dumps(model_identity(llmConfig))
+
+
+def cache_key(task: str, llmConfig) -> str:
+    identity = [TEMPLATE_VERSION, normalize_task(task), *model_identity(llmConfig)]
+    return hashlib.sha256(json.dumps(identity).encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class StructureCache:
+    """Base class for reasoning structure caches used by `reasoningEngine.self_discover`.
+
+    Subclasses implement `_get`/`_put`; hit/miss accounting is handled here.
+    """
+
+    def __init__(self):
+        self.stats = CacheStats()
+
+    def get(self, key: str) -> dict:
+        structure = self._get(key)
+        if structure is None:
+            self.stats.misses += 1
+        else:
+            self.stats.hits += 1
+        return structure
+
+    def put(self, key: str, structure: dict):
+        self._put(key, structure)
+
+    def _get(self, key: str) -> dict:
+        raise NotImplementedError
+
+    def _put(self, key: str, structure: dict):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class MemoryStructureCache(StructureCache):
+
+    def __init__(self, max_entries: int = 1024, ttl: float = None):
+        super().__init__()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> dict:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            created, structure = entry
+            if self.ttl is not None and time.time() - created > self.ttl:
+                del self._entries[key]
+                self.stats.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            return structure
+
+    def _put(self, key: str, structure: dict):
+        with self._lock:
+            self._entries[key] = (time.time(), structure)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteStructureCache(StructureCache):
+
+    def __init__(self, path: str, max_entries: int = 100000, ttl: float = None):
+        super().__init__()
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS structures ("
+            "key TEXT PRIMARY KEY, structure TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS structures_accessed ON structures (accessed)")
+        self._conn.commit()
+
+    def _get(self, key: str) -> dict:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT structure, created FROM structures WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            structure, created = row
+            if self.ttl is not None and now - created > self.ttl:
+                self._conn.execute("DELETE FROM structures WHERE key = ?", (key,))
+                self._conn.commit()
+                self.stats.expirations += 1
+                return None
+            self._conn.execute("UPDATE structures SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return json.loads(structure)
+
+    def _put(self, key: str, structure: dict):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO structures (key, structure, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(structure), now, now)
+            )
+            excess = self._conn.execute("SELECT COUNT(*) FROM structures").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM structures WHERE key IN (SELECT key FROM structures ORDER BY accessed ASC LIMIT ?)",
+                    (excess,)
+                )
+                self.stats.evictions += excess
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM structures")
+            self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM structures").fetchone()[0]
+
+
+class TieredStructureCache(StructureCache):
+    """In-memory LRU in front of a persistent store; disk hits are promoted into memory."""
+
+    def __init__(self, memory: MemoryStructureCache, disk: StructureCache):
+        super().__init__()
+        self.memory = memory
+        self.disk = disk
+
+    def _get(self, key: str) -> dict:
+        structure = self.memory.get(key)
+        if structure is None:
+            structure = self.disk.get(key)
+            if structure is not None:
+                self.memory.put(key, structure)
+        return structure
+
+    def _put(self, key: str, structure: dict):
+        self.memory.put(key, structure)
+        self.disk.put(key, structure)
+
+    def clear(self):
+        self.memory.clear()
+        self.disk.clear()
+
+
+_default_cache = None
+
+
+def default_cache() -> StructureCache:
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = MemoryStructureCache()
+    return _default_cache
+
+
+def set_default_cache(cache: StructureCache):
+    global _default_cache
+    _default_cache = cache
@@ -0,0 +1,447 @@
+from . import structureCache
+from dataclasses import dataclass
+import numpy as np
+import threading
+import hashlib
+import json
+import re
+import os
+
+_TOKEN_PATTERN = re.compile(r"[a-z]+|[0-9]+(?:\.[0-9]+)?")
+_STOP_WORDS = frozenset(
+    "a an and are as at be by can do does for from has have he her his how i if in is it its "
+    "of on or she so that the their them then there they this to was we what when where which "
+    "who will with would you your".split()
+)
+
+
+class HashingEmbedder:
+    """Offline task embedder: signed feature hashing of word unigrams and bigrams with sublinear TF.
+
+    No document frequencies are kept, so vectors never go stale as the index grows incrementally.
+    """
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def _features(self, text: str) -> list:
+        # Numbers are collapsed so instances of one task family that differ only in quantities match.
+        words = ["<num>" if word[0].isdigit() else word for word in _TOKEN_PATTERN.findall(text.lower()) if word not in _STOP_WORDS]
+        return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+    def embed_batch(self, texts: list) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            counts = {}
+            for feature in self._features(text):
+                digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+                bucket = (digest >> 1) % self.dim
+                sign = 1.0 if digest & 1 else -1.0
+                counts[bucket] = counts.get(bucket, 0.0) + sign
+            for bucket, count in counts.items():
+                vectors[row, bucket] = np.sign(count) * (1.0 + np.log(abs(count))) if count else 0.0
+        return _normalize(vectors)
+
+
+class LlamaEmbedder:
+    """Task embedder backed by a llama.cpp embedding model."""
+
+    def __init__(self, gguf_path: str, threads: int = 4, context_length: int = 512, gpu_layers: int = -1):
+        from llama_cpp import Llama
+        self._llm = Llama(
+            model_path=gguf_path,
+            embedding=True,
+            n_ctx=context_length,
+            n_threads=threads,
+            n_gpu_layers=gpu_layers,
+            verbose=False
+        )
+        self.dim = self._llm.n_embd()
+        self._lock = threading.Lock()
+
+    def embed_batch(self, texts: list) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        with self._lock:
+            for row, text in enumerate(texts):
+                embedding = np.asarray(self._llm.embed(text), dtype=np.float32)
+                # Models without a pooling layer return one vector per token.
+                vectors[row] = embedding.mean(axis=0) if embedding.ndim == 2 else embedding
+        return _normalize(vectors)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+@dataclass
+class Match:
+    task: str
+    structure: dict
+    score: float
+
+
+class _Ids:
+    """Growable int64 array of row ids."""
+
+    def __init__(self, capacity: int = 16):
+        self.values = np.zeros(capacity, dtype=np.int64)
+        self.count = 0
+
+    def append(self, ids: np.ndarray):
+        needed = self.count + len(ids)
+        if needed > len(self.values):
+            self.values = np.resize(self.values, max(needed, 2 * len(self.values)))
+        self.values[self.count:needed] = ids
+        self.count = needed
+
+    def view(self) -> np.ndarray:
+        return self.values[:self.count]
+
+
+class _Vectors:
+    """Every vector by row id: memory-mapped from the index file when persisted, a growable array otherwise."""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.path = None
+        self.array = np.zeros((0, dim), dtype=np.float32)
+        self.count = 0
+
+    def map(self, path: str, count: int):
+        # The file is only ever appended to, so it is remapped as it grows.
+        self.path = path
+        self.count = count
+        if count:
+            self.array = np.memmap(path, dtype=np.float32, mode="r", shape=(count, self.dim))
+
+    def append(self, vectors: np.ndarray):
+        needed = self.count + len(vectors)
+        if self.path:
+            self.map(self.path, needed)
+            return
+        if needed > len(self.array):
+            grown = np.zeros((max(needed, 2 * len(self.array), 64), self.dim), dtype=np.float32)
+            grown[:self.count] = self.array[:self.count]
+            self.array = grown
+        self.array[self.count:needed] = vectors
+        self.count = needed
+
+    def take(self, ids: np.ndarray) -> np.ndarray:
+        return self.array[ids]
+
+
+# Rows scored per matrix product while assigning a whole partition, so a mapped file is not read into RAM at once.
+_CHUNK = 65536
+
+
+class _Partition:
+    """The rows of one model. Exact scan while small, then an inverted file: rows are grouped under
+    their nearest of ~2 sqrt(n) k-means centroids and a query only scans the `nprobe` closest groups."""
+
+    def __init__(self, vectors: _Vectors, nprobe: int, exact_below: int):
+        self.vectors = vectors
+        self.nprobe = nprobe
+        self.exact_below = exact_below
+        self.ids = _Ids()
+        self.centroids = None
+        self.lists = None
+        self.trained_on = 0
+
+    def add(self, ids: np.ndarray) -> np.ndarray:
+        """Cluster of each added row (-1 while scanned exactly), or None when adding retrained the partition."""
+        self.ids.append(ids)
+        if self.ids.count >= self.exact_below and self.ids.count >= 2 * self.trained_on:
+            # Retraining at each doubling keeps the cost amortized as the index grows.
+            self.train()
+            return None
+        if self.centroids is None:
+            return np.full(len(ids), -1, dtype=np.int32)
+        assignment = self.nearest(ids)
+        self.assign(ids, assignment)
+        return assignment
+
+    def train(self, iterations: int = 8):
+        ids = self.ids.view()
+        count = len(ids)
+        clusters = min(count, max(1, int(2 * np.sqrt(count))))
+        rng = np.random.default_rng(count)
+        # Spherical k-means on a sample of ~40 vectors per centroid.
+        sample = self.vectors.take(np.sort(ids[rng.choice(count, min(count, 40 * clusters), replace=False)]))
+        centroids = sample[rng.choice(len(sample), clusters, replace=False)]
+        for _ in range(iterations):
+            assignment = (sample @ centroids.T).argmax(axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            empty = ~sums.any(axis=1)
+            sums[empty] = centroids[empty]
+            centroids = _normalize(sums)
+        self.restore(centroids, ids)
+
+    def restore(self, centroids: np.ndarray, ids: np.ndarray, assignment: np.ndarray = None):
+        # Clusters for the first `len(ids)` rows, assigned here unless given.
+        self.centroids = centroids
+        self.lists = [_Ids() for _ in range(len(centroids))]
+        self.trained_on = len(ids)
+        self.assign(ids, self.nearest(ids) if assignment is None else assignment)
+
+    def nearest(self, ids: np.ndarray) -> np.ndarray:
+        assignment = np.zeros(len(ids), dtype=np.int32)
+        for start in range(0, len(ids), _CHUNK):
+            assignment[start:start + _CHUNK] = (self.vectors.take(ids[start:start + _CHUNK]) @ self.centroids.T).argmax(axis=1)
+        return assignment
+
+    def assign(self, ids: np.ndarray, assignment: np.ndarray):
+        order = np.argsort(assignment, kind="stable")
+        clusters, starts = np.unique(assignment[order], return_index=True)
+        for cluster, members in zip(clusters, np.split(ids[order], starts[1:])):
+            self.lists[cluster].append(members)
+
+    def _best(self, ids: np.ndarray, query: np.ndarray) -> tuple:
+        if len(ids) == 0:
+            return (-1, -np.inf)
+        scores = self.vectors.take(ids) @ query
+        index = int(scores.argmax())
+        return (int(ids[index]), float(scores[index]))
+
+    def best(self, query: np.ndarray) -> tuple:
+        if self.centroids is None:
+            return self._best(self.ids.view(), query)
+        centroid_scores = self.centroids @ query
+        nprobe = min(self.nprobe, len(self.centroids))
+        probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        return self._best(np.concatenate([self.lists[cluster].view() for cluster in probe]), query)
+
+
+class StructureIndex:
+    """Cosine-similarity index from task text to previously discovered reasoning structures.
+
+    Structures are only matched against tasks discovered with the same `model` (see
+    `structureCache.model_key`). Normalized vectors are partitioned per model; past `exact_below`
+    entries a partition is searched as an inverted file over k-means clusters, probing the `nprobe`
+    closest ones. When `path` is given, vectors, entries and a row table are appended to files in that
+    directory, so inserts are durable, and each partition's centroids and cluster lists are saved
+    whenever it is trained. On reopen the vectors are memory-mapped rather than read and the saved
+    clusters are reused instead of retraining; tasks and structures stay on disk and only the matched
+    entry is read.
+    """
+
+    FORMAT = 2
+
+    def __init__(self, path: str = None, embedder=None, threshold: float = 0.6, nprobe: int = 24, exact_below: int = 4096):
+        self.path = path
+        self.embedder = embedder or HashingEmbedder()
+        self.threshold = threshold
+        self.nprobe = nprobe
+        self.exact_below = exact_below
+        self.dim = self.embedder.dim
+        self._lock = threading.Lock()
+        self._vectors = _Vectors(self.dim)
+        self._partitions = {}
+        self._models = []
+        self._model_ids = {}
+        self._count = 0
+        # In memory: (task, structure) per row. On disk: byte offset of each row's line in entries.jsonl.
+        self._entries = []
+        self._offsets = []
+        if path:
+            self._open()
+
+    def _meta_path(self) -> str:
+        return os.path.join(self.path, "meta.json")
+
+    def _vectors_path(self) -> str:
+        return os.path.join(self.path, "vectors.f32")
+
+    def _entries_path(self) -> str:
+        return os.path.join(self.path, "entries.jsonl")
+
+    def _rows_path(self) -> str:
+        return os.path.join(self.path, "rows.i64")
+
+    def _models_path(self) -> str:
+        return os.path.join(self.path, "models.json")
+
+    def _clusters_path(self) -> str:
+        # Cluster of each row added after its partition was last trained; -1 while it was scanned exactly.
+        return os.path.join(self.path, "clusters.i32")
+
+    def _ivf_path(self, model_id: int) -> str:
+        return os.path.join(self.path, f"ivf-{model_id}.npz")
+
+    def _open(self):
+        os.makedirs(self.path, exist_ok=True)
+        meta = {
+            "format": self.FORMAT,
+            "embedder": type(self.embedder).__name__,
+            "dim": self.dim,
+            "template_version": structureCache.TEMPLATE_VERSION,
+        }
+        if os.path.exists(self._meta_path()):
+            with open(self._meta_path()) as f:
+                stored = json.load(f)
+            if stored != meta:
+                raise ValueError(f"Structure index at {self.path} was built with a different format, embedder or discovery templates.")
+        else:
+            with open(self._meta_path(), "w") as f:
+                json.dump(meta, f)
+        if os.path.exists(self._models_path()):
+            with open(self._models_path()) as f:
+                self._models = json.load(f)
+            self._model_ids = {model: model_id for model_id, model in enumerate(self._models)}
+
+        # Writes go vectors, then entry, then row, so the row table decides which rows are complete;
+        # anything a crash left past the last complete row is cut off.
+        rows = np.fromfile(self._rows_path(), dtype=np.int64).reshape(-1, 2) if os.path.exists(self._rows_path()) else np.zeros((0, 2), dtype=np.int64)
+        row_bytes = self.dim * np.dtype(np.float32).itemsize
+        vector_rows = os.path.getsize(self._vectors_path()) // row_bytes if os.path.exists(self._vectors_path()) else 0
+        rows = rows[:vector_rows]
+        entries_end = 0
+        if len(rows):
+            with open(self._entries_path(), "rb") as f:
+                f.seek(int(rows[-1, 0]))
+                entries_end = f.tell() + len(f.readline())
+        for path, size in ((self._rows_path(), rows.nbytes), (self._vectors_path(), len(rows) * row_bytes), (self._entries_path(), entries_end)):
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                with open(path, "ab") as f:
+                    f.truncate(size)
+
+        self._count = len(rows)
+        self._offsets = rows[:, 0].tolist()
+        self._vectors.map(self._vectors_path(), self._count)
+        stored = np.fromfile(self._clusters_path(), dtype=np.int32) if os.path.exists(self._clusters_path()) else np.zeros(0, dtype=np.int32)
+        clusters = np.full(self._count, -1, dtype=np.int32)
+        clusters[:min(len(stored), self._count)] = stored[:self._count]
+        model_ids = rows[:, 1]
+        for model_id in np.unique(model_ids):
+            members = np.flatnonzero(model_ids == model_id)
+            partition = self._partition(self._models[model_id])
+            partition.ids.append(members)
+            if not self._restore(partition, int(model_id), members, clusters) and len(members) >= self.exact_below:
+                # No usable saved clusters, e.g. an index written before they were kept.
+                partition.train()
+                self._save_ivf(partition, int(model_id))
+        if len(stored) != self._count:
+            # Cut back, or filled in for rows a crash left without one.
+            self._write_atomic(self._clusters_path(), clusters.tobytes())
+
+    def _restore(self, partition: _Partition, model_id: int, members: np.ndarray, clusters: np.ndarray) -> bool:
+        # Rebuilds the partition's cluster lists from its saved training plus the per-row clusters added since.
+        if not os.path.exists(self._ivf_path(model_id)):
+            return False
+        try:
+            with np.load(self._ivf_path(model_id), allow_pickle=False) as ivf:
+                centroids, trained, assignment = ivf["centroids"], ivf["ids"], ivf["assignment"]
+        except Exception:
+            return False
+        if len(trained) > len(members) or not np.array_equal(trained, members[:len(trained)]) or centroids.shape[1:] != (self.dim,):
+            return False
+        partition.restore(centroids, trained, assignment)
+        rest = members[len(trained):]
+        missing = rest[(clusters[rest] < 0) | (clusters[rest] >= len(centroids))]
+        clusters[missing] = partition.nearest(missing)
+        partition.assign(rest, clusters[rest])
+        return True
+
+    def _save_ivf(self, partition: _Partition, model_id: int):
+        trained = partition.ids.view()[:partition.trained_on]
+        assignment = np.zeros(len(trained), dtype=np.int32)
+        for cluster, ids in enumerate(partition.lists):
+            assignment[np.searchsorted(trained, ids.view())] = cluster
+        tmp_path = f"{self._ivf_path(model_id)}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, centroids=partition.centroids, ids=trained, assignment=assignment)
+        os.replace(tmp_path, self._ivf_path(model_id))
+
+    def _write_atomic(self, path: str, data: bytes):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _partition(self, model: str) -> _Partition:
+        partition = self._partitions.get(model)
+        if partition is None:
+            partition = self._partitions[model] = _Partition(self._vectors, self.nprobe, self.exact_below)
+        return partition
+
+    def _model_id(self, model: str) -> int:
+        model_id = self._model_ids.get(model)
+        if model_id is None:
+            model_id = self._model_ids[model] = len(self._models)
+            self._models.append(model)
+            if self.path:
+                tmp_path = f"{self._models_path()}.{os.getpid()}.tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump(self._models, f)
+                os.replace(tmp_path, self._models_path())
+        return model_id
+
+    def add(self, task: str, structure: dict, model: str = None):
+        self.add_batch([task], [structure], model)
+
+    def add_batch(self, tasks: list, structures: list, model: str = None):
+        vectors = self.embedder.embed_batch(tasks)
+        with self._lock:
+            ids = np.arange(self._count, self._count + len(tasks))
+            if self.path:
+                model_id = self._model_id(model)
+                with open(self._vectors_path(), "ab") as f:
+                    f.write(vectors.tobytes())
+                offsets = []
+                with open(self._entries_path(), "ab") as f:
+                    for task, structure in zip(tasks, structures):
+                        offsets.append(f.tell())
+                        f.write((json.dumps({"task": task, "structure": structure, "model": model}) + "\n").encode("utf-8"))
+                with open(self._rows_path(), "ab") as f:
+                    f.write(np.array([(offset, model_id) for offset in offsets], dtype=np.int64).tobytes())
+                self._offsets.extend(offsets)
+            else:
+                self._entries.extend(zip(tasks, structures))
+            self._vectors.append(vectors)
+            assignment = self._partition(model).add(ids)
+            if self.path:
+                if assignment is None:
+                    self._save_ivf(self._partition(model), model_id)
+                    assignment = np.full(len(ids), -1, dtype=np.int32)
+                with open(self._clusters_path(), "ab") as f:
+                    f.write(assignment.astype(np.int32).tobytes())
+            self._count += len(tasks)
+
+    def _entry(self, row: int) -> tuple:
+        if not self.path:
+            return self._entries[row]
+        with open(self._entries_path(), "rb") as f:
+            f.seek(self._offsets[row])
+            entry = json.loads(f.readline())
+        return (entry["task"], entry["structure"])
+
+    def search_batch(self, tasks: list, model: str = None) -> list:
+        """Best match among the entries added for `model`, per task, or None when there are none."""
+        queries = self.embedder.embed_batch(tasks)
+        with self._lock:
+            partition = self._partitions.get(model)
+            if partition is None:
+                return [None] * len(tasks)
+            best = [partition.best(query) for query in queries]
+        matches = []
+        for row, score in best:
+            if row < 0:
+                matches.append(None)
+                continue
+            task, structure = self._entry(row)
+            matches.append(Match(task=task, structure=structure, score=score))
+        return matches
+
+    def search(self, task: str, model: str = None) -> Match:
+        return self.search_batch([task], model)[0]
+
+    def lookup(self, task: str, model: str = None) -> Match:
+        match = self.search(task, model)
+        if match is None or match.score < self.threshold:
+            return None
+        return match
+
+    def __len__(self):
+        return self._count
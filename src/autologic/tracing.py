@@ -0,0 +1,258 @@
+from collections import deque
+import contextvars
+import functools
+import itertools
+import threading
+import asyncio
+import atexit
+import json
+import time
+import os
+
+# Opt-in span recorder. `span` is a no-op until `enable` is called, like the metrics module.
+
+_current = contextvars.ContextVar("autologic_span",default=None)
+
+
+class Span:
+    __slots__ = ("tracer", "name", "category", "args", "trace", "id", "parent", "track", "start", "seconds", "error", "_token")
+
+    def __init__(self, tracer: "Tracer", name: str, category: str, args: dict):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+        self.error = None
+
+    def set(self, **args):
+        self.args.update(args)
+
+    def __enter__(self):
+        parent = _current.get()
+        self.id = next(self.tracer._ids)
+        # Spans opened outside any other span start a new trace: one timeline per request.
+        self.trace = parent.trace if parent is not None else self.id
+        self.parent = parent.id if parent is not None else None
+        self.track = _track()
+        self._token = _current.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self.start
+        _current.reset(self._token)
+        if exc is not None:
+            self.error = str(exc) or exc_type.__name__
+        self.tracer.record(self)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def set(self, **args):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+
+def _track() -> int:
+    # Concurrent asyncio tasks share a thread, so each task gets its own track.
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    return id(task) if task is not None else threading.get_ident()
+
+
+class Tracer:
+    """Keeps the most recent `max_spans` finished spans and exports them.
+
+    With `jsonl_path`, every span is also appended to that file as it finishes, so a trace of a
+    long-running process can be followed live and survives a crash.
+    """
+
+    def __init__(self, max_spans: int = 100_000, jsonl_path: str = None):
+        self.spans = deque(maxlen=max_spans)
+        self.origin = time.perf_counter()
+        self.wall_origin = time.time()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._file = open(jsonl_path,"a",buffering=1) if jsonl_path else None
+
+    def record(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+            if self._file is not None:
+                self._file.write(json.dumps(self._record(span)) + "\n")
+
+    def _record(self, span: Span) -> dict:
+        record = {
+            "trace": span.trace,
+            "id": span.id,
+            "parent": span.parent,
+            "name": span.name,
+            "category": span.category,
+            "time": self.wall_origin + (span.start - self.origin),
+            "seconds": span.seconds,
+            "args": span.args,
+        }
+        if span.error is not None:
+            record["error"] = span.error
+        return record
+
+    def records(self) -> list:
+        with self._lock:
+            return [self._record(span) for span in self.spans]
+
+    def chrome(self) -> dict:
+        """Chrome trace-event JSON: one process per trace, one thread per thread or asyncio task."""
+        with self._lock:
+            spans = list(self.spans)
+        tracks = {}
+        names = {}
+        trace_events = []
+        for span in spans:
+            tid = tracks.setdefault(span.track,len(tracks) + 1)
+            if span.parent is None:
+                names[span.trace] = f"{span.trace}: {span.name}" + (f" {span.args['task']}" if "task" in span.args else "")
+            args = dict(span.args,id=span.id,parent=span.parent)
+            if span.error is not None:
+                args["error"] = span.error
+            trace_events.append({
+                "name": span.name,
+                "cat": span.category,
+                "ph": "X",
+                "ts": round((span.start - self.origin) * 1e6,3),
+                "dur": round(span.seconds * 1e6,3),
+                "pid": span.trace,
+                "tid": tid,
+                "args": args,
+            })
+        for trace, name in names.items():
+            trace_events.append({"name": "process_name", "ph": "M", "pid": trace, "args": {"name": name}})
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+    def export(self, path: str):
+        """Write the trace to `path`: JSON lines for a .jsonl path, Chrome trace-event JSON otherwise."""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory,exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path,"w") as f:
+            if path.endswith(".jsonl"):
+                for record in self.records():
+                    f.write(json.dumps(record) + "\n")
+            else:
+                json.dump(self.chrome(),f)
+        os.replace(tmp_path,path)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+_tracer = None
+_export_path = None
+_atexit_registered = False
+
+
+def enable(path: str = None, max_spans: int = 100_000) -> Tracer:
+    """Start recording spans. With `path`, the trace is written there on `flush` and at exit;
+    a .jsonl path is appended to as spans finish instead."""
+    global _tracer, _export_path, _atexit_registered
+    live = path is not None and path.endswith(".jsonl")
+    _tracer = Tracer(max_spans=max_spans,jsonl_path=path if live else None)
+    _export_path = None if live else path
+    if not _atexit_registered:
+        atexit.register(flush)
+        _atexit_registered = True
+    return _tracer
+
+
+def disable():
+    global _tracer, _export_path
+    flush()
+    if _tracer is not None:
+        _tracer.close()
+    _tracer = None
+    _export_path = None
+
+
+def tracer() -> Tracer:
+    return _tracer
+
+
+def enabled() -> bool:
+    return _tracer is not None
+
+
+def span(name: str, category: str = "engine", **args):
+    if _tracer is None:
+        return _NULL_SPAN
+    return Span(_tracer,name,category,args)
+
+
+def detach(spans: list, start: float) -> list:
+    """Plain records of finished `spans`, timed from `start`, that `adopt` can replay in another process."""
+    positions = {span.id: position for position, span in enumerate(spans)}
+    return [
+        {"name": span.name, "category": span.category, "args": span.args, "error": span.error,
+         "offset": span.start - start, "seconds": span.seconds, "parent": positions.get(span.parent)}
+        for span in spans
+    ]
+
+
+def adopt(records: list, start: float):
+    """Record spans detached in another process as children of the current span, shifted to `start`."""
+    if _tracer is None or not records:
+        return
+    parent = _current.get()
+    ids = [next(_tracer._ids) for _ in records]
+    for record, span_id in zip(records,ids):
+        span = Span(_tracer,record["name"],record["category"],record["args"])
+        span.id = span_id
+        if record["parent"] is not None:
+            span.parent = ids[record["parent"]]
+        else:
+            span.parent = parent.id if parent is not None else None
+        span.trace = parent.trace if parent is not None else ids[-1]
+        span.track = parent.track if parent is not None else _track()
+        span.start = start + record["offset"]
+        span.seconds = record["seconds"]
+        span.error = record["error"]
+        _tracer.record(span)
+
+
+def traced(name: str, category: str = "engine"):
+    """Decorator wrapping every call of a function taking `task` first in a span carrying the task."""
+    def decorate(function):
+        def task_args(args, kwargs) -> dict:
+            if _tracer is None:
+                return {}
+            task = kwargs["task"] if "task" in kwargs else args[0] if args else None
+            return {"task": task[:120]} if isinstance(task,str) else {}
+        if asyncio.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                with span(name,category,**task_args(args,kwargs)):
+                    return await function(*args,**kwargs)
+            return async_wrapper
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name,category,**task_args(args,kwargs)):
+                return function(*args,**kwargs)
+        return wrapper
+    return decorate
+
+
+def flush():
+    if _tracer is not None and _export_path:
+        _tracer.export(_export_path)
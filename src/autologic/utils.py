@@ -1,8 +1,24 @@
 from . import config 
+from . import jsonRepair
+from . import tracing
+from dataclasses import dataclass
 import json
 import re
+import time
 import datetime
 
+
+@dataclass
+class ClientStats:
+    created: int = 0
+    reused: int = 0
+
+    @property
+    def reuse_rate(self) -> float:
+        total = self.created + self.reused
+        return self.reused / total if total else 0.0
+
+
 def id_to_rm(id: int) -> str:
     try:
         return config.REASONING_MODULES_LIST[id]
@@ -10,38 +26,28 @@ def id_to_rm(id: int) -> str:
         raise ValueError("Invalid ID")
     pass
 
-def rm_list() -> str: 
+def rm_list(abbreviated: bool = False) -> str: 
     module_list_str = ""
+    modules = config.REASONING_MODULES_SHORT_LIST if abbreviated else config.REASONING_MODULES_LIST
     
-    for id, module in enumerate(config.REASONING_MODULES_LIST):
+    for id, module in enumerate(modules):
         module_list_str += f"{id}. {module}\n"
         
     return module_list_str
 
-def extractJSONToDict(response: str,language_identifer_optional = True):
-    # Define the pattern
-    if language_identifer_optional:
-        pattern = r"```(?:json)?\s*(.*?)```"
-    else: 
-        pattern = r"```json\s*(.*?)```"
-    matches = re.findall(pattern, response, flags=re.DOTALL)  
-
-    json_str = None
-    if matches:
-        json_str = matches[0]
-    else:
-        print("No JSON found in the text.")
-        print(json_str)
-        raise Exception("No JSON Found")
-
-    selection = None
-    if json_str:
+def extractJSONToDict(response: str,language_identifer_optional = True,allow_partial = False):
+    # Tolerates unfenced or unclosed blocks and repairs common defects; see jsonRepair.extract.
+    with tracing.span("extractJSONToDict","extract",chars=len(response or "")) as span:
         try:
-            selection = json.loads(json_str)
-        except:
-            raise Exception("Unable to instantiate JSON.")
-        
-    return selection
+            extraction = jsonRepair.extract(response,language_identifer_optional)
+        except ValueError:
+            # The caller's retry logs the error; stdout may be carrying the CLI's or a server's output.
+            raise Exception("No JSON Found")
+        span.set(repairs=extraction.repairs,complete=extraction.complete)
+
+    if not extraction.complete and not allow_partial:
+        raise jsonRepair.IncompleteJSON("Unable to instantiate JSON: the response was cut short.",value=extraction.value)
+    return extraction.value
 
 def extractMDBlock(response: str,language_identifer_optional = True):
     # Define the pattern
@@ -49,7 +55,8 @@ def extractMDBlock(response: str,language_identifer_optional = True):
         pattern = r"```(?:md)?\s*(.*?)```"
     else: 
         pattern = r"```md\s*(.*?)```"
-    matches = re.findall(pattern, response, flags=re.DOTALL)  
+    with tracing.span("extractMDBlock","extract",chars=len(response or "")):
+        matches = re.findall(pattern, response, flags=re.DOTALL)  
 
     md_str = None
     if matches:
@@ -61,5 +68,88 @@ def extractMDBlock(response: str,language_identifer_optional = True):
 
     return md_str
 
+class BlockScanner:
+    """Incrementally scans a streamed response for the first complete code block.
+
+    `feed` returns True once the block the extractors above would pick is complete: the first
+    triple back-tick fence has been closed or, for JSON responses that start with a bare object
+    (JSON mode), that object is balanced. The backend can then stop generating, unless
+    `stop_at_block` is False. `on_chunk` is called with every chunk as it arrives.
+    """
+
+    def __init__(self, json_block: bool = True, stop_at_block: bool = True, on_chunk=None):
+        self.json_block = json_block
+        self.stop_at_block = stop_at_block
+        self.on_chunk = on_chunk
+        self.text = ""
+        self.chunks = 0
+        self.complete = False
+        self.early_stop = False
+        self._started = time.perf_counter()
+        self.elapsed = 0.0
+        self._search_from = 0
+        self._block_start = None
+        self._bare = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> bool:
+        self.chunks += 1
+        self.text += chunk
+        self.elapsed = time.perf_counter() - self._started
+        if self.on_chunk is not None:
+            self.on_chunk(chunk)
+        if not self.complete:
+            self.complete = self._scan()
+        return self.complete and self.stop_at_block
+
+    def _scan(self) -> bool:
+        if self._bare is None and self.text.strip():
+            self._bare = self.json_block and self.text.lstrip().startswith("{")
+            self._search_from = len(self.text) - len(self.text.lstrip())
+        if self._bare:
+            return self._scan_object()
+
+        if self._block_start is None:
+            start = self.text.find("```",self._search_from)
+            if start < 0:
+                # A fence may be split across chunks.
+                self._search_from = max(0,len(self.text) - 2)
+                return False
+            self._block_start = start + 3
+            self._search_from = self._block_start
+        end = self.text.find("```",self._search_from)
+        if end < 0:
+            self._search_from = max(self._block_start,len(self.text) - 2)
+            return False
+        return True
+
+    def _scan_object(self) -> bool:
+        for position in range(self._search_from,len(self.text)):
+            char = self.text[position]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    return True
+        self._search_from = len(self.text)
+        return False
+
+    def report(self) -> str:
+        how = "stopped once the block was complete" if self.early_stop else "ran to completion"
+        return f"streamed {self.chunks} chunks ({len(self.text)} chars) in {self.elapsed:.2f}s, {how}"
+
+
 def log_print(msg):
     print(f"{datetime.datetime.now()} | {msg}")
\ No newline at end of file
@@ -0,0 +1,24 @@
+from autologic import backends
+from autologic import reasoningEngine
+from autologic.bench import FakeBackend
+from autologic.bench.runner import BACKEND_NAME, TASKS
+import pytest
+
+
+@pytest.fixture
+def fake_backend():
+    backend = FakeBackend()
+    backends.register_backend(BACKEND_NAME,backend)
+    yield backend
+    backends.unregister_backend(BACKEND_NAME)
+
+
+@pytest.fixture
+def llm_config(fake_backend):
+    # Greedy, so the response cache applies.
+    return reasoningEngine.LLMConfig(model_type=BACKEND_NAME,model_name="fake",temp=0.0)
+
+
+@pytest.fixture
+def task():
+    return TASKS[0]
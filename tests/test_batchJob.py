@@ -0,0 +1,92 @@
+from autologic import batchJob
+from autologic import structureCache
+from autologic.batchJob import BatchJobConfig
+import json
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def fresh_structure_cache():
+    structureCache.set_default_cache(structureCache.MemoryStructureCache())
+    yield
+    structureCache.set_default_cache(None)
+
+
+def write_lines(path, items):
+    with open(path,"a") as f:
+        for item in items:
+            f.write(json.dumps(item) + "\n")
+
+
+def read_results(path) -> list:
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_runs_every_task(llm_config, tmp_path):
+    input_path, output_path = tmp_path / "tasks.jsonl", tmp_path / "results.jsonl"
+    write_lines(input_path,["Add 2 and 3.", {"task": "Add 4 and 5.", "id": "b"}, {"no_task": 1}])
+    with open(input_path,"a") as f:
+        f.write("\n")
+    summary = batchJob.run_job(BatchJobConfig(str(input_path),str(output_path),llm_config,concurrency=2))
+    assert (summary.completed, summary.failed) == (3, 1)
+    results = {record["line"]: record for record in read_results(output_path)}
+    assert results[0]["answer"] == "42" and results[0]["id"] == 0
+    assert results[1]["id"] == "b"
+    assert "task" in results[2]["error"]
+
+
+def test_family_shares_one_discovery(fake_backend, llm_config, tmp_path):
+    input_path, output_path = tmp_path / "tasks.jsonl", tmp_path / "results.jsonl"
+    write_lines(input_path,[{"task": f"Add {n} and {n + 1}.", "family": "sums"} for n in range(4)])
+    batchJob.run_job(BatchJobConfig(str(input_path),str(output_path),llm_config))
+    # Three discovery calls, then one solve call per task.
+    assert fake_backend.calls == 3 + 4
+    assert len({json.dumps(record["reasoning_structure"]) for record in read_results(output_path)}) == 1
+
+
+def test_resumes_from_checkpoint(llm_config, tmp_path):
+    input_path, output_path = tmp_path / "tasks.jsonl", tmp_path / "results.jsonl"
+    write_lines(input_path,[f"Add {n} and {n + 1}." for n in range(3)])
+    config = BatchJobConfig(str(input_path),str(output_path),llm_config)
+    batchJob.run_job(config)
+    # More input arrives, and a crash left half a result behind the checkpoint.
+    write_lines(input_path,[f"Add {n} and {n + 1}." for n in range(3,5)])
+    with open(output_path,"a") as f:
+        f.write('{"line": 3, "ans')
+    summary = batchJob.run_job(config)
+    assert (summary.resumed_from, summary.completed) == (3, 2)
+    assert sorted(record["line"] for record in read_results(output_path)) == [0, 1, 2, 3, 4]
+
+
+def test_resume_false_starts_over(llm_config, tmp_path):
+    input_path, output_path = tmp_path / "tasks.jsonl", tmp_path / "results.jsonl"
+    write_lines(input_path,["Add 2 and 3."])
+    batchJob.run_job(BatchJobConfig(str(input_path),str(output_path),llm_config))
+    summary = batchJob.run_job(BatchJobConfig(str(input_path),str(output_path),llm_config,resume=False))
+    assert (summary.resumed_from, summary.completed) == (0, 1)
+    assert len(read_results(output_path)) == 1
+
+
+def test_checkpoint_of_other_input_is_rejected(llm_config, tmp_path):
+    input_path, output_path = tmp_path / "tasks.jsonl", tmp_path / "results.jsonl"
+    write_lines(input_path,["Add 2 and 3."])
+    batchJob.run_job(BatchJobConfig(str(input_path),str(output_path),llm_config))
+    other_path = tmp_path / "other.jsonl"
+    write_lines(other_path,["Add 2 and 3."])
+    with pytest.raises(ValueError):
+        batchJob.run_job(BatchJobConfig(str(other_path),str(output_path),llm_config))
+
+
+def test_checkpoint_watermark_waits_for_oldest_pending(tmp_path):
+    checkpoint = batchJob.Checkpoint(str(tmp_path / "checkpoint"),str(tmp_path / "tasks.jsonl"))
+    for line, offset in ((0, 0), (1, 10), (2, 20)):
+        checkpoint.read(line,offset + 10)
+        checkpoint.submit(line,offset)
+    checkpoint.complete(1,100,False)
+    assert (checkpoint.line, checkpoint.offset, checkpoint.done) == (0, 0, {1})
+    checkpoint.complete(0,200,True)
+    assert (checkpoint.line, checkpoint.offset, checkpoint.done) == (2, 20, set())
+    checkpoint.save()
+    loaded = batchJob.Checkpoint.load(checkpoint.path,str(tmp_path / "tasks.jsonl"))
+    assert (loaded.line, loaded.offset, loaded.completed, loaded.failed, loaded.output_bytes) == (2, 20, 2, 1, 200)
@@ -0,0 +1,109 @@
+from autologic import backends
+from autologic import cascade
+from autologic import reasoningEngine
+from autologic.bench import FakeBackend, fakeBackend
+import asyncio
+import json
+import pytest
+
+STRUCTURE = {"Reasoning Structure": fakeBackend._STRUCTURE}
+
+
+def answer_response(answer: str) -> str:
+    filled = fakeBackend._fill(STRUCTURE)
+    filled["Reasoning Structure"]["FINAL_ANSWER"] = answer
+    return "```json\n" + json.dumps(filled) + "\n```"
+
+
+@pytest.fixture
+def tiers():
+    # Two fake backends, cheap first.
+    names = ["cascade-cheap", "cascade-strong"]
+    fakes = [FakeBackend(), FakeBackend()]
+    for name, fake in zip(names,fakes):
+        backends.register_backend(name,fake)
+    yield [(fake, reasoningEngine.LLMConfig(model_type=name,model_name=name,temp=0.0)) for name, fake in zip(names,fakes)]
+    for name in names:
+        backends.unregister_backend(name)
+
+
+def policy(tiers, **cheap_options) -> cascade.CascadePolicy:
+    return cascade.CascadePolicy([cascade.CascadeTier(tiers[0][1],**cheap_options),cascade.CascadeTier(tiers[1][1])])
+
+
+def solve(policy: cascade.CascadePolicy, use_async: bool) -> str:
+    if use_async:
+        return asyncio.run(policy.async_solve_with_structure("What is 6 * 7?",STRUCTURE))
+    return policy.solve_with_structure("What is 6 * 7?",STRUCTURE)
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_cheap_tier_serves_when_it_can(tiers, use_async):
+    cheap = policy(tiers)
+    assert solve(cheap,use_async) == "42"
+    assert tiers[1][0].calls == 0
+    assert [(stats.attempts, stats.served) for stats in cheap.stats] == [(1, 1), (0, 0)]
+    assert cheap.stats[0].calls == 1 and cheap.stats[0].estimated_tokens > 0
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_failing_tier_escalates(tiers, use_async):
+    tiers[0][0].malformed_rate = 1.0
+    failing = policy(tiers,retries=2)
+    assert solve(failing,use_async) == "42"
+    assert tiers[0][0].calls == 2 and tiers[1][0].calls == 1
+    assert (failing.stats[0].failures, failing.stats[1].served) == (1, 1)
+    assert failing.stats[0].hit_rate == 0.0
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_slow_tier_times_out(tiers, use_async):
+    tiers[0][0].latency = 2.0
+    slow = policy(tiers,timeout=0.05)
+    assert solve(slow,use_async) == "42"
+    assert (slow.stats[0].timeouts, slow.stats[1].served) == (1, 1)
+    assert slow.stats[0].seconds < 1.0
+
+
+def test_disagreeing_samples_escalate(tiers):
+    tiers[0][0].responses = {"solve": [answer_response("41"), answer_response("42"), answer_response("43")]}
+    sampled = policy(tiers,samples=3)
+    assert solve(sampled,False) == "42"
+    assert sampled.stats[0].low_agreement == 1 and tiers[0][0].calls == 3
+
+
+def test_agreeing_samples_serve(tiers):
+    tiers[0][0].responses = {"solve": [answer_response("42"), answer_response(" 42 "), answer_response("41")]}
+    sampled = policy(tiers,samples=3)
+    assert solve(sampled,False) == "42"
+    assert tiers[1][0].calls == 0
+
+
+def test_all_tiers_failing_raises(tiers):
+    for fake, _ in tiers:
+        fake.failure_rate = 1.0
+    failing = policy(tiers)
+    with pytest.raises(Exception, match="All cascade tiers failed: cascade-cheap: failure .*; cascade-strong: failure"):
+        solve(failing,False)
+    assert "served 0/1 attempts" in failing.report()
+
+
+def test_solve_uses_the_cascade(tiers, fake_backend, llm_config, task):
+    cheap = policy(tiers)
+    assert reasoningEngine.solve(task,llm_config,cascade=cheap) == "42"
+    assert fake_backend.calls == 3 and tiers[0][0].calls == 1
+    assert cheap.requests == 1
+
+
+def test_load_policy(tiers, tmp_path):
+    path = tmp_path / "cascade.json"
+    path.write_text(json.dumps([
+        {"model_type": "cascade-cheap", "temp": 0.0, "timeout": 5, "samples": 3, "cost_per_1k_tokens": 0.1},
+        {"model_type": "openai", "model_name": "gpt-4"},
+    ]))
+    loaded = cascade.load_policy(str(path))
+    assert [tier.name for tier in loaded.tiers] == ["cascade-cheap", "gpt-4"]
+    assert (loaded.tiers[0].timeout, loaded.tiers[0].samples, loaded.tiers[0].cost_per_1k_tokens) == (5, 3, 0.1)
+    assert loaded.tiers[1].llmConfig.model_type == reasoningEngine.ModelType.OPENAI
+    with pytest.raises(ValueError):
+        cascade.CascadePolicy([])
@@ -0,0 +1,99 @@
+from autologic import events
+from autologic import reasoningEngine
+from autologic import structureCache
+from autologic.bench import fakeBackend
+from autologic.reasoningEngine import DiscoveryMode
+import asyncio
+import json
+import pytest
+
+TOKEN_PHASES = ("select", "adapt", "implement", "solve")
+
+
+def event_names(stream: list) -> list:
+    # Consecutive tokens collapsed into one entry.
+    names = []
+    for event in stream:
+        name = type(event).__name__
+        if not (name == "Token" and names and names[-1] == "Token"):
+            names.append(name)
+    return names
+
+
+def tokens_by_phase(stream: list) -> dict:
+    text = {}
+    for event in stream:
+        if isinstance(event,events.Token):
+            text[event.phase] = text.get(event.phase,"") + event.text
+    return text
+
+
+def test_solve_stream_yields_the_pipeline_in_order(fake_backend, llm_config, task):
+    stream = list(reasoningEngine.solve_stream(task,llm_config))
+    assert event_names(stream) == [
+        "PhaseStarted", "Token", "PhaseFinished", "ModulesSelected",
+        "PhaseStarted", "Token", "PhaseFinished", "ModulesAdapted",
+        "PhaseStarted", "Token", "PhaseFinished", "StructureReady",
+        "PhaseStarted", "Token", "PhaseFinished", "Answer",
+    ]
+    assert [event.phase for event in stream if isinstance(event,events.PhaseStarted)] == list(TOKEN_PHASES)
+    assert all(event.ok for event in stream if isinstance(event,events.PhaseFinished))
+    # Tokens carry each phase's whole response, even without LLMConfig.stream.
+    assert tokens_by_phase(stream)["select"] == fakeBackend.synthetic_response("select","")
+    selected = next(event for event in stream if isinstance(event,events.ModulesSelected))
+    assert selected.ids == [1, 15, 32] and all(selected.modules)
+    ready = next(event for event in stream if isinstance(event,events.StructureReady))
+    assert ready.source == "discovered" and list(ready.reasoning_structure) == ["Reasoning Structure"]
+    assert stream[-1].answer == "42"
+
+
+def test_rejected_responses_yield_retries(fake_backend, llm_config, task):
+    fake_backend.responses = {"select": ["I am not sure how to format this.", fakeBackend.synthetic_response("select","")]}
+    stream = list(reasoningEngine.solve_stream(task,llm_config))
+    retries = [event for event in stream if isinstance(event,events.Retry)]
+    assert [event.phase for event in retries] == ["select"]
+    finished = [(event.phase, event.ok) for event in stream if isinstance(event,events.PhaseFinished)]
+    assert finished[:2] == [("select", False), ("select", True)]
+    assert isinstance(stream[-1],events.Answer)
+
+
+def test_failure_ends_the_stream(fake_backend, llm_config, task):
+    fake_backend.failure_rate = 1.0
+    stream = list(reasoningEngine.solve_stream(task,llm_config,retries=1))
+    assert isinstance(stream[-1],events.Failed) and stream[-1].error
+    assert not any(isinstance(event,events.Answer) for event in stream)
+
+
+@pytest.mark.parametrize("discovery_mode, source", [(DiscoveryMode.FUSED, "fused"), (DiscoveryMode.THREE_STEP, "cache")])
+def test_structure_source(fake_backend, llm_config, task, discovery_mode, source):
+    cache = structureCache.MemoryStructureCache()
+    if source == "cache":
+        reasoningEngine.self_discover(task,llm_config,cache=cache)
+    stream = list(reasoningEngine.solve_stream(task,llm_config,reuse_structure=True,structure_cache=cache,discovery_mode=discovery_mode))
+    assert [event.source for event in stream if isinstance(event,events.StructureReady)] == [source]
+
+
+def test_async_solve_stream(fake_backend, llm_config, task):
+    async def collect():
+        return [event async for event in reasoningEngine.async_solve_stream(task,llm_config)]
+    stream = asyncio.run(collect())
+    assert event_names(stream)[-4:] == ["PhaseStarted", "Token", "PhaseFinished", "Answer"]
+    assert set(tokens_by_phase(stream)) == set(TOKEN_PHASES)
+
+
+def test_closing_the_async_stream_cancels_the_solve(fake_backend, llm_config, task):
+    fake_backend.latency = 0.05
+
+    async def first_phase():
+        stream = reasoningEngine.async_solve_stream(task,llm_config)
+        first = await stream.__anext__()
+        await stream.aclose()
+        await asyncio.sleep(0.3)
+        return first
+    assert asyncio.run(first_phase()) == events.PhaseStarted(phase="select")
+    assert fake_backend.calls == 1
+
+
+def test_to_dict_is_json_ready():
+    event = events.StructureReady(reasoning_structure={"FINAL_ANSWER": ""},source="index")
+    assert json.loads(json.dumps(events.to_dict(event))) == {"event": "StructureReady", "reasoning_structure": {"FINAL_ANSWER": ""}, "source": "index"}
@@ -0,0 +1,83 @@
+from autologic import reasoningEngine
+from autologic.reasoningEngine import DiscoveryMode
+import json
+import pytest
+
+validate_fused = getattr(reasoningEngine,"__validate_fused")
+
+STRUCTURE = {"Step 1": {"Description": "Add the numbers.", "Result": ""}, "FINAL_ANSWER": ""}
+
+
+def discovery(**changes) -> dict:
+    return dict(dict(reasoning_modules=[1, 15], adapted_modules=["Add the numbers.", "Check the sum."], reasoning_structure=STRUCTURE),**changes)
+
+
+def test_valid_discovery():
+    selection, adapted_modules, reasoning_structure = validate_fused(discovery())
+    assert selection == {"reasoning_modules": [1, 15]}
+    assert adapted_modules == "- Add the numbers.\n- Check the sum.\n"
+    assert reasoning_structure == STRUCTURE
+
+
+def test_lenient_shapes_are_normalized():
+    selection, adapted_modules, reasoning_structure = validate_fused(discovery(
+        reasoning_modules=["1", 15],
+        adapted_modules="Add the numbers.",
+        reasoning_structure={"Reasoning Structure": STRUCTURE}
+    ))
+    assert selection == {"reasoning_modules": [1, 15]}
+    assert adapted_modules == "- Add the numbers.\n"
+    assert reasoning_structure == STRUCTURE
+
+
+@pytest.mark.parametrize("changes", [
+    dict(reasoning_modules=[]),
+    dict(reasoning_modules=[1, 2, 3, 4, 5, 6]),
+    dict(reasoning_modules=["one"]),
+    dict(reasoning_modules=[-1]),
+    dict(reasoning_modules=[len(reasoningEngine.config.REASONING_MODULES_LIST)]),
+    dict(adapted_modules=[]),
+    dict(adapted_modules=["  "]),
+    dict(reasoning_structure={"Step 1": ""}),
+    dict(reasoning_structure={"FINAL_ANSWER": ""}),
+    dict(reasoning_structure="Step 1 then FINAL_ANSWER"),
+])
+def test_invalid_discovery(changes):
+    with pytest.raises(ValueError):
+        validate_fused(discovery(**changes))
+
+
+def test_not_an_object():
+    with pytest.raises(ValueError):
+        validate_fused([1, 15])
+
+
+def test_fused_mode_makes_one_call(fake_backend, llm_config, task):
+    reasoning_structure = reasoningEngine.self_discover(task,llm_config,discovery_mode=DiscoveryMode.FUSED)
+    assert fake_backend.calls == 1
+    assert reasoning_structure == reasoningEngine.self_discover(task,llm_config)
+
+
+@pytest.mark.parametrize("response", [
+    "I am not sure how to format this.",
+    "```json\n" + json.dumps(dict(discovery(),reasoning_modules=[999])) + "\n```",
+])
+def test_invalid_fused_response_falls_back_to_three_steps(fake_backend, llm_config, task, response):
+    fake_backend.responses = {"fused": [response]}
+    reasoning_structure = reasoningEngine.self_discover(task,llm_config,discovery_mode=DiscoveryMode.FUSED)
+    assert fake_backend.calls == 1 + 3
+    assert list(reasoning_structure["Reasoning Structure"])[-1] == "FINAL_ANSWER"
+
+
+@pytest.mark.parametrize("mode, phase, structure", [
+    (DiscoveryMode.THREE_STEP, "implement", STRUCTURE),
+    (DiscoveryMode.THREE_STEP, "implement", {"Reasoning Structure": STRUCTURE}),
+    (DiscoveryMode.FUSED, "fused", discovery()),
+    (DiscoveryMode.FUSED, "fused", discovery(reasoning_structure={"Reasoning Structure": STRUCTURE})),
+])
+def test_discovered_structures_share_one_shape(fake_backend, llm_config, task, mode, phase, structure):
+    fake_backend.responses = {phase: ["```json\n" + json.dumps(structure) + "\n```"]}
+    cache = reasoningEngine.structureCache.MemoryStructureCache()
+    reasoning_structure = reasoningEngine.self_discover(task,llm_config,cache=cache,discovery_mode=mode)
+    assert reasoning_structure == {"Reasoning Structure": STRUCTURE}
+    assert cache.get(reasoningEngine.structureCache.cache_key(task,llm_config)) == reasoning_structure
@@ -0,0 +1,60 @@
+import asyncio
+import pytest
+
+pytest.importorskip("google.generativeai")
+from autologic import gemini
+
+
+class FakeClient:
+    def __init__(self, client_options):
+        self.api_key = client_options["api_key"]
+        self.requests = []
+
+    def _response(self, request):
+        self.requests.append(request)
+        return gemini.genai.protos.GenerateContentResponse(
+            candidates=[{"content": {"parts": [{"text": f"{self.api_key}:{request.contents[0].parts[0].text}"}]}}],
+            usage_metadata={"prompt_token_count": 3, "candidates_token_count": 1},
+        )
+
+    def generate_content(self, request, timeout=None):
+        return self._response(request)
+
+
+class FakeAsyncClient(FakeClient):
+    async def generate_content(self, request, timeout=None):
+        await asyncio.sleep(0.01)
+        return self._response(request)
+
+
+@pytest.fixture
+def fake_clients(monkeypatch):
+    monkeypatch.setattr(gemini.glm,"GenerativeServiceClient",FakeClient)
+    monkeypatch.setattr(gemini.glm,"GenerativeServiceAsyncClient",FakeAsyncClient)
+    monkeypatch.setattr(gemini,"_clients",{})
+    monkeypatch.setattr(gemini,"_async_clients",gemini.weakref.WeakKeyDictionary())
+
+
+def test_invoke_sends_one_turn_request(fake_clients):
+    assert gemini.invoke("hi",api_key="k1",temp=0.2,max_context=64,json_mode=True) == "k1:hi"
+    request = gemini.get_client("k1").requests[0]
+    assert request.model == f"models/{gemini.DEFAULT_MODEL}"
+    assert request.generation_config.max_output_tokens == 64
+    assert request.generation_config.response_mime_type == "application/json"
+    assert len(request.safety_settings) == len(gemini._safety_settings)
+
+
+def test_concurrent_keys_keep_their_own_async_clients(fake_clients):
+    async def run():
+        answers = await asyncio.gather(*(gemini.async_invoke(f"q{i}",api_key=f"k{i % 2}") for i in range(6)))
+        return answers, gemini.get_async_client("k0"), gemini.get_async_client("k1")
+
+    answers, first, second = asyncio.run(run())
+    assert answers == [f"k{i % 2}:q{i}" for i in range(6)]
+    assert (first.api_key, second.api_key) == ("k0", "k1")
+    assert len(first.requests) == len(second.requests) == 3
+
+    # A new event loop gets new clients.
+    async def client():
+        return gemini.get_async_client("k0")
+    assert asyncio.run(client()) is not first
@@ -0,0 +1,210 @@
+from autologic import grammars
+from autologic import reasoningEngine
+from autologic.bench import fakeBackend
+import dataclasses
+import json
+import pytest
+
+# A small GBNF recognizer covering the syntax grammars.py uses, so grammars can be checked against text without a model.
+_ESCAPES = {"n": "\n", "t": "\t", "r": "\r"}
+
+
+class _Parser:
+    def __init__(self, text: str):
+        self.text = text
+        self.pos = 0
+
+    def peek(self) -> str:
+        while self.pos < len(self.text) and self.text[self.pos] == " ":
+            self.pos += 1
+        return self.text[self.pos] if self.pos < len(self.text) else ""
+
+    def char(self) -> str:
+        char = self.text[self.pos]
+        self.pos += 1
+        if char != "\\":
+            return char
+        escape = self.text[self.pos]
+        self.pos += 1
+        if escape == "x":
+            self.pos += 2
+            return chr(int(self.text[self.pos - 2:self.pos],16))
+        return _ESCAPES.get(escape,escape)
+
+    def alternatives(self):
+        options = [self.sequence()]
+        while self.peek() == "|":
+            self.pos += 1
+            options.append(self.sequence())
+        return ("alt", options)
+
+    def sequence(self):
+        items = []
+        while self.peek() not in ("", "|", ")"):
+            items.append(self.repeat(self.atom()))
+        return ("seq", items)
+
+    def atom(self):
+        start = self.peek()
+        if start == '"':
+            self.pos += 1
+            literal = ""
+            while self.text[self.pos] != '"':
+                literal += self.char()
+            self.pos += 1
+            return ("lit", literal)
+        if start == "[":
+            self.pos += 1
+            negated = self.text[self.pos] == "^"
+            self.pos += negated
+            ranges = []
+            while self.text[self.pos] != "]":
+                low = self.char()
+                high = low
+                if self.text[self.pos] == "-" and self.text[self.pos + 1] != "]":
+                    self.pos += 1
+                    high = self.char()
+                ranges.append((low, high))
+            self.pos += 1
+            return ("cls", negated, ranges)
+        if start == "(":
+            self.pos += 1
+            node = self.alternatives()
+            assert self.peek() == ")"
+            self.pos += 1
+            return node
+        end = self.pos
+        while end < len(self.text) and (self.text[end].isalnum() or self.text[end] == "-"):
+            end += 1
+        name, self.pos = self.text[self.pos:end], end
+        return ("ref", name)
+
+    def repeat(self, node):
+        if self.pos < len(self.text) and self.text[self.pos] in "*+?{":
+            op = self.text[self.pos]
+            self.pos += 1
+            if op == "{":
+                end = self.text.index("}",self.pos)
+                low, high = self.text[self.pos:end].split(",")
+                self.pos = end + 1
+                return ("rep", node, int(low), int(high))
+            return ("rep", node, int(op == "+"), 1 if op == "?" else None)
+        return node
+
+
+def accepts(grammar: str, text: str) -> bool:
+    rules = {}
+    for line in filter(str.strip,grammar.splitlines()):
+        name, body = line.split("::=",1)
+        rules[name.strip()] = _Parser(body).alternatives()
+    memo = {}
+
+    def ends(node, start: int) -> set:
+        key = (id(node), start)
+        if key in memo:
+            return memo[key]
+        kind = node[0]
+        if kind == "lit":
+            result = {start + len(node[1])} if text.startswith(node[1],start) else set()
+        elif kind == "cls":
+            result = {start + 1} if start < len(text) and any(low <= text[start] <= high for low, high in node[2]) != node[1] else set()
+        elif kind == "ref":
+            result = ends(rules[node[1]],start)
+        elif kind == "alt":
+            result = set().union(*(ends(option,start) for option in node[1]))
+        elif kind == "seq":
+            result = {start}
+            for item in node[1]:
+                result = set().union(*(ends(item,position) for position in result))
+        else:
+            _, item, low, high = node
+            result, current, seen, count = set(), {start}, {start}, 0
+            if low == 0:
+                result |= current
+            while current and (high is None or count < high):
+                current = set().union(*(ends(item,position) for position in current)) - seen
+                seen |= current
+                count += 1
+                if count >= low:
+                    result |= current
+        memo[key] = result
+        return result
+
+    return len(text) in ends(rules["root"],0)
+
+
+def fenced(response: str) -> str:
+    # The block a constrained generation produces, without the chatter around it.
+    return response[response.index("```"):response.rindex("```") + 3]
+
+
+def json_block(value) -> str:
+    return "```json\n" + json.dumps(value,indent=2) + "\n```"
+
+
+STRUCTURE = {"Reasoning Structure": {"Step 1": {"Description": "Add the numbers.", "Result": ""}, "FINAL_ANSWER": ""}}
+
+
+@pytest.mark.parametrize("phase, grammar", [
+    ("select", grammars.SELECT_GRAMMAR),
+    ("adapt", grammars.ADAPT_GRAMMAR),
+    ("implement", grammars.IMPLEMENT_GRAMMAR),
+    ("fused", grammars.FUSED_GRAMMAR),
+], ids=["select", "adapt", "implement", "fused"])
+def test_phase_grammars_accept_well_formed_output(phase, grammar):
+    assert accepts(grammar,fenced(fakeBackend.synthetic_response(phase,"")))
+
+
+@pytest.mark.parametrize("grammar, text", [
+    (grammars.SELECT_GRAMMAR, json_block({"reasoning_modules": [len(grammars.config.REASONING_MODULES_LIST)]})),
+    (grammars.SELECT_GRAMMAR, json_block({"reasoning_modules": []})),
+    (grammars.SELECT_GRAMMAR, json_block({"reasoning_modules": [1, 2, 3, 4, 5, 6]})),
+    (grammars.IMPLEMENT_GRAMMAR, json_block({"FINAL_ANSWER": "", "Step 1": ""})),
+    (grammars.IMPLEMENT_GRAMMAR, json_block({"Step 1": ""})),
+    (grammars.ADAPT_GRAMMAR, "```md\n```"),
+], ids=["unknown-module", "no-modules", "six-modules", "answer-first", "no-answer", "empty-md"])
+def test_phase_grammars_reject_malformed_output(grammar, text):
+    assert not accepts(grammar,text)
+
+
+def test_solve_grammar_fixes_keys_and_requires_an_answer():
+    grammar = grammars.solve_grammar(STRUCTURE)
+    filled = {"Reasoning Structure": {"Step 1": {"Description": "Add 2 and 3.", "Result": "5"}, "FINAL_ANSWER": "5"}}
+    assert accepts(grammar,json_block(filled))
+    assert not accepts(grammar,json_block({"Reasoning Structure": dict(filled["Reasoning Structure"],FINAL_ANSWER="")}))
+    assert not accepts(grammar,json_block({"Reasoning Structure": {"FINAL_ANSWER": "5", "Step 1": filled["Reasoning Structure"]["Step 1"]}}))
+    assert not accepts(grammar,json_block({"Reasoning Structure": dict(filled["Reasoning Structure"],Extra="x")}))
+    assert grammars.solve_grammar(json.loads(json.dumps(STRUCTURE))) is grammar
+
+
+def test_structured_output_constrains_every_phase(fake_backend, llm_config, task, monkeypatch):
+    calls = []
+    invoke = fake_backend.invoke
+
+    def recording_invoke(prompt, llmConfig, template=None, scanner=None, **options):
+        response = invoke(prompt,llmConfig,template,scanner)
+        calls.append((fakeBackend.PHASES.get(template,"solve"), options, response))
+        return response
+    monkeypatch.setattr(fake_backend,"invoke",recording_invoke)
+
+    reasoningEngine.solve(task,dataclasses.replace(llm_config,structured_output=True))
+    assert [phase for phase, _, _ in calls] == ["select", "adapt", "implement", "solve"]
+    for phase, options, response in calls:
+        assert options["json_mode"] == (phase != "adapt")
+        assert accepts(options["grammar"],fenced(response))
+
+
+def test_structured_output_is_off_by_default(fake_backend, llm_config, task, monkeypatch):
+    options_seen = []
+    invoke = fake_backend.invoke
+    monkeypatch.setattr(fake_backend,"invoke",lambda prompt, llmConfig, template=None, scanner=None, **options: options_seen.append(options) or invoke(prompt,llmConfig,template,scanner))
+    reasoningEngine.solve(task,llm_config)
+    assert options_seen and all(not options.get("grammar") and not options.get("json_mode") for options in options_seen)
+
+
+def test_bare_json_mode_responses_parse(fake_backend, llm_config, task):
+    # JSON mode returns the object without a fence.
+    fake_backend.responses = {"select": [json.dumps({"reasoning_modules": [1, 15]})], "implement": [json.dumps(STRUCTURE)]}
+    reasoning_structure = reasoningEngine.self_discover(task,dataclasses.replace(llm_config,structured_output=True))
+    assert fake_backend.calls == 3
+    assert reasoning_structure == STRUCTURE
@@ -0,0 +1,112 @@
+from autologic import hedging
+from autologic import reasoningEngine
+from autologic.hedging import HedgePolicy
+import dataclasses
+import threading
+import asyncio
+import time
+import pytest
+
+
+def warm_policy(max_rate: float = 1.0) -> HedgePolicy:
+    # Hedge every call that takes longer than 20ms.
+    policy = HedgePolicy(percentile=0.5,max_rate=max_rate,min_samples=1)
+    policy.latency.observe("solve",0.02)
+    return policy
+
+
+def slow_primary(primary: str = "primary", hedge: str = "hedge", seconds: float = 0.3):
+    def call(hedged: bool) -> str:
+        if hedged:
+            return hedge
+        time.sleep(seconds)
+        return primary
+    return call
+
+
+def test_percentile():
+    tracker = hedging.LatencyTracker(window=4)
+    assert tracker.percentile("a",0.5) is None
+    for seconds in (5.0, 1.0, 2.0, 3.0, 4.0):
+        tracker.observe("a",seconds)
+    assert tracker.count("a") == 4
+    assert (tracker.percentile("a",0.5), tracker.percentile("a",0.95)) == (2.0, 4.0)
+
+
+def test_invalid_percentile():
+    with pytest.raises(ValueError):
+        HedgePolicy(percentile=1.0)
+
+
+def test_no_hedge_while_warming_up():
+    policy = HedgePolicy(min_samples=2)
+    assert policy.run("solve",slow_primary(seconds=0.01),bool) == ("primary", False)
+    assert policy.latency.count("solve") == 1
+    assert policy.stats["solve"].fired == 0
+
+
+def test_hedge_wins_and_primary_latency_is_kept():
+    policy = warm_policy()
+    assert policy.run("solve",slow_primary(),bool) == ("hedge", True)
+    stats = policy.stats["solve"]
+    assert (stats.calls, stats.fired, stats.wins) == (1, 1, 1)
+    # The running primary cannot be interrupted and finishes in the background.
+    assert (stats.cancelled, stats.abandoned) == (0, 1)
+    deadline = time.monotonic() + 5
+    while policy.latency.count("solve") < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert policy.latency.percentile("solve",1.0) >= 0.3
+
+
+def test_hedge_rate_is_capped():
+    policy = warm_policy(max_rate=0.0)
+    assert policy.run("solve",slow_primary(seconds=0.05),bool) == ("primary", False)
+    assert (policy.stats["solve"].fired, policy.stats["solve"].capped) == (0, 1)
+
+
+def test_unparseable_hedge_falls_back_to_primary():
+    policy = warm_policy()
+    assert policy.run("solve",slow_primary(hedge="garbage",seconds=0.05),lambda response: response != "garbage") == ("primary", False)
+    assert policy.stats["solve"].wins == 0
+
+
+def test_failed_hedge_keeps_primary():
+    def call(hedged: bool) -> str:
+        if hedged:
+            raise Exception("hedge failed")
+        time.sleep(0.05)
+        return "primary"
+    assert warm_policy().run("solve",call,bool) == ("primary", False)
+
+
+def test_async_hedge_cancels_primary():
+    policy = warm_policy()
+    cancelled = threading.Event()
+    async def call(hedged: bool) -> str:
+        if hedged:
+            return "hedge"
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        return "primary"
+    async def main():
+        result = await policy.async_run("solve",call,bool)
+        await asyncio.sleep(0)
+        return result
+    assert asyncio.run(main()) == ("hedge", True)
+    assert cancelled.is_set()
+    stats = policy.stats["solve"]
+    assert (stats.wins, stats.cancelled, stats.abandoned) == (1, 1, 0)
+    assert policy.latency.count("solve") == 2
+    assert "1 cancelled, 0 abandoned" in policy.report()
+
+
+def test_engine_routes_phase_calls_through_the_policy(fake_backend, llm_config, task):
+    policy = HedgePolicy(phases=["select"],min_samples=1,max_rate=1.0)
+    config = dataclasses.replace(llm_config,hedge=policy)
+    for _ in range(3):
+        assert reasoningEngine.select(task,config) == {"reasoning_modules": [1, 15, 32]}
+    assert policy.stats["select"].calls == 3
+    assert list(policy.stats) == ["select"]
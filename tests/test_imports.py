@@ -0,0 +1,15 @@
+import autologic
+import subprocess
+import sys
+import os
+
+HEAVY_MODULES = ("openai", "llama_cpp", "google.generativeai", "numpy")
+
+
+def test_engine_and_cli_imports_stay_light():
+    # Backends and their SDKs are imported on first use, so a fresh interpreter must not load them.
+    code = "import sys, autologic.reasoningEngine, autologic.cli; print(' '.join(sorted(set(sys.argv[1:]) & set(sys.modules))))"
+    src = os.path.dirname(os.path.dirname(os.path.abspath(autologic.__file__)))
+    env = dict(os.environ,PYTHONPATH=os.pathsep.join(filter(None,(src, os.environ.get("PYTHONPATH")))))
+    result = subprocess.run([sys.executable, "-c", code, *HEAVY_MODULES],env=env,capture_output=True,text=True,check=True)
+    assert result.stdout.split() == []
@@ -0,0 +1,102 @@
+from autologic import jsonRepair
+from autologic import utils
+import pytest
+
+
+@pytest.mark.parametrize("response, value, repair", [
+    ('{"a": 1, "b": [1, 2,],}', {"a": 1, "b": [1, 2]}, "trailing comma"),
+    ('{"a": 1, // note\n "b": /* inline */ 2}', {"a": 1, "b": 2}, "comment"),
+    ("{'a': 'x'}", {"a": "x"}, "single quotes"),
+    ('{a: 1, b_c: "x"}', {"a": 1, "b_c": "x"}, "unquoted key"),
+    ('{"a": "He said "hi" to me", "b": 1}', {"a": 'He said "hi" to me', "b": 1}, "unescaped quote"),
+    ('{"a": "line one\nline two"}', {"a": "line one\nline two"}, "control character in string"),
+    ('{"a": "x" "b": 2}', {"a": "x", "b": 2}, "missing comma"),
+    ('{"a": 1\n "b": 2}', {"a": 1, "b": 2}, "missing comma"),
+    ('{"a": 1,, "b": 2}', {"a": 1, "b": 2}, "extra comma"),
+    ('{"a": [1, 2}}', {"a": [1, 2]}, "mismatched bracket"),
+    ('{"a": True, "b": None}', {"a": True, "b": None}, "python literal"),
+    ('{"a": yes}', {"a": "yes"}, "unquoted value"),
+    ('{"a": "\\q"}', {"a": "q"}, "invalid escape"),
+    ('{"a": .5, "b": 2.}', {"a": 0.5, "b": 2.0}, "malformed number"),
+])
+def test_repairs(response, value, repair):
+    extraction = jsonRepair.extract(response)
+    assert extraction.value == value
+    assert repair in extraction.repairs
+    assert extraction.complete
+
+
+def test_valid_json_needs_no_repairs():
+    extraction = jsonRepair.extract('Here it is:\n```json\n{"a": [1, {"b": null}]}\n```')
+    assert extraction.value == {"a": [1, {"b": None}]}
+    assert extraction.repairs == []
+    assert extraction.complete and extraction.fenced
+
+
+def test_first_fenced_block_wins():
+    response = 'Intro {"ignored": true}\n```\n{"a": 1}\n```\n```json\n{"b": 2}\n```'
+    assert jsonRepair.extract(response).value == {"a": 1}
+
+
+def test_fenced_array():
+    assert jsonRepair.extract('```json\n["a" "b"]\n```').value == ["a", "b"]
+
+
+def test_missing_closing_fence():
+    extraction = jsonRepair.extract('```json\n{"a": 1}\n')
+    assert extraction.value == {"a": 1}
+    assert extraction.complete
+
+
+def test_bare_object_after_prose_braces():
+    extraction = jsonRepair.extract('Use {curly braces} like this: {"a": 1}')
+    assert extraction.value == {"a": 1}
+    assert not extraction.fenced
+
+
+@pytest.mark.parametrize("response, value", [
+    ('```json\n{"a": "x", "b": "unfinished', {"a": "x"}),
+    ('```json\n{"a": ["x", "y', {"a": ["x"]}),
+    ('```json\n{"a": [1, 2', {"a": [1]}),
+    ('{"a": {"b": "x"}, "c": 1', {"a": {"b": "x"}}),
+    ('{"a": "x" "b', {"a": "x"}),
+    ('{"a": "b', {}),
+])
+def test_truncated_tail_is_closed(response, value):
+    extraction = jsonRepair.extract(response)
+    assert extraction.value == value
+    assert not extraction.complete
+
+
+def test_truncated_bare_object_is_incomplete():
+    with pytest.raises(jsonRepair.IncompleteJSON):
+        utils.extractJSONToDict('{"a": "b')
+    assert utils.extractJSONToDict('{"a": "b',allow_partial=True) == {}
+
+
+@pytest.mark.parametrize("response", ["no json here", "prose {braces here", ""])
+def test_no_json(response):
+    with pytest.raises(ValueError):
+        jsonRepair.extract(response)
+
+
+def test_conform_wraps_and_unwraps():
+    template = {"Reasoning Structure": {"step": "", "FINAL_ANSWER": ""}}
+    inner = {"step": "x", "FINAL_ANSWER": "42"}
+    assert jsonRepair.conform(inner,template) == {"Reasoning Structure": inner}
+    assert jsonRepair.conform({"Wrapper": inner},template["Reasoning Structure"]) == inner
+
+
+def test_missing_fields_subset_and_merge():
+    template = {"a": "", "b": {"c": "", "d": ""}}
+    partial = {"a": "x", "b": {"c": ""}}
+    missing = jsonRepair.missing_fields(partial,template)
+    assert missing == [["b", "c"], ["b", "d"]]
+    assert jsonRepair.subset(template,missing) == {"b": {"c": "", "d": ""}}
+    assert jsonRepair.merge(partial,{"b": {"c": "y", "d": "z"}}) == {"a": "x", "b": {"c": "y", "d": "z"}}
+
+
+def test_missing_json_raises_without_printing(capsys):
+    with pytest.raises(Exception, match="No JSON Found"):
+        utils.extractJSONToDict("I am not sure how to format this.")
+    assert capsys.readouterr().out == ""
@@ -0,0 +1,238 @@
+import threading
+import pickle
+import time
+import pytest
+
+llama_cpp = pytest.importorskip("llama_cpp")
+from autologic import localLLM
+import numpy as np
+
+
+class FakeLlama:
+    # Stands in for llama_cpp.Llama, one token per prompt byte; loads of paths in `blocked` wait until it is set.
+    loads = []
+    blocked = {}
+    longest_token_prefix = staticmethod(llama_cpp.Llama.longest_token_prefix)
+
+    def __init__(self, model_path: str, n_ctx: int = 256, **options):
+        FakeLlama.loads.append(model_path)
+        release = FakeLlama.blocked.get(model_path)
+        if release is not None:
+            release.wait(5)
+        self.model_path = model_path
+        self.input_ids = np.zeros(n_ctx,dtype=np.intc)
+        self.n_tokens = 0
+        self.evaluated = 0
+        self.restored = 0
+        self.calls = []
+
+    def tokenize(self, text: bytes, special: bool = False) -> list:
+        return list(text)
+
+    def reset(self):
+        self.n_tokens = 0
+
+    def eval(self, tokens: list):
+        self.input_ids[self.n_tokens:self.n_tokens + len(tokens)] = tokens
+        self.n_tokens += len(tokens)
+        self.evaluated += len(tokens)
+
+    def save_state(self) -> llama_cpp.LlamaState:
+        llama_state = self.input_ids[:self.n_tokens].astype(np.uint8).tobytes()
+        return llama_cpp.LlamaState(input_ids=self.input_ids.copy(),scores=np.zeros((self.n_tokens,4),dtype=np.single),n_tokens=self.n_tokens,llama_state=llama_state,llama_state_size=len(llama_state),seed=7)
+
+    def load_state(self, state: llama_cpp.LlamaState):
+        self.input_ids = state.input_ids.copy()
+        self.n_tokens = state.n_tokens
+        self.restored += 1
+
+    def __call__(self, prompt: str, stream: bool = False, **options):
+        self.calls.append(dict(options,stream=stream))
+        text = "```json\n{}\n```\nSome commentary."
+        if not stream:
+            return {"choices": [{"text": text}], "usage": {"prompt_tokens": len(prompt), "completion_tokens": len(text)}}
+        return ({"choices": [{"text": char}]} for char in text)
+
+
+@pytest.fixture
+def gguf(tmp_path, monkeypatch):
+    FakeLlama.loads = []
+    FakeLlama.blocked = {}
+    monkeypatch.setattr(localLLM,"Llama",FakeLlama)
+    def make(name: str, size: int = 100) -> str:
+        path = tmp_path / f"{name}.gguf"
+        path.write_bytes(b"\0" * size)
+        return str(path)
+    return make
+
+
+def wait_for(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_resident_models_are_reused(gguf):
+    pool = localLLM.ModelPool()
+    path = gguf("a")
+    assert pool.get(path) is pool.get(path)
+    assert pool.get(path,n_ctx=4000) is not pool.get(path)
+    assert len(FakeLlama.loads) == 2
+    assert (pool.stats.hits, pool.stats.misses) == (2, 2)
+
+
+def test_least_recently_used_model_is_evicted(gguf):
+    pool = localLLM.ModelPool(max_models=2)
+    a, b, c = gguf("a"), gguf("b"), gguf("c")
+    pool.get(a)
+    pool.get(b)
+    pool.get(a)
+    pool.get(c)
+    assert pool.stats.evictions == 1
+    pool.get(a)
+    assert FakeLlama.loads == [a, b, c]
+    pool.get(b)
+    assert FakeLlama.loads == [a, b, c, b]
+
+
+def test_memory_budget_evicts_until_the_new_model_fits(gguf):
+    pool = localLLM.ModelPool(max_models=4,memory_budget=250)
+    pool.get(gguf("a",100))
+    pool.get(gguf("b",100))
+    pool.get(gguf("c",100))
+    assert (len(pool), pool.resident_bytes()) == (2, 200)
+    # The requested model is kept even if it alone is over budget.
+    pool.get(gguf("d",300))
+    assert (len(pool), pool.resident_bytes()) == (1, 300)
+
+
+def test_concurrent_gets_of_one_model_load_it_once(gguf):
+    pool = localLLM.ModelPool()
+    path = gguf("a")
+    FakeLlama.blocked[path] = threading.Event()
+    models = []
+    threads = [threading.Thread(target=lambda: models.append(pool.get(path))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    wait_for(lambda: pool.stats.hits + pool.stats.misses == 4)
+    FakeLlama.blocked[path].set()
+    for thread in threads:
+        thread.join()
+    assert FakeLlama.loads == [path]
+    assert len(models) == 4 and all(model is models[0] for model in models)
+
+
+def test_failed_load_is_not_cached(gguf, monkeypatch):
+    pool = localLLM.ModelPool()
+    path = gguf("a")
+    def broken(**options):
+        raise ValueError("bad file")
+    monkeypatch.setattr(localLLM,"Llama",broken)
+    with pytest.raises(ValueError):
+        pool.get(path)
+    monkeypatch.setattr(localLLM,"Llama",FakeLlama)
+    assert pool.get(path).llm.model_path == path
+
+
+def test_loads_in_flight_count_against_the_budget(gguf):
+    pool = localLLM.ModelPool(max_models=4,memory_budget=200)
+    pool.get(gguf("a",100))
+    b, c = gguf("b",100), gguf("c",100)
+    FakeLlama.blocked = {b: threading.Event(), c: threading.Event()}
+    threads = [threading.Thread(target=pool.get,args=(path,)) for path in (b, c)]
+    threads[0].start()
+    wait_for(lambda: b in FakeLlama.loads)
+    threads[1].start()
+    wait_for(lambda: c in FakeLlama.loads)
+    # b is still loading, so c only fits once a is gone.
+    assert len(pool) == 0 and pool.stats.evictions == 1
+    for event in FakeLlama.blocked.values():
+        event.set()
+    for thread in threads:
+        thread.join()
+    assert pool.resident_bytes() == 200
+
+
+def test_loads_in_flight_count_against_max_models(gguf):
+    pool = localLLM.ModelPool(max_models=2)
+    pool.get(gguf("a"))
+    b = gguf("b")
+    FakeLlama.blocked[b] = threading.Event()
+    thread = threading.Thread(target=pool.get,args=(b,))
+    thread.start()
+    wait_for(lambda: b in FakeLlama.loads)
+    pool.get(gguf("c"))
+    assert len(pool) == 1 and pool.stats.evictions == 1
+    FakeLlama.blocked[b].set()
+    thread.join()
+    assert len(pool) == 2
+
+
+PREFIX = "Instructions and worked examples.\n"
+
+
+def test_prefix_is_evaluated_once_and_restored(gguf):
+    model = localLLM.ModelPool().get(gguf("a"))
+    llm = model.llm
+    localLLM._reuse_prefix(model,PREFIX + "Task one",PREFIX)
+    assert (llm.evaluated, llm.restored) == (len(PREFIX), 0)
+    # Another prompt replaced the context, so the next call restores the prefix instead of evaluating it.
+    llm.reset()
+    llm.eval(list(b"Something else entirely"))
+    evaluated = llm.evaluated
+    localLLM._reuse_prefix(model,PREFIX + "Task two",PREFIX)
+    assert (llm.evaluated, llm.restored) == (evaluated, 1)
+    assert bytes(llm.input_ids[:llm.n_tokens].astype(np.uint8)) == PREFIX.encode("utf-8")
+
+
+def test_prefix_state_is_persisted(gguf, tmp_path):
+    path = gguf("a")
+    cache_dir = str(tmp_path / "kv")
+    first = localLLM._prefix_state(localLLM.ModelPool().get(path),PREFIX,cache_dir)
+    model = localLLM.ModelPool().get(path)
+    state = localLLM._prefix_state(model,PREFIX,cache_dir)
+    assert model.llm.evaluated == 0
+    assert (state.n_tokens, state.llama_state, state.seed) == (first.n_tokens, first.llama_state, first.seed)
+    assert np.array_equal(state.input_ids,first.input_ids) and np.array_equal(state.scores,first.scores)
+
+
+def test_prefix_state_of_other_identity_is_ignored(gguf, tmp_path):
+    path = gguf("a")
+    cache_dir = str(tmp_path / "kv")
+    model = localLLM.ModelPool().get(path)
+    localLLM._prefix_state(model,PREFIX,cache_dir)
+    identity = localLLM._prefix_state_identity(model,PREFIX)
+    state_path = str(tmp_path / "kv" / f"{identity}.kvstate")
+    assert localLLM._load_prefix_state(state_path,identity) is not None
+    assert localLLM._load_prefix_state(state_path,localLLM._prefix_state_identity(model,"Other prefix")) is None
+
+
+class _Payload:
+    def __reduce__(self):
+        return (exec, ("import builtins; builtins.autologic_payload_ran = True",))
+
+
+def test_prefix_state_file_is_never_unpickled(gguf, tmp_path):
+    import builtins
+    cache_dir = tmp_path / "kv"
+    cache_dir.mkdir()
+    model = localLLM.ModelPool().get(gguf("a"))
+    identity = localLLM._prefix_state_identity(model,PREFIX)
+    (cache_dir / f"{identity}.kvstate").write_bytes(pickle.dumps(_Payload()))
+    state = localLLM._prefix_state(model,PREFIX,str(cache_dir))
+    assert not hasattr(builtins,"autologic_payload_ran")
+    # The unreadable file was replaced by a freshly evaluated state.
+    assert model.llm.evaluated == len(PREFIX) and state.n_tokens == len(PREFIX)
+    assert localLLM._load_prefix_state(str(cache_dir / f"{identity}.kvstate"),identity) is not None
+
+
+@pytest.mark.parametrize("streamed", [False, True])
+def test_invoke_passes_the_token_cap(gguf, monkeypatch, streamed):
+    monkeypatch.setattr(localLLM,"_pool",localLLM.ModelPool())
+    path = gguf("a")
+    scanner = localLLM.BlockScanner() if streamed else None
+    text = localLLM.invoke("prompt",gguf_path=path,max_tokens=64,scanner=scanner)
+    assert text == ("```json\n{}\n```" if streamed else "```json\n{}\n```\nSome commentary.")
+    llm = localLLM.get_model(path).llm
+    assert [call["max_tokens"] for call in llm.calls] == [64]
@@ -0,0 +1,80 @@
+from autologic import localWorkers
+from autologic.utils import BlockScanner
+import pytest
+import time
+
+
+def test_parse_cpulist():
+    assert localWorkers._parse_cpulist("0-3,8,10-11\n") == [0, 1, 2, 3, 8, 10, 11]
+    assert localWorkers._parse_cpulist("\n") == []
+
+
+@pytest.fixture
+def cpus(monkeypatch):
+    def set_nodes(*nodes):
+        available = {cpu for node in nodes for cpu in node}
+        monkeypatch.setattr(localWorkers.os,"sched_getaffinity",lambda pid: available,raising=False)
+        monkeypatch.setattr(localWorkers,"_numa_nodes",lambda available: [list(node) for node in nodes])
+    return set_nodes
+
+
+def test_core_sets_spread_workers_over_numa_nodes(cpus):
+    cpus(range(0,4),range(4,8))
+    assert localWorkers.core_sets(4) == [[0, 1], [4, 5], [2, 3], [6, 7]]
+    assert localWorkers.core_sets(3) == [[0, 1], [4, 5, 6, 7], [2, 3]]
+    assert localWorkers.core_sets(1) == [[0, 1, 2, 3]]
+
+
+def test_core_sets_share_cores_when_oversubscribed(cpus):
+    cpus(range(0,2))
+    assert localWorkers.core_sets(3) == [[0], [1], [0]]
+
+
+def test_numa_nodes_fall_back_to_all_cpus(monkeypatch):
+    monkeypatch.setattr(localWorkers.glob,"glob",lambda pattern: [])
+    assert localWorkers._numa_nodes([0, 1, 2]) == [[0, 1, 2]]
+
+
+def test_result_restores_the_scanner():
+    pool = localWorkers.LocalWorkerPool(0)
+    chunks = []
+    scanner = BlockScanner(on_chunk=chunks.append)
+    state = {"text": "```json\n{}\n```", "chunks": 5, "complete": True, "early_stop": True, "elapsed": 0.5}
+    assert pool._result({"text": state["text"], "scanner": state},scanner) == state["text"]
+    assert (scanner.text, scanner.chunks, scanner.complete, scanner.early_stop) == (state["text"], 5, True, True)
+    assert chunks == [state["text"]]
+    with pytest.raises(Exception, match="All local workers have exited"):
+        pool.submit("preload")
+
+
+@pytest.fixture(scope="module")
+def pool():
+    pytest.importorskip("llama_cpp")
+    pool = localWorkers.LocalWorkerPool(2,cores=[[0], [0]])
+    yield pool
+    pool.close()
+
+
+def test_worker_errors_reach_the_caller(pool, tmp_path):
+    missing = str(tmp_path / "missing.gguf")
+    with pytest.raises(Exception):
+        pool.preload(missing)
+    with pytest.raises(Exception, match="FileNotFoundError"):
+        pool.invoke("prompt",gguf_path=missing,max_context=256)
+    # preload raises on the first worker's failure; the other one reports shortly after.
+    deadline = time.monotonic() + 5
+    while sum(stats.failures for stats in pool.utilization()) < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert sum(stats.failures for stats in pool.utilization()) == 3
+    assert all(worker.alive for worker in pool.workers)
+
+
+def test_exited_worker_fails_its_calls_and_is_skipped(pool, tmp_path):
+    worker = pool.workers[0]
+    worker.process.terminate()
+    worker.process.join(5)
+    worker._receiver.join(5)
+    assert not worker.alive
+    assert pool._least_loaded() is pool.workers[1]
+    with pytest.raises(Exception, match="has exited"):
+        pool.submit("preload",worker=worker)
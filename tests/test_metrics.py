@@ -0,0 +1,89 @@
+from autologic import metrics
+from autologic import reasoningEngine
+from autologic.bench import fakeBackend
+from autologic.bench.runner import BACKEND_NAME
+import json
+import pytest
+
+
+@pytest.fixture
+def registry():
+    yield metrics.enable()
+    metrics.disable()
+
+
+def test_recording_is_a_no_op_until_enabled():
+    assert not metrics.enabled()
+    metrics.inc(metrics.RETRIES,phase="select")
+    metrics.observe(metrics.PHASE_SECONDS,1.0,phase="select")
+    assert metrics.timed(metrics.PHASE_SECONDS,phase="select") is metrics._NULL_TIMER
+    assert metrics.enable().snapshot() == {"counters": [], "histograms": []}
+    metrics.disable()
+
+
+def test_histogram_quantiles_interpolate_within_buckets():
+    histogram = metrics.Histogram(buckets=(1.0, 2.0, 4.0))
+    for value in (0.5, 1.5, 1.5, 3.0, 10.0):
+        histogram.observe(value)
+    assert histogram.counts == [1, 2, 1, 1]
+    assert (histogram.count, histogram.sum, histogram.mean) == (5, 16.5, 3.3)
+    assert histogram.quantile(0.2) == 1.0
+    assert histogram.quantile(0.5) == pytest.approx(1.75)
+    # Observations past the last bound report that bound.
+    assert histogram.quantile(1.0) == 4.0
+    assert metrics.Histogram().quantile(0.5) == 0.0
+
+
+def test_prometheus_exposition(registry):
+    metrics.inc(metrics.RETRIES,phase="select")
+    metrics.inc(metrics.RETRIES,2,phase="select")
+    metrics.inc(metrics.BACKEND_ERRORS,backend='a "quoted"\nname')
+    registry.buckets = (1.0, 2.0)
+    metrics.observe(metrics.PHASE_SECONDS,0.5,phase="solve")
+    metrics.observe(metrics.PHASE_SECONDS,1.5,phase="solve")
+    lines = registry.prometheus().splitlines()
+    assert lines.count(f"# TYPE {metrics.RETRIES} counter") == 1
+    assert f'{metrics.RETRIES}{{phase="select"}} 3' in lines
+    assert f'{metrics.BACKEND_ERRORS}{{backend="a \\"quoted\\"\\nname"}} 1' in lines
+    assert f"# TYPE {metrics.PHASE_SECONDS} histogram" in lines
+    assert [line for line in lines if line.startswith(f"{metrics.PHASE_SECONDS}_bucket")] == [
+        f'{metrics.PHASE_SECONDS}_bucket{{phase="solve",le="1.0"}} 1',
+        f'{metrics.PHASE_SECONDS}_bucket{{phase="solve",le="2.0"}} 2',
+        f'{metrics.PHASE_SECONDS}_bucket{{phase="solve",le="+Inf"}} 2',
+    ]
+    assert f'{metrics.PHASE_SECONDS}_count{{phase="solve"}} 2' in lines
+
+
+def test_sinks_receive_samples_and_flushes(tmp_path):
+    jsonl, prom = tmp_path / "metrics.jsonl", tmp_path / "out" / "metrics.prom"
+    metrics.enable([metrics.JSONLinesSink(str(jsonl)),metrics.PrometheusFileSink(str(prom))])
+    metrics.inc(metrics.RETRIES,phase="select")
+    with metrics.timed(metrics.PHASE_SECONDS,phase="select"):
+        pass
+    metrics.disable()
+    samples = [json.loads(line) for line in jsonl.read_text().splitlines()]
+    assert [(sample["kind"], sample["name"], sample["labels"]) for sample in samples] == [
+        ("counter", metrics.RETRIES, {"phase": "select"}),
+        ("histogram", metrics.PHASE_SECONDS, {"phase": "select"}),
+    ]
+    assert f'{metrics.RETRIES}{{phase="select"}} 1' in prom.read_text()
+    assert not list(prom.parent.glob("*.tmp"))
+
+
+def test_solve_records_phases_retries_and_backend_calls(fake_backend, llm_config, task, registry):
+    fake_backend.responses = {"select": ["I am not sure how to format this.", fakeBackend.synthetic_response("select","")]}
+    reasoningEngine.solve(task,llm_config)
+    for phase, attempts in (("select", 2), ("adapt", 1), ("implement", 1), ("solve", 1)):
+        assert registry.histogram(metrics.PHASE_SECONDS,phase=phase).count == attempts
+    assert registry.counter(metrics.RETRIES,phase="select") == 1
+    assert registry.counter(metrics.EXTRACTION_FAILURES,phase="select") == 1
+    assert registry.histogram(metrics.BACKEND_SECONDS,backend=BACKEND_NAME).count == 5
+    assert registry.counter(metrics.BACKEND_ERRORS,backend=BACKEND_NAME) == 0
+
+
+def test_backend_failures_are_counted(fake_backend, llm_config, task, registry):
+    fake_backend.failure_rate = 1.0
+    with pytest.raises(Exception):
+        reasoningEngine.self_discover(task,llm_config,retries=2)
+    assert registry.counter(metrics.BACKEND_ERRORS,backend=BACKEND_NAME) == 2
+    assert registry.counter(metrics.RETRIES,phase="select") == 2
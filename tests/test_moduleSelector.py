@@ -0,0 +1,117 @@
+from autologic import config
+from autologic import metrics
+from autologic import moduleSelector
+from autologic import reasoningEngine
+from autologic.bench import fakeBackend
+from dataclasses import replace
+import json
+import numpy as np
+import pytest
+
+MODULE = config.REASONING_MODULES_LIST[15]
+
+
+@pytest.fixture
+def phases(fake_backend, monkeypatch):
+    seen = []
+    invoke = fake_backend.invoke
+
+    def recording(prompt, llmConfig, template=None, scanner=None, **options):
+        seen.append(fakeBackend.PHASES.get(template,"solve"))
+        return invoke(prompt,llmConfig,template,scanner,**options)
+
+    monkeypatch.setattr(fake_backend,"invoke",recording)
+    return seen
+
+
+def test_similarity_picks_matching_module():
+    selector = moduleSelector.ModuleSelector(threshold=0.9)
+    selection = selector.choose(MODULE)
+    assert selection.source == "similarity"
+    assert selection.reasoning_modules == [15]
+    assert selection.confidence == pytest.approx(1.0)
+    assert selector.select(MODULE) == {"reasoning_modules": [15]}
+
+
+def test_not_confident_below_threshold():
+    selector = moduleSelector.ModuleSelector(threshold=2.0)
+    selection = selector.choose(MODULE)
+    assert selection.reasoning_modules == []
+    assert selection.confidence < selector.threshold
+    assert selector.select(MODULE) is None
+
+
+def test_max_modules_is_bounded():
+    with pytest.raises(ValueError):
+        moduleSelector.ModuleSelector(max_modules=0)
+    with pytest.raises(ValueError):
+        moduleSelector.ModuleSelector(max_modules=6)
+    selector = moduleSelector.ModuleSelector(threshold=-1.0,max_modules=2)
+    assert len(selector.choose(MODULE).reasoning_modules) == 2
+
+
+def test_record_ignores_invalid_labels():
+    selector = moduleSelector.ModuleSelector()
+    selector.record("task",[])
+    selector.record("task",["x"])
+    selector.record("task",[len(config.REASONING_MODULES_LIST)])
+    assert len(selector) == 0
+    selector.record("task",["3", 1, 3])
+    assert selector._labels == [[1, 3]]
+
+
+def test_classifier_trains_after_min_examples():
+    selector = moduleSelector.ModuleSelector(min_examples=2,retrain_every=2,l2=1e-3)
+    selector.record("Add the two fractions together",[2, 7])
+    assert not selector.trained
+    selector.record("Sort the list of words alphabetically",[9])
+    assert selector.trained
+    selection = selector.choose("Add the two fractions together")
+    assert selection.source == "classifier"
+    assert selection.reasoning_modules == [2, 7]
+    # Tasks unlike any logged one are still scored by similarity.
+    assert selector.choose(MODULE).source == "similarity"
+
+
+def test_log_survives_reopen(tmp_path):
+    log_path = str(tmp_path / "selections.jsonl")
+    selector = moduleSelector.ModuleSelector(log_path=log_path,min_examples=2,l2=1e-3)
+    selector.record("Add the two fractions together",[2, 7])
+    selector.record("Sort the list of words alphabetically",[9])
+    with open(log_path,"a") as f:
+        f.write("not json\n")
+    reopened = moduleSelector.ModuleSelector(log_path=log_path,min_examples=2,l2=1e-3)
+    assert len(reopened) == 2
+    assert reopened.trained
+    assert reopened.choose("Sort the list of words alphabetically").reasoning_modules == [9]
+    with open(log_path) as f:
+        assert json.loads(f.readline()) == {"task": "Add the two fractions together", "reasoning_modules": [2, 7]}
+
+
+def test_module_vectors_are_cached(tmp_path, monkeypatch):
+    cache_path = str(tmp_path / "modules.npy")
+    vectors = moduleSelector.ModuleSelector(cache_path=cache_path).module_vectors
+    monkeypatch.setattr(moduleSelector.HashingEmbedder,"embed_batch",lambda self, texts: pytest.fail("module vectors were re-embedded"))
+    assert np.array_equal(moduleSelector.ModuleSelector(cache_path=cache_path).module_vectors,vectors)
+
+
+def test_confident_selector_skips_select_call(phases, llm_config):
+    selector = moduleSelector.ModuleSelector(threshold=0.9)
+    reasoningEngine.self_discover(MODULE,replace(llm_config,selector=selector))
+    assert phases == ["adapt", "implement"]
+    # Local picks are not logged as training examples.
+    assert len(selector) == 0
+
+
+def test_fallback_asks_llm_and_records_selection(phases, llm_config, task):
+    selector = moduleSelector.ModuleSelector(threshold=2.0)
+    registry = metrics.enable()
+    try:
+        reasoningEngine.self_discover(task,replace(llm_config,selector=selector))
+        counters = registry.snapshot()["counters"]
+    finally:
+        metrics.disable()
+    assert phases == ["select", "adapt", "implement"]
+    assert selector._tasks == [task]
+    assert selector._labels == [[1, 15, 32]]
+    assert {"name": metrics.LOCAL_SELECTIONS, "labels": {"source": "similarity", "result": "fallback"}, "value": 1} in counters
@@ -0,0 +1,35 @@
+from autologic import config
+from autologic import prompts
+from autologic import reasoningEngine
+from autologic import structureCache
+from autologic import utils
+import pytest
+
+static_prefix = getattr(reasoningEngine,"__static_prefix")
+
+TEMPLATES = {name: getattr(config,name) for name in dir(config) if name.endswith("PROMPT_TEMPLATE")}
+
+
+@pytest.mark.parametrize("name", sorted(TEMPLATES))
+def test_task_specific_text_comes_last(name):
+    template = TEMPLATES[name]
+    modules = utils.rm_list() if template in prompts.MODULE_LIST_TEMPLATES else "- A chosen module\n"
+    prefix = static_prefix(template,reasoningEngine.ChatTemplate.CHATML)
+    # Everything before the task-specific text is shared, so it must hold the instructions and examples.
+    assert len(prefix) > 0.5 * len(template.split("{task}")[0])
+    task = "A task that only appears once."
+    prompt,_ = reasoningEngine.formatPrompt(template.format(task=task,modules=modules,reasoning_structure="{}",fields="{}"),reasoningEngine.LLMConfig(chat_template=reasoningEngine.ChatTemplate.CHATML))
+    assert prompt.startswith(prefix)
+    assert task in prompt[len(prefix):]
+
+
+def test_module_list_is_part_of_the_prefix():
+    prefix = static_prefix(config.SELECT_PHASE_PROMPT_TEMPLATE,reasoningEngine.ChatTemplate.MIXTRAL_INSTRUCT)
+    assert config.REASONING_MODULES_LIST[-1] in prefix
+    assert prompts.select("Add 2 and 3.").index(config.REASONING_MODULES_LIST[-1]) < prompts.select("Add 2 and 3.").index("Add 2 and 3.")
+
+
+def test_prompt_layout_is_part_of_the_template_version(monkeypatch):
+    version = structureCache._template_version()
+    monkeypatch.setattr(config,"PROMPT_LAYOUT",config.PROMPT_LAYOUT + 1)
+    assert structureCache._template_version() != version
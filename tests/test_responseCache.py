@@ -0,0 +1,78 @@
+from autologic import reasoningEngine
+from autologic import responseCache
+from autologic.responseCache import CacheMode, ResponseCache
+import dataclasses
+import pytest
+
+
+@pytest.fixture
+def use_cache():
+    def use(cache: ResponseCache) -> ResponseCache:
+        responseCache.set_default_cache(cache)
+        return cache
+    yield use
+    responseCache.set_default_cache(None)
+
+
+def test_read_write_serves_repeated_calls(fake_backend, llm_config, task, use_cache):
+    cache = use_cache(ResponseCache())
+    first = reasoningEngine.self_discover(task,llm_config)
+    calls = fake_backend.calls
+    assert reasoningEngine.self_discover(task,llm_config) == first
+    assert fake_backend.calls == calls
+    assert cache.stats.hits == calls and cache.stats.misses == calls
+
+
+def test_sampled_calls_bypass_the_cache(fake_backend, llm_config, task, use_cache):
+    cache = use_cache(ResponseCache())
+    sampled = dataclasses.replace(llm_config,temp=0.8)
+    reasoningEngine.self_discover(task,sampled)
+    reasoningEngine.self_discover(task,sampled)
+    assert len(cache) == 0
+    assert cache.stats.bypassed == fake_backend.calls
+
+
+def test_record_always_calls_the_backend(fake_backend, llm_config, task, use_cache):
+    cache = use_cache(ResponseCache(mode=CacheMode.RECORD))
+    reasoningEngine.self_discover(task,llm_config)
+    calls = fake_backend.calls
+    reasoningEngine.self_discover(task,llm_config)
+    assert fake_backend.calls == 2 * calls
+    assert cache.stats.hits == 0 and len(cache) == calls
+
+
+def test_replay_serves_recorded_responses_offline(fake_backend, llm_config, task, use_cache, tmp_path):
+    path = str(tmp_path / "responses.db")
+    recorder = use_cache(ResponseCache(path,mode=CacheMode.RECORD))
+    recorded = reasoningEngine.self_discover(task,llm_config)
+    recorder.close()
+    fake_backend.failure_rate = 1.0
+    use_cache(ResponseCache(path,mode=CacheMode.REPLAY))
+    assert reasoningEngine.self_discover(task,llm_config) == recorded
+
+
+def test_replay_miss_raises(llm_config, task, use_cache):
+    use_cache(ResponseCache(mode=CacheMode.REPLAY))
+    with pytest.raises(responseCache.CacheMiss):
+        reasoningEngine.self_discover(task,llm_config)
+    with pytest.raises(responseCache.CacheMiss):
+        reasoningEngine.self_discover(task,dataclasses.replace(llm_config,temp=0.8))
+
+
+def test_unparseable_response_is_not_kept(fake_backend, llm_config, task, use_cache):
+    cache = use_cache(ResponseCache())
+    fake_backend.malformed_rate = 1.0
+    with pytest.raises(Exception):
+        reasoningEngine.select(task,llm_config)
+    assert len(cache) == 0
+    assert cache.stats.discards >= 1
+
+
+def test_disk_store_is_kept_under_max_bytes(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.db"),max_entries=1,max_bytes=200)
+    for index in range(10):
+        cache.put(str(index),f"response {index} " + "x" * index * 20)
+    assert cache.disk_bytes() <= 200
+    assert cache.lookup("9") is not None
+    assert cache.stats.evictions > 0
+    cache.close()
@@ -0,0 +1,158 @@
+from autologic import reasoningEngine
+from autologic import scheduler
+from autologic.scheduler import Budget, Priority, Scheduler
+import threading
+import asyncio
+import time
+import pytest
+
+
+class RateLimitError(Exception):
+
+    def __init__(self, headers: dict = None):
+        super().__init__("rate limited")
+        self.status_code = 429
+        self.response = type("Response",(),{"headers": headers or {}})()
+
+
+def wait_for(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_parse_budget():
+    assert scheduler.parse_budget("openai:gpt-4=500/30000") == ("openai:gpt-4", Budget(500,30000))
+    assert scheduler.parse_budget("gemini=60") == ("gemini", Budget(60,None))
+    with pytest.raises(ValueError):
+        scheduler.parse_budget("gemini=lots")
+
+
+def test_rate_limit_delay():
+    assert scheduler.rate_limit_delay(RateLimitError({"retry-after": "2"})) == 2.0
+    assert scheduler.rate_limit_delay(RateLimitError({"retry-after-ms": "250"})) == 0.25
+    assert scheduler.rate_limit_delay(RateLimitError()) == 0.0
+    assert scheduler.rate_limit_delay(ValueError("bad")) is None
+
+
+def test_rate_limited_call_is_retried_and_slows_the_lane():
+    attempts = []
+    def call():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise RateLimitError({"retry-after-ms": "50"})
+        return "ok"
+    schedule = Scheduler()
+    assert schedule.run("openai","gpt",".",call) == "ok"
+    assert attempts[1] - attempts[0] >= 0.05
+    status = schedule.status()["openai"]
+    assert (status["calls"], status["rate_limited"]) == (2, 1)
+    assert status["rate_factor"] == pytest.approx(0.55)
+
+
+def test_other_errors_are_not_retried():
+    def call():
+        raise ValueError("bad")
+    schedule = Scheduler()
+    with pytest.raises(ValueError):
+        schedule.run("openai","gpt",".",call)
+    assert schedule.status()["openai"]["calls"] == 1
+
+
+def test_max_concurrency_is_respected():
+    schedule = Scheduler({"openai": Budget(max_concurrency=2)})
+    running, peak = [0], [0]
+    lock = threading.Lock()
+    def call():
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0],running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+        return "ok"
+    threads = [threading.Thread(target=schedule.run,args=("openai","gpt",".",call)) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak[0] == 2
+    assert schedule.status()["openai"]["calls"] == 6
+
+
+def test_request_budget_spaces_calls():
+    schedule = Scheduler({"openai:gpt": Budget(requests_per_minute=600,burst_seconds=0.1)})
+    start = time.monotonic()
+    for _ in range(3):
+        schedule.run("openai","gpt",".",lambda: "ok")
+    # One call in the burst, then one every 0.1s.
+    assert time.monotonic() - start >= 0.15
+    assert "openai:gpt" in schedule.status()
+
+
+def test_interactive_calls_go_before_batch_calls():
+    schedule = Scheduler({"openai": Budget(max_concurrency=1)})
+    release = threading.Event()
+    order = []
+    def run(priority, name):
+        with scheduler.context(priority,name):
+            schedule.run("openai","gpt",".",lambda: order.append(name) or "ok")
+    blocker = threading.Thread(target=schedule.run,args=("openai","gpt",".",lambda: release.wait() and "ok"))
+    blocker.start()
+    wait_for(lambda: schedule.status()["openai"]["in_flight"] == 1)
+    threads = []
+    for priority, name in ((Priority.BATCH, "batch"), (Priority.INTERACTIVE, "interactive")):
+        threads.append(threading.Thread(target=run,args=(priority,name)))
+        threads[-1].start()
+        wait_for(lambda: schedule.status()["openai"]["queued"] == len(threads))
+    release.set()
+    for thread in [blocker, *threads]:
+        thread.join()
+    assert order == ["interactive", "batch"]
+
+
+def test_async_run():
+    schedule = Scheduler({"openai": Budget(max_concurrency=1)})
+    async def call():
+        await asyncio.sleep(0.01)
+        return "ok"
+    async def main():
+        return await asyncio.gather(*(schedule.async_run("openai","gpt",".",call) for _ in range(3)))
+    assert asyncio.run(main()) == ["ok"] * 3
+    assert schedule.status()["openai"]["calls"] == 3
+
+
+@pytest.fixture
+def default_scheduler():
+    previous = scheduler.default_scheduler()
+    def install(schedule):
+        scheduler.set_default_scheduler(schedule)
+        return schedule
+    yield install
+    scheduler.set_default_scheduler(previous)
+
+
+def test_engine_calls_go_through_the_default_scheduler(llm_config, task, default_scheduler):
+    schedule = default_scheduler(Scheduler({"openai": Budget(requests_per_minute=500)}))
+    reasoningEngine.select(task,llm_config)
+    assert schedule.status()[llm_config.model_type]["calls"] == 1
+
+
+def test_engine_calls_bypass_a_scheduler_without_budgets(llm_config, task, default_scheduler):
+    schedule = default_scheduler(Scheduler())
+    reasoningEngine.select(task,llm_config)
+    assert schedule.status() == {}
+
+
+def test_scheduled_openai_calls_turn_off_sdk_retries(default_scheduler):
+    openai = pytest.importorskip("autologic.openai")
+    backend_call = getattr(reasoningEngine,"__backend_call")
+    llm_config = reasoningEngine.LLMConfig(model_type=reasoningEngine.ModelType.OPENAI,api_key="key")
+    default_scheduler(Scheduler())
+    assert backend_call(".",llm_config,None,None,False,None)[2]["max_retries"] is None
+    default_scheduler(Scheduler({"openai": Budget(requests_per_minute=500)}))
+    assert backend_call(".",llm_config,None,None,False,None)[2]["max_retries"] == 0
+    assert openai.get_client("key",max_retries=0).max_retries == 0
+    assert openai.get_client("key").max_retries == openai._max_retries
+    assert openai.get_client("key",max_retries=0) is openai.get_client("key",max_retries=0)
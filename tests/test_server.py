@@ -0,0 +1,104 @@
+from autologic import structureCache
+from autologic.server import Server, ServerConfig
+import http.client
+import threading
+import json
+import time
+import pytest
+
+
+@pytest.fixture
+def start_server(llm_config):
+    servers = []
+    def start(**options) -> Server:
+        server = Server(ServerConfig(discover_config=llm_config,port=0,**options))
+        threading.Thread(target=server.httpd.serve_forever,kwargs={"poll_interval": 0.01},daemon=True).start()
+        servers.append(server)
+        return server
+    yield start
+    for server in servers:
+        server.httpd.shutdown()
+        server.httpd.server_close()
+    structureCache.set_default_cache(None)
+
+
+def request(server: Server, method: str, path: str, body=None) -> tuple:
+    connection = http.client.HTTPConnection(*server.httpd.server_address[:2],timeout=10)
+    payload = body if isinstance(body,(bytes, type(None))) else json.dumps(body).encode("utf-8")
+    connection.request(method,path,body=payload,headers={"Content-Type": "application/json"})
+    response = connection.getresponse()
+    result = (response.status,json.loads(response.read()),response.getheader("Retry-After"))
+    connection.close()
+    return result
+
+
+def test_solve(start_server, task):
+    status, body, _ = request(start_server(),"POST","/v1/solve",{"task": task})
+    assert status == 200
+    assert body["answer"] == "42"
+
+
+def test_self_discover_then_solve_with_structure(start_server, task):
+    server = start_server()
+    status, body, _ = request(server,"POST","/v1/self_discover",{"task": task, "discovery_mode": "fused"})
+    assert status == 200
+    status, body, _ = request(server,"POST","/v1/solve_with_structure",{"task": task, "reasoning_structure": body["reasoning_structure"]})
+    assert (status, body["answer"]) == (200, "42")
+
+
+@pytest.mark.parametrize("path, body", [
+    ("/v1/solve", b"not json"),
+    ("/v1/solve", [1, 2]),
+    ("/v1/solve", {}),
+    ("/v1/solve", {"task": "  "}),
+    ("/v1/solve", {"task": "Add 2 and 3.", "retries": 0}),
+    ("/v1/solve", {"task": "Add 2 and 3.", "retries": "3"}),
+    ("/v1/solve", {"task": "Add 2 and 3.", "reuse_structure": "yes"}),
+    ("/v1/solve", {"task": "Add 2 and 3.", "discovery_mode": "two_step"}),
+    ("/v1/solve", {"task": "Add 2 and 3.", "priority": "urgent"}),
+    ("/v1/solve_with_structure", {"task": "Add 2 and 3."}),
+    ("/v1/solve_with_structure", {"task": "Add 2 and 3.", "reasoning_structure": {}}),
+    ("/v1/solve_with_structure", {"task": "Add 2 and 3.", "reasoning_structure": ["step"]}),
+])
+def test_bad_requests_are_rejected_before_dispatch(start_server, fake_backend, path, body):
+    status, response, _ = request(start_server(),"POST",path,body)
+    assert status == 400
+    assert response["error"]
+    assert fake_backend.calls == 0
+
+
+def test_unknown_paths(start_server):
+    server = start_server()
+    assert request(server,"POST","/v1/unknown",{"task": "x"})[0] == 404
+    assert request(server,"GET","/v1/solve")[0] == 404
+
+
+def test_backend_failure_is_500(start_server, fake_backend, task):
+    fake_backend.failure_rate = 1.0
+    status, body, _ = request(start_server(),"POST","/v1/solve",{"task": task, "retries": 1})
+    assert status == 500
+    assert body["error"]
+
+
+def test_full_lane_is_429(start_server, fake_backend, llm_config, task):
+    fake_backend.latency = 0.2
+    server = start_server(concurrency={llm_config.model_type: 1},queue_size=0)
+    first = threading.Thread(target=request,args=(server,"POST","/v1/solve",{"task": task}))
+    first.start()
+    deadline = time.monotonic() + 5
+    while server.lanes[llm_config.model_type].running == 0:
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+    status, body, retry_after = request(server,"POST","/v1/solve",{"task": task})
+    first.join()
+    assert (status, retry_after) == (429, "1")
+
+
+def test_draining_is_503(start_server, task):
+    server = start_server()
+    assert request(server,"GET","/healthz")[0] == 200
+    assert server.drain(timeout=1)
+    status, body, retry_after = request(server,"POST","/v1/solve",{"task": task})
+    assert (status, retry_after) == (503, "1")
+    status, health, _ = request(server,"GET","/healthz")
+    assert (status, health["status"]) == (503, "draining")
@@ -0,0 +1,74 @@
+from autologic import config
+from autologic import reasoningEngine
+from autologic.utils import BlockScanner
+import dataclasses
+import pytest
+
+local_invoke_args = getattr(reasoningEngine,"__local_invoke_args")
+
+RESPONSE = "Sure.\n```json\n{\"a\": \"``\"}\n```\nLet me know if you need anything else."
+
+
+def feed(scanner: BlockScanner, text: str, size: int) -> int:
+    # Chunks fed until the scanner asked to stop, or all of them.
+    for count, start in enumerate(range(0,len(text),size),1):
+        if scanner.feed(text[start:start + size]):
+            return count
+    return None
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 16, 1000])
+def test_scanner_stops_at_the_closing_fence(size):
+    scanner = BlockScanner()
+    assert feed(scanner,RESPONSE,size) is not None
+    block_end = RESPONSE.index("```",RESPONSE.index("```") + 3) + 3
+    # At most the chunk carrying the closing fence is read past it.
+    assert block_end <= len(scanner.text) < block_end + size
+    assert scanner.text.startswith(RESPONSE[:block_end])
+
+
+@pytest.mark.parametrize("size", [1, 4, 1000])
+def test_scanner_balances_bare_json_objects(size):
+    text = '  {"a": {"b": "}\\" {"}, "c": "x"} trailing'
+    object_end = text.index("} trailing") + 1
+    scanner = BlockScanner()
+    assert feed(scanner,text,size) is not None
+    assert object_end <= len(scanner.text) < object_end + size
+    assert scanner.text.startswith(text[:object_end])
+
+
+def test_scanner_without_json_waits_for_a_fence():
+    scanner = BlockScanner(json_block=False)
+    assert feed(scanner,'{"a": 1} then ```md\n- step\n``` done',4) is not None
+    assert "- step\n```" in scanner.text
+
+
+def test_scanner_can_run_to_completion():
+    chunks = []
+    scanner = BlockScanner(stop_at_block=False,on_chunk=chunks.append)
+    assert feed(scanner,RESPONSE,8) is None
+    assert scanner.complete and scanner.text == RESPONSE == "".join(chunks)
+
+
+def test_stream_stops_each_phase_after_its_block(fake_backend, llm_config, task, monkeypatch):
+    scanners = []
+    invoke = fake_backend.invoke
+
+    def recording_invoke(prompt, llmConfig, template=None, scanner=None, **options):
+        scanners.append(scanner)
+        return invoke(prompt,llmConfig,template,scanner)
+    monkeypatch.setattr(fake_backend,"invoke",recording_invoke)
+
+    answer = reasoningEngine.solve(task,dataclasses.replace(llm_config,stream=True))
+    assert answer == "42"
+    assert len(scanners) == 4
+    assert all(scanner.early_stop and not scanner.text.rstrip().endswith("else.") for scanner in scanners)
+
+
+def test_local_calls_carry_a_per_phase_token_cap():
+    llm_config = reasoningEngine.LLMConfig(model_type=reasoningEngine.ModelType.LOCAL,gguf_path="model.gguf")
+    caps = {template: local_invoke_args("prompt",llm_config,template)["max_tokens"] for template in config.COMPACT_TEMPLATES}
+    assert caps[config.SELECT_PHASE_PROMPT_TEMPLATE] < caps[config.IMPLEMENT_PHASE_PROMPT_TEMPLATE] < caps[config.SOLVE_PROMPT_TEMPLATE]
+    for template, compact in config.COMPACT_TEMPLATES.items():
+        assert local_invoke_args("prompt",llm_config,compact)["max_tokens"] == caps[template]
+    assert local_invoke_args("prompt",llm_config)["max_tokens"] is None
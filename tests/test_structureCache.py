@@ -0,0 +1,57 @@
+from autologic import reasoningEngine
+from autologic import structureCache
+
+
+def test_cache_key_normalizes_task_and_separates_models(llm_config):
+    other = reasoningEngine.LLMConfig(model_type=llm_config.model_type,model_name="other")
+    assert structureCache.cache_key("Add  2\nand 3",llm_config) == structureCache.cache_key(" Add 2 and 3 ",llm_config)
+    assert structureCache.cache_key("Add 2 and 3",llm_config) != structureCache.cache_key("Add 2 and 3",other)
+
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = structureCache.MemoryStructureCache(max_entries=2)
+    cache.put("a",{"a": 1})
+    cache.put("b",{"b": 1})
+    assert cache.get("a") == {"a": 1}
+    cache.put("c",{"c": 1})
+    assert cache.get("b") is None
+    assert len(cache) == 2
+    assert (cache.stats.hits, cache.stats.misses, cache.stats.evictions) == (1, 1, 1)
+
+
+def test_memory_cache_expires_entries():
+    cache = structureCache.MemoryStructureCache(ttl=-1)
+    cache.put("a",{"a": 1})
+    assert cache.get("a") is None
+    assert cache.stats.expirations == 1
+
+
+def test_sqlite_cache_survives_reopen(tmp_path):
+    path = str(tmp_path / "structures.db")
+    cache = structureCache.SQLiteStructureCache(path)
+    cache.put("a",{"step": "x", "FINAL_ANSWER": ""})
+    cache.close()
+    cache = structureCache.SQLiteStructureCache(path,max_entries=1)
+    assert cache.get("a") == {"step": "x", "FINAL_ANSWER": ""}
+    cache.put("b",{"b": 1})
+    assert len(cache) == 1
+    assert cache.get("a") is None
+    cache.close()
+
+
+def test_tiered_cache_promotes_disk_hits(tmp_path):
+    disk = structureCache.SQLiteStructureCache(str(tmp_path / "structures.db"))
+    disk.put("a",{"a": 1})
+    cache = structureCache.TieredStructureCache(structureCache.MemoryStructureCache(),disk)
+    assert cache.get("a") == {"a": 1}
+    assert len(cache.memory) == 1
+    disk.close()
+
+
+def test_self_discover_reuses_cached_structure(fake_backend, llm_config, task):
+    cache = structureCache.MemoryStructureCache()
+    first = reasoningEngine.self_discover(task,llm_config,cache=cache)
+    calls = fake_backend.calls
+    assert reasoningEngine.self_discover(" ".join(task.split()) + " ",llm_config,cache=cache) == first
+    assert fake_backend.calls == calls
+    assert cache.stats.hits == 1
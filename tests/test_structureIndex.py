@@ -0,0 +1,63 @@
+from autologic import reasoningEngine
+from autologic import structureIndex
+import pytest
+
+
+def test_index_matches_similar_tasks_per_model():
+    index = structureIndex.StructureIndex(threshold=0.5)
+    index.add("John has 12 apples and gives 5 away. How many are left?",{"apples": ""},model="a")
+    index.add("Sort these words alphabetically: pear, fig, apple.",{"sort": ""},model="a")
+    match = index.lookup("Mary has 20 apples and gives 7 away. How many are left?",model="a")
+    assert match is not None and match.structure == {"apples": ""}
+    assert index.lookup("Mary has 20 apples and gives 7 away. How many are left?",model="b") is None
+    assert index.lookup("What is the capital of France?",model="a") is None
+
+
+def test_index_reopens_from_disk(tmp_path):
+    path = str(tmp_path / "index")
+    index = structureIndex.StructureIndex(path)
+    index.add_batch(["Add 2 and 3.", "Sort pear, fig and apple."],[{"add": ""}, {"sort": ""}],model="a")
+    index = structureIndex.StructureIndex(path)
+    assert len(index) == 2
+    assert index.search("Sort fig, pear and apple.",model="a").structure == {"sort": ""}
+    assert index.search("Add 2 and 3.",model="b") is None
+
+
+def test_index_rejects_other_embedder(tmp_path):
+    path = str(tmp_path / "index")
+    structureIndex.StructureIndex(path).add("Add 2 and 3.",{"add": ""})
+    with pytest.raises(ValueError):
+        structureIndex.StructureIndex(path,embedder=structureIndex.HashingEmbedder(dim=64))
+
+
+def test_self_discover_reuses_indexed_structure(fake_backend, llm_config):
+    index = structureIndex.StructureIndex(threshold=0.5)
+    reasoningEngine.self_discover("John has 12 apples and gives 5 away. How many are left?",llm_config,index=index)
+    calls = fake_backend.calls
+    reasoningEngine.self_discover("Mary has 20 apples and gives 7 away. How many are left?",llm_config,index=index)
+    assert fake_backend.calls == calls
+
+
+def test_index_reopen_reuses_saved_clusters(tmp_path, monkeypatch):
+    path = str(tmp_path / "index")
+    words = ["alpha", "beta", "gamma", "delta", "omega"]
+    tasks = [f"Task {first} after {second}" for first in words for second in words if first != second]
+    index = structureIndex.StructureIndex(path,exact_below=8)
+    index.add_batch(tasks[:10],[{"task": task} for task in tasks[:10]],model="a")
+    index.add_batch(tasks[10:],[{"task": task} for task in tasks[10:]],model="a")
+
+    def train(self, iterations=8):
+        raise AssertionError("retrained on reopen")
+    monkeypatch.setattr(structureIndex._Partition,"train",train)
+    reopened = structureIndex.StructureIndex(path,exact_below=8)
+    assert isinstance(reopened._vectors.array,structureIndex.np.memmap)
+    partition, original = reopened._partitions["a"], index._partitions["a"]
+    assert sorted(map(sorted,(ids.view().tolist() for ids in partition.lists))) == sorted(map(sorted,(ids.view().tolist() for ids in original.lists)))
+    for task in tasks:
+        assert reopened.search(task,model="a").structure == {"task": task}
+
+
+def test_index_trains_on_a_single_entry():
+    index = structureIndex.StructureIndex(exact_below=1)
+    index.add("Add 2 and 3.",{"add": ""})
+    assert index.search("Add 2 and 3.").structure == {"add": ""}
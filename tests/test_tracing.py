@@ -0,0 +1,160 @@
+from autologic import reasoningEngine
+from autologic import tracing
+from autologic.bench.runner import BACKEND_NAME
+import asyncio
+import json
+import pytest
+import time
+
+
+@pytest.fixture
+def tracer():
+    yield tracing.enable()
+    tracing.disable()
+
+
+def by_name(records: list) -> dict:
+    return {record["name"]: record for record in records}
+
+
+def test_spans_are_no_ops_until_enabled():
+    assert not tracing.enabled()
+    with tracing.span("phase") as span:
+        span.set(chars=1)
+    assert span is tracing._NULL_SPAN
+    tracing.adopt([{"name": "x", "category": "y", "args": {}, "error": None, "offset": 0.0, "seconds": 0.0, "parent": None}],time.perf_counter())
+    assert tracing.tracer() is None
+
+
+def test_spans_nest_and_record_errors(tracer):
+    with pytest.raises(ValueError):
+        with tracing.span("outer",task="t"):
+            with tracing.span("inner","phase") as inner:
+                inner.set(chars=3)
+            raise ValueError("boom")
+    with tracing.span("next"):
+        pass
+    records = by_name(tracer.records())
+    assert records["inner"]["parent"] == records["outer"]["id"]
+    assert records["inner"]["trace"] == records["outer"]["trace"] == records["outer"]["id"]
+    assert (records["inner"]["category"], records["inner"]["args"]) == ("phase", {"chars": 3})
+    assert records["outer"]["error"] == "boom"
+    assert "error" not in records["inner"]
+    # A span opened outside any other starts a new trace.
+    assert records["next"]["trace"] == records["next"]["id"] != records["outer"]["trace"]
+
+
+def test_solve_records_phase_and_backend_spans(tracer, llm_config, task):
+    reasoningEngine.solve(task,llm_config)
+    records = tracer.records()
+    ids = {record["id"]: record for record in records}
+    roots = [record for record in records if record["parent"] is None]
+    assert [root["name"] for root in roots] == ["request"]
+    assert roots[0]["args"] == {"task": task[:120]}
+    assert {record["trace"] for record in records} == {roots[0]["id"]}
+    phases = [record["name"] for record in records if record["category"] == "phase"]
+    assert phases == ["select", "adapt", "implement", "solve"]
+    backend_calls = [record for record in records if record["category"] == "backend"]
+    assert len(backend_calls) == 4
+    for record in backend_calls:
+        assert record["name"] == BACKEND_NAME
+        assert ids[record["parent"]]["name"] == "invoke"
+        assert record["args"]["completion_chars"] > 0
+
+
+def test_concurrent_tasks_get_their_own_traces_and_tracks(tracer):
+    async def request(name: str):
+        with tracing.span(name):
+            await asyncio.sleep(0.01)
+            with tracing.span(name + ".child"):
+                pass
+
+    async def main():
+        await asyncio.gather(request("a"),request("b"))
+
+    asyncio.run(main())
+    spans = {span.name: span for span in tracer.spans}
+    assert spans["a.child"].trace == spans["a"].id
+    assert spans["b.child"].trace == spans["b"].id
+    assert spans["a"].track == spans["a.child"].track != spans["b"].track
+
+
+def test_detach_and_adopt_replay_spans_under_the_current_span(tracer):
+    start = time.perf_counter()
+    with tracing.span("worker","llama.cpp"):
+        with tracing.span("generate","llama.cpp",stream=False):
+            pass
+    with pytest.raises(RuntimeError):
+        with tracing.span("failed"):
+            raise RuntimeError("no model")
+    records = tracing.detach(list(tracer.spans),start)
+    # Records are plain data, so they survive a process boundary.
+    assert json.loads(json.dumps(records)) == records
+    detached = by_name(records)
+    assert detached["generate"]["parent"] == records.index(detached["worker"])
+    assert detached["worker"]["parent"] is None
+    assert detached["failed"]["error"] == "no model"
+
+    parent_tracer = tracing.enable()
+    adopted_at = time.perf_counter()
+    with tracing.span("request") as request:
+        tracing.adopt(records,adopted_at)
+    spans = {span.name: span for span in parent_tracer.spans}
+    assert spans["worker"].parent == spans["failed"].parent == request.id
+    assert spans["generate"].parent == spans["worker"].id
+    assert {span.trace for span in spans.values()} == {request.id}
+    assert spans["worker"].track == request.track
+    assert spans["generate"].start == pytest.approx(adopted_at + detached["generate"]["offset"])
+    assert spans["generate"].seconds == detached["generate"]["seconds"]
+    assert spans["generate"].args == {"stream": False}
+    assert spans["failed"].error == "no model"
+    assert len({span.id for span in spans.values()}) == 4
+
+
+def test_adopt_outside_a_span_starts_a_trace(tracer):
+    start = time.perf_counter()
+    with tracing.span("worker"):
+        with tracing.span("generate"):
+            pass
+    records = tracing.detach(list(tracer.spans),start)
+    parent_tracer = tracing.enable()
+    tracing.adopt(records,start)
+    spans = {span.name: span for span in parent_tracer.spans}
+    # The outermost span finishes last, so it is the root of the adopted trace.
+    assert spans["worker"].parent is None
+    assert spans["generate"].trace == spans["worker"].trace == spans["worker"].id
+
+
+def test_traced_truncates_task(tracer):
+    @tracing.traced("request")
+    def run(task: str, retries: int = 1):
+        return retries
+
+    @tracing.traced("request")
+    async def async_run(task: str):
+        return task
+
+    assert run(task="x" * 200) == 1
+    assert asyncio.run(async_run("short")) == "short"
+    run(None)
+    assert [record["args"] for record in tracer.records()] == [{"task": "x" * 120}, {"task": "short"}, {}]
+
+
+def test_export_writes_chrome_and_jsonl(tmp_path):
+    live_path = str(tmp_path / "live.jsonl")
+    tracing.enable(live_path)
+    try:
+        with tracing.span("request",task="t"):
+            with tracing.span("select","phase"):
+                pass
+        with open(live_path) as f:
+            assert [json.loads(line)["name"] for line in f] == ["select", "request"]
+        chrome_path = str(tmp_path / "trace" / "trace.json")
+        tracing.tracer().export(chrome_path)
+    finally:
+        tracing.disable()
+    with open(chrome_path) as f:
+        events = json.load(f)["traceEvents"]
+    assert [event["name"] for event in events] == ["select", "request", "process_name"]
+    assert events[0]["args"]["parent"] == events[1]["args"]["id"]
+    assert events[2]["args"] == {"name": f"{events[1]['pid']}: request t"}